@@ -0,0 +1,282 @@
+"""
+Negotiated gzip/brotli compression of JSON and text responses.
+
+Deck payloads with several levels per card and review history are large and
+repetitive JSON; compressed they are a fraction of the size. CompressionMiddleware
+picks brotli or gzip from Accept-Encoding and compresses responses of a
+compressible type from `minimum_size` bytes on, at a tunable level (brotli
+quality 11 and gzip 9 cost a lot of CPU for little gain on dynamic responses).
+
+Successful GET responses get a weak ETag from a hash of their uncompressed body
+(unless the route set one) and a 304 for a matching If-None-Match. Compressed
+bodies are cached by that hash in a CompressedBodyCache bounded in bytes, so an
+unchanged deck is compressed once, not on every request. Streamed responses
+(e.g. CSV exports) are compressed as they are sent and not cached.
+"""
+
+import hashlib
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable
+
+import brotli
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+# Bodies from this size on are compressed in a thread, not on the event loop
+INLINE_COMPRESSION_LIMIT = 64 * 1024
+
+# Preferred first when the client accepts both with the same q-value
+ENCODINGS = ("br", "gzip")
+
+
+def negotiate_encoding(accept_encoding: str) -> str | None:
+    """Encoding to use for an Accept-Encoding header, None for the identity."""
+    weights: dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding.strip()] = q
+    best, best_q = None, 0.0
+    for encoding in ENCODINGS:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of If-None-Match with an ETag (RFC 9110, 13.1.2)."""
+    opaque = etag.removeprefix("W/")
+    tags = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return any(tag == "*" or tag == opaque for tag in tags)
+
+
+def _weak(etag: str) -> str:
+    return etag if etag.startswith("W/") else f"W/{etag}"
+
+
+class CompressedBodyCache:
+    """LRU of compressed bodies by (body hash, encoding, level), bounded in bytes."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._bodies: OrderedDict[tuple, bytes] = OrderedDict()
+
+    def get(self, key: tuple) -> bytes | None:
+        body = self._bodies.get(key)
+        if body is None:
+            self.misses += 1
+            return None
+        self._bodies.move_to_end(key)
+        self.hits += 1
+        return body
+
+    def put(self, key: tuple, body: bytes) -> None:
+        if len(body) > self.max_bytes or key in self._bodies:
+            return
+        self._bodies[key] = body
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, evicted = self._bodies.popitem(last=False)
+            self.size -= len(evicted)
+
+    def clear(self) -> None:
+        self._bodies.clear()
+        self.size = 0
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            "entries": len(self._bodies),
+            "size": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+compressed_body_cache = CompressedBodyCache(settings.COMPRESSION_CACHE_MAX_BYTES)
+
+
+class CompressionMiddleware:
+    """Pure ASGI middleware: whole bodies are compressed (and cached) at once, streams per chunk."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int | None = None,
+        gzip_level: int | None = None,
+        brotli_quality: int | None = None,
+        cache: CompressedBodyCache | None = None,
+    ) -> None:
+        self.app = app
+        self.minimum_size = settings.COMPRESSION_MIN_SIZE if minimum_size is None else minimum_size
+        self.gzip_level = settings.COMPRESSION_GZIP_LEVEL if gzip_level is None else gzip_level
+        self.brotli_quality = (
+            settings.COMPRESSION_BROTLI_QUALITY if brotli_quality is None else brotli_quality
+        )
+        self.cache = compressed_body_cache if cache is None else cache
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        encoding = negotiate_encoding(headers.get("accept-encoding", ""))
+        # ETags for GET are added whether the client accepts compression or not
+        if encoding is None and scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        responder = _Responder(self, send, scope["method"], encoding, headers)
+        await self.app(scope, receive, responder.send)
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, mode=brotli.MODE_TEXT, quality=self.brotli_quality)
+        return _gzip_compressor(self.gzip_level)(body, True)
+
+    def level(self, encoding: str) -> int:
+        return self.brotli_quality if encoding == "br" else self.gzip_level
+
+
+def _gzip_compressor(level: int) -> Callable[[bytes, bool], bytes]:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(data: bytes, last: bool) -> bytes:
+        out = compressor.compress(data)
+        return out + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+    return compress
+
+
+def _brotli_compressor(quality: int) -> Callable[[bytes, bool], bytes]:
+    compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=quality)
+
+    def compress(data: bytes, last: bool) -> bytes:
+        out = compressor.process(data)
+        return out + (compressor.finish() if last else compressor.flush())
+
+    return compress
+
+
+class _Responder:
+    def __init__(
+        self,
+        middleware: CompressionMiddleware,
+        send: Send,
+        method: str,
+        encoding: str | None,
+        request_headers: Headers,
+    ) -> None:
+        self.middleware = middleware
+        self._send = send
+        self.method = method
+        self.encoding = encoding
+        self.if_none_match = request_headers.get("if-none-match")
+        self.start: Message | None = None
+        self.stream: Callable[[bytes, bool], bytes] | None = None
+        self.started = False
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            # Held back until the first body chunk shows whether the body is streamed
+            self.start = message
+            return
+        if message["type"] != "http.response.body" or self.start is None:
+            await self._send(message)
+            return
+        if self.started:
+            await self._send_chunk(message)
+            return
+        self.started = True
+        if message.get("more_body", False):
+            await self._start_stream(message)
+        else:
+            await self._send_whole(message.get("body", b""))
+
+    def _compressible(self, headers: MutableHeaders) -> bool:
+        return "content-encoding" not in headers and headers.get("content-type", "").startswith(
+            COMPRESSIBLE_TYPES
+        )
+
+    async def _send_whole(self, body: bytes) -> None:
+        start = self.start
+        headers = MutableHeaders(scope=start)
+        compressible = self._compressible(headers)
+        digest = None
+        if compressible and self.method == "GET" and start["status"] == 200:
+            digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+            if "etag" not in headers:
+                headers["ETag"] = f'W/"{digest}"'
+            if self.if_none_match and _etag_matches(self.if_none_match, headers["etag"]):
+                await self._send_not_modified(headers)
+                return
+        if compressible:
+            headers.add_vary_header("Accept-Encoding")
+        if compressible and self.encoding is not None and len(body) >= self.middleware.minimum_size:
+            body = await self._compressed(body, digest)
+            headers["Content-Encoding"] = self.encoding
+            headers["Content-Length"] = str(len(body))
+            if "etag" in headers:
+                headers["ETag"] = _weak(headers["etag"])
+        await self._send(start)
+        await self._send({"type": "http.response.body", "body": body})
+
+    async def _compressed(self, body: bytes, digest: str | None) -> bytes:
+        middleware, encoding = self.middleware, self.encoding
+        key = (digest, encoding, middleware.level(encoding))
+        if digest is not None:
+            cached = middleware.cache.get(key)
+            if cached is not None:
+                return cached
+        if len(body) < INLINE_COMPRESSION_LIMIT:
+            compressed = middleware.compress(body, encoding)
+        else:
+            compressed = await run_in_threadpool(middleware.compress, body, encoding)
+        if digest is not None:
+            middleware.cache.put(key, compressed)
+        return compressed
+
+    async def _send_not_modified(self, headers: MutableHeaders) -> None:
+        for name in ("content-length", "content-type"):
+            del headers[name]
+        headers.add_vary_header("Accept-Encoding")
+        await self._send({**self.start, "status": 304})
+        await self._send({"type": "http.response.body", "body": b""})
+
+    async def _start_stream(self, message: Message) -> None:
+        headers = MutableHeaders(scope=self.start)
+        if self._compressible(headers) and self.encoding is not None:
+            level = self.middleware.level(self.encoding)
+            if self.encoding == "br":
+                self.stream = _brotli_compressor(level)
+            else:
+                self.stream = _gzip_compressor(level)
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            del headers["content-length"]
+        await self._send(self.start)
+        await self._send_chunk(message)
+
+    async def _send_chunk(self, message: Message) -> None:
+        if self.stream is None:
+            await self._send(message)
+            return
+        more_body = message.get("more_body", False)
+        body = self.stream(message.get("body", b""), not more_body)
+        await self._send({"type": "http.response.body", "body": body, "more_body": more_body})
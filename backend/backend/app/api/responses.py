@@ -0,0 +1,39 @@
+# backend/app/api/responses.py
+"""
+JSON responses for large payloads (card lists, study sessions, sync).
+
+A route with a response_model has what it returns validated by FastAPI against
+the model once more and then serialized; routes that build their response
+models from database rows pay for validation twice, and routes returning plain
+dicts go through jsonable_encoder() and json.dumps(), both in Python. Returned
+from a route, FastJSONResponse skips all of that: Pydantic models are dumped as
+they are by Pydantic's serializer (by alias, as FastAPI does), plain data by
+orjson. Routes keep their response_model for the OpenAPI schema.
+
+Only return models that match the route's response_model: nothing checks them
+any more. See benchmarks/json_responses.py for the gain.
+"""
+
+from typing import Any
+
+import orjson
+import pydantic_core
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+def _holds_models(content: Any) -> bool:
+    if isinstance(content, (list, tuple)):
+        return bool(content) and isinstance(content[0], BaseModel)
+    return isinstance(content, BaseModel)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse serializing Pydantic models with Pydantic and other data with orjson."""
+
+    def render(self, content: Any) -> bytes:
+        if _holds_models(content):
+            return pydantic_core.to_json(content, by_alias=True)
+        # Types orjson doesn't know (e.g. Decimal) are converted as FastAPI would
+        return orjson.dumps(content, default=jsonable_encoder, option=orjson.OPT_NON_STR_KEYS)
@@ -1,16 +1,31 @@
 # backend/app/api/routes/cards.py
 from datetime import datetime, timezone
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Literal
 from uuid import UUID
 
-from fastapi import APIRouter, Body, Depends, File, Form, HTTPException, Response, UploadFile
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    File,
+    Form,
+    HTTPException,
+    Query,
+    Response,
+    UploadFile,
+)
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from sqlalchemy.orm.attributes import flag_modified
 from starlette import status
 
+from app.api.responses import FastJSONResponse
 from app.auth.dependencies import get_current_user_id
 from app.core.enums import ReviewRating
+from app.core.uuid7 import uuid7
 from app.db.session import SessionLocal
 from app.models.card import Card
 from app.models.card_level import CardLevel
@@ -27,10 +42,23 @@ from app.schemas.cards import (
     CreateCardRequest,
     CreateCardResponse,
     McqContentIn,
+    MediaManifest,
+    MediaUploadConfirm,
+    MediaUploadUrlRequest,
+    MediaUploadUrlResponse,
     QaContentIn,
     ReplaceLevelsRequest,
 )
 from app.services.deck_access import is_deck_editor
+from app.services.media_manifest import build_media_manifest, stream_media_bundle
+from app.services.media_store import (
+    confirm_media_upload,
+    discard_media,
+    presign_media_upload,
+    store_media,
+)
+from app.services.media_variants import attach_image_srcsets
+from app.services.review_history_buffer import review_history_buffer
 from app.services.review_service import ReviewService
 from app.services.storage_service import FileType, storage_service
 
@@ -88,6 +116,78 @@ def _ensure_active_progress(
     return progress
 
 
+def _lock_client_review_id(db: Session, user_id: UUID, client_review_id: UUID) -> None:
+    """
+    Serialize reviews carrying the same client review id until the transaction ends.
+
+    The unique index includes reviewed_at (the partition key), so two retries with
+    different ratedAt values would both pass it; under this lock the second one
+    finds the first one's row instead.
+    """
+    db.execute(
+        text("SELECT pg_advisory_xact_lock(hashtextextended(:key, 0))"),
+        {"key": f"review:{user_id}:{client_review_id}"},
+    )
+
+
+def _find_recorded_review(
+    db: Session, user_id: UUID, client_review_id: UUID | None
+) -> tuple[UUID, UUID] | None:
+    """(card_id, card_level_id) of a review already recorded under this client id."""
+    if client_review_id is None:
+        return None
+    row = (
+        db.query(CardReviewHistory.card_id, CardReviewHistory.card_level_id)
+        .filter(
+            CardReviewHistory.user_id == user_id,
+            CardReviewHistory.client_review_id == client_review_id,
+        )
+        .first()
+    )
+    return (row.card_id, row.card_level_id) if row else None
+
+
+def _duplicate_review_response(
+    db: Session, user_id: UUID, card_id: UUID, recorded: tuple[UUID, UUID]
+) -> ReviewResponse:
+    """Current state of the reviewed level, returned to a client that retried a review."""
+    recorded_card_id, card_level_id = recorded
+    if recorded_card_id != card_id:
+        # The id was used for another card: this review would be silently dropped
+        raise HTTPException(
+            status_code=409, detail="Client review id already used for another card"
+        )
+    level = db.get(CardLevel, card_level_id)
+    progress = (
+        db.query(CardProgress).filter_by(user_id=user_id, card_level_id=card_level_id).first()
+    )
+    if not level or not progress:
+        # Level or progress was removed after the review was recorded
+        raise HTTPException(status_code=409, detail="Review already recorded")
+    return ReviewResponse(
+        card_id=card_id,
+        card_level_id=card_level_id,
+        level_index=level.level_index,
+        stability=progress.stability,
+        difficulty=progress.difficulty,
+        next_review=progress.next_review,
+        duplicate=True,
+    )
+
+
+def _review_conflict(
+    db: Session, user_id: UUID, card_id: UUID, client_review_id: UUID | None
+) -> ReviewResponse:
+    """Answer a review whose commit failed on a constraint."""
+    db.rollback()
+    # Concurrent retry won the race on the unique client_review_id index
+    duplicate = _find_recorded_review(db, user_id, client_review_id)
+    if duplicate:
+        return _duplicate_review_response(db, user_id, card_id, duplicate)
+    # Otherwise the card or its level was deleted while the review was being recorded
+    raise HTTPException(status_code=404, detail="Card not found")
+
+
 class MoveCardRequest(BaseModel):
     target_deck_id: UUID
 
@@ -267,7 +367,8 @@ def get_cards_for_review(
                 answer_audio_urls=level.answer_audio_urls,
             )
         )
-    return result
+    attach_image_srcsets(db, result)
+    return FastJSONResponse(result)
 
 
 @router.get("/{card_id}/review_preview", response_model=list[ReviewPreviewItem])
@@ -325,6 +426,13 @@ async def review_card(
     if not card:
         raise HTTPException(status_code=404, detail="Card not found")
 
+    # Client retry of an already recorded review: acknowledge without re-applying the policy
+    if payload.client_review_id is not None:
+        _lock_client_review_id(db, user_uuid, payload.client_review_id)
+        duplicate = _find_recorded_review(db, user_uuid, payload.client_review_id)
+        if duplicate:
+            return _duplicate_review_response(db, user_uuid, card_id, duplicate)
+
     settings = _ensure_settings(db, user_uuid)
     progress = _ensure_active_progress(db, user_id=user_uuid, card=card, settings=settings)
 
@@ -341,7 +449,8 @@ async def review_card(
     progress.next_review = updated.next_review
     db.add(progress)
 
-    history_entry = CardReviewHistory(
+    history_row = dict(
+        id=uuid7(),
         user_id=user_uuid,
         card_id=card.id,
         card_level_id=progress.card_level_id,
@@ -350,10 +459,27 @@ async def review_card(
         show_at=payload.shown_at,
         reveal_at=payload.revealed_at or payload.rated_at,
         reviewed_at=payload.rated_at,
+        client_review_id=payload.client_review_id,
     )
-    db.add(history_entry)
+    # Write-behind: a row without a client review id is queued after progress commits.
+    # A row with one is inserted with progress, so a retry waiting on the lock above
+    # (on any worker) finds it and the policy is not applied twice
+    buffered = review_history_buffer.enabled and payload.client_review_id is None
+    if not buffered:
+        db.add(CardReviewHistory(**history_row))
 
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        return _review_conflict(db, user_uuid, card_id, payload.client_review_id)
+
+    if buffered and not review_history_buffer.add(history_row):
+        # Queue is full: fall back to a synchronous insert rather than dropping the row
+        db.add(CardReviewHistory(**history_row))
+        try:
+            db.commit()
+        except IntegrityError:
+            return _review_conflict(db, user_uuid, card_id, payload.client_review_id)
     db.refresh(progress)
 
     level = db.get(CardLevel, progress.card_level_id)
@@ -610,7 +736,43 @@ def get_cards_for_review_with_levels(
                 review_history=reviews_by_card.get(card.id, []),
             )
         )
-    return result
+    attach_image_srcsets(db, [level for item in result for level in item.levels])
+    return FastJSONResponse(result)
+
+
+@router.get("/review/media-manifest", response_model=MediaManifest)
+def get_review_media_manifest(
+    user_id: UUID = Depends(get_current_user_id),
+    limit: int = Query(default=20, ge=1, le=200),
+    manifest_format: Literal["json", "zip"] = Query(default="json", alias="format"),
+    db: Session = Depends(get_db),
+):
+    """
+    Media of the cards due for review (as /review_with_levels returns them),
+    each file once, for prefetching. format=zip streams the files with the
+    manifest in one archive.
+    """
+    now = datetime.now(timezone.utc)
+    card_ids = [
+        row.card_id
+        for row in (
+            db.query(CardProgress.card_id)
+            .filter(CardProgress.user_id == user_id)
+            .filter(CardProgress.is_active.is_(True))
+            .filter(CardProgress.next_review <= now)
+            .order_by(CardProgress.next_review.asc())
+            .limit(limit)
+        )
+    ]
+    levels = db.query(CardLevel).filter(CardLevel.card_id.in_(card_ids)).all()
+    manifest = build_media_manifest(db, card_ids, levels)
+    if manifest_format == "json":
+        return FastJSONResponse(manifest)
+    return StreamingResponse(
+        stream_media_bundle(manifest),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="media.zip"'},
+    )
 
 
 @router.put("/{card_id}/levels", response_model=CardSummary)
@@ -845,21 +1007,17 @@ def upload_level_question_image(
     if card_level.question_image_urls and len(card_level.question_image_urls) >= MAX_IMAGES:
         raise HTTPException(status_code=422, detail=f"Maximum {MAX_IMAGES} images per side allowed")
 
-    # Read file data
-    file_data = file.file.read()
-
     # Check if file is empty
-    if len(file_data) == 0:
+    if not file.size:
         raise HTTPException(status_code=422, detail="File is empty")
 
     # Upload to storage
     try:
-        image_url = storage_service.upload_file(
-            file_data=file_data,
+        image_url = store_media(
+            db,
+            file.file,
             filename=file.filename or "image.jpg",
             content_type=file.content_type or "image/jpeg",
-            card_id=f"{card_id}_{level_index}_{len(card_level.question_image_urls or [])}",
-            side="question",
             file_type=FileType.IMAGE,
         )
     except ValueError as e:
@@ -911,17 +1069,13 @@ def upload_level_answer_image(
     if card_level.answer_image_urls and len(card_level.answer_image_urls) >= MAX_IMAGES:
         raise HTTPException(status_code=422, detail=f"Maximum {MAX_IMAGES} images per side allowed")
 
-    # Read file data
-    file_data = file.file.read()
-
     # Upload to storage
     try:
-        image_url = storage_service.upload_file(
-            file_data=file_data,
+        image_url = store_media(
+            db,
+            file.file,
             filename=file.filename or "image.jpg",
             content_type=file.content_type or "image/jpeg",
-            card_id=f"{card_id}_{level_index}_{len(card_level.answer_image_urls or [])}",
-            side="answer",
             file_type=FileType.IMAGE,
         )
     except ValueError as e:
@@ -977,7 +1131,7 @@ def delete_level_question_image(
 
     # Delete from storage
     image_url = card_level.question_image_urls[array_index]
-    storage_service.delete_file(image_url)
+    discard_media(image_url)
 
     # Remove from array
     card_level.question_image_urls.pop(array_index)
@@ -1021,7 +1175,7 @@ def delete_level_answer_image(
 
     # Delete from storage
     image_url = card_level.answer_image_urls[array_index]
-    storage_service.delete_file(image_url)
+    discard_media(image_url)
 
     # Remove from array
     card_level.answer_image_urls.pop(array_index)
@@ -1069,17 +1223,13 @@ def upload_option_image(
     if not option_found:
         raise HTTPException(status_code=404, detail="Option not found")
 
-    # Read file data
-    file_data = file.file.read()
-
     # Upload to storage
     try:
-        image_url = storage_service.upload_file(
-            file_data=file_data,
+        image_url = store_media(
+            db,
+            file.file,
             filename=file.filename or "image.jpg",
             content_type=file.content_type or "image/jpeg",
-            card_id=f"{card_id}_{option_id}",
-            side="option",
             file_type=FileType.IMAGE,
         )
     except ValueError as e:
@@ -1091,7 +1241,7 @@ def upload_option_image(
             # Delete old image if exists
             old_url = option.get("image_url")
             if old_url:
-                storage_service.delete_file(old_url)
+                discard_media(old_url)
             option["image_url"] = image_url
             break
 
@@ -1152,21 +1302,17 @@ def upload_level_question_audio(
             detail=f"Invalid file type. Allowed: {allowed}",
         )
 
-    # Read file data
-    file_data = file.file.read()
-
     # Check if file is empty
-    if len(file_data) == 0:
+    if not file.size:
         raise HTTPException(status_code=422, detail="File is empty")
 
     # Upload to storage
     try:
-        audio_url = storage_service.upload_file(
-            file_data=file_data,
+        audio_url = store_media(
+            db,
+            file.file,
             filename=file.filename or "audio.mp3",
             content_type=file.content_type or "audio/mpeg",
-            card_id=f"{card_id}_{level_index}_{len(card_level.question_audio_urls or [])}",
-            side="question",
             file_type=FileType.AUDIO,
         )
     except ValueError as e:
@@ -1231,21 +1377,17 @@ def upload_level_answer_audio(
             detail=f"Invalid file type. Allowed: {allowed}",
         )
 
-    # Read file data
-    file_data = file.file.read()
-
     # Check if file is empty
-    if len(file_data) == 0:
+    if not file.size:
         raise HTTPException(status_code=422, detail="File is empty")
 
     # Upload to storage
     try:
-        audio_url = storage_service.upload_file(
-            file_data=file_data,
+        audio_url = store_media(
+            db,
+            file.file,
             filename=file.filename or "audio.mp3",
             content_type=file.content_type or "audio/mpeg",
-            card_id=f"{card_id}_{level_index}_{len(card_level.answer_audio_urls or [])}",
-            side="answer",
             file_type=FileType.AUDIO,
         )
     except ValueError as e:
@@ -1304,7 +1446,7 @@ def delete_level_question_audio(
 
     # Delete from storage
     audio_url = card_level.question_audio_urls[array_index]
-    storage_service.delete_file(audio_url)
+    discard_media(audio_url)
 
     # Remove from array
     card_level.question_audio_urls.pop(array_index)
@@ -1349,7 +1491,7 @@ def delete_level_answer_audio(
 
     # Delete from storage
     audio_url = card_level.answer_audio_urls[array_index]
-    storage_service.delete_file(audio_url)
+    discard_media(audio_url)
 
     # Remove from array
     card_level.answer_audio_urls.pop(array_index)
@@ -1359,3 +1501,106 @@ def delete_level_answer_audio(
     db.commit()
 
     return Response(status_code=204)
+
+
+# Files per side of a level, for each kind of media
+_MAX_MEDIA_PER_SIDE = {"image": 10, "audio": 10}
+
+
+def _editable_level(db: Session, card_id: UUID, level_index: int, user_id: UUID) -> CardLevel:
+    card = db.get(Card, card_id)
+    if not card:
+        raise HTTPException(status_code=404, detail="Card not found")
+
+    if not is_deck_editor(db, card.deck_id, user_id):
+        raise HTTPException(status_code=403, detail="Card not accessible")
+
+    card_level = db.query(CardLevel).filter_by(card_id=card_id, level_index=level_index).first()
+    if not card_level:
+        raise HTTPException(status_code=404, detail="Card level not found")
+    return card_level
+
+
+def _check_media_count(card_level: CardLevel, side: str, kind: str) -> None:
+    urls = getattr(card_level, f"{side}_{kind}_urls")
+    limit = _MAX_MEDIA_PER_SIDE[kind]
+    if urls and len(urls) >= limit:
+        noun = "images" if kind == "image" else "audio files"
+        raise HTTPException(status_code=422, detail=f"Maximum {limit} {noun} per side allowed")
+
+
+@router.post(
+    "/{card_id}/levels/{level_index}/media-upload-url", response_model=MediaUploadUrlResponse
+)
+def create_level_media_upload_url(
+    card_id: UUID,
+    level_index: int,
+    request: MediaUploadUrlRequest,
+    user_id: UUID = Depends(get_current_user_id),
+    db: Session = Depends(get_db),
+):
+    """Presigned URL to upload an image or audio file of a level directly to storage.
+
+    The client PUTs the file to upload_url with upload_headers, then attaches it
+    with POST /{card_id}/levels/{level_index}/media. Without upload_url storage
+    already has the file and it can be attached right away.
+    """
+    card_level = _editable_level(db, card_id, level_index, user_id)
+    _check_media_count(card_level, request.side, request.kind)
+
+    try:
+        media_url, upload = presign_media_upload(
+            db,
+            request.sha256,
+            request.size,
+            request.content_type,
+            FileType(request.kind),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    if upload is None:
+        return MediaUploadUrlResponse(media_url=media_url)
+    return MediaUploadUrlResponse(
+        media_url=media_url,
+        upload_url=upload.url,
+        upload_headers=upload.headers,
+        expires_in=upload.expires_in,
+    )
+
+
+@router.post("/{card_id}/levels/{level_index}/media", response_model=CardLevelContent)
+def confirm_level_media_upload(
+    card_id: UUID,
+    level_index: int,
+    request: MediaUploadConfirm,
+    user_id: UUID = Depends(get_current_user_id),
+    db: Session = Depends(get_db),
+):
+    """Attach a file uploaded through media-upload-url to the level, after checking it in storage.
+
+    Appends to existing images or audio files of the side.
+    """
+    card_level = _editable_level(db, card_id, level_index, user_id)
+    _check_media_count(card_level, request.side, request.kind)
+
+    try:
+        media_url = confirm_media_upload(
+            db, request.sha256, request.content_type, FileType(request.kind)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    field = f"{request.side}_{request.kind}_urls"
+    setattr(card_level, field, [*(getattr(card_level, field) or []), media_url])
+    db.commit()
+    db.refresh(card_level)
+
+    return CardLevelContent(
+        level_index=card_level.level_index,
+        content=card_level.content,
+        question_image_urls=card_level.question_image_urls,
+        answer_image_urls=card_level.answer_image_urls,
+        question_audio_urls=card_level.question_audio_urls,
+        answer_audio_urls=card_level.answer_audio_urls,
+    )
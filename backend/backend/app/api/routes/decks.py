@@ -1,14 +1,21 @@
+import io
 import logging
 import math
+import os
 import random
+import tempfile
+import zipfile
 from datetime import datetime, timezone
-from typing import List, Optional
+from typing import IO, List, Literal, Optional
+from urllib.parse import quote
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, status
-from sqlalchemy import asc
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, asc
 from sqlalchemy.orm import Session
 
+from app.api.responses import FastJSONResponse
 from app.auth.dependencies import get_current_user_id
 from app.db.session import SessionLocal
 from app.models.card import Card
@@ -28,16 +35,26 @@ from app.schemas.cards import (
     DeckSummary,
     DeckUpdate,
     DeckWithCards,
+    ImageSrcset,
+    MediaManifest,
     PaginatedCardsResponse,
 )
 from app.schemas.decks_public import PublicDeckSummary
-from app.services.anki_mapper import AnkiMapper
-from app.services.anki_parser import ApkgParseError, ApkgParser
+from app.schemas.imports import CsvImportReport, ImportJobStatus
+from app.services.csv_import import CsvImportError, import_csv
 from app.services.deck_access import is_deck_editor, is_deck_owner, require_deck_editor
+from app.services.deck_export import MEDIA_TYPES, export_deck, export_filename
+from app.services.import_jobs import submit_anki_import, upload_dir
+from app.services.media_manifest import build_media_manifest, stream_media_bundle
+from app.services.media_variants import attach_image_srcsets, image_srcsets
 
 router = APIRouter(tags=["decks"])
 logger = logging.getLogger(__name__)
 
+_UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+_CSV_EXTENSIONS = (".csv", ".tsv", ".tab", ".txt")
+
 
 def get_db():
     db = SessionLocal()
@@ -69,6 +86,23 @@ def _user_has_deck_in_group(db: Session, user_id: UUID, deck_id: UUID) -> bool:
     return link is not None
 
 
+def _can_read_deck(db: Session, deck: Deck, user_id: UUID) -> bool:
+    """Owner, editor, public deck, or deck linked in one of the user's groups (viewer invite)."""
+    return (
+        deck.owner_id == user_id
+        or deck.is_public
+        or is_deck_editor(db, deck.id, user_id)
+        or _user_has_deck_in_group(db, user_id, deck.id)
+    )
+
+
+def _srcsets(srcsets: dict[str, ImageSrcset], urls: Optional[List[str]]) -> Optional[list]:
+    """Srcsets of a level's image URLs as in attach_image_srcsets(), for dict responses."""
+    if not urls:
+        return None
+    return [srcsets[url].model_dump() if url in srcsets else None for url in urls]
+
+
 @router.get("/public", response_model=List[PublicDeckSummary])
 def search_public_decks(
     q: Optional[str] = Query(default=None),
@@ -234,6 +268,8 @@ def list_deck_cards(
             CardSummary(card_id=card.id, title=card.title, type=card.type, levels=levels_data)
         )
 
+    attach_image_srcsets(db, [level for card in result for level in card.levels])
+
     deck_detail = DeckDetail(
         id=deck.id,
         title=deck.title,
@@ -246,13 +282,15 @@ def list_deck_cards(
         can_edit=is_deck_editor(db, deck_id, user_uuid),
     )
 
-    return PaginatedCardsResponse(
-        deck=deck_detail,
-        cards=result,
-        total=total_count,
-        page=page,
-        per_page=per_page,
-        total_pages=total_pages,
+    return FastJSONResponse(
+        PaginatedCardsResponse(
+            deck=deck_detail,
+            cards=result,
+            total=total_count,
+            page=page,
+            per_page=per_page,
+            total_pages=total_pages,
+        )
     )
 
 
@@ -269,13 +307,7 @@ def get_deck_session(
     if not deck:
         raise HTTPException(404, "Deck not found")
 
-    # Allow access if: owner, editor, public, OR deck is linked in user's group (viewer invite)
-    if (
-        deck.owner_id != user_uuid
-        and not deck.is_public
-        and not is_deck_editor(db, deck_id, user_uuid)
-        and not _user_has_deck_in_group(db, user_uuid, deck_id)
-    ):
+    if not _can_read_deck(db, deck, user_uuid):
         raise HTTPException(403, "Deck not accessible")
 
     cards: List[Card] = (
@@ -368,7 +400,57 @@ def get_deck_session(
                 ],
             )
         )
-    return result
+    attach_image_srcsets(db, [level for item in result for level in item.levels])
+    return FastJSONResponse(result)
+
+
+@router.get("/{deck_id}/media-manifest", response_model=MediaManifest)
+def get_deck_media_manifest(
+    deck_id: UUID,
+    limit: int = Query(default=50, ge=1, le=200),
+    manifest_format: Literal["json", "zip"] = Query(default="json", alias="format"),
+    user_id: UUID = Depends(get_current_user_id),
+    db: Session = Depends(get_db),
+):
+    """
+    Media of the next `limit` cards of the deck, each file once, for prefetching.
+
+    Cards come in study order: the user's cards by next review, then new cards
+    in deck order. format=zip streams the files with the manifest in one archive.
+    """
+    deck = db.query(Deck).filter(Deck.id == deck_id).first()
+    if not deck:
+        raise HTTPException(404, "Deck not found")
+
+    if not _can_read_deck(db, deck, user_id):
+        raise HTTPException(403, "Deck not accessible")
+
+    card_ids = [
+        row.id
+        for row in (
+            db.query(Card.id)
+            .outerjoin(
+                CardProgress,
+                and_(
+                    CardProgress.card_id == Card.id,
+                    CardProgress.user_id == user_id,
+                    CardProgress.is_active.is_(True),
+                ),
+            )
+            .filter(Card.deck_id == deck_id)
+            .order_by(CardProgress.next_review.asc().nulls_last(), Card.created_at.asc())
+            .limit(limit)
+        )
+    ]
+    levels = db.query(CardLevel).filter(CardLevel.card_id.in_(card_ids)).all()
+    manifest = build_media_manifest(db, card_ids, levels)
+    if manifest_format == "json":
+        return FastJSONResponse(manifest)
+    return StreamingResponse(
+        stream_media_bundle(manifest),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="media.zip"'},
+    )
 
 
 @router.post("/", response_model=DeckSummary, status_code=status.HTTP_201_CREATED)
@@ -456,6 +538,8 @@ def get_deck_with_cards(
             )
         )
 
+    attach_image_srcsets(db, [level for card in result_cards for level in card.levels])
+
     # Build DeckDetail manually to pass can_edit
     deck_detail = DeckDetail(
         id=deck.id,
@@ -467,7 +551,7 @@ def get_deck_with_cards(
         show_card_title=deck.show_card_title,
         can_edit=is_deck_editor(db, deck_id, userid),
     )
-    return DeckWithCards(deck=deck_detail, cards=result_cards)
+    return FastJSONResponse(DeckWithCards(deck=deck_detail, cards=result_cards))
 
 
 @router.get("/{deck_id}/with_cards", response_model=DeckWithCards)
@@ -518,6 +602,8 @@ def get_deck_with_cards_ordered(
             )
         )
 
+    attach_image_srcsets(db, [level for card in out_cards for level in card.levels])
+
     deck_detail = DeckDetail(
         id=deck.id,
         title=deck.title,
@@ -528,7 +614,7 @@ def get_deck_with_cards_ordered(
         show_card_title=deck.show_card_title,
         can_edit=is_deck_editor(db, deck_id, user_id),
     )
-    return DeckWithCards(deck=deck_detail, cards=out_cards)
+    return FastJSONResponse(DeckWithCards(deck=deck_detail, cards=out_cards))
 
 
 @router.delete("/{deck_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -636,12 +722,7 @@ def get_study_cards(
     if not deck:
         raise HTTPException(status_code=404, detail="Deck not found")
 
-    # Allow access if: owner, editor, public, OR deck is linked in user's group (viewer invite)
-    if (
-        not deck.is_public
-        and not is_deck_editor(db, deck_id, user_id)
-        and not _user_has_deck_in_group(db, user_id, deck_id)
-    ):
+    if not _can_read_deck(db, deck, user_id):
         raise HTTPException(status_code=403, detail="Deck not accessible")
 
     cards: List[Card] = (
@@ -720,6 +801,15 @@ def get_study_cards(
         active_level_index_by_card = {card_id: lvl_index for card_id, lvl_index, _ in active_rows}
         active_level_id_by_card = {card_id: lvl_id for card_id, _, lvl_id in active_rows}
 
+    srcsets = image_srcsets(
+        db,
+        [
+            url
+            for lvl in levels_all
+            for url in (lvl.question_image_urls or []) + (lvl.answer_image_urls or [])
+        ],
+    )
+
     # Ответ в формате фронта (camelCase + нужные поля)
     out = []
     for c in cards:
@@ -742,6 +832,8 @@ def get_study_cards(
                         "answerImageUrls": card_level.answer_image_urls,
                         "questionAudioUrls": card_level.question_audio_urls,
                         "answerAudioUrls": card_level.answer_audio_urls,
+                        "questionImageSrcsets": _srcsets(srcsets, card_level.question_image_urls),
+                        "answerImageSrcsets": _srcsets(srcsets, card_level.answer_image_urls),
                     }
                     for card_level in lvls
                 ],
@@ -758,51 +850,156 @@ def get_study_cards(
             }
         )
 
-    return {"cards": out, "deck": {"show_card_title": deck.show_card_title}}
+    return FastJSONResponse({"cards": out, "deck": {"show_card_title": deck.show_card_title}})
+
 
+@router.get("/{deck_id}/export")
+def export_deck_file(
+    deck_id: UUID,
+    export_format: Literal["json", "csv", "apkg"] = Query(default="json", alias="format"),
+    user_id: UUID = Depends(get_current_user_id),
+    db: Session = Depends(get_db),
+):
+    """
+    Download the deck as JSON, CSV (one row per level) or an Anki .apkg package.
 
-@router.post("/import-anki", status_code=status.HTTP_201_CREATED)
+    The file is streamed while the cards are read, so exports of any size use
+    the same memory. Media files are not included, levels keep their URLs.
+    """
+    deck = db.query(Deck).filter(Deck.id == deck_id).first()
+    if not deck:
+        raise HTTPException(status_code=404, detail="Deck not found")
+    if not _can_read_deck(db, deck, user_id):
+        raise HTTPException(status_code=403, detail="Deck not accessible")
+
+    filename = export_filename(deck.title, export_format)
+    ascii_name = filename.encode("ascii", "ignore").decode() or f"deck.{export_format}"
+    return StreamingResponse(
+        export_deck(deck_id, export_format),
+        media_type=MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": (
+                f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}"
+            )
+        },
+    )
+
+
+async def _spool_upload(upload: UploadFile, dest: IO[bytes]) -> None:
+    """Copy an upload to a file chunk by chunk."""
+    while chunk := await upload.read(_UPLOAD_CHUNK_SIZE):
+        dest.write(chunk)
+    dest.flush()
+
+
+@router.post("/import-anki", status_code=status.HTTP_202_ACCEPTED, response_model=ImportJobStatus)
 async def import_anki_deck(
     file: UploadFile,
+    deck_id: Optional[UUID] = Query(
+        default=None, description="Update this deck instead of creating a new one"
+    ),
     user_id: UUID = Depends(get_current_user_id),
     db: Session = Depends(get_db),
 ):
     """
-    Import an Anki deck from .apkg file.
+    Queue an import of an Anki deck from .apkg file.
 
-    Creates a new deck with all cards from the Anki package.
+    The package is spooled to disk and imported by a background worker, so the
+    request returns as soon as the upload is stored. Poll GET /imports/{job_id}
+    for progress and the created deck.
+
+    With deck_id, an updated export of a previously imported deck is applied to
+    that deck: notes are matched by Anki guid, changed notes are updated in place
+    (keeping progress), new ones are added and removed ones deleted.
     """
     # Validate file extension
     if not file.filename or not file.filename.lower().endswith(".apkg"):
         raise HTTPException(status_code=422, detail="Only .apkg files are supported")
 
+    if deck_id is not None:
+        try:
+            require_deck_editor(db, deck_id, user_id)
+        except ValueError as e:
+            if str(e) == "not_found":
+                raise HTTPException(status_code=404, detail="Deck not found")
+            raise HTTPException(status_code=403, detail="Deck not accessible")
+
+        # Without guids every note would be added again as a duplicate
+        has_cards = db.query(Card.id).filter(Card.deck_id == deck_id).first() is not None
+        has_anki_cards = (
+            db.query(Card.id).filter(Card.deck_id == deck_id, Card.source_guid.isnot(None)).first()
+            is not None
+        )
+        if has_cards and not has_anki_cards:
+            raise HTTPException(
+                status_code=422, detail="Only decks imported from Anki can be updated"
+            )
+
+    # Spool the upload to disk: the package is never held in memory as a whole.
+    # The job owns the file from here on and removes it when it finishes.
+    spooled = tempfile.NamedTemporaryFile(
+        prefix="upload-", suffix=".apkg", dir=upload_dir(), delete=False
+    )
     try:
-        # Read file content
-        content = await file.read()
+        with spooled:
+            await _spool_upload(file, spooled)
 
-        # Parse the .apkg file
-        parser = ApkgParser(content)
-        anki_deck = parser.parse()
+        # Reject obviously broken uploads now rather than in a failed job
+        if not zipfile.is_zipfile(spooled.name):
+            raise HTTPException(status_code=422, detail="Invalid .apkg file: not a ZIP archive")
 
-        # Create deck and cards in database
-        mapper = AnkiMapper(db, user_id)
-        deck, cards = mapper.create_deck(anki_deck)
+        job = submit_anki_import(db, user_id, spooled.name, file.filename, deck_id=deck_id)
+    except BaseException:
+        os.unlink(spooled.name)
+        raise
 
-        logger.info(
-            f"Imported Anki deck '{deck.title}' (id={deck.id}) "
-            f"with {len(cards)} cards for user {user_id}"
-        )
+    logger.info(f"Queued Anki import job {job.id} ({file.filename}) for user {user_id}")
+    return job
 
-        return {
-            "deck_id": str(deck.id),
-            "title": deck.title,
-            "cards_created": len(cards),
-            "warnings": [],
-        }
 
-    except ApkgParseError as e:
-        logger.error(f"Failed to parse .apkg file: {e}")
-        raise HTTPException(status_code=422, detail=f"Invalid .apkg file: {str(e)}")
-    except Exception as e:
-        logger.error(f"Failed to import Anki deck: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Import failed: {str(e)}")
+@router.post("/{deck_id}/import-csv", response_model=CsvImportReport)
+def import_csv_cards(
+    deck_id: UUID,
+    file: UploadFile,
+    user_id: UUID = Depends(get_current_user_id),
+    db: Session = Depends(get_db),
+):
+    """
+    Add flashcards to the deck from a CSV or TSV file (UTF-8, header row required).
+
+    Columns: question, answer, and optionally explanation, level and title.
+    Each row is a level; a row with level 2, 3, ... adds a level to the card
+    above it. Rows are validated like POST /cards: cards with an invalid row
+    or a title already in the deck are skipped and reported by row number,
+    all other cards are added.
+    """
+    if not file.filename or not file.filename.lower().endswith(_CSV_EXTENSIONS):
+        raise HTTPException(status_code=422, detail="Only .csv and .tsv files are supported")
+
+    try:
+        require_deck_editor(db, deck_id, user_id)
+    except ValueError as e:
+        if str(e) == "not_found":
+            raise HTTPException(status_code=404, detail="Deck not found")
+        raise HTTPException(status_code=403, detail="Deck not accessible")
+
+    deck = db.query(Deck).filter(Deck.id == deck_id).first()
+    study_settings = _ensure_settings(db, deck.owner_id) if deck.auto_add_cards_to_study else None
+
+    # Decoded as it is read: the upload is never held in memory as a whole
+    stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        result = import_csv(db, deck, stream, file.filename, study_settings=study_settings)
+    except CsvImportError as e:
+        db.rollback()
+        raise HTTPException(status_code=422, detail=str(e))
+    finally:
+        # The upload's file is closed by FastAPI
+        stream.detach()
+    db.commit()
+
+    logger.info(
+        f"CSV import into deck {deck_id}: {result.cards_created} cards from {result.rows} rows, "
+        f"{result.errors_total} errors"
+    )
+    return result
@@ -0,0 +1,39 @@
+# backend/app/api/routes/imports.py
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from app.auth.dependencies import get_current_user_id
+from app.db.session import SessionLocal
+from app.models.deck import Deck
+from app.models.import_job import ImportJob
+from app.schemas.imports import ImportJobStatus
+
+router = APIRouter()
+
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@router.get("/{job_id}", response_model=ImportJobStatus)
+def get_import_job(
+    job_id: UUID,
+    user_id: UUID = Depends(get_current_user_id),
+    db: Session = Depends(get_db),
+):
+    """Progress of a background import: phase, notes processed, warnings and the final deck."""
+    job = db.get(ImportJob, job_id)
+    if job is None or job.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Import job not found")
+
+    response = ImportJobStatus.model_validate(job)
+    if job.deck_id is not None:
+        deck = db.get(Deck, job.deck_id)
+        response.deck_title = deck.title if deck else None
+    return response
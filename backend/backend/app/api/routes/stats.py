@@ -29,6 +29,7 @@ from app.services.stats_service import (
     get_activity_chart,
     get_activity_heatmap,
     get_deck_progress,
+    get_user_study_dates,
 )
 
 router = APIRouter()
@@ -54,21 +55,12 @@ def calculate_streak(db: Session, user_id: UUID) -> int:
     Calculate current streak of consecutive days with reviews.
     Streak is counted from today backwards until a day with no reviews is found.
     """
-    # Get all dates with reviews for this user
-    review_dates = (
-        db.query(func.date(CardReviewHistory.reviewed_at))
-        .filter(CardReviewHistory.user_id == user_id)
-        .distinct()
-        .order_by(func.date(CardReviewHistory.reviewed_at).desc())
-        .all()
-    )
+    # Get all dates with reviews for this user (including archived history)
+    dates_set = get_user_study_dates(db, user_id)
 
-    if not review_dates:
+    if not dates_set:
         return 0
 
-    # Convert to set of date objects for easier lookup
-    dates_set = {row[0] for row in review_dates}
-
     # Get today's date in UTC
     today = datetime.now(timezone.utc).date()
     yesterday = today - timedelta(days=1)
@@ -0,0 +1,36 @@
+# backend/app/api/routes/sync.py
+from typing import Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from app.api.responses import FastJSONResponse
+from app.auth.dependencies import get_current_user_id
+from app.db.session import SessionLocal
+from app.schemas.sync import SyncResponse
+from app.services.sync_service import get_sync_changes
+
+router = APIRouter()
+
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@router.get("", response_model=SyncResponse)
+def sync_changes(
+    since: Optional[int] = Query(default=None, ge=0, description="Cursor from previous sync"),
+    user_id: UUID = Depends(get_current_user_id),
+    db: Session = Depends(get_db),
+):
+    """
+    Return cards, card levels, progress and deck memberships changed since the cursor.
+
+    Without `since` a full snapshot is returned. Deleted entities come as tombstones.
+    """
+    return FastJSONResponse(get_sync_changes(db, user_id, since))
@@ -0,0 +1,87 @@
+"""
+Early rejection of oversized media uploads.
+
+FastAPI reads a multipart body completely (spooling files to disk) before the
+endpoint runs, so the size check of the endpoint only fails once the whole
+upload has been received. UploadSizeLimitMiddleware rejects uploads to the
+media routes as soon as their body is known to be too large: right away from
+the Content-Length header, or once the bytes received cross the limit for
+chunked bodies. The response is the endpoint's own 422 "File too large".
+"""
+
+import re
+
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.services.storage_service import StorageService
+
+# Allowance for multipart boundaries, part headers and form fields around the file
+MULTIPART_OVERHEAD = 64 * 1024
+
+# (path pattern, max file size) of the upload routes
+MEDIA_UPLOAD_LIMITS = (
+    (
+        re.compile(r"^/api/cards/[^/]+/levels/\d+/(question|answer)-image$"),
+        StorageService.IMAGE_MAX_FILE_SIZE,
+    ),
+    (re.compile(r"^/api/cards/[^/]+/option-image$"), StorageService.IMAGE_MAX_FILE_SIZE),
+    (
+        re.compile(r"^/api/cards/[^/]+/levels/\d+/(question|answer)-audio$"),
+        StorageService.AUDIO_MAX_FILE_SIZE,
+    ),
+)
+
+
+def _too_large(max_size: int) -> str:
+    return f"File too large. Max size: {max_size} bytes ({max_size // (1024 * 1024)}MB)"
+
+
+class UploadSizeLimitMiddleware:
+    """Pure ASGI middleware: the body is passed through as it arrives, never buffered."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        limits: tuple[tuple[re.Pattern, int], ...] = MEDIA_UPLOAD_LIMITS,
+        overhead: int = MULTIPART_OVERHEAD,
+    ) -> None:
+        self.app = app
+        self.limits = limits
+        self.overhead = overhead
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        max_size = self._max_size(scope)
+        if max_size is None:
+            await self.app(scope, receive, send)
+            return
+
+        limit = max_size + self.overhead
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > limit:
+            response = JSONResponse({"detail": _too_large(max_size)}, status_code=422)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Re-raised by FastAPI's body parsing, answered by its exception handler
+                    raise HTTPException(status_code=422, detail=_too_large(max_size))
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    def _max_size(self, scope: Scope) -> int | None:
+        if scope["type"] != "http" or scope["method"] != "POST":
+            return None
+        for pattern, max_size in self.limits:
+            if pattern.match(scope["path"]):
+                return max_size
+        return None
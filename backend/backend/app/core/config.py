@@ -28,6 +28,86 @@ class Settings(BaseSettings):
     MINIO_SECRET_KEY: str = "minioadmin"
     MINIO_BUCKET_NAME: str = "card-media"
     MINIO_USE_SSL: bool = False
+    # Endpoint browsers reach storage at, for presigned uploads (default: MINIO_ENDPOINT)
+    MINIO_PUBLIC_ENDPOINT: str = ""
+    # Lifetime of presigned upload URLs
+    MEDIA_UPLOAD_URL_EXPIRES_S: int = 900
+    # Object storage client: timeouts per attempt, attempts per request (retries with backoff)
+    STORAGE_CONNECT_TIMEOUT_S: float = 5.0
+    STORAGE_READ_TIMEOUT_S: float = 30.0
+    STORAGE_MAX_ATTEMPTS: int = 3
+    # Create/check the bucket when the API starts instead of on the first upload
+    STORAGE_PROVISION_ON_STARTUP: bool = True
+
+    # Review history write-behind: progress stays synchronous, history rows are
+    # buffered per worker and flushed in multi-row INSERTs
+    REVIEW_HISTORY_WRITE_BEHIND: bool = False
+    REVIEW_HISTORY_FLUSH_INTERVAL_MS: int = 500
+    REVIEW_HISTORY_FLUSH_BATCH_SIZE: int = 500
+    REVIEW_HISTORY_QUEUE_MAX_SIZE: int = 10000
+
+    # Sync change log retention (python -m app.services.sync_service): changes older
+    # than this are deleted, clients with an older cursor get a full snapshot
+    SYNC_CHANGES_RETENTION_DAYS: int = 30
+
+    # Review history partitioning: monthly partitions are created ahead of time,
+    # partitions older than the retention are folded into daily rollups and detached
+    REVIEW_HISTORY_PARTITIONS_AHEAD: int = 3
+    REVIEW_HISTORY_RETENTION_MONTHS: int = 24
+    REVIEW_HISTORY_DROP_ARCHIVED: bool = False
+
+    # Background deck imports: uploads are spooled to IMPORT_UPLOAD_DIR (must be shared
+    # with the workers), jobs are claimed from import_jobs by the in-process worker
+    # and/or `python -m app.services.import_jobs`
+    IMPORT_UPLOAD_DIR: str = ""  # default: <tmp>/mnemonic-imports
+    IMPORT_WORKER_ENABLED: bool = True
+    IMPORT_WORKER_POLL_INTERVAL_S: float = 2.0
+    IMPORT_JOB_LEASE_SECONDS: int = 300
+    IMPORT_JOB_MAX_ATTEMPTS: int = 3
+    # Threads uploading media of one Anki import (they share one boto3 client)
+    ANKI_MEDIA_UPLOAD_WORKERS: int = 8
+    # Uploaded packages are parsed in a pool of worker processes with resource
+    # limits (per worker; CPU time and timeout per task of one import batch)
+    IMPORT_SANDBOX_ENABLED: bool = True
+    IMPORT_SANDBOX_WORKERS: int = 2
+    IMPORT_SANDBOX_MEMORY_MB: int = 1024
+    IMPORT_SANDBOX_MAX_FILE_MB: int = 2048
+    IMPORT_SANDBOX_CPU_SECONDS: int = 60
+    IMPORT_SANDBOX_TIMEOUT_S: float = 120.0
+    # Deck exports read cards and levels through a server-side cursor, this many rows per fetch
+    EXPORT_BATCH_ROWS: int = 1000
+    # Media garbage collection (python -m app.services.media_gc): unreferenced objects
+    # are deleted once they haven't been uploaded or linked for this long
+    MEDIA_GC_GRACE_HOURS: int = 24
+    # Image variants (app/services/media_variants.py): uploaded images are re-encoded
+    # as WebP without metadata at these widths (none wider than the original) and at
+    # full size capped to IMAGE_MAX_DIMENSION, by a background worker in a pool of
+    # MEDIA_VARIANTS_WORKERS processes
+    MEDIA_VARIANTS_WORKER_ENABLED: bool = True
+    MEDIA_VARIANTS_WORKERS: int = 2
+    MEDIA_VARIANTS_POLL_INTERVAL_S: float = 5.0
+    # A batch claimed by a worker that hasn't finished it in this long (e.g. the
+    # worker died) is processed again
+    MEDIA_VARIANTS_CLAIM_LEASE_S: float = 900.0
+    IMAGE_VARIANT_WIDTHS: list[int] = [320, 640, 1280]
+    IMAGE_MAX_DIMENSION: int = 2048
+    IMAGE_VARIANT_QUALITY: int = 80
+    # Audio transcoding (app/services/audio_transcode.py): the same worker re-encodes
+    # uploaded audio as mono Opus/WebM at AUDIO_OPUS_BITRATE, with silence trimmed and
+    # loudness normalized, and relinks levels to it; needs ffmpeg (FFMPEG_PATH),
+    # without it audio is served as uploaded
+    AUDIO_TRANSCODE_ENABLED: bool = True
+    FFMPEG_PATH: str = "ffmpeg"
+    AUDIO_OPUS_BITRATE: str = "32k"
+    AUDIO_TRANSCODE_TIMEOUT_S: float = 60.0
+
+    # Response compression (app/api/compression.py): JSON and text responses from
+    # COMPRESSION_MIN_SIZE bytes on are sent with brotli or gzip, as the client accepts;
+    # compressed bodies of GET responses are cached by ETag up to COMPRESSION_CACHE_MAX_BYTES
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    COMPRESSION_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
 
 
 settings = Settings()
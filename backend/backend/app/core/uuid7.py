@@ -0,0 +1,79 @@
+# backend/app/core/uuid7.py
+"""
+Time-ordered UUIDs (version 7, RFC 9562).
+
+Layout: 48-bit unix timestamp in milliseconds, 4-bit version, 12-bit counter,
+2-bit variant, 62 random bits. The counter (RFC 9562 method 1) keeps ids generated
+by one process strictly increasing within the same millisecond, so new rows land
+on the right edge of the primary key B-tree instead of a random page.
+
+The value is an ordinary uuid.UUID: v7 and older v4 keys live side by side in the
+same UUID columns.
+"""
+
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+_COUNTER_MAX = 0xFFF
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def uuid7() -> uuid.UUID:
+    """Generate a UUIDv7; monotonic within the process."""
+    global _last_ms, _counter
+
+    with _lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms > _last_ms:
+            _last_ms = now_ms
+            # Random start leaves room to increment without guessable sequences
+            _counter = int.from_bytes(os.urandom(2), "big") & 0x7FF
+        elif _counter < _COUNTER_MAX:
+            _counter += 1
+        else:
+            # Counter exhausted (or clock went back): borrow the next millisecond
+            _last_ms += 1
+            _counter = 0
+        timestamp_ms, counter = _last_ms, _counter
+
+    rand_b = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+    value = (timestamp_ms & ((1 << 48) - 1)) << 80 | 0x7 << 76 | counter << 64 | 0b10 << 62 | rand_b
+    return uuid.UUID(int=value)
+
+
+def uuid7_time(value: uuid.UUID) -> datetime | None:
+    """Creation time encoded in a UUIDv7, or None for other versions (e.g. legacy v4 ids)."""
+    if value.version != 7:
+        return None
+    return datetime.fromtimestamp((value.int >> 80) / 1000, tz=timezone.utc)
+
+
+# set_bit() positions (byte * 8 + bit, least significant bit first) of the version
+# nibble (0111) and the variant (10)
+_VERSION_VARIANT_BITS = ((52, 1), (53, 1), (54, 1), (55, 0), (70, 0), (71, 1))
+
+
+def uuid7_sql(timestamp_ms: str, seed: str | None = None) -> str:
+    """
+    SQL expression building a UUIDv7 in the database, for INSERT ... SELECT.
+
+    `timestamp_ms` is a bigint SQL expression (unix ms); the other bits are
+    random. There is no per-millisecond counter, which bulk copies of timestamped
+    data (e.g. imported review logs) don't need. With `seed` (a text SQL
+    expression) the other bits come from md5(seed) instead, so the same seed and
+    timestamp always give the same UUID.
+    """
+    value = f"decode(md5({seed}), 'hex')" if seed is not None else "uuid_send(gen_random_uuid())"
+    value = (
+        f"overlay({value} placing substring(int8send(CAST({timestamp_ms} AS bigint)) from 3) "
+        "from 1 for 6)"
+    )
+    for bit, bit_value in _VERSION_VARIANT_BITS:
+        value = f"set_bit({value}, {bit}, {bit_value})"
+    return f"CAST(encode({value}, 'hex') AS uuid)"
@@ -0,0 +1,113 @@
+"""
+Bulk loading with Postgres COPY.
+
+Rows are encoded in COPY text format and streamed in chunks through the
+session's own connection, so a COPY joins the surrounding transaction and its
+statement-level triggers fire once per chunk rather than once per row.
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import uuid
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Iterable, Sequence
+
+from sqlalchemy.engine import Connection
+
+COPY_CHUNK_ROWS = 5000
+
+
+def _array_element(value: Any) -> str:
+    if value is None:
+        return "NULL"
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{text}"'
+
+
+def _encode_text(value: str) -> str:
+    # Chained replace is several times faster than str.translate on short strings
+    return (
+        value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+    )
+
+
+def _encode_json(value: dict) -> str:
+    return _encode_text(json.dumps(value, ensure_ascii=False))
+
+
+# Exact-type fast path for the common column types; everything else goes through
+# the isinstance chain in encode_copy_value
+_FAST_ENCODERS = {
+    str: _encode_text,
+    uuid.UUID: str,
+    int: str,
+    float: repr,
+    dict: _encode_json,
+}
+
+
+def encode_copy_value(value: Any) -> str:
+    """Encode one value for COPY ... FROM STDIN (text format)."""
+    encoder = _FAST_ENCODERS.get(type(value))
+    if encoder is not None:
+        return encoder(value)
+    if value is None:
+        return "\\N"
+    if isinstance(value, Enum):
+        value = value.value
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, dict):
+        # JSON(B) document
+        return _encode_json(value)
+    if isinstance(value, list):
+        # Postgres array literal
+        return _encode_text("{" + ",".join(_array_element(v) for v in value) + "}")
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return _encode_text(str(value))
+
+
+def copy_rows(
+    connection: Connection,
+    table: str,
+    columns: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    chunk_rows: int = COPY_CHUNK_ROWS,
+) -> int:
+    """
+    COPY rows into `table` using the connection's current transaction.
+
+    Values are encoded by encode_copy_value: dicts become JSON, lists become
+    Postgres arrays, None becomes NULL.
+
+    Returns:
+        Number of rows copied
+    """
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+    cursor = connection.connection.cursor()
+    total = 0
+    try:
+        buf = io.StringIO()
+        pending = 0
+        for row in rows:
+            buf.write("\t".join(encode_copy_value(v) for v in row))
+            buf.write("\n")
+            pending += 1
+            if pending >= chunk_rows:
+                buf.seek(0)
+                cursor.copy_expert(sql, buf)
+                total += pending
+                buf, pending = io.StringIO(), 0
+        if pending:
+            buf.seek(0)
+            cursor.copy_expert(sql, buf)
+            total += pending
+    finally:
+        cursor.close()
+    return total
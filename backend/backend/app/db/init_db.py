@@ -9,8 +9,13 @@ from app.models.card_review_history import CardReviewHistory  # noqa: F401
 from app.models.card_tag import CardTag  # noqa: F401
 from app.models.comment import Comment  # noqa: F401
 from app.models.deck import Deck  # noqa: F401
+from app.models.import_job import ImportJob  # noqa: F401
+from app.models.media_object import MediaObject  # noqa: F401
+from app.models.review_daily_rollup import ReviewDailyRollup  # noqa: F401
 from app.models.study_group import StudyGroup  # noqa: F401
 from app.models.study_group_deck import StudyGroupDeck  # noqa: F401
+from app.models.sync_change import SyncChange  # noqa: F401
+from app.models.sync_horizon import SyncHorizon  # noqa: F401
 from app.models.user import User  # noqa: F401
 from app.models.user_learning_settings import UserLearningSettings  # noqa: F401
 from app.models.user_study_group import UserStudyGroup  # noqa: F401
@@ -0,0 +1,108 @@
+"""
+Postgres triggers that keep media_objects.ref_count in step with card_levels.
+
+A reference is a URL of a content-addressed media object in a level's image or
+audio arrays, or in the image_url of a multiple choice option. Like the sync
+triggers (app/db/sync_triggers.py) these are statement-level with transition
+tables, so COPY loads, bulk updates and cascaded card deletes adjust the counts
+with one UPDATE per statement. URLs of objects not in media_objects (uploads
+from before content addressing, remote URLs) are ignored.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+_EVENTS = {"ins": "INSERT", "upd": "UPDATE", "del": "DELETE"}
+
+
+def _refs_sql(rows: str, delta: int) -> str:
+    """(object key, delta) of every media URL in a transition table."""
+    return f"""
+        SELECT substring(u FROM '^/[a-z]+/(.+)$') AS object_key, {delta} AS delta
+        FROM {rows} r,
+        unnest(
+            COALESCE(r.question_image_urls, '{{}}') || COALESCE(r.answer_image_urls, '{{}}')
+            || COALESCE(r.question_audio_urls, '{{}}') || COALESCE(r.answer_audio_urls, '{{}}')
+        ) u
+        UNION ALL
+        SELECT substring(o ->> 'image_url' FROM '^/images/(.+)$'), {delta}
+        FROM {rows} r,
+        jsonb_array_elements(
+            CASE WHEN jsonb_typeof(r.content -> 'options') = 'array'
+                THEN r.content -> 'options' ELSE '[]' END
+        ) o
+        WHERE jsonb_typeof(o) = 'object' AND o ->> 'image_url' IS NOT NULL"""
+
+
+def referenced_keys_sql(table: str = "card_levels") -> str:
+    """SELECT of the object keys rows of `table` link to (object_key column, may be NULL)."""
+    return _refs_sql(table, 1)
+
+
+def _apply_sql(refs: str) -> str:
+    # Rows are locked in key order: concurrent statements sharing objects can't deadlock
+    return f"""
+        UPDATE media_objects m SET ref_count = m.ref_count + d.delta
+        FROM (
+            SELECT l.object_key, d.delta
+            FROM (
+                SELECT object_key, sum(delta) AS delta FROM ({refs}) refs
+                WHERE object_key IS NOT NULL
+                GROUP BY object_key
+                HAVING sum(delta) <> 0
+            ) d
+            JOIN media_objects l ON l.object_key = d.object_key
+            ORDER BY l.object_key
+            FOR UPDATE OF l
+        ) d
+        WHERE m.object_key = d.object_key;"""
+
+
+_FUNCTION_SQL = f"""
+CREATE OR REPLACE FUNCTION media_refs_card_levels() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN{_apply_sql(_refs_sql("old_rows", -1))}
+    ELSIF TG_OP = 'UPDATE' THEN{_apply_sql(
+        _refs_sql("new_rows", 1) + " UNION ALL " + _refs_sql("old_rows", -1)
+    )}
+    ELSE{_apply_sql(_refs_sql("new_rows", 1))}
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def _trigger_sql(suffix: str, event: str) -> str:
+    name = f"trg_media_refs_card_levels_{suffix}"
+    transition = "OLD TABLE AS old_rows" if event == "DELETE" else "NEW TABLE AS new_rows"
+    if event == "UPDATE":
+        transition = "OLD TABLE AS old_rows NEW TABLE AS new_rows"
+    # Guarded by pg_trigger so that create_all on startup doesn't take table locks
+    return f"""
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = '{name}') THEN
+        CREATE TRIGGER {name} AFTER {event} ON card_levels
+        REFERENCING {transition}
+        FOR EACH STATEMENT EXECUTE FUNCTION media_refs_card_levels();
+    END IF;
+END;
+$$
+"""
+
+
+def install_media_ref_triggers(connection: Connection) -> None:
+    """Create (or refresh) the reference counting function and triggers. Idempotent."""
+    connection.execute(text(_FUNCTION_SQL))
+    for suffix, event in _EVENTS.items():
+        connection.execute(text(_trigger_sql(suffix, event)))
+
+
+def drop_media_ref_triggers(connection: Connection) -> None:
+    """Remove the reference counting triggers and function."""
+    for suffix in _EVENTS:
+        connection.execute(
+            text(f"DROP TRIGGER IF EXISTS trg_media_refs_card_levels_{suffix} ON card_levels")
+        )
+    connection.execute(text("DROP FUNCTION IF EXISTS media_refs_card_levels()"))
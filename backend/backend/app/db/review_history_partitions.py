@@ -0,0 +1,162 @@
+"""
+Monthly range partitions of card_review_history.
+
+The table is partitioned by reviewed_at: card_review_history_pYYYY_MM holds one
+calendar month (UTC), card_review_history_default catches anything outside the
+created range (offline clients). Creating a month whose rows already landed in
+the default partition moves them into the new partition.
+
+Bulk history (Anki review logs) is inserted through the parent once the months
+it covers have partitions: the importer creates them beforehand in a short
+transaction of its own, since creating or attaching a partition locks the
+default partition (ACCESS EXCLUSIVE) until the transaction ends.
+"""
+
+import re
+from datetime import date, datetime, timezone
+from typing import Iterable
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+PARENT_TABLE = "card_review_history"
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+
+# Serializes partition creation: two transactions must not build the same month
+_PARTITION_LOCK_KEY = 7_266_153_418_001
+
+_MONTH_PARTITION_RE = re.compile(rf"^{PARENT_TABLE}_p(\d{{4}})_(\d{{2}})$")
+
+
+def month_start(value: date | datetime) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_p{month:%Y_%m}"
+
+
+def _bound(month: date) -> str:
+    # Partition bounds can't be bind parameters; dates are formatted, never user input
+    return f"'{month.isoformat()} 00:00:00+00'"
+
+
+def list_month_partitions(connection: Connection) -> dict[date, str]:
+    """Attached monthly partitions, keyed by the first day of the month."""
+    names = connection.execute(
+        text("""
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = CAST(:parent AS regclass)
+            """),
+        {"parent": PARENT_TABLE},
+    ).scalars()
+
+    partitions = {}
+    for name in names:
+        match = _MONTH_PARTITION_RE.match(name)
+        if match:
+            partitions[date(int(match[1]), int(match[2]), 1)] = name
+    return partitions
+
+
+def _has_stray_rows(connection: Connection, month: date) -> bool:
+    lower, upper = _bound(month), _bound(add_months(month, 1))
+    return connection.execute(text(f"""
+            SELECT EXISTS (
+                SELECT 1 FROM {DEFAULT_PARTITION}
+                WHERE reviewed_at >= {lower} AND reviewed_at < {upper}
+            )
+            """)).scalar()
+
+
+def create_month_partition(connection: Connection, month: date) -> str:
+    """Create the partition for `month`, moving matching rows out of the default partition."""
+    name = partition_name(month)
+    lower, upper = _bound(month), _bound(add_months(month, 1))
+
+    if not _has_stray_rows(connection, month):
+        connection.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} "
+                f"FOR VALUES FROM ({lower}) TO ({upper})"
+            )
+        )
+        return name
+
+    # Postgres refuses to create a partition whose range already has rows in DEFAULT
+    connection.execute(text(f"CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS)"))
+    connection.execute(text(f"""
+            WITH moved AS (
+                DELETE FROM {DEFAULT_PARTITION}
+                WHERE reviewed_at >= {lower} AND reviewed_at < {upper}
+                RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+            """))
+    connection.execute(
+        text(
+            f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ({lower}) TO ({upper})"
+        )
+    )
+    return name
+
+
+def ensure_review_history_partitions(
+    connection: Connection,
+    months_ahead: int,
+    since: date | None = None,
+    today: date | None = None,
+) -> list[str]:
+    """
+    Make sure the default partition and monthly partitions up to `months_ahead` exist.
+
+    Args:
+        connection: Connection in an open transaction
+        months_ahead: Number of future months to create after the current one
+        since: First month to create (defaults to the current month)
+        today: Reference date (defaults to now, UTC)
+
+    Returns:
+        Names of the partitions created by this call
+    """
+    current = month_start(today or datetime.now(timezone.utc))
+    month = month_start(since) if since else current
+    last = add_months(current, months_ahead)
+
+    connection.execute(
+        text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT")
+    )
+
+    months = []
+    while month <= last:
+        months.append(month)
+        month = add_months(month, 1)
+    return create_month_partitions(connection, months)
+
+
+def create_month_partitions(connection: Connection, months: Iterable[date]) -> list[str]:
+    """
+    Create the partitions of `months` that don't exist yet.
+
+    Creation is serialized by an advisory lock held until the transaction ends,
+    so two transactions never build the same month. Commit soon: every new
+    partition keeps the default partition locked until then.
+
+    Returns:
+        Names of the partitions created by this call
+    """
+    connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _PARTITION_LOCK_KEY})
+    existing = list_month_partitions(connection)
+    return [
+        create_month_partition(connection, month)
+        for month in sorted(set(months))
+        if month not in existing
+    ]
@@ -0,0 +1,108 @@
+"""
+Postgres triggers that feed the sync_changes log.
+
+Triggers are statement-level with transition tables: one INSERT ... SELECT per
+statement instead of one per row, so bulk imports pay a single extra insert.
+Transition tables can't be shared between events, hence three triggers per table.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+# table -> (entity_type, entity_id, deck_id, user_id, extra join)
+_TRACKED_TABLES: dict[str, tuple[str, str, str, str, str]] = {
+    "cards": ("card", "r.id", "r.deck_id", "NULL::uuid", ""),
+    "card_levels": (
+        "card_level",
+        "r.id",
+        "c.deck_id",
+        "NULL::uuid",
+        "LEFT JOIN cards c ON c.id = r.card_id",
+    ),
+    "card_progress": (
+        "card_progress",
+        "r.id",
+        "c.deck_id",
+        "r.user_id",
+        "LEFT JOIN cards c ON c.id = r.card_id",
+    ),
+    "user_study_group_decks": (
+        "deck_membership",
+        "r.user_group_id",
+        "r.deck_id",
+        "g.user_id",
+        "LEFT JOIN user_study_groups g ON g.id = r.user_group_id",
+    ),
+}
+
+# A card moved to another deck disappears for the old deck's subscribers and its
+# levels have to be delivered to the new deck's subscribers.
+_CARD_MOVED_SQL = """
+        INSERT INTO sync_changes (entity_type, entity_id, deck_id, user_id, op)
+        SELECT 'card', o.id, o.deck_id, NULL, 'delete'
+        FROM old_rows o JOIN new_rows n ON n.id = o.id
+        WHERE n.deck_id IS DISTINCT FROM o.deck_id;
+        INSERT INTO sync_changes (entity_type, entity_id, deck_id, user_id, op)
+        SELECT 'card_level', l.id, n.deck_id, NULL, 'update'
+        FROM old_rows o JOIN new_rows n ON n.id = o.id
+        JOIN card_levels l ON l.card_id = n.id
+        WHERE n.deck_id IS DISTINCT FROM o.deck_id;
+"""
+
+_EVENTS = {"ins": "INSERT", "upd": "UPDATE", "del": "DELETE"}
+
+
+def _function_sql(table: str) -> str:
+    entity_type, entity_id, deck_id, user_id, join = _TRACKED_TABLES[table]
+    select = f"SELECT '{entity_type}', {entity_id}, {deck_id}, {user_id}"
+    insert = "INSERT INTO sync_changes (entity_type, entity_id, deck_id, user_id, op)"
+    moved = _CARD_MOVED_SQL if table == "cards" else ""
+    return f"""
+CREATE OR REPLACE FUNCTION sync_log_{table}() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        {insert} {select}, 'delete' FROM old_rows r {join};
+    ELSIF TG_OP = 'UPDATE' THEN{moved}
+        {insert} {select}, 'update' FROM new_rows r {join};
+    ELSE
+        {insert} {select}, 'insert' FROM new_rows r {join};
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def _trigger_sql(table: str, suffix: str, event: str) -> str:
+    name = f"trg_sync_{table}_{suffix}"
+    transition = "OLD TABLE AS old_rows" if event == "DELETE" else "NEW TABLE AS new_rows"
+    if event == "UPDATE":
+        transition = "OLD TABLE AS old_rows NEW TABLE AS new_rows"
+    # Guarded by pg_trigger so that create_all on startup doesn't take table locks
+    return f"""
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = '{name}') THEN
+        CREATE TRIGGER {name} AFTER {event} ON {table}
+        REFERENCING {transition}
+        FOR EACH STATEMENT EXECUTE FUNCTION sync_log_{table}();
+    END IF;
+END;
+$$
+"""
+
+
+def install_sync_triggers(connection: Connection) -> None:
+    """Create (or refresh) change-log functions and triggers. Idempotent."""
+    for table in _TRACKED_TABLES:
+        connection.execute(text(_function_sql(table)))
+        for suffix, event in _EVENTS.items():
+            connection.execute(text(_trigger_sql(table, suffix, event)))
+
+
+def drop_sync_triggers(connection: Connection) -> None:
+    """Remove change-log triggers and functions."""
+    for table in _TRACKED_TABLES:
+        for suffix in _EVENTS:
+            connection.execute(text(f"DROP TRIGGER IF EXISTS trg_sync_{table}_{suffix} ON {table}"))
+        connection.execute(text(f"DROP FUNCTION IF EXISTS sync_log_{table}()"))
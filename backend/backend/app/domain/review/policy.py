@@ -7,6 +7,7 @@ from .dto import LearningSettingsSnapshot
 from .entities import CardLevelProgressState
 
 FIRST_AGAIN_MINUTES = 5
+MIN_STABILITY_DAYS = 0.0035  # 5 минут
 
 
 class ReviewPolicy:
@@ -33,9 +34,7 @@ class ReviewPolicy:
         now: datetime,
     ) -> CardLevelProgressState:
         new_difficulty = min(10.0, max(1.0, state.difficulty + self.DIFFICULTY_DELTA[rating]))
-        new_stability = max(
-            0.0035, state.stability * self.STABILITY_MULT[rating]
-        )  # >= 5 минут (в днях)
+        new_stability = max(MIN_STABILITY_DAYS, state.stability * self.STABILITY_MULT[rating])
 
         if rating == ReviewRating.again and state.last_reviewed is None:
             next_review = now + timedelta(minutes=FIRST_AGAIN_MINUTES)
@@ -1,11 +1,49 @@
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import APIRouter, FastAPI
 from starlette.middleware.cors import CORSMiddleware
 
-from app.api.routes import auth, cards, comments, deck_editors, decks, groups, stats
+from app.api.compression import CompressionMiddleware, compressed_body_cache
+from app.api.routes import auth, cards, comments, deck_editors, decks, groups, imports, stats, sync
+from app.api.upload_limits import UploadSizeLimitMiddleware
+from app.core.config import settings
 from app.core.version import __version__
 from app.db.init_db import init_db
+from app.services.anki_sandbox import sandbox_pool
+from app.services.import_jobs import import_worker
+from app.services.media_variants import image_pool, media_variants_worker
+from app.services.review_history_buffer import review_history_buffer
+from app.services.storage_service import get_storage_service
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.STORAGE_PROVISION_ON_STARTUP:
+        # Бакет проверяется один раз здесь, а не перед каждой загрузкой;
+        # если хранилище недоступно, проверку повторит первая загрузка
+        try:
+            get_storage_service().ensure_bucket()
+        except Exception:
+            logger.warning("Media bucket is not ready, retrying on first upload", exc_info=True)
+    if settings.IMPORT_WORKER_ENABLED:
+        import_worker.start()
+    if settings.MEDIA_VARIANTS_WORKER_ENABLED:
+        media_variants_worker.start()
+    yield
+    # Незавершённый импорт возвращается в очередь после текущего батча
+    import_worker.stop()
+    sandbox_pool.shutdown()
+    # Варианты изображений: воркер останавливается после текущего батча
+    media_variants_worker.stop()
+    image_pool.shutdown()
+    # Записываем оставшуюся в буфере историю ревью перед остановкой воркера
+    review_history_buffer.stop()
+
 
-app = FastAPI(title="Flashcards API", version=__version__)
+app = FastAPI(title="Flashcards API", version=__version__, lifespan=lifespan)
 
 init_db()
 
@@ -15,6 +53,10 @@ origins = [
     "http://localhost:3000",
 ]
 
+# Сжатие ответов: внутренний слой, поэтому сжимаются только ответы эндпоинтов
+app.add_middleware(CompressionMiddleware)
+# Добавлен до CORS, чтобы ответы об ошибке тоже получали CORS-заголовки
+app.add_middleware(UploadSizeLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -32,6 +74,8 @@ api.include_router(decks.router, prefix="/decks", tags=["decks"])
 api.include_router(deck_editors.router, prefix="/decks", tags=["deck-editors"])
 api.include_router(stats.router, prefix="/stats", tags=["stats"])
 api.include_router(comments.router, tags=["comments"])
+api.include_router(sync.router, prefix="/sync", tags=["sync"])
+api.include_router(imports.router, prefix="/imports", tags=["imports"])
 
 app.include_router(api)
 
@@ -41,6 +85,18 @@ def health_check():
     return {"status": "ok"}
 
 
+@app.get("/health/review-history-buffer")
+def review_history_buffer_metrics():
+    """Queue depth and flush timings of the review history write-behind buffer."""
+    return review_history_buffer.metrics()
+
+
+@app.get("/health/compression-cache")
+def compression_cache_metrics():
+    """Size and hit counts of the compressed response body cache."""
+    return compressed_body_cache.metrics()
+
+
 @app.get("/version")
 def version_check():
     """Возвращает текущую версию приложения."""
@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import DateTime, ForeignKey, Integer, String, func
+from sqlalchemy import DateTime, ForeignKey, Index, Integer, String, func, text
 from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -14,6 +14,17 @@ from .card_tag import CardTag  # noqa: F401 - needed for SQLAlchemy relationship
 class Card(Base):
     __tablename__ = "cards"
 
+    __table_args__ = (
+        # Incremental Anki re-import: cards of a deck are matched by note guid
+        Index(
+            "uq_cards_deck_source_guid",
+            "deck_id",
+            "source_guid",
+            unique=True,
+            postgresql_where=text("source_guid IS NOT NULL"),
+        ),
+    )
+
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True),
         primary_key=True,
@@ -31,12 +42,23 @@ class Card(Base):
     max_level: Mapped[int] = mapped_column(Integer)
     settings: Mapped[dict | None] = mapped_column(JSONB)
 
+    # Imported cards: Anki note guid and hash of the note content they were built from
+    source_guid: Mapped[str | None] = mapped_column(String, nullable=True)
+    source_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
+
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         server_default=func.now(),
         nullable=False,
     )
 
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
+    )
+
     progress = relationship(
         "CardProgress",
         back_populates="card",
@@ -1,9 +1,10 @@
 from __future__ import annotations
 
 import uuid
+from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import ForeignKey, Integer, String, UniqueConstraint
+from sqlalchemy import DateTime, ForeignKey, Integer, String, UniqueConstraint, func
 from sqlalchemy.dialects.postgresql import ARRAY, JSONB, UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -40,6 +41,13 @@ class CardLevel(Base):
     question_audio_urls: Mapped[Optional[list[str]]] = mapped_column(ARRAY(String), nullable=True)
     answer_audio_urls: Mapped[Optional[list[str]]] = mapped_column(ARRAY(String), nullable=True)
 
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
+    )
+
     card: Mapped[Card] = relationship("Card", back_populates="levels")  # noqa: F821
 
     progress: Mapped[list[CardProgress]] = relationship(  # noqa: F821
@@ -7,6 +7,7 @@ from sqlalchemy import Boolean, DateTime, Float, ForeignKey, Index, UniqueConstr
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
+from app.core.uuid7 import uuid7
 from app.db.base import Base
 from app.models.card import Card  # noqa: F401 - needed for SQLAlchemy relationship
 from app.models.card_level import CardLevel  # noqa: F401 - needed for SQLAlchemy relationship
@@ -30,7 +31,7 @@ class CardProgress(Base):
         ),
     )
 
-    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid7)
 
     user_id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True),
@@ -3,12 +3,15 @@ from __future__ import annotations
 import uuid
 from datetime import datetime
 
-from sqlalchemy import DateTime, Enum, ForeignKey, Index, Integer
+from sqlalchemy import DateTime, Enum, ForeignKey, Index, Integer, event, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
+from app.core.config import settings
 from app.core.enums import ReviewRating
+from app.core.uuid7 import uuid7
 from app.db.base import Base
+from app.db.review_history_partitions import ensure_review_history_partitions
 from app.models.card import Card  # noqa: F401 - needed for SQLAlchemy relationship
 from app.models.card_level import CardLevel  # noqa: F401 - needed for SQLAlchemy relationship
 
@@ -16,18 +19,36 @@ from app.models.card_level import CardLevel  # noqa: F401 - needed for SQLAlchem
 
 
 class CardReviewHistory(Base):
+    """Append-only review log, range-partitioned by month on reviewed_at.
+
+    Partitions are managed in app/db/review_history_partitions.py; old months are
+    folded into ReviewDailyRollup and detached (app/services/review_history_archive.py).
+    """
+
     __tablename__ = "card_review_history"
 
     # Composite indexes for statistics queries
     __table_args__ = (
         Index("idx_user_review_date", "user_id", "reviewed_at"),
         Index("idx_card_deck_reviews", "card_id", "reviewed_at"),
+        # Idempotent ingestion: one history row per client-generated review id.
+        # Unique indexes of a partitioned table must contain the partition key;
+        # a retried review carries the same rated_at, so it still collides
+        Index(
+            "uq_user_client_review_id",
+            "user_id",
+            "client_review_id",
+            "reviewed_at",
+            unique=True,
+            postgresql_where=text("client_review_id IS NOT NULL"),
+        ),
+        {"postgresql_partition_by": "RANGE (reviewed_at)"},
     )
 
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True),
         primary_key=True,
-        default=uuid.uuid4,
+        default=uuid7,
     )
 
     user_id: Mapped[uuid.UUID] = mapped_column(
@@ -61,8 +82,18 @@ class CardReviewHistory(Base):
 
     show_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
     reveal_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
-    reviewed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    # Partition key, hence part of the primary key
+    reviewed_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), primary_key=True, nullable=False
+    )
+
+    client_review_id: Mapped[uuid.UUID | None] = mapped_column(UUID(as_uuid=True), nullable=True)
 
     user = relationship("User", back_populates="review_history")
     card = relationship("Card", back_populates="review_history")
     card_level = relationship("CardLevel", back_populates="review_history")
+
+
+@event.listens_for(CardReviewHistory.__table__, "after_create")
+def _create_partitions(target, connection, **kw) -> None:
+    ensure_review_history_partitions(connection, settings.REVIEW_HISTORY_PARTITIONS_AHEAD)
@@ -7,6 +7,7 @@ from sqlalchemy import DateTime, ForeignKey, Text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
+from app.core.uuid7 import uuid7
 from app.db.base import Base
 
 
@@ -18,7 +19,7 @@ class Comment(Base):
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True),
         primary_key=True,
-        default=uuid.uuid4,
+        default=uuid7,
     )
 
     user_id: Mapped[uuid.UUID] = mapped_column(
@@ -0,0 +1,94 @@
+import uuid
+from datetime import datetime
+
+from sqlalchemy import BigInteger, DateTime, ForeignKey, Index, Integer, String, Text, func, text
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.uuid7 import uuid7
+from app.db.base import Base
+
+
+class ImportJob(Base):
+    """Deck import submitted over HTTP and processed by a background worker.
+
+    Workers claim jobs with SELECT ... FOR UPDATE SKIP LOCKED and keep a heartbeat;
+    a running job whose heartbeat is older than the lease is claimed again and
+    resumed after last_note_id (see app/services/import_jobs.py).
+    """
+
+    __tablename__ = "import_jobs"
+
+    __table_args__ = (
+        # Claim queue: only unfinished jobs are indexed
+        Index(
+            "idx_import_jobs_claim",
+            "status",
+            "created_at",
+            postgresql_where=text("status IN ('queued', 'running')"),
+        ),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid7)
+
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+
+    # anki
+    kind: Mapped[str] = mapped_column(String(16), nullable=False, default="anki")
+    # create: new deck | update: re-import into deck_id, matching notes by guid
+    mode: Mapped[str] = mapped_column(
+        String(16), nullable=False, default="create", server_default="create"
+    )
+    # queued | running | done | failed
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default="queued")
+    # queued | parsing | importing | finalizing | done | failed
+    phase: Mapped[str] = mapped_column(String(16), nullable=False, default="queued")
+
+    # Uploaded package spooled to IMPORT_UPLOAD_DIR; removed when the job finishes
+    source_path: Mapped[str] = mapped_column(Text, nullable=False)
+    filename: Mapped[str] = mapped_column(String, nullable=False)
+
+    notes_total: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    notes_processed: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    cards_created: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    cards_updated: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    cards_deleted: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    # Notes without a question; no card is made for them
+    notes_skipped: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    # Anki review log entries added to card_review_history
+    reviews_imported: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    # Resume checkpoint: Anki note id of the last committed batch
+    last_note_id: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+
+    warnings: Mapped[list] = mapped_column(
+        JSONB, nullable=False, default=list, server_default=text("'[]'::jsonb")
+    )
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    # Deck being filled; linked to the user's study group only when the job is done.
+    # In update mode it is the existing deck and is set when the job is submitted.
+    deck_id: Mapped[uuid.UUID | None] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("decks.id", ondelete="SET NULL"), nullable=True
+    )
+
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    worker_id: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    heartbeat_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
+    )
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
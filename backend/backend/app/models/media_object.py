@@ -0,0 +1,84 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import BigInteger, DateTime, Index, Integer, String, event, func, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+from app.db.media_refs import install_media_ref_triggers
+
+
+class MediaObject(Base):
+    """Uploaded media file, stored once per content under a key derived from its SHA-256.
+
+    ref_count is the number of references from card levels; it is maintained by
+    triggers on card_levels (see app/db/media_refs.py), so every write path,
+    including COPY imports and cascaded deletes, keeps it right. Objects that
+    are no longer referenced are left in storage for garbage collection.
+    """
+
+    __tablename__ = "media_objects"
+
+    __table_args__ = (
+        # Garbage collection candidates
+        Index(
+            "idx_media_objects_unreferenced",
+            "last_used_at",
+            postgresql_where=text("ref_count <= 0"),
+        ),
+        # Queue of app/services/media_variants.py
+        Index(
+            "idx_media_objects_variants_pending",
+            "created_at",
+            postgresql_where=text("variants IS NULL"),
+        ),
+        # Transcoded audio still linked from levels (app/services/audio_transcode.py)
+        Index(
+            "idx_media_objects_relink_pending",
+            "transcoded_sha256",
+            postgresql_where=text("transcoded_sha256 IS NOT NULL AND ref_count > 0"),
+        ),
+    )
+
+    # Hex SHA-256 of the content
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    object_key: Mapped[str] = mapped_column(String, nullable=False, unique=True)
+
+    # image | audio
+    file_type: Mapped[str] = mapped_column(String(8), nullable=False)
+    content_type: Mapped[str] = mapped_column(String(100), nullable=False)
+    size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+
+    ref_count: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default=text("0")
+    )
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+    # Last upload of this content: a fresh upload isn't referenced until the
+    # level it was uploaded for is saved
+    last_used_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
+    # Dimensions of an image, once processed
+    width: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    height: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    # Derived files (app/services/media_variants.py): [{"key", "width", "height",
+    # "size"}, ...] in ascending width; NULL until processed, [] if there are none
+    variants: Mapped[Optional[list[dict]]] = mapped_column(JSONB, nullable=True)
+    # When a variants worker claimed this object for processing (claim_pending_media())
+    claimed_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    # Length of audio in milliseconds, once processed (trimmed length for compact versions)
+    duration_ms: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    # Compact Opus/WebM version of audio (app/services/audio_transcode.py), itself a
+    # media object; levels linking to this one are relinked to it
+    transcoded_sha256: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _install_media_ref_triggers(target, connection, **kw) -> None:
+    install_media_ref_triggers(connection)
@@ -0,0 +1,35 @@
+import uuid
+from datetime import date
+
+from sqlalchemy import Date, Float, ForeignKey, Integer
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class ReviewDailyRollup(Base):
+    """Per-day review aggregates of archived card_review_history partitions.
+
+    Written only by the archival job, for days whose raw rows were detached, so
+    stats add it to the live history without double counting.
+    """
+
+    __tablename__ = "review_daily_rollups"
+
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    deck_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("decks.id", ondelete="CASCADE"), primary_key=True
+    )
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+
+    reviews_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    again_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    hard_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    good_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    easy_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    # Sum of (reviewed_at - show_at), same measure as the live study time stats
+    study_seconds: Mapped[float] = mapped_column(Float, nullable=False, default=0)
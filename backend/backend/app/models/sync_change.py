@@ -0,0 +1,50 @@
+import uuid
+from datetime import datetime
+
+from sqlalchemy import BigInteger, DateTime, Index, String, event, func, text
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+from app.db.sync_triggers import install_sync_triggers
+
+
+class SyncChange(Base):
+    """Append-only change log for incremental client sync.
+
+    Rows are written by statement-level triggers (see app/db/sync_triggers.py), so bulk
+    deletes, cascades and COPY loads are captured the same way as ORM writes.
+    """
+
+    __tablename__ = "sync_changes"
+
+    __table_args__ = (Index("idx_sync_changes_txid", "txid"),)
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+
+    # Transaction id of the writer: the sync cursor is a txid snapshot xmin,
+    # so a change is never skipped because its transaction committed late
+    txid: Mapped[int] = mapped_column(
+        BigInteger, nullable=False, server_default=text("txid_current()")
+    )
+
+    # card | card_level | card_progress | deck_membership
+    entity_type: Mapped[str] = mapped_column(String(32), nullable=False)
+    # For deck_membership this is the user_group_id (deck_id completes the key)
+    entity_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), nullable=False)
+
+    # Audience: deck subscribers (cards, levels) or a single user (progress, memberships)
+    deck_id: Mapped[uuid.UUID | None] = mapped_column(UUID(as_uuid=True), nullable=True)
+    user_id: Mapped[uuid.UUID | None] = mapped_column(UUID(as_uuid=True), nullable=True)
+
+    # insert | update | delete
+    op: Mapped[str] = mapped_column(String(8), nullable=False)
+
+    changed_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _install_sync_triggers(target, connection, **kw) -> None:
+    install_sync_triggers(connection)
@@ -0,0 +1,24 @@
+from datetime import datetime
+
+from sqlalchemy import BigInteger, DateTime, SmallInteger, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class SyncHorizon(Base):
+    """Oldest sync cursor the change log still answers (a single row).
+
+    The retention job deletes sync_changes below `txid`; a client whose cursor is
+    older gets a full snapshot instead of an incomplete change set.
+    """
+
+    __tablename__ = "sync_horizon"
+
+    id: Mapped[int] = mapped_column(SmallInteger, primary_key=True, default=1)
+
+    txid: Mapped[int] = mapped_column(BigInteger, nullable=False)
+
+    pruned_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
@@ -5,6 +5,7 @@ from uuid import UUID
 from pydantic import BaseModel, ConfigDict, Field
 
 from app.core.enums import ReviewRating
+from app.schemas.cards import ImageSrcset
 
 
 class CardForReview(BaseModel):
@@ -25,6 +26,9 @@ class CardForReview(BaseModel):
     answer_image_urls: Optional[List[str]] = None
     question_audio_urls: Optional[List[str]] = None
     answer_audio_urls: Optional[List[str]] = None
+    # One per image URL, None for images without variants (not processed yet)
+    question_image_srcsets: Optional[List[Optional[ImageSrcset]]] = None
+    answer_image_srcsets: Optional[List[Optional[ImageSrcset]]] = None
 
 
 class ReviewRequest(BaseModel):
@@ -35,6 +39,9 @@ class ReviewRequest(BaseModel):
     revealed_at: Optional[datetime] = Field(None, alias="revealedAt")
     rated_at: datetime = Field(..., alias="ratedAt")
     timezone: Optional[str] = None
+    # Generated by the client once per review; retries with the same id are not re-applied,
+    # whatever their ratedAt; reusing it for another card is rejected with 409
+    client_review_id: Optional[UUID] = Field(None, alias="clientReviewId")
 
 
 class ReviewResponse(BaseModel):
@@ -47,6 +54,9 @@ class ReviewResponse(BaseModel):
     difficulty: float
     next_review: datetime
 
+    # True when the review was already recorded (client retry) and not applied again
+    duplicate: bool = False
+
 
 class ReviewPreviewItem(BaseModel):
     model_config = ConfigDict(populate_by_name=True)
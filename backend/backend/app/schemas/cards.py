@@ -1,10 +1,48 @@
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Literal, Optional, Union
 from uuid import UUID
 
 from pydantic import BaseModel, ConfigDict, Field, conint, model_validator
 
 
+class ImageVariant(BaseModel):
+    url: str
+    width: int
+    height: int
+
+
+class ImageSrcset(BaseModel):
+    """Responsive WebP variants of an image, for <img srcset> / <picture>."""
+
+    # The original image
+    src: str
+    width: Optional[int] = None
+    height: Optional[int] = None
+    # "url 320w, url 640w, ..."
+    srcset: str
+    variants: List[ImageVariant]
+
+
+class MediaManifestItem(BaseModel):
+    """A media file of the levels of a manifest."""
+
+    url: str
+    kind: Literal["image", "audio"]
+    # From media_objects; None for files stored before content addressing or remote URLs
+    content_type: Optional[str] = None
+    size: Optional[int] = None
+    sha256: Optional[str] = None
+
+
+class MediaManifest(BaseModel):
+    """Media of the next cards of a study session, each file once."""
+
+    card_ids: List[UUID]
+    media: List[MediaManifestItem]
+    # Sum of the known sizes
+    total_size: int
+
+
 class CardLevelContent(BaseModel):
     level_index: int
     content: Dict
@@ -12,6 +50,36 @@ class CardLevelContent(BaseModel):
     answer_image_urls: Optional[List[str]] = None
     question_audio_urls: Optional[List[str]] = None
     answer_audio_urls: Optional[List[str]] = None
+    # One per image URL, None for images without variants (not processed yet)
+    question_image_srcsets: Optional[List[Optional[ImageSrcset]]] = None
+    answer_image_srcsets: Optional[List[Optional[ImageSrcset]]] = None
+
+
+class MediaUploadUrlRequest(BaseModel):
+    """A file the client is about to upload directly to storage."""
+
+    side: Literal["question", "answer"]
+    kind: Literal["image", "audio"]
+    content_type: str
+    size: int = Field(gt=0)
+    # Hex SHA-256 of the file; storage checks the uploaded bytes against it
+    sha256: str = Field(pattern=r"^[0-9a-f]{64}$")
+
+
+class MediaUploadUrlResponse(BaseModel):
+    # URL the level will link to once the upload is confirmed
+    media_url: str
+    # PUT the file here with exactly these headers; None if storage already has it
+    upload_url: Optional[str] = None
+    upload_headers: Dict[str, str] = Field(default_factory=dict)
+    expires_in: Optional[int] = None
+
+
+class MediaUploadConfirm(BaseModel):
+    side: Literal["question", "answer"]
+    kind: Literal["image", "audio"]
+    content_type: str
+    sha256: str = Field(pattern=r"^[0-9a-f]{64}$")
 
 
 class CardForReviewWithLevels(BaseModel):
@@ -0,0 +1,55 @@
+# backend/app/schemas/imports.py
+from datetime import datetime
+from typing import List, Optional
+from uuid import UUID
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class ImportJobStatus(BaseModel):
+    job_id: UUID = Field(validation_alias="id")
+    kind: str
+    # create | update
+    mode: str
+    # queued | running | done | failed
+    status: str
+    # queued | parsing | importing | finalizing | done | failed
+    phase: str
+    filename: str
+    notes_total: Optional[int] = None
+    notes_processed: int
+    cards_created: int
+    cards_updated: int
+    cards_deleted: int
+    notes_skipped: int
+    reviews_imported: int
+    warnings: List[str]
+    error: Optional[str] = None
+    # Set once the deck exists; the deck shows up in the user's groups when status is done
+    deck_id: Optional[UUID] = None
+    deck_title: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class CsvRowError(BaseModel):
+    # Row number in the file, the header is row 1
+    row: int
+    error: str
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class CsvImportReport(BaseModel):
+    rows: int
+    cards_created: int
+    levels_created: int
+    # Cards skipped because of an invalid row or a title that is taken
+    cards_failed: int
+    errors_total: int
+    # The first errors by row; errors_total counts all of them
+    errors: List[CsvRowError]
+
+    model_config = ConfigDict(from_attributes=True)
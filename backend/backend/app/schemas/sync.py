@@ -0,0 +1,79 @@
+# backend/app/schemas/sync.py
+from datetime import datetime
+from typing import Dict, List, Optional
+from uuid import UUID
+
+from pydantic import BaseModel, ConfigDict
+
+
+class SyncCard(BaseModel):
+    id: UUID
+    deck_id: UUID
+    title: str
+    type: str
+    max_level: int
+    updated_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class SyncCardLevel(BaseModel):
+    id: UUID
+    card_id: UUID
+    level_index: int
+    content: Dict
+    question_image_urls: Optional[List[str]] = None
+    answer_image_urls: Optional[List[str]] = None
+    question_audio_urls: Optional[List[str]] = None
+    answer_audio_urls: Optional[List[str]] = None
+    updated_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class SyncProgress(BaseModel):
+    id: UUID
+    card_id: UUID
+    card_level_id: UUID
+    is_active: bool
+    stability: float
+    difficulty: float
+    next_review: Optional[datetime] = None
+    last_reviewed: Optional[datetime] = None
+    updated_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class SyncDeckMembership(BaseModel):
+    user_group_id: UUID
+    deck_id: UUID
+    order_index: int = 0
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class SyncMembershipKey(BaseModel):
+    user_group_id: UUID
+    deck_id: UUID
+
+
+class SyncTombstones(BaseModel):
+    """Deleted entities. A deleted card implies its levels and progress are gone too."""
+
+    cards: List[UUID] = []
+    card_levels: List[UUID] = []
+    progress: List[UUID] = []
+    deck_memberships: List[SyncMembershipKey] = []
+
+
+class SyncResponse(BaseModel):
+    """Changes since the requested cursor; pass `cursor` back as `since` next time."""
+
+    cursor: int
+    full: bool
+    cards: List[SyncCard] = []
+    card_levels: List[SyncCardLevel] = []
+    progress: List[SyncProgress] = []
+    deck_memberships: List[SyncDeckMembership] = []
+    deleted: SyncTombstones = SyncTombstones()
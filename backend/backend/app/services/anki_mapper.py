@@ -2,22 +2,202 @@
 Mapper for converting Anki data to MnemonicFlow models.
 
 This module handles the conversion of Anki notes and cards into
-MnemonicFlow Deck, Card, and CardLevel entities.
+MnemonicFlow Deck, Card, and CardLevel entities. Notes arrive prepared (fields
+picked, HTML cleaned, media references found) from the import sandbox, see
+app/services/anki_sandbox.py; the mapper only writes them.
+
+Cards and levels are written with COPY in note batches, with ids generated
+client-side, so an import costs a few round trips per batch instead of one per
+note. create_deck() runs the whole import in a single transaction; background
+import jobs drive start_deck/import_notes/link_deck themselves and commit each
+batch together with a resume checkpoint (see app/services/import_jobs.py).
+
+Re-imports: every card remembers the guid of its Anki note and a hash of the
+note content. import_notes() diffs the package against the deck's existing
+cards (load_existing) and only writes new and changed notes; changed notes are
+updated in place, so card ids and the user's progress survive. remove_missing()
+then deletes cards whose notes are gone from the package.
+
+Scheduling: import_scheduling() COPYs Anki's review log and card scheduling
+state into temporary staging tables and derives card_review_history and
+card_progress from them with one INSERT ... SELECT each, so the whole revlog is
+processed by Postgres in a single pass instead of row by row in Python. The
+monthly history partitions it writes to are created first, in a transaction of
+their own (prepare_review_history).
 """
 
 from __future__ import annotations
 
-import re
 import uuid
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from typing import Iterator
 
+from sqlalchemy import and_, delete, select, text, update
+from sqlalchemy.engine import Connection
 from sqlalchemy.orm import Session
 
+from app.core.config import settings
+from app.core.uuid7 import uuid7, uuid7_sql
+from app.db.bulk_copy import copy_rows
+from app.db.review_history_partitions import add_months, create_month_partitions, month_start
+from app.domain.review.policy import MIN_STABILITY_DAYS
 from app.models.card import Card
 from app.models.card_level import CardLevel
 from app.models.deck import Deck
 from app.models.user_study_group import UserStudyGroup
 from app.models.user_study_group_deck import UserStudyGroupDeck
-from app.services.anki_parser import AnkiDeck, AnkiNote
+from app.services.anki_media import AnkiMediaUploader
+from app.services.anki_parser import REVLOG_COLUMNS, AnkiDeck
+from app.services.anki_sandbox import SandboxedApkg
+from app.services.anki_transform import PreparedNote
+from app.services.media_store import record_media_objects
+
+_CARD_COLUMNS = ("id", "deck_id", "type", "title", "max_level", "source_guid", "source_hash")
+_LEVEL_COLUMNS = (
+    "id",
+    "card_id",
+    "level_index",
+    "content",
+    "question_image_urls",
+    "answer_image_urls",
+    "question_audio_urls",
+    "answer_audio_urls",
+)
+
+# Notes per COPY round trip; also the unit of statement-level sync trigger work
+IMPORT_BATCH_NOTES = 5000
+
+# Card ids per DELETE statement when removing notes that left the package
+_DELETE_CHUNK = 1000
+
+# Rows per revlog batch read from SQLite and COPY-ed into staging
+REVLOG_BATCH_ROWS = 50_000
+
+_STAGING_CARD_COLUMNS = ("id", "note_guid", "ord", "type", "queue", "due", "ivl", "factor")
+
+# Created and dropped within the caller's transaction
+_CREATE_STAGING_SQL = """
+    CREATE TEMP TABLE anki_import_cards (
+        id bigint, note_guid text, ord int, type int, queue int, due bigint, ivl bigint, factor int
+    );
+    CREATE TEMP TABLE anki_import_revlog (
+        id bigint, cid bigint, ease int, ivl bigint, time bigint, type int
+    );
+"""
+
+# Anki card id -> card and level 0 of its note, resolved once for both inserts
+_CREATE_CARD_MAP_SQL = """
+    CREATE TEMP TABLE anki_import_card_map AS
+    SELECT ac.id AS anki_card_id, c.id AS card_id, l.id AS card_level_id
+    FROM anki_import_cards ac
+    JOIN cards c ON c.deck_id = CAST(:deck_id AS uuid) AND c.source_guid = ac.note_guid
+    JOIN card_levels l ON l.card_id = c.id AND l.level_index = 0
+"""
+
+# One history row per answered review (ease 0 is a manual reschedule). The
+# client_review_id is derived from the deck and the revlog id, so importing the
+# same log into the same deck again (update mode) adds only the new reviews; it
+# is time-ordered like the row id, which keeps its unique index append-mostly.
+# The monthly partitions the rows fall into are created beforehand, in a short
+# transaction of their own (prepare_review_history).
+_INSERT_HISTORY_SQL = f"""
+    INSERT INTO card_review_history (
+        id, user_id, card_id, card_level_id, rating, interval_minutes,
+        show_at, reveal_at, reviewed_at, client_review_id
+    )
+    SELECT
+        {uuid7_sql("r.id")},
+        CAST(:user_id AS uuid),
+        m.card_id,
+        m.card_level_id,
+        CAST(
+            (CASE r.ease WHEN 1 THEN 'again' WHEN 2 THEN 'hard' WHEN 3 THEN 'good' ELSE 'easy' END)
+            AS review_rating
+        ),
+        CASE WHEN r.ivl >= 0 THEN r.ivl * 1440 ELSE CEIL(-r.ivl / 60.0) END,
+        to_timestamp((r.id - LEAST(GREATEST(r.time, 0), 3600000)) / 1000.0),
+        to_timestamp(r.id / 1000.0),
+        to_timestamp(r.id / 1000.0),
+        {uuid7_sql("r.id", seed="CAST(:deck_id AS text) || ':' || r.id")}
+    FROM anki_import_revlog r
+    JOIN anki_import_card_map m ON m.anki_card_id = r.cid
+    WHERE r.ease BETWEEN 1 AND 4
+    ON CONFLICT (user_id, client_review_id, reviewed_at)
+        WHERE client_review_id IS NOT NULL DO NOTHING
+"""
+
+# Anki's first release; earlier review months only come from bogus revlog ids
+_FIRST_ANKI_MONTH = date(2006, 1, 1)
+
+# Progress of every card Anki has already scheduled, from the note's first card
+# (by template ordinal): stability is the current interval, difficulty follows
+# the ease factor (250% -> 5, 130% -> 10, 370% and up -> 1), next_review is the
+# due date. New cards get no progress, like cards never studied in MnemonicFlow;
+# existing progress (update mode) is kept.
+_INSERT_PROGRESS_SQL = f"""
+    INSERT INTO card_progress (
+        id, user_id, card_id, card_level_id, is_active, stability, difficulty,
+        next_review, last_reviewed, created_at, updated_at
+    )
+    SELECT
+        {uuid7_sql("floor(extract(epoch FROM now()) * 1000)")},
+        CAST(:user_id AS uuid),
+        ac.card_id,
+        ac.card_level_id,
+        true,
+        GREATEST(
+            CASE WHEN ac.ivl >= 0 THEN ac.ivl ELSE -ac.ivl / 86400.0 END, :min_stability
+        ),
+        CASE WHEN ac.factor > 0
+            THEN LEAST(10.0, GREATEST(1.0, 5.0 + (2500 - ac.factor) / 240.0))
+            ELSE 5.0
+        END,
+        CASE WHEN ac.due > 1000000000
+            THEN to_timestamp(ac.due)
+            ELSE to_timestamp(:collection_created + ac.due * 86400)
+        END,
+        to_timestamp(lr.last_id / 1000.0),
+        now(),
+        now()
+    FROM (
+        SELECT DISTINCT ON (m.card_id) m.card_id, m.card_level_id, ac.*
+        FROM anki_import_cards ac
+        JOIN anki_import_card_map m ON m.anki_card_id = ac.id
+        WHERE ac.type > 0
+        ORDER BY m.card_id, ac.ord
+    ) ac
+    LEFT JOIN (
+        SELECT cid, MAX(id) AS last_id FROM anki_import_revlog WHERE ease > 0 GROUP BY cid
+    ) lr ON lr.cid = ac.id
+    ON CONFLICT DO NOTHING
+"""
+
+
+@dataclass
+class ExistingCard:
+    """Card of the target deck previously imported from an Anki note."""
+
+    card_id: uuid.UUID
+    # Level 0 holds the note content; None if the user deleted it
+    level_id: uuid.UUID | None
+    source_hash: str | None
+
+
+@dataclass
+class ImportBatch:
+    """What import_notes() wrote for one batch of notes."""
+
+    last_note_id: int
+    notes: int
+    created: int = 0
+    updated: int = 0
+    # Notes without a question
+    skipped: int = 0
+
+    @property
+    def unchanged(self) -> int:
+        return self.notes - self.created - self.updated - self.skipped
 
 
 class AnkiMapper:
@@ -26,37 +206,55 @@ class AnkiMapper:
 
     Usage:
         mapper = AnkiMapper(db, user_id)
-        deck, cards = mapper.create_deck(anki_deck)
+        with SandboxedApkg(path) as package:
+            deck, cards_created = mapper.create_deck(package)
+
+    Without a media uploader, image and sound references are dropped with the HTML.
     """
 
-    def __init__(self, db: Session, user_id: uuid.UUID) -> None:
+    def __init__(
+        self, db: Session, user_id: uuid.UUID, media: AnkiMediaUploader | None = None
+    ) -> None:
         self.db = db
         self.user_id = user_id
+        self.media = media
 
-    def create_deck(self, anki_deck: AnkiDeck) -> tuple[Deck, list[Card]]:
+    def create_deck(self, package: SandboxedApkg) -> tuple[Deck, int]:
         """
         Create a MnemonicFlow deck and cards from Anki data.
 
+        Notes are consumed from the package batch by batch and each batch is
+        COPY-ed into cards and card_levels, so created cards are not kept in
+        memory. The review log and scheduling state follow (import_scheduling).
+        Nothing is committed until everything is written.
+
         Args:
-            anki_deck: Parsed Anki deck
+            package: Opened Anki package
 
         Returns:
-            Tuple of (Deck, list of Card)
+            Tuple of (Deck, number of created cards)
 
         Raises:
             ValueError: If deck cannot be created
         """
-        # Get or create user's default study group
-        user_group = (
-            self.db.query(UserStudyGroup).filter(UserStudyGroup.user_id == self.user_id).first()
-        )
+        anki_deck = package.parse()
+        # Before anything is written: the partitions' foreign keys lock cards
+        self.prepare_review_history(anki_deck)
+        deck = self.start_deck(anki_deck)
 
-        if not user_group:
-            user_group = UserStudyGroup(user_id=self.user_id, title_override="My Decks")
-            self.db.add(user_group)
-            self.db.flush()
+        cards_created = 0
+        for batch in self.import_notes(package, deck, existing={}):
+            cards_created += batch.created
+
+        self.import_scheduling(package, deck)
+        self.link_deck(deck)
+        self.db.commit()
+        self.db.refresh(deck)
+
+        return deck, cards_created
 
-        # Create deck
+    def start_deck(self, anki_deck: AnkiDeck) -> Deck:
+        """Create the (still unlinked) deck the notes are imported into. Not committed."""
         deck = Deck(
             owner_id=self.user_id,
             title=self._clean_deck_name(anki_deck.name),
@@ -65,144 +263,315 @@ class AnkiMapper:
         )
         self.db.add(deck)
         self.db.flush()
+        return deck
 
-        # Link deck to user's study group
-        link = UserStudyGroupDeck(
-            user_group_id=user_group.id,
-            deck_id=deck.id,
-            order_index=0,
-        )
-        self.db.add(link)
+    def import_notes(
+        self,
+        package: SandboxedApkg,
+        deck: Deck,
+        after_note_id: int | None = None,
+        batch_size: int = IMPORT_BATCH_NOTES,
+        existing: dict[str, ExistingCard] | None = None,
+    ) -> Iterator[ImportBatch]:
+        """
+        Write notes into cards and card_levels of `deck`, one batch at a time.
 
-        # Create cards from notes
-        cards = []
-        for note in anki_deck.notes:
-            card = self._create_card_from_note(note, deck.id, anki_deck)
-            if card:
-                cards.append(card)
+        Notes are matched to the deck's cards by guid. New notes are COPY-ed,
+        notes whose content hash changed are updated in place, unchanged notes
+        are not written at all (nor is their media uploaded). Notes without a
+        question are skipped.
 
-        self.db.commit()
-        self.db.refresh(deck)
+        Nothing is committed here: after each batch the caller gets an
+        ImportBatch and decides whether to commit, e.g. together with a resume
+        checkpoint.
 
-        return deck, cards
+        Args:
+            package: Opened Anki package
+            deck: Target deck (flushed)
+            after_note_id: Resume after this Anki note id
+            batch_size: Notes per COPY round trip
+            existing: guid -> card map of the deck, updated as notes are written;
+                loaded with load_existing() if not given
+        """
+        anki_deck = package.parse()
+        if existing is None:
+            existing = self.load_existing(deck.id)
+
+        analyzed = False
+        for prepared in package.iter_prepared(batch_size, after_id=after_note_id):
+            batch = ImportBatch(
+                last_note_id=prepared.last_note_id,
+                notes=prepared.notes,
+                skipped=prepared.skipped,
+            )
+
+            pending = self._changed_notes(prepared.prepared, existing)
+            if self.media is not None:
+                # Start the uploads of the whole batch before waiting for any of them
+                for note, _ in pending:
+                    self.media.submit_refs(*note.question_media)
+                    self.media.submit_refs(*note.answer_media)
+
+            card_rows, level_rows, card_updates, level_updates = self._batch_rows(
+                pending, deck.id, existing
+            )
+            connection = self._write_batch(card_rows, level_rows, card_updates, level_updates)
+
+            if not analyzed and card_rows and batch.notes < anki_deck.note_count:
+                # On a young database the planner still thinks cards is nearly empty and
+                # checks card_levels.card_id with a seq scan, which makes every later batch
+                # slower. Fresh statistics (ANALYZE sees our uncommitted rows) switch the
+                # FK check and sync trigger join to the primary key index.
+                connection.execute(text("ANALYZE cards"))
+                analyzed = True
+
+            batch.created = len(card_rows)
+            batch.updated = len(card_updates)
+            yield batch
 
-    def _create_card_from_note(
+    @staticmethod
+    def _changed_notes(
+        notes: list[PreparedNote], existing: dict[str, ExistingCard]
+    ) -> list[tuple[PreparedNote, ExistingCard | None]]:
+        """(note, matching card or None) of the notes that are new or whose content changed."""
+        pending = []
+        for note in notes:
+            match = existing.get(note.guid)
+            if match is not None and match.source_hash == note.content_hash:
+                continue
+            pending.append((note, match))
+        return pending
+
+    def _batch_rows(
         self,
-        note: AnkiNote,
+        pending: list[tuple[PreparedNote, ExistingCard | None]],
         deck_id: uuid.UUID,
-        anki_deck: AnkiDeck,
-    ) -> Card | None:
+        existing: dict[str, ExistingCard],
+    ) -> tuple[list, list, list[dict], list[dict]]:
         """
-        Create a Card from an AnkiNote.
+        Rows to COPY and UPDATE for the changed notes of a batch.
 
-        Args:
-            note: Anki note to convert
-            deck_id: Target deck ID
-            anki_deck: Full Anki deck for model/media access
+        Returns (card rows, level rows, card updates, level updates); `existing`
+        is updated so a guid repeated later in the package matches these cards.
+        """
+        card_rows, level_rows = [], []
+        card_updates, level_updates = [], []
+        for note, match in pending:
+            card_row, level_row = self._rows_from_note(
+                note, deck_id, card_id=match.card_id if match else None
+            )
+            if match is None:
+                card_rows.append(card_row)
+                level_rows.append(level_row)
+                # A guid repeated later in the package updates this card
+                existing[note.guid] = ExistingCard(card_row[0], level_row[0], note.content_hash)
+                continue
+
+            card = dict(zip(_CARD_COLUMNS, card_row))
+            card_updates.append({k: card[k] for k in ("id", "title", "source_hash")})
+            if match.level_id is None:
+                level_rows.append(level_row)
+                match.level_id = level_row[0]
+            else:
+                level = dict(zip(_LEVEL_COLUMNS, level_row))
+                del level["card_id"], level["level_index"]
+                level_updates.append({**level, "id": match.level_id})
+            match.source_hash = note.content_hash
+        return card_rows, level_rows, card_updates, level_updates
+
+    def _write_batch(
+        self, card_rows: list, level_rows: list, card_updates: list[dict], level_updates: list[dict]
+    ) -> Connection:
+        """COPY new cards and levels, UPDATE changed ones. Returns the connection used."""
+        if self.media is not None:
+            # Before the levels: only references to recorded objects are counted
+            record_media_objects(self.db, self.media.drain_stored())
+
+        # The caller may have committed since the last batch: take the current connection
+        connection = self.db.connection()
+        copy_rows(connection, "cards", _CARD_COLUMNS, card_rows)
+        copy_rows(connection, "card_levels", _LEVEL_COLUMNS, level_rows)
+        if card_updates:
+            # Bulk UPDATE ... WHERE id = :id, one executemany per table
+            self.db.execute(update(Card), card_updates)
+        if level_updates:
+            self.db.execute(update(CardLevel), level_updates)
+        return connection
+
+    def prepare_review_history(self, anki_deck: AnkiDeck) -> list[str]:
+        """
+        Create the monthly history partitions the review log falls into. Committed.
+
+        Runs on a connection of its own, in a short transaction: creating a
+        partition locks the default partition, which holds every user's
+        unpartitioned history, until the transaction ends. Months before Anki
+        existed or past the partitions created ahead are bogus revlog ids, their
+        rows go to the default partition. Call it while the session has nothing
+        uncommitted: a new partition's foreign keys lock cards and card_levels.
 
         Returns:
-            Created Card or None if note has no valid content
+            Names of the partitions created
         """
-        # Extract question and answer from note fields
-        question, answer = self._extract_qa_from_note(note, anki_deck)
+        last = add_months(
+            month_start(datetime.now(timezone.utc)), settings.REVIEW_HISTORY_PARTITIONS_AHEAD
+        )
+        months = [m for m in anki_deck.review_months if _FIRST_ANKI_MONTH <= m <= last]
+        if not months:
+            return []
+        with self.db.get_bind().begin() as connection:
+            return create_month_partitions(connection, months)
 
-        # Skip empty cards
-        if not question or not question.strip():
-            return None
+    def import_scheduling(self, package: SandboxedApkg, deck: Deck) -> tuple[int, int]:
+        """
+        Import Anki's review log and scheduling state for the deck's cards. Not committed.
 
-        # Create card title (truncate question)
-        title = self._clean_html(question)[:100]
-        if not title.strip():
-            title = "Imported Card"
+        Call after the notes are imported and prepare_review_history(): reviews
+        and progress are matched to cards by note guid. Cards of all templates
+        of a note share the note's card, so their reviews end up in one history.
 
-        # Create card
-        card = Card(
-            deck_id=deck_id,
-            type="flashcard",
-            title=title,
-            max_level=1,
-            settings=None,
+        Returns:
+            (review history rows added, progress rows added)
+        """
+        anki_deck = package.parse()
+        if not anki_deck.review_count and not anki_deck.scheduled_card_count:
+            # Exported without scheduling information
+            return 0, 0
+
+        connection = self.db.connection()
+        connection.exec_driver_sql(_CREATE_STAGING_SQL)
+
+        copy_rows(
+            connection,
+            "anki_import_cards",
+            _STAGING_CARD_COLUMNS,
+            (
+                (c.id, c.note_guid, c.ord, c.type, c.queue, c.due, c.ivl, c.factor)
+                for cards in package.iter_cards(batch_size=REVLOG_BATCH_ROWS)
+                for c in cards
+            ),
         )
-        self.db.add(card)
-        self.db.flush()
-
-        # Create card level
-        level = CardLevel(
-            card_id=card.id,
-            level_index=0,
-            content={
-                "question": self._clean_html(question),
-                "answer": self._clean_html(answer),
-            },
-            question_image_urls=None,
-            answer_image_urls=None,
-            question_audio_urls=None,
-            answer_audio_urls=None,
+        if anki_deck.review_count:
+            copy_rows(
+                connection,
+                "anki_import_revlog",
+                REVLOG_COLUMNS,
+                (row for rows in package.iter_revlog(REVLOG_BATCH_ROWS) for row in rows),
+                chunk_rows=REVLOG_BATCH_ROWS,
+            )
+        params = {
+            "user_id": str(self.user_id),
+            "deck_id": str(deck.id),
+            "min_stability": MIN_STABILITY_DAYS,
+            "collection_created": anki_deck.created_at,
+        }
+        # Without fresh statistics on cards (just filled by import_notes) the planner
+        # picks nested loops over the whole deck
+        connection.exec_driver_sql("ANALYZE cards, anki_import_cards, anki_import_revlog")
+        connection.execute(text(_CREATE_CARD_MAP_SQL), params)
+        connection.exec_driver_sql("ANALYZE anki_import_card_map")
+
+        reviews = connection.execute(text(_INSERT_HISTORY_SQL), params).rowcount
+        progress = connection.execute(text(_INSERT_PROGRESS_SQL), params).rowcount
+
+        connection.exec_driver_sql(
+            "DROP TABLE anki_import_cards, anki_import_revlog, anki_import_card_map"
         )
-        self.db.add(level)
-
-        return card
+        return reviews, progress
+
+    def load_existing(self, deck_id: uuid.UUID) -> dict[str, ExistingCard]:
+        """Cards of the deck that came from Anki notes, by note guid."""
+        rows = self.db.execute(
+            select(Card.source_guid, Card.id, CardLevel.id, Card.source_hash)
+            .outerjoin(CardLevel, and_(CardLevel.card_id == Card.id, CardLevel.level_index == 0))
+            .where(Card.deck_id == deck_id, Card.source_guid.isnot(None))
+        )
+        return {
+            guid: ExistingCard(card_id, level_id, source_hash)
+            for guid, card_id, level_id, source_hash in rows
+        }
 
-    def _extract_qa_from_note(
-        self,
-        note: AnkiNote,
-        anki_deck: AnkiDeck,
-    ) -> tuple[str, str]:
+    def remove_missing(self, package: SandboxedApkg, existing: dict[str, ExistingCard]) -> int:
         """
-        Extract question and answer from Anki note fields.
+        Delete cards whose notes are no longer in the package. Not committed.
 
-        This method handles:
-        - Basic model (Front/Back)
-        - Custom models (uses field names from model)
-        - HTML content cleanup
-
-        Args:
-            note: Anki note
-            anki_deck: Full Anki deck for model access
+        Progress, history and comments of those cards go with them (ON DELETE
+        CASCADE). Cards created in MnemonicFlow (without a guid) are kept.
 
         Returns:
-            Tuple of (question, answer)
+            Number of deleted cards
         """
-        model = anki_deck.models.get(note.model_id, {})
-
-        # Get field names from model
-        field_names = []
-        if "flds" in model:
-            field_names = [f.get("name", "") for f in model["flds"]]
-
-        # Map fields to names
-        fields_dict = {}
-        for i, field_value in enumerate(note.fields):
-            if i < len(field_names):
-                fields_dict[field_names[i]] = field_value
-            else:
-                fields_dict[f"field_{i}"] = field_value
+        package_guids = package.note_guids()
+        removed = [guid for guid in existing if guid not in package_guids]
+        for start in range(0, len(removed), _DELETE_CHUNK):
+            chunk = removed[start : start + _DELETE_CHUNK]
+            self.db.execute(
+                delete(Card)
+                .where(Card.id.in_([existing[guid].card_id for guid in chunk]))
+                .execution_options(synchronize_session=False)
+            )
+        for guid in removed:
+            del existing[guid]
+        return len(removed)
+
+    def link_deck(self, deck: Deck) -> None:
+        """Add the deck to the user's default study group, creating the group if needed."""
+        # Get or create user's default study group
+        user_group = (
+            self.db.query(UserStudyGroup).filter(UserStudyGroup.user_id == self.user_id).first()
+        )
 
-        # Try to find Front/Back fields
-        question = ""
-        answer = ""
+        if not user_group:
+            user_group = UserStudyGroup(user_id=self.user_id, title_override="My Decks")
+            self.db.add(user_group)
+            self.db.flush()
 
-        # Common field name variations
-        question_field_names = ["Front", "Question", "front", "question"]
-        answer_field_names = ["Back", "Answer", "back", "answer"]
+        link = UserStudyGroupDeck(
+            user_group_id=user_group.id,
+            deck_id=deck.id,
+            order_index=0,
+        )
+        self.db.add(link)
+        self.db.flush()
 
-        for name in question_field_names:
-            if name in fields_dict:
-                question = fields_dict[name]
-                break
+    def _rows_from_note(
+        self, note: PreparedNote, deck_id: uuid.UUID, card_id: uuid.UUID | None = None
+    ) -> tuple[tuple, tuple]:
+        """
+        Build the cards and card_levels rows for a prepared note.
 
-        for name in answer_field_names:
-            if name in fields_dict:
-                answer = fields_dict[name]
-                break
+        Args:
+            note: Note with a question
+            deck_id: Target deck ID
+            card_id: ID of the card being updated; a new one if not given
 
-        # Fallback: use first two fields
-        if not question and len(note.fields) > 0:
-            question = note.fields[0]
-        if not answer and len(note.fields) > 1:
-            answer = note.fields[1]
+        Returns:
+            (card row, level row) in _CARD_COLUMNS/_LEVEL_COLUMNS order
+        """
+        # Media references become storage URLs; waits for this note's uploads
+        if self.media is not None:
+            question_images, question_audio = self.media.resolve(*note.question_media)
+            answer_images, answer_audio = self.media.resolve(*note.answer_media)
+        else:
+            question_images = question_audio = answer_images = answer_audio = None
 
-        return question, answer
+        # Create card title (truncate question)
+        title = note.question[:100]
+        if not title.strip():
+            title = "Imported Card"
+
+        card_id = card_id or uuid7()
+        card_row = (card_id, deck_id, "flashcard", title, 1, note.guid, note.content_hash)
+        level_row = (
+            uuid7(),
+            card_id,
+            0,
+            {"question": note.question, "answer": note.answer},
+            question_images,
+            answer_images,
+            question_audio,
+            answer_audio,
+        )
+        return card_row, level_row
 
     def _clean_deck_name(self, name: str) -> str:
         """Clean and sanitize deck name."""
@@ -210,54 +579,3 @@ class AnkiMapper:
         name = name.split("::")[-1].strip()
         # Limit length
         return name[:200] if name else "Imported from Anki"
-
-    @staticmethod
-    def _clean_html(text: str) -> str:
-        """
-        Clean HTML content from Anki fields.
-
-        Removes:
-        - HTML tags but preserves line breaks
-        - Anki sound tags ([sound:file.mp3])
-        - Anki cloze markers
-
-        Preserves:
-        - Basic text formatting
-        - Line breaks
-        """
-        if not text:
-            return ""
-
-        # Remove Anki sound tags
-        text = re.sub(r"\[sound:[^\]]+\]", "", text)
-
-        # Remove HTML comments
-        text = re.sub(r"<!--.*?-->", "", text, flags=re.DOTALL)
-
-        # Replace <br> with newlines
-        text = re.sub(r"<br\s*/?\s*>", "\n", text, flags=re.IGNORECASE)
-
-        # Replace </div> and </p> with newlines
-        text = re.sub(r"</\s*(div|p)\s*>", "\n", text, flags=re.IGNORECASE)
-
-        # Replace <li> with bullets
-        text = re.sub(r"<\s*li\s*>", "• ", text, flags=re.IGNORECASE)
-
-        # Remove all other HTML tags
-        text = re.sub(r"<[^>]+>", "", text)
-
-        # Decode HTML entities
-        text = (
-            text.replace("&nbsp;", " ")
-            .replace("&lt;", "<")
-            .replace("&gt;", ">")
-            .replace("&amp;", "&")
-            .replace("&quot;", '"')
-            .replace("&#39;", "'")
-        )
-
-        # Clean up whitespace
-        text = re.sub(r"\n{3,}", "\n\n", text)  # Max 2 consecutive newlines
-        text = text.strip()
-
-        return text
@@ -0,0 +1,185 @@
+# backend/app/services/anki_media.py
+"""
+Upload of media referenced by imported Anki notes.
+
+Notes reference media by file name: <img src="cat.jpg"> and [sound:hello.mp3].
+AnkiMediaUploader uploads each referenced file once, however many notes use it,
+through a bounded thread pool. The threads share the storage service's boto3
+client (clients are thread-safe) and the bucket is checked once per import, not
+once per file. Files are stored content-addressed (app/services/media_store.py):
+media already in storage, e.g. from an earlier import of the same shared deck,
+is not uploaded again. Card levels get the resulting URLs in their image/audio
+arrays; the tags themselves are stripped from the text by anki_transform.clean_html.
+"""
+
+from __future__ import annotations
+
+import logging
+import mimetypes
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import unquote
+
+from app.core.config import settings
+from app.services.anki_parser import ApkgParser
+from app.services.anki_sandbox import SandboxedApkg
+from app.services.anki_transform import find_media_refs
+from app.services.media_store import StoredMedia, upload_content
+from app.services.storage_service import FileType, StorageService, get_storage_service
+
+logger = logging.getLogger(__name__)
+
+# mimetypes names that differ from the ones StorageService accepts
+_CONTENT_TYPE_ALIASES = {
+    "audio/x-wav": "audio/wav",
+    "audio/mp3": "audio/mpeg",
+    "audio/x-m4a": "audio/mp4",
+    "audio/opus": "audio/ogg",
+}
+
+# Per-file problems are summarised beyond this many warnings
+MAX_MEDIA_WARNINGS = 20
+
+
+class AnkiMediaUploader:
+    """
+    Uploads media of one Anki package, each file once.
+
+    Usage:
+        with AnkiMediaUploader(package) as media:
+            for note in batch:
+                media.submit_refs(*note.question_media)  # start uploads of the whole batch
+            for note in batch:
+                image_urls, audio_urls = media.resolve(*note.question_media)  # wait for them
+            record_media_objects(db, media.drain_stored())  # before the levels are written
+    """
+
+    def __init__(
+        self,
+        parser: ApkgParser | SandboxedApkg,
+        storage: StorageService | None = None,
+        max_workers: int | None = None,
+    ) -> None:
+        self.parser = parser
+        self._storage = storage
+        # Threads are started lazily: packages without media cost nothing
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or settings.ANKI_MEDIA_UPLOAD_WORKERS,
+            thread_name_prefix="anki-media",
+        )
+        # file name -> upload of that file; only touched from the importing thread
+        self._uploads: dict[str, Future[str | None]] = {}
+
+        self._lock = threading.Lock()
+        self._warnings: list[str] = []
+        self._skipped = 0
+        # Stored since the last drain_stored()
+        self._stored: list[StoredMedia] = []
+        # Files that weren't in storage yet
+        self.uploaded = 0
+
+    def __enter__(self) -> AnkiMediaUploader:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def storage(self) -> StorageService:
+        if self._storage is None:
+            self._storage = get_storage_service()
+        return self._storage
+
+    def submit(self, *fields: str) -> None:
+        """Start uploading media referenced by the fields that isn't uploaded yet."""
+        for field in fields:
+            self.submit_refs(*find_media_refs(field))
+
+    def submit_refs(self, images: list[str], sounds: list[str]) -> None:
+        """Start uploading the named images and sounds that aren't uploaded yet."""
+        for name in images:
+            self._submit(name, FileType.IMAGE)
+        for name in sounds:
+            self._submit(name, FileType.AUDIO)
+
+    def urls(self, field: str) -> tuple[list[str] | None, list[str] | None]:
+        """
+        Storage URLs of the images and sounds referenced by a field.
+
+        Waits for the uploads; files that were skipped are left out. Empty lists
+        are returned as None, like card levels without media.
+        """
+        return self.resolve(*find_media_refs(field))
+
+    def resolve(
+        self, images: list[str], sounds: list[str]
+    ) -> tuple[list[str] | None, list[str] | None]:
+        """Storage URLs of the named images and sounds, like urls()."""
+        self.submit_refs(images, sounds)
+        image_urls = [url for name in images if (url := self._uploads[name].result())]
+        audio_urls = [url for name in sounds if (url := self._uploads[name].result())]
+        return image_urls or None, audio_urls or None
+
+    def drain_stored(self) -> list[StoredMedia]:
+        """Objects stored since the last call, to be recorded in media_objects."""
+        with self._lock:
+            stored, self._stored = self._stored, []
+            return stored
+
+    def warnings(self) -> list[str]:
+        """Problems with individual files, capped at MAX_MEDIA_WARNINGS."""
+        with self._lock:
+            reported = list(self._warnings)
+            if self._skipped > len(reported):
+                reported.append(f"{self._skipped - len(reported)} more media files were skipped")
+            return reported
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def _submit(self, name: str, file_type: FileType) -> None:
+        if name in self._uploads:
+            return
+        if not self._uploads:
+            self.storage.ensure_bucket()
+            # Read the archive index here, not concurrently in the upload threads
+            self.parser.media_files
+        self._uploads[name] = self._executor.submit(self._upload, name, file_type)
+
+    def _upload(self, name: str, file_type: FileType) -> str | None:
+        """Upload one file. Returns None if it was skipped; storage errors propagate."""
+        member_name = self._resolve(name)
+        if member_name is None:
+            self._skip(f"Media file {name!r} is missing from the package")
+            return None
+
+        content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        content_type = _CONTENT_TYPE_ALIASES.get(content_type, content_type)
+        size = self.parser.media_size(member_name) or 0
+        try:
+            self.storage.validate_file(name, content_type, size, file_type)
+        except ValueError as e:
+            self._skip(f"Media file {name!r} skipped: {e}")
+            return None
+
+        data = self.parser.read_media(member_name)
+        stored = upload_content(data, content_type, file_type, storage=self.storage)
+        with self._lock:
+            self._stored.append(stored)
+            self.uploaded += stored.uploaded
+        return stored.url
+
+    def _resolve(self, name: str) -> str | None:
+        """Name of the file in the package: src attributes may be URL-encoded."""
+        media_files = self.parser.media_files
+        for candidate in (name, unquote(name)):
+            if candidate in media_files:
+                return candidate
+        return None
+
+    def _skip(self, message: str) -> None:
+        logger.info(message)
+        with self._lock:
+            self._skipped += 1
+            if len(self._warnings) < MAX_MEDIA_WARNINGS:
+                self._warnings.append(message)
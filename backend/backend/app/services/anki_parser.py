@@ -5,16 +5,49 @@ Anki .apkg format:
 - ZIP archive containing SQLite database (collection.anki2 or collection.anki21)
 - media JSON file with media file mappings
 - Media files (images, audio)
+
+The parser works from a file on disk and keeps memory bounded: the SQLite
+database is extracted to a temp file and queried in place, notes and cards are
+yielded in batches from the cursor, and media files are read from the archive
+only when asked for by name. Media access alone (media_files, open_media) never
+extracts the database, so a process that only uploads media doesn't decompress
+the collection (see app/services/anki_sandbox.py).
+
+Reads take id bounds (after_id, until_id), so a package can be processed in
+independent chunks, e.g. by several processes: note_id_boundaries() splits the
+notes into ranges of a given size.
+
+Scheduling data: cards carry Anki's scheduling state (type/queue/due/ivl/factor)
+and the review log is streamed as plain tuples in REVLOG_COLUMNS order - with
+hundreds of thousands of entries per collection, building an object per review
+would cost more than loading them.
 """
 
 from __future__ import annotations
 
-import io
 import json
+import os
+import shutil
 import sqlite3
+import tempfile
 import zipfile
 from dataclasses import dataclass, field
-from typing import Any
+from datetime import date
+from typing import IO, Any, Iterator
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Newer Anki versions ship a stub collection.anki2 next to the real collection.anki21
+_DB_FILE_PREFERENCE = (".anki21", ".anki2")
+
+_COPY_CHUNK_SIZE = 1024 * 1024
+
+# Open id bounds: Anki ids are positive 64-bit integers
+_NO_ID = -1
+_MAX_ID = 2**63 - 1
+
+# Order of the values in rows yielded by ApkgParser.iter_revlog()
+REVLOG_COLUMNS = ("id", "cid", "ease", "ivl", "time", "type")
 
 
 @dataclass
@@ -35,17 +68,35 @@ class AnkiCard:
     id: int
     note_id: int
     ord: int  # Template ordinal
+    note_guid: str = ""
+
+    # Scheduling state, as stored by Anki
+    type: int = 0  # 0 new, 1 learning, 2 review, 3 relearning
+    queue: int = 0  # like type; -1 suspended, -2/-3 buried
+    # new: position; learning: unix timestamp; review: days since collection creation
+    due: int = 0
+    ivl: int = 0  # days if positive, seconds if negative
+    factor: int = 0  # ease in permille (2500 = 250%), 0 for new cards
+    reps: int = 0
+    lapses: int = 0
 
 
 @dataclass
 class AnkiDeck:
-    """Represents a parsed Anki deck."""
+    """Collection-level metadata of a parsed Anki package (notes are streamed separately)."""
 
     name: str
-    notes: list[AnkiNote] = field(default_factory=list)
-    cards: list[AnkiCard] = field(default_factory=list)
     models: dict[int, dict[str, Any]] = field(default_factory=dict)
-    media_map: dict[str, bytes] = field(default_factory=dict)  # filename -> content
+    media_files: dict[str, str] = field(default_factory=dict)  # filename -> archive member
+    note_count: int = 0
+    card_count: int = 0
+    review_count: int = 0
+    # Months (UTC) the review log has entries in
+    review_months: list[date] = field(default_factory=list)
+    # Cards that are not new (Anki has scheduled them)
+    scheduled_card_count: int = 0
+    # Collection creation (unix seconds): day-based due dates count from here
+    created_at: int = 0
 
 
 class ApkgParseError(Exception):
@@ -56,186 +107,367 @@ class ApkgParseError(Exception):
 
 class ApkgParser:
     """
-    Parser for Anki .apkg files.
+    Streaming parser for Anki .apkg files.
 
     Usage:
-        parser = ApkgParser(file_data)
-        deck = parser.parse()
+        with ApkgParser(path) as parser:
+            deck = parser.parse()
+            for notes in parser.iter_notes():
+                ...
+            image = parser.read_media("picture.jpg")
     """
 
-    def __init__(self, file_data: bytes) -> None:
-        self.file_data = file_data
+    def __init__(
+        self,
+        source: str | os.PathLike[str],
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        database: str | os.PathLike[str] | None = None,
+    ):
+        """
+        Args:
+            source: The .apkg file
+            batch_size: Default batch size of the iter_* methods
+            database: The collection already extracted by extract_database(), opened
+                instead of extracting it again. Not removed by close().
+        """
+        self.source = source
+        self.batch_size = batch_size
+        self.database = database
         self._zip_file: zipfile.ZipFile | None = None
         self._db_conn: sqlite3.Connection | None = None
-        self._media_map: dict[str, str] = {}  # number -> filename
+        self._tmp_dir: str | None = None
+        self._media_files: dict[str, str] | None = None  # filename -> archive member name
+        self._deck: AnkiDeck | None = None
+
+    def __enter__(self) -> ApkgParser:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
 
     def parse(self) -> AnkiDeck:
-        """Parse the .apkg file and return an AnkiDeck."""
-        self._extract_zip()
-        self._parse_media_map()
-        self._open_database()
-        return self._parse_deck()
-
-    def _extract_zip(self) -> None:
-        """Extract and validate the ZIP archive."""
+        """Open the package and read collection metadata. Notes and cards are not loaded."""
+        if self._deck is None:
+            media_files = self.media_files
+            self._open_database()
+            self._deck = self._parse_collection(media_files)
+        return self._deck
+
+    @property
+    def media_files(self) -> dict[str, str]:
+        """Media file name -> archive member. Reads the archive index only."""
+        if self._media_files is None:
+            self._open_zip()
+            self._media_files = self._parse_media_map()
+        return self._media_files
+
+    def iter_notes(
+        self,
+        batch_size: int | None = None,
+        after_id: int | None = None,
+        until_id: int | None = None,
+    ) -> Iterator[list[AnkiNote]]:
+        """Yield notes in batches, in id order: after `after_id`, up to and including `until_id`."""
+        cursor = self._cursor()
         try:
-            self._zip_file = zipfile.ZipFile(io.BytesIO(self.file_data))
-        except zipfile.BadZipFile as e:
-            raise ApkgParseError(f"Invalid ZIP file: {e}")
+            cursor.execute(
+                "SELECT id, guid, mid, flds, tags FROM notes WHERE id > ? AND id <= ? ORDER BY id",
+                (
+                    after_id if after_id is not None else _NO_ID,
+                    until_id if until_id is not None else _MAX_ID,
+                ),
+            )
+            while rows := cursor.fetchmany(batch_size or self.batch_size):
+                yield [self._note_from_row(row) for row in rows]
+        except sqlite3.Error as e:
+            raise ApkgParseError(f"Failed to parse notes: {e}")
+        finally:
+            cursor.close()
 
-        # Find the Anki database file
-        db_files = [
-            name for name in self._zip_file.namelist() if name.endswith((".anki2", ".anki21"))
-        ]
-        if not db_files:
-            raise ApkgParseError("No Anki database file found (.anki2 or .anki21)")
+    def note_id_boundaries(self, every: int, after_id: int | None = None) -> list[int]:
+        """
+        Ids splitting the notes after `after_id` into ranges of `every` notes.
 
-    def _parse_media_map(self) -> None:
-        """Parse the media JSON file."""
-        if not self._zip_file:
-            raise ApkgParseError("ZIP file not initialized")
+        Every `every`-th note id and the last one, ascending: the ranges are
+        (after_id, b[0]], (b[0], b[1]], ... Empty if there are no such notes.
+        """
+        cursor = self._cursor()
+        try:
+            cursor.execute(
+                """
+                SELECT id FROM (
+                    SELECT id, row_number() OVER (ORDER BY id) AS n,
+                           count(*) OVER () AS total
+                    FROM notes WHERE id > ?
+                ) WHERE n % ? = 0 OR n = total
+                ORDER BY id
+                """,
+                (after_id if after_id is not None else _NO_ID, every),
+            )
+            return [note_id for (note_id,) in cursor]
+        except sqlite3.Error as e:
+            raise ApkgParseError(f"Failed to parse notes: {e}")
+        finally:
+            cursor.close()
+
+    def note_guids(self) -> set[str]:
+        """Guids of all notes in the package."""
+        cursor = self._cursor()
+        try:
+            return {guid for (guid,) in cursor.execute("SELECT guid FROM notes")}
+        except sqlite3.Error as e:
+            raise ApkgParseError(f"Failed to parse notes: {e}")
+        finally:
+            cursor.close()
+
+    def iter_cards(
+        self, batch_size: int | None = None, after_id: int | None = None
+    ) -> Iterator[list[AnkiCard]]:
+        """Yield cards in batches, in id order, optionally starting after a card id."""
+        cursor = self._cursor()
+        try:
+            cursor.execute(
+                """
+                SELECT c.id, c.nid, c.ord, n.guid, c.type, c.queue, c.due, c.ivl, c.factor,
+                       c.reps, c.lapses
+                FROM cards c
+                JOIN notes n ON n.id = c.nid
+                WHERE c.id > ?
+                ORDER BY c.id
+                """,
+                (after_id if after_id is not None else _NO_ID,),
+            )
+            while rows := cursor.fetchmany(batch_size or self.batch_size):
+                yield [self._card_from_row(row) for row in rows]
+        except sqlite3.Error as e:
+            raise ApkgParseError(f"Failed to parse cards: {e}")
+        finally:
+            cursor.close()
+
+    def iter_revlog(
+        self, batch_size: int | None = None, after_id: int | None = None
+    ) -> Iterator[list[tuple[int, ...]]]:
+        """
+        Yield review log entries in batches, in id (= review time) order,
+        optionally starting after an entry id.
+
+        Rows are tuples in REVLOG_COLUMNS order: id (review time, unix ms), card id,
+        ease (1 again .. 4 easy, 0 manual reschedule), new interval (days if
+        positive, seconds if negative), answer time (ms), review type.
+        """
+        cursor = self._cursor()
+        try:
+            cursor.execute(
+                f"SELECT {', '.join(REVLOG_COLUMNS)} FROM revlog WHERE id > ? ORDER BY id",
+                (after_id if after_id is not None else _NO_ID,),
+            )
+            while rows := cursor.fetchmany(batch_size or self.batch_size):
+                yield rows
+        except sqlite3.Error as e:
+            raise ApkgParseError(f"Failed to parse review log: {e}")
+        finally:
+            cursor.close()
+
+    def open_media(self, filename: str) -> IO[bytes] | None:
+        """Open a media file from the archive for streaming, or None if it isn't there."""
+        member = self.media_files.get(filename)
+        if member is None:
+            return None
+        try:
+            return self._zip_file.open(member)
+        except KeyError:
+            # Media file referenced but not present in archive
+            return None
+
+    def read_media(self, filename: str) -> bytes | None:
+        """Read a single media file into memory."""
+        media = self.open_media(filename)
+        if media is None:
+            return None
+        with media:
+            return media.read()
+
+    def media_size(self, filename: str) -> int | None:
+        """Uncompressed size of a media file without reading it."""
+        member = self.media_files.get(filename)
+        if member is None:
+            return None
+        try:
+            return self._zip_file.getinfo(member).file_size
+        except KeyError:
+            return None
+
+    def close(self) -> None:
+        """Close the database and archive and remove the extracted files."""
+        if self._db_conn:
+            self._db_conn.close()
+            self._db_conn = None
+        if self._zip_file:
+            self._zip_file.close()
+            self._zip_file = None
+            self._media_files = None
+        if self._tmp_dir:
+            shutil.rmtree(self._tmp_dir, ignore_errors=True)
+            self._tmp_dir = None
+
+    def _open_zip(self) -> None:
+        """Open and validate the ZIP archive."""
+        try:
+            self._zip_file = zipfile.ZipFile(self.source)
+        except (zipfile.BadZipFile, OSError) as e:
+            raise ApkgParseError(f"Invalid ZIP file: {e}")
 
+    def _parse_media_map(self) -> dict[str, str]:
+        """Parse the media JSON file."""
         try:
-            media_json_bytes = self._zip_file.read("media")
-            media_json = json.loads(media_json_bytes.decode("utf-8"))
-            # media_json maps numbers to filenames
-            self._media_map = {str(k): v for k, v in media_json.items()}
+            media_json = json.loads(self._zip_file.read("media").decode("utf-8"))
         except KeyError:
             # No media file in this package
-            self._media_map = {}
+            media_json = {}
         except (json.JSONDecodeError, UnicodeDecodeError) as e:
             raise ApkgParseError(f"Invalid media JSON: {e}")
 
-    def _open_database(self) -> None:
-        """Open the SQLite database from the .anki2 file."""
-        if not self._zip_file:
-            raise ApkgParseError("ZIP file not initialized")
-
-        # Find the database file
-        db_files = [
-            name for name in self._zip_file.namelist() if name.endswith((".anki2", ".anki21"))
-        ]
-        if not db_files:
-            raise ApkgParseError("No database file found")
+        # media_json maps archive member numbers to filenames
+        return {filename: str(number) for number, filename in media_json.items()}
+
+    def _find_database_member(self) -> str:
+        names = self._zip_file.namelist()
+        for suffix in _DB_FILE_PREFERENCE:
+            for name in names:
+                if name.endswith(suffix):
+                    return name
+        raise ApkgParseError("No Anki database file found (.anki2 or .anki21)")
+
+    def extract_database(self, path: str | os.PathLike[str]) -> None:
+        """Extract the SQLite database of the package to `path`."""
+        if self._zip_file is None:
+            self._open_zip()
+        db_member = self._find_database_member()
+        try:
+            with self._zip_file.open(db_member) as src, open(path, "wb") as dst:
+                shutil.copyfileobj(src, dst, _COPY_CHUNK_SIZE)
+        except (OSError, zipfile.BadZipFile) as e:
+            raise ApkgParseError(f"Failed to open database: {e}")
 
-        db_file = db_files[0]
+    def _open_database(self) -> None:
+        """Extract the SQLite database to a temp file (unless given) and open it there."""
+        db_path = self.database
+        if db_path is None:
+            self._tmp_dir = tempfile.mkdtemp(prefix="apkg-")
+            db_path = os.path.join(self._tmp_dir, "collection.db")
+            self.extract_database(db_path)
 
         try:
-            db_data = self._zip_file.read(db_file)
-            # Create in-memory database from the binary file data
-            # Use backup method to load binary database into memory
-            source_conn = sqlite3.connect(":memory:", check_same_thread=False)
-            # Write the binary data to a temporary file and then restore
-            import tempfile
-
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".anki2") as tmp_file:
-                tmp_file.write(db_data)
-                tmp_file.flush()
-                # Now connect to the temp file and backup to memory
-                try:
-                    disk_conn = sqlite3.connect(tmp_file.name, check_same_thread=False)
-                    disk_conn.backup(source_conn)
-                    disk_conn.close()
-                finally:
-                    import os
-
-                    try:
-                        os.unlink(tmp_file.name)
-                    except OSError:
-                        pass
-            self._db_conn = source_conn
-        except Exception as e:
+            self._db_conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._db_conn.execute("PRAGMA query_only = ON")
+        except sqlite3.Error as e:
             raise ApkgParseError(f"Failed to open database: {e}")
 
-    def _parse_deck(self) -> AnkiDeck:
-        """Parse notes, cards, and models from the database."""
-        if not self._db_conn:
-            raise ApkgParseError("Database not initialized")
+    def _cursor(self) -> sqlite3.Cursor:
+        self.parse()
+        return self._db_conn.cursor()
 
+    def _parse_collection(self, media_files: dict[str, str]) -> AnkiDeck:
+        """Read deck name, models and counts from the collection."""
         cursor = self._db_conn.cursor()
-
-        # Get deck name from collection
-        try:
-            cursor.execute("SELECT decks FROM col")
-            col_data = cursor.fetchone()
-            if col_data and col_data[0]:
-                decks_json = json.loads(col_data[0])
-                # Get first deck name
-                deck_name = next(iter(decks_json.values()), {}).get("name", "Imported from Anki")
-            else:
-                deck_name = "Imported from Anki"
-        except (json.JSONDecodeError, StopIteration):
-            deck_name = "Imported from Anki"
-
-        # Get models from collection
         try:
-            cursor.execute("SELECT models FROM col")
+            cursor.execute("SELECT decks, models, crt FROM col")
             col_data = cursor.fetchone()
-            models = {}
-            if col_data and col_data[0]:
-                models_json = json.loads(col_data[0])
-                for model_id, model_data in models_json.items():
-                    models[int(model_id)] = model_data
-        except (json.JSONDecodeError, ValueError):
-            models = {}
+        except sqlite3.Error as e:
+            raise ApkgParseError(f"Failed to read collection: {e}")
 
-        # Parse notes
-        notes = []
-        try:
-            cursor.execute("SELECT id, guid, mid, flds, tags FROM notes")
-            for row in cursor.fetchall():
-                note_id, guid, model_id, fields, tags = row
-                # Fields are separated by \x1f
-                field_list = fields.split("\x1f")
-                # Tags are space-separated (may also be in "tag1 tag2" format)
-                tag_list = [t for t in tags.split() if t] if tags else []
-                notes.append(
-                    AnkiNote(
-                        id=note_id,
-                        guid=guid,
-                        model_id=model_id,
-                        fields=field_list,
-                        tags=tag_list,
-                    )
-                )
-        except Exception as e:
-            raise ApkgParseError(f"Failed to parse notes: {e}")
+        deck_name = self._deck_name(col_data[0] if col_data else None)
+        models = self._models(col_data[1] if col_data else None)
 
-        # Parse cards
-        cards = []
         try:
-            cursor.execute("SELECT id, nid, ord FROM cards")
-            for row in cursor.fetchall():
-                card_id, note_id, ord = row
-                cards.append(AnkiCard(id=card_id, note_id=note_id, ord=ord))
-        except Exception as e:
-            raise ApkgParseError(f"Failed to parse cards: {e}")
-
-        # Load media files into memory
-        media_files = {}
-        if self._zip_file:
-            for number, filename in self._media_map.items():
-                try:
-                    media_data = self._zip_file.read(str(number))
-                    media_files[filename] = media_data
-                except KeyError:
-                    # Media file referenced but not present in archive
-                    pass
-
-        cursor.close()
-        self._db_conn.close()
+            note_count = cursor.execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+            card_count = cursor.execute("SELECT COUNT(*) FROM cards").fetchone()[0]
+            review_count = cursor.execute("SELECT COUNT(*) FROM revlog").fetchone()[0]
+            review_months = self._review_months(cursor)
+            scheduled_card_count = cursor.execute(
+                "SELECT COUNT(*) FROM cards WHERE type > 0"
+            ).fetchone()[0]
+        except sqlite3.Error as e:
+            raise ApkgParseError(f"Failed to read collection: {e}")
+        finally:
+            cursor.close()
 
         return AnkiDeck(
             name=deck_name,
-            notes=notes,
-            cards=cards,
             models=models,
-            media_map=media_files,
+            media_files=media_files,
+            note_count=note_count,
+            card_count=card_count,
+            review_count=review_count,
+            review_months=review_months,
+            scheduled_card_count=scheduled_card_count,
+            created_at=(col_data[2] or 0) if col_data else 0,
+        )
+
+    @staticmethod
+    def _deck_name(decks_json: str | None) -> str:
+        """Name of the collection's first deck."""
+        deck_name = "Imported from Anki"
+        try:
+            if decks_json:
+                decks = json.loads(decks_json)
+                deck_name = next(iter(decks.values()), {}).get("name", deck_name)
+        except json.JSONDecodeError:
+            pass
+        return deck_name
+
+    @staticmethod
+    def _models(models_json: str | None) -> dict[int, dict]:
+        """Note types of the collection by id, empty if they can't be read."""
+        try:
+            if models_json:
+                return {
+                    int(model_id): model_data
+                    for model_id, model_data in json.loads(models_json).items()
+                }
+        except (json.JSONDecodeError, ValueError):
+            pass
+        return {}
+
+    @staticmethod
+    def _review_months(cursor: sqlite3.Cursor) -> list[date]:
+        # Revlog ids are the review time in unix ms
+        rows = cursor.execute("""
+            SELECT DISTINCT strftime('%Y-%m-01', id / 1000, 'unixepoch') FROM revlog
+            WHERE id > 0
+            """)
+        return [date.fromisoformat(month) for (month,) in rows if month]
+
+    @staticmethod
+    def _card_from_row(row: tuple) -> AnkiCard:
+        card_id, nid, ord, guid, type_, queue, due, ivl, factor, reps, lapses = row
+        return AnkiCard(
+            id=card_id,
+            note_id=nid,
+            ord=ord,
+            note_guid=guid,
+            type=type_,
+            queue=queue,
+            due=due,
+            ivl=ivl,
+            factor=factor,
+            reps=reps,
+            lapses=lapses,
+        )
+
+    @staticmethod
+    def _note_from_row(row: tuple) -> AnkiNote:
+        note_id, guid, model_id, fields, tags = row
+        return AnkiNote(
+            id=note_id,
+            guid=guid,
+            model_id=model_id,
+            # Fields are separated by \x1f
+            fields=fields.split("\x1f"),
+            # Tags are space-separated
+            tags=[t for t in tags.split() if t] if tags else [],
         )
 
     def __del__(self) -> None:
-        """Clean up database connection."""
-        if self._db_conn:
-            self._db_conn.close()
-        if self._zip_file:
-            self._zip_file.close()
+        """Clean up database connection and extracted files."""
+        self.close()
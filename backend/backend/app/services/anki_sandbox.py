@@ -0,0 +1,361 @@
+# backend/app/services/anki_sandbox.py
+"""
+Parsing of uploaded Anki packages in a sandboxed process pool.
+
+An .apkg is untrusted input: a zip archive whose SQLite collection is
+decompressed, queried and run through regex-heavy HTML cleanup. A zip bomb or a
+pathological deck must not take the memory or CPU of the process that also
+serves reviews, so everything that touches the collection runs in the worker
+processes of SandboxPool (spawned, not forked from the API), with limits:
+
+- address space, RLIMIT_AS (IMPORT_SANDBOX_MEMORY_MB): allocations beyond it
+  raise MemoryError in the worker
+- size of written files, RLIMIT_FSIZE (IMPORT_SANDBOX_MAX_FILE_MB): caps the
+  extracted collection, larger writes fail with EFBIG (Python ignores SIGXFSZ)
+- CPU time per task, RLIMIT_CPU re-armed before every task
+  (IMPORT_SANDBOX_CPU_SECONDS): SIGXCPU kills the worker
+- wall clock time per task (IMPORT_SANDBOX_TIMEOUT_S), enforced by the parent,
+  which kills the workers and starts a fresh pool
+
+Workers also run at a lower scheduling priority than the API.
+
+SandboxedApkg is what the importer reads a package through. The collection is
+extracted once per package by a worker and the other tasks open that file.
+Notes are prepared (app/services/anki_transform.py) in id ranges of one import
+batch: each range is a task, a few of them per worker are in flight, and the
+parent gets the batches back in note order, so parsing a large package scales
+over IMPORT_SANDBOX_WORKERS cores. The parent keeps the database work and reads
+media files from the archive itself by name, without extracting the collection.
+
+Exceeding a limit fails the import with SandboxLimitExceeded (an
+ApkgParseError: retrying the same package would not help). With
+IMPORT_SANDBOX_ENABLED off the same tasks run in the calling process.
+"""
+
+from __future__ import annotations
+
+import errno
+import logging
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from typing import IO, Any, Callable, Iterator
+
+from app.core.config import settings
+from app.services.anki_parser import AnkiCard, AnkiDeck, ApkgParseError, ApkgParser
+from app.services.anki_transform import PreparedBatch, prepare_notes
+
+try:
+    import resource
+except ImportError:  # Windows: workers run without resource limits
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+_MB = 1024 * 1024
+
+# Tasks in flight per worker: the next range is parsed while the parent writes the last one
+_TASKS_PER_WORKER = 2
+
+_WORKER_NICENESS = 10
+
+
+class SandboxLimitExceeded(ApkgParseError):
+    """Processing the package exceeded the memory, CPU time, file size or time limit."""
+
+    pass
+
+
+# Worker side: these run in the pool's processes
+
+_cpu_seconds = 0
+_max_file_mb = 0
+_parser: ApkgParser | None = None
+
+
+def _init_worker(memory_bytes: int, file_bytes: int, cpu_seconds: int) -> None:
+    global _cpu_seconds, _max_file_mb
+    _cpu_seconds = cpu_seconds
+    _max_file_mb = file_bytes // _MB
+    # Ctrl+C is the parent's business; it stops the pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    os.nice(_WORKER_NICENESS)
+    if resource is None:
+        return
+    if memory_bytes:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+    if file_bytes:
+        resource.setrlimit(resource.RLIMIT_FSIZE, (file_bytes, file_bytes))
+
+
+def _limited(fn: Callable[..., Any], *args: Any) -> Any:
+    """Run a task with _cpu_seconds of CPU time on top of what the worker already used."""
+    if resource is not None and _cpu_seconds:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        spent = int(usage.ru_utime + usage.ru_stime) + 1
+        resource.setrlimit(resource.RLIMIT_CPU, (spent + _cpu_seconds, resource.RLIM_INFINITY))
+    return fn(*args)
+
+
+def _on_package(fn: Callable[..., Any], source: str, database: str, *args: Any) -> Any:
+    """Run fn(parser, *args) on the package; the worker keeps it open for the next task."""
+    global _parser
+    if _parser is None or (_parser.source, _parser.database) != (source, database):
+        if _parser is not None:
+            _parser.close()
+        _parser = ApkgParser(source, database=database)
+    return fn(_parser, *args)
+
+
+def _extract_database(source: str, database: str) -> None:
+    with ApkgParser(source) as parser:
+        try:
+            parser.extract_database(database)
+        except ApkgParseError as e:
+            if isinstance(e.__context__, OSError) and e.__context__.errno == errno.EFBIG:
+                raise SandboxLimitExceeded(f"the collection is larger than {_max_file_mb} MB")
+            raise
+
+
+def _read_deck(parser: ApkgParser) -> AnkiDeck:
+    return parser.parse()
+
+
+def _note_id_boundaries(parser: ApkgParser, every: int, after_id: int | None) -> list[int]:
+    return parser.note_id_boundaries(every, after_id)
+
+
+def _prepare_range(parser: ApkgParser, after_id: int | None, until_id: int) -> PreparedBatch:
+    notes = [
+        note for batch in parser.iter_notes(after_id=after_id, until_id=until_id) for note in batch
+    ]
+    return prepare_notes(notes, parser.parse().models)
+
+
+def _note_guids(parser: ApkgParser) -> set[str]:
+    return parser.note_guids()
+
+
+def _read_cards(parser: ApkgParser, batch_size: int, after_id: int | None) -> list[AnkiCard]:
+    return next(parser.iter_cards(batch_size, after_id=after_id), [])
+
+
+def _read_revlog(
+    parser: ApkgParser, batch_size: int, after_id: int | None
+) -> list[tuple[int, ...]]:
+    return next(parser.iter_revlog(batch_size, after_id=after_id), [])
+
+
+# Parent side
+
+
+class SandboxPool:
+    """
+    Process pool with resource limits for parsing untrusted packages.
+
+    Workers are spawned on the first task. A worker killed by a limit breaks the
+    pool (BrokenProcessPool) and a task over the wall clock limit gets the
+    workers killed; either way the next task starts a new pool.
+
+    Limits default to the IMPORT_SANDBOX_* settings; 0 means no limit.
+    """
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        memory_mb: int | None = None,
+        max_file_mb: int | None = None,
+        cpu_seconds: int | None = None,
+        timeout_s: float | None = None,
+    ) -> None:
+        self.workers = workers or settings.IMPORT_SANDBOX_WORKERS
+        self.memory_mb = settings.IMPORT_SANDBOX_MEMORY_MB if memory_mb is None else memory_mb
+        self.max_file_mb = (
+            settings.IMPORT_SANDBOX_MAX_FILE_MB if max_file_mb is None else max_file_mb
+        )
+        self.cpu_seconds = (
+            settings.IMPORT_SANDBOX_CPU_SECONDS if cpu_seconds is None else cpu_seconds
+        )
+        self.timeout_s = settings.IMPORT_SANDBOX_TIMEOUT_S if timeout_s is None else timeout_s
+
+        self._lock = threading.Lock()
+        self._executor: ProcessPoolExecutor | None = None
+        self._tmp_dir: str | None = None
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        """Run fn(*args) in a worker; fn and the arguments must be picklable."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.memory_mb * _MB, self.max_file_mb * _MB, self.cpu_seconds),
+                )
+            return self._executor.submit(_limited, fn, *args)
+
+    def result(self, future: Future) -> Any:
+        """Wait for a task; limits exceeded on the way raise SandboxLimitExceeded."""
+        try:
+            return future.result(timeout=self.timeout_s or None)
+        except FutureTimeoutError:
+            self.reset()
+            raise SandboxLimitExceeded(f"processing took longer than {self.timeout_s:g} s")
+        except BrokenProcessPool:
+            self.reset()
+            raise SandboxLimitExceeded("the import process was killed: out of CPU time or memory")
+        except MemoryError:
+            raise SandboxLimitExceeded(f"processing needs more than {self.memory_mb} MB")
+
+    def new_path(self, suffix: str = "") -> str:
+        """A path in the pool's scratch directory, removed when the pool shuts down."""
+        with self._lock:
+            if self._tmp_dir is None:
+                self._tmp_dir = tempfile.mkdtemp(prefix="anki-sandbox-")
+            return os.path.join(self._tmp_dir, uuid.uuid4().hex + suffix)
+
+    def reset(self) -> None:
+        """Kill the workers; the next task starts a new pool."""
+        self.shutdown(kill=True)
+
+    def shutdown(self, kill: bool = False) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+            tmp_dir, self._tmp_dir = self._tmp_dir, None
+        if executor is not None:
+            if kill:
+                logger.warning("Killing Anki import sandbox workers")
+                # ProcessPoolExecutor has no public way to stop a running task
+                for process in list((executor._processes or {}).values()):
+                    process.kill()
+            executor.shutdown(wait=not kill, cancel_futures=True)
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+sandbox_pool = SandboxPool()
+
+
+class SandboxedApkg:
+    """
+    Read side of an Anki package for the importer, parsed in the sandbox.
+
+    Offers what AnkiMapper and AnkiMediaUploader need: metadata, prepared note
+    batches, guids, cards and review log, and media by name.
+
+    Usage:
+        with SandboxedApkg(path) as package:
+            deck = package.parse()
+            for batch in package.iter_prepared(batch_size=5000):
+                ...
+            image = package.read_media("picture.jpg")
+    """
+
+    def __init__(
+        self,
+        source: str | os.PathLike[str],
+        pool: SandboxPool | None = None,
+        isolated: bool | None = None,
+    ) -> None:
+        self.source = os.fspath(source)
+        self.pool = pool or sandbox_pool
+        self.isolated = settings.IMPORT_SANDBOX_ENABLED if isolated is None else isolated
+        # Media are read here, from the archive index only; not isolated, it does everything
+        self._parser = ApkgParser(self.source)
+        self._database: str | None = None
+        self._deck: AnkiDeck | None = None
+
+    def __enter__(self) -> SandboxedApkg:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def parse(self) -> AnkiDeck:
+        """Collection metadata, see ApkgParser.parse()."""
+        if self._deck is None:
+            self._deck = self._call(_read_deck)
+        return self._deck
+
+    def iter_prepared(
+        self, batch_size: int, after_id: int | None = None
+    ) -> Iterator[PreparedBatch]:
+        """Yield prepared batches of `batch_size` notes in note id order, after `after_id`."""
+        boundaries = self._call(_note_id_boundaries, batch_size, after_id)
+        ranges = zip([after_id, *boundaries[:-1]], boundaries)
+        if not self.isolated:
+            for after, until in ranges:
+                yield _prepare_range(self._parser, after, until)
+            return
+
+        in_flight: deque[Future] = deque()
+        try:
+            for after, until in ranges:
+                in_flight.append(self._submit(_prepare_range, after, until))
+                if len(in_flight) >= self.pool.workers * _TASKS_PER_WORKER:
+                    yield self.pool.result(in_flight.popleft())
+            while in_flight:
+                yield self.pool.result(in_flight.popleft())
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+    def note_guids(self) -> set[str]:
+        return self._call(_note_guids)
+
+    def iter_cards(self, batch_size: int | None = None) -> Iterator[list[AnkiCard]]:
+        """Yield cards in batches, in id order, see ApkgParser.iter_cards()."""
+        after_id = None
+        while cards := self._call(_read_cards, batch_size or self._parser.batch_size, after_id):
+            yield cards
+            after_id = cards[-1].id
+
+    def iter_revlog(self, batch_size: int | None = None) -> Iterator[list[tuple[int, ...]]]:
+        """Yield review log entries in batches, see ApkgParser.iter_revlog()."""
+        after_id = None
+        while rows := self._call(_read_revlog, batch_size or self._parser.batch_size, after_id):
+            yield rows
+            after_id = rows[-1][0]
+
+    @property
+    def media_files(self) -> dict[str, str]:
+        return self._parser.media_files
+
+    def open_media(self, filename: str) -> IO[bytes] | None:
+        return self._parser.open_media(filename)
+
+    def read_media(self, filename: str) -> bytes | None:
+        return self._parser.read_media(filename)
+
+    def media_size(self, filename: str) -> int | None:
+        return self._parser.media_size(filename)
+
+    def close(self) -> None:
+        self._parser.close()
+        if self._database is not None:
+            try:
+                os.unlink(self._database)
+            except FileNotFoundError:
+                # Gone with a reset pool
+                pass
+            self._database = None
+
+    def _call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if not self.isolated:
+            return fn(self._parser, *args)
+        return self.pool.result(self._submit(fn, *args))
+
+    def _submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        if self._database is None:
+            # Set first, so that close() removes a partly extracted file
+            self._database = self.pool.new_path(".anki2")
+            self.pool.result(self.pool.submit(_extract_database, self.source, self._database))
+        return self.pool.submit(_on_package, fn, self.source, self._database, *args)
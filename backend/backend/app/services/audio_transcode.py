@@ -0,0 +1,333 @@
+# backend/app/services/audio_transcode.py
+"""
+Compact re-encoding of card audio.
+
+Audio is accepted as uploaded, up to 10 MB of WAV, MP3, M4A, WebM or Ogg, and
+short recordings of a word or phrase often come as seconds of uncompressed WAV
+with silence on both ends. If ffmpeg is installed (FFMPEG_PATH), the media
+variants worker (app/services/media_variants.py) re-encodes every audio file in
+media_objects: mono Opus in WebM at AUDIO_OPUS_BITRATE (a speech bitrate),
+leading and trailing silence trimmed, loudness normalized, metadata dropped.
+The result is content-addressed like any upload and recorded as its own
+media_objects row; the original keeps a link to it (transcoded_sha256) and both
+get their duration (duration_ms). Output that isn't smaller than the original
+is not kept.
+
+Levels are then relinked: relink_transcoded_audio() rewrites the audio URL
+arrays of every level that links to a transcoded original, whichever way the
+link was made (upload, direct upload, Anki import, a later upload of the same
+content). The reference count triggers move the reference to the compact
+version, the original is left to garbage collection, and the sync triggers
+send the new URLs to clients.
+
+Without ffmpeg (or with AUDIO_TRANSCODE_ENABLED off) audio is served as
+uploaded and stays queued (variants IS NULL) until ffmpeg is available.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, NamedTuple
+
+from sqlalchemy import Row, func, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.media_object import MediaObject
+from app.services.media_store import (
+    StoredMedia,
+    claim_pending_media,
+    release_media_claims,
+    upload_content,
+)
+from app.services.storage_service import FileType, StorageService, get_storage_service
+
+logger = logging.getLogger(__name__)
+
+# Audio files per batch for each ffmpeg process running at once
+_TASKS_PER_WORKER = 4
+
+# Levels relinked per statement
+_RELINK_BATCH_SIZE = 500
+
+# Leading and trailing silence: quieter than this
+_SILENCE_THRESHOLD = "-50dB"
+
+# EBU R128 loudness of spoken word
+_LOUDNORM = "loudnorm=I=-16:TP=-1.5:LRA=11"
+
+# Originals still linked from levels, with the URLs of their compact versions
+_LINKS_SQL = """
+    SELECT '/audio/' || o.object_key AS old_url, '/audio/' || c.object_key AS new_url
+    FROM media_objects o
+    JOIN media_objects c ON c.sha256 = o.transcoded_sha256
+    WHERE o.transcoded_sha256 IS NOT NULL AND o.ref_count > 0
+"""
+
+
+def _relinked_sql(column: str) -> str:
+    # Same order, linked originals replaced by their compact versions
+    return f"""
+        COALESCE((
+            SELECT array_agg(COALESCE(k.new_url, a.u) ORDER BY a.n)
+            FROM unnest(l.{column}) WITH ORDINALITY a(u, n)
+            LEFT JOIN links k ON k.old_url = a.u
+        ), l.{column})"""
+
+
+_RELINK_SQL = f"""
+    WITH links AS ({_LINKS_SQL}),
+    old AS (SELECT array_agg(old_url)::varchar[] AS urls FROM links),
+    batch AS (
+        SELECT l.id FROM card_levels l, old
+        WHERE l.question_audio_urls && old.urls OR l.answer_audio_urls && old.urls
+        LIMIT :limit
+        FOR UPDATE OF l SKIP LOCKED
+    )
+    UPDATE card_levels l SET
+        question_audio_urls = {_relinked_sql("question_audio_urls")},
+        answer_audio_urls = {_relinked_sql("answer_audio_urls")},
+        updated_at = now()
+    FROM batch
+    WHERE l.id = batch.id
+"""
+
+
+class AudioTranscodeError(Exception):
+    """ffmpeg failed, timed out or found nothing but silence."""
+
+    pass
+
+
+class TranscodedAudio(NamedTuple):
+    """Opus/WebM data and the durations of the original and the compact version."""
+
+    data: bytes
+    duration_ms: int
+    source_duration_ms: int | None
+
+
+def find_ffmpeg() -> str | None:
+    """Path of the ffmpeg executable, or None if transcoding is off or ffmpeg is missing."""
+    if not settings.AUDIO_TRANSCODE_ENABLED:
+        return None
+    return shutil.which(settings.FFMPEG_PATH)
+
+
+def _ms(match: re.Match | None) -> int | None:
+    if match is None:
+        return None
+    hours, minutes, seconds = match.groups()
+    return round((int(hours) * 3600 + int(minutes) * 60 + float(seconds)) * 1000)
+
+
+def transcode_audio(
+    data: bytes,
+    ffmpeg: str,
+    bitrate: str = "32k",
+    timeout_s: float = 60.0,
+) -> TranscodedAudio:
+    """
+    Re-encode audio as mono Opus/WebM at `bitrate`, trimmed and normalized.
+
+    The same input always gives the same bytes (bit-exact output), so the
+    compact version of content shared by many cards is stored once.
+
+    Raises:
+        AudioTranscodeError: If ffmpeg fails, times out or the audio is all silence
+    """
+    trim = f"silenceremove=start_periods=1:start_threshold={_SILENCE_THRESHOLD}"
+    with tempfile.TemporaryDirectory(prefix="mnemonic-audio-") as tmp:
+        source, output = os.path.join(tmp, "source"), os.path.join(tmp, "output.webm")
+        with open(source, "wb") as f:
+            f.write(data)
+        command = [
+            ffmpeg,
+            "-hide_banner",
+            "-nostdin",
+            "-nostats",
+            "-i",
+            source,
+            "-vn",
+            "-map_metadata",
+            "-1",
+            # Trailing silence is trimmed as leading silence of the reversed clip
+            "-af",
+            f"{trim},areverse,{trim},areverse,{_LOUDNORM}",
+            "-ac",
+            "1",
+            "-ar",
+            "48000",
+            "-c:a",
+            "libopus",
+            "-b:a",
+            bitrate,
+            "-application",
+            "voip",
+            "-fflags",
+            "+bitexact",
+            "-f",
+            "webm",
+            "-progress",
+            "pipe:1",
+            output,
+        ]
+        try:
+            result = subprocess.run(
+                command, capture_output=True, text=True, timeout=timeout_s, check=True
+            )
+        except subprocess.TimeoutExpired:
+            raise AudioTranscodeError(f"ffmpeg timed out after {timeout_s}s") from None
+        except subprocess.CalledProcessError as e:
+            reason = e.stderr.strip().splitlines()[-1:] or [f"exit status {e.returncode}"]
+            raise AudioTranscodeError(f"ffmpeg failed: {reason[0]}") from None
+        with open(output, "rb") as f:
+            encoded = f.read()
+
+    # Progress reports the length of the output written so far; the last one is final
+    times = re.findall(r"^out_time_us=(\d+)$", result.stdout, re.MULTILINE)
+    duration_ms = int(times[-1]) // 1000 if times else 0
+    if duration_ms <= 0:
+        raise AudioTranscodeError("nothing left after trimming silence")
+    source_duration_ms = _ms(re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", result.stderr))
+    return TranscodedAudio(encoded, duration_ms, source_duration_ms)
+
+
+def process_pending_audio(
+    db: Session,
+    storage: StorageService | None = None,
+    transcode: Callable[[bytes], TranscodedAudio] | None = None,
+    limit: int | None = None,
+) -> int:
+    """
+    Transcode a batch of audio files that aren't yet, and commit.
+
+    Like process_pending_images(), the batch is claimed in a short transaction,
+    ffmpeg and uploads run without row locks and the results are written in
+    another one.
+
+    Args:
+        db: Database session
+        storage: Storage service (defaults to the shared one)
+        transcode: Function making the compact version (defaults to ffmpeg with
+            the configured bitrate; nothing is processed if ffmpeg is missing)
+        limit: Audio files per batch (defaults to a few per worker)
+
+    Returns:
+        Number of audio files processed, 0 when none are waiting
+    """
+    if transcode is None:
+        ffmpeg = find_ffmpeg()
+        if ffmpeg is None:
+            return 0
+        transcode = partial(
+            transcode_audio,
+            ffmpeg=ffmpeg,
+            bitrate=settings.AUDIO_OPUS_BITRATE,
+            timeout_s=settings.AUDIO_TRANSCODE_TIMEOUT_S,
+        )
+    storage = storage or get_storage_service()
+    limit = limit or settings.MEDIA_VARIANTS_WORKERS * _TASKS_PER_WORKER
+    rows = claim_pending_media(db, FileType.AUDIO, limit)
+    if not rows:
+        return 0
+
+    try:
+        results = _transcode_all(rows, storage, transcode)
+    except Exception:
+        release_media_claims(db, [row.sha256 for row in rows])
+        raise
+    for digest, (audio, compact) in results.items():
+        if compact is not None:
+            # Already final: not queued for transcoding itself
+            db.execute(
+                insert(MediaObject)
+                .values(
+                    sha256=compact.sha256,
+                    object_key=compact.object_key,
+                    file_type=FileType.AUDIO.value,
+                    content_type=compact.content_type,
+                    size=compact.size,
+                    duration_ms=audio.duration_ms,
+                    variants=[],
+                )
+                .on_conflict_do_update(
+                    index_elements=[MediaObject.sha256], set_={"last_used_at": func.now()}
+                )
+            )
+        db.execute(
+            update(MediaObject)
+            .where(MediaObject.sha256 == digest)
+            .values(
+                duration_ms=audio.source_duration_ms if audio else None,
+                transcoded_sha256=compact.sha256 if compact else None,
+                variants=[],
+                claimed_at=None,
+            )
+        )
+    db.commit()
+    return len(rows)
+
+
+def _transcode_all(
+    rows: list[Row], storage: StorageService, transcode: Callable[[bytes], TranscodedAudio]
+) -> dict[str, tuple[TranscodedAudio | None, StoredMedia | None]]:
+    # Downloads, ffmpeg runs and uploads, without holding any row lock
+    sources = {}
+    for row in rows:
+        data = storage.download_object(row.object_key)
+        if data is None:
+            logger.warning("Audio %s not transcoded: missing in storage", row.sha256)
+        else:
+            sources[row.sha256] = data
+    # ffmpeg runs in its own processes; threads only wait for them
+    with ThreadPoolExecutor(max_workers=settings.MEDIA_VARIANTS_WORKERS) as executor:
+        futures = {
+            digest: executor.submit(_transcode, digest, transcode, data)
+            for digest, data in sources.items()
+        }
+        transcoded = {digest: future.result() for digest, future in futures.items()}
+
+    storage.ensure_bucket()
+    results = {}
+    for row in rows:
+        audio = transcoded.get(row.sha256)
+        compact = None
+        if audio is not None and len(audio.data) < row.size:
+            compact = upload_content(audio.data, "audio/webm", FileType.AUDIO, storage)
+        results[row.sha256] = (audio, compact)
+    return results
+
+
+def _transcode(
+    digest: str, transcode: Callable[[bytes], TranscodedAudio], data: bytes
+) -> TranscodedAudio | None:
+    try:
+        return transcode(data)
+    except AudioTranscodeError as e:
+        logger.warning("Audio %s not transcoded: %s", digest, e)
+        return None
+
+
+def relink_transcoded_audio(db: Session, limit: int = _RELINK_BATCH_SIZE) -> int:
+    """
+    Point a batch of levels linking to transcoded originals at the compact
+    versions, and commit.
+
+    Returns:
+        Number of levels relinked, 0 when none link to a transcoded original
+    """
+    if db.execute(text(f"SELECT EXISTS ({_LINKS_SQL})")).scalar():
+        relinked = db.execute(text(_RELINK_SQL), {"limit": limit}).rowcount
+    else:
+        relinked = 0
+    db.commit()
+    return relinked
@@ -0,0 +1,356 @@
+# backend/app/services/csv_import.py
+"""
+Bulk import of flashcards from CSV/TSV files.
+
+The file needs a header row with question and answer columns; explanation,
+level and title are optional. Every row is one level: a row without a level
+(or with level 1) starts a new card, rows with level 2, 3, ... add levels to
+it. The title is taken from the first row of a card; without one the card is
+named like in POST /cards (DeckTitle-N).
+
+Rows are read and validated as they stream in, with the rules of
+POST /cards for flashcards. A card is imported only if all its rows are
+valid; invalid rows are reported with their row number (the header is row 1).
+Valid cards are COPY-ed into temporary staging tables CSV_IMPORT_BATCH_ROWS
+levels at a time; title conflicts (with the deck or earlier rows of the file)
+are then resolved in the database, and cards, levels and, for decks that add
+new cards to study, progress are written with one INSERT ... SELECT each.
+Nothing is committed here.
+"""
+
+from __future__ import annotations
+
+import csv
+import itertools
+from dataclasses import dataclass, field
+from typing import Iterator, TextIO
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.uuid7 import uuid7, uuid7_sql
+from app.db.bulk_copy import copy_rows
+from app.models.card import Card
+from app.models.deck import Deck
+from app.models.user_learning_settings import UserLearningSettings
+
+# Levels per COPY into staging
+CSV_IMPORT_BATCH_ROWS = 5000
+
+# Row errors listed in the report; the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+
+REQUIRED_COLUMNS = ("question", "answer")
+OPTIONAL_COLUMNS = ("explanation", "level", "title")
+
+_STAGING_CARD_COLUMNS = ("id", "source_row", "title", "max_level")
+_STAGING_LEVEL_COLUMNS = ("id", "card_id", "level_index", "content")
+
+# Created and dropped within the caller's transaction
+_CREATE_STAGING_SQL = """
+    CREATE TEMP TABLE csv_import_cards (
+        id uuid, source_row int, title text, max_level int
+    );
+    CREATE TEMP TABLE csv_import_levels (
+        id uuid, card_id uuid, level_index int, content jsonb
+    );
+"""
+
+# Cards whose title is taken, by a card of the deck or by an earlier row of the
+# file (first_row), leave staging and are reported
+_DELETE_TITLE_CONFLICTS_SQL = """
+    WITH deleted AS (
+        DELETE FROM csv_import_cards s
+        USING (
+            SELECT DISTINCT ON (id) id, first_row FROM (
+                SELECT s.id, CAST(NULL AS int) AS first_row
+                FROM csv_import_cards s
+                JOIN cards c ON c.deck_id = CAST(:deck_id AS uuid) AND c.title = s.title
+                UNION ALL
+                SELECT id, first_row FROM (
+                    SELECT id, source_row, min(source_row) OVER (PARTITION BY title) AS first_row
+                    FROM csv_import_cards
+                    WHERE title IS NOT NULL
+                ) t
+                WHERE source_row > first_row
+            ) c
+            ORDER BY id, first_row NULLS FIRST
+        ) conflict
+        WHERE s.id = conflict.id
+        RETURNING s.id, s.source_row, s.title, conflict.first_row
+    ), deleted_levels AS (
+        DELETE FROM csv_import_levels l USING deleted d WHERE l.card_id = d.id
+    )
+    SELECT source_row, title, first_row FROM deleted ORDER BY source_row
+"""
+
+# Cards without a title are numbered after the cards already in the deck, in
+# file order, like consecutive POST /cards calls would
+_INSERT_CARDS_SQL = """
+    INSERT INTO cards (id, deck_id, type, title, max_level, settings)
+    SELECT
+        id,
+        CAST(:deck_id AS uuid),
+        'flashcard',
+        COALESCE(
+            title, :title_prefix || '-' || (:card_count + row_number() OVER (ORDER BY source_row))
+        ),
+        max_level,
+        NULL
+    FROM csv_import_cards
+    ORDER BY source_row
+"""
+
+_INSERT_LEVELS_SQL = """
+    INSERT INTO card_levels (id, card_id, level_index, content)
+    SELECT id, card_id, level_index, content FROM csv_import_levels
+"""
+
+# Level 0 of every new card goes to study, as POST /cards does for these decks
+_INSERT_PROGRESS_SQL = f"""
+    INSERT INTO card_progress (
+        id, user_id, card_id, card_level_id, is_active, stability, difficulty,
+        next_review, last_reviewed, created_at, updated_at
+    )
+    SELECT
+        {uuid7_sql("floor(extract(epoch FROM now()) * 1000)")},
+        CAST(:user_id AS uuid),
+        card_id,
+        id,
+        true,
+        :stability,
+        :difficulty,
+        now(),
+        NULL,
+        now(),
+        now()
+    FROM csv_import_levels
+    WHERE level_index = 0
+    ON CONFLICT DO NOTHING
+"""
+
+
+class CsvImportError(ValueError):
+    """The file as a whole can't be imported (no header, missing columns, bad encoding)."""
+
+
+@dataclass
+class RowError:
+    row: int
+    error: str
+
+
+@dataclass
+class CsvImportResult:
+    # Data rows read
+    rows: int = 0
+    cards_created: int = 0
+    levels_created: int = 0
+    # Cards not imported because of an invalid row or a taken title
+    cards_failed: int = 0
+    errors_total: int = 0
+    # The first MAX_REPORTED_ERRORS row errors, by row
+    errors: list[RowError] = field(default_factory=list)
+
+    def add_error(self, row: int, error: str) -> None:
+        self.errors_total += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(RowError(row, error))
+
+
+@dataclass
+class _PendingCard:
+    row: int
+    title: str | None
+    levels: list[dict] = field(default_factory=list)
+    failed: bool = False
+
+
+def detect_delimiter(filename: str, header: str) -> str:
+    """Tab for .tsv/.tab files, otherwise the separator the header row uses."""
+    if filename.lower().endswith((".tsv", ".tab")):
+        return "\t"
+    try:
+        return csv.Sniffer().sniff(header, delimiters=",;\t").delimiter
+    except csv.Error:
+        return ","
+
+
+def import_csv(
+    db: Session,
+    deck: Deck,
+    stream: TextIO,
+    filename: str,
+    study_settings: UserLearningSettings | None = None,
+) -> CsvImportResult:
+    """
+    Import the cards of a CSV/TSV file into `deck`. Not committed.
+
+    Args:
+        db: Session; the import runs in its current transaction
+        deck: Target deck
+        stream: The file as text
+        filename: Name of the uploaded file, for the delimiter
+        study_settings: Learning settings of the deck owner; when given, new
+            cards are added to study with their initial stability and difficulty
+
+    Raises:
+        CsvImportError: If the file can't be read as a card table
+    """
+    result = CsvImportResult()
+    connection = db.connection()
+    connection.exec_driver_sql(_CREATE_STAGING_SQL)
+
+    card_rows: list[tuple] = []
+    level_rows: list[tuple] = []
+    for card in _read_cards(stream, filename, result):
+        if card.failed:
+            result.cards_failed += 1
+            continue
+        card_id = uuid7()
+        card_rows.append((card_id, card.row, card.title, len(card.levels) - 1))
+        level_rows += [
+            (uuid7(), card_id, level_index, content)
+            for level_index, content in enumerate(card.levels)
+        ]
+        if len(level_rows) >= CSV_IMPORT_BATCH_ROWS:
+            copy_rows(connection, "csv_import_cards", _STAGING_CARD_COLUMNS, card_rows)
+            copy_rows(connection, "csv_import_levels", _STAGING_LEVEL_COLUMNS, level_rows)
+            card_rows, level_rows = [], []
+    copy_rows(connection, "csv_import_cards", _STAGING_CARD_COLUMNS, card_rows)
+    copy_rows(connection, "csv_import_levels", _STAGING_LEVEL_COLUMNS, level_rows)
+
+    connection.exec_driver_sql("ANALYZE csv_import_cards, csv_import_levels")
+    params = {"deck_id": str(deck.id)}
+    for row, title, first_row in connection.execute(text(_DELETE_TITLE_CONFLICTS_SQL), params):
+        result.cards_failed += 1
+        if first_row is None:
+            result.add_error(row, f"Card with title '{title}' already exists in this deck")
+        else:
+            result.add_error(row, f"Card with title '{title}' is already in row {first_row}")
+    result.errors.sort(key=lambda e: e.row)
+    del result.errors[MAX_REPORTED_ERRORS:]
+
+    card_count = db.query(Card).filter(Card.deck_id == deck.id).count()
+    result.cards_created = connection.execute(
+        text(_INSERT_CARDS_SQL),
+        {**params, "title_prefix": deck.title.replace(" ", "_"), "card_count": card_count},
+    ).rowcount
+    result.levels_created = connection.execute(text(_INSERT_LEVELS_SQL)).rowcount
+    if study_settings is not None:
+        connection.execute(
+            text(_INSERT_PROGRESS_SQL),
+            {
+                "user_id": str(deck.owner_id),
+                "stability": study_settings.initial_stability,
+                "difficulty": study_settings.initial_difficulty,
+            },
+        )
+
+    connection.exec_driver_sql("DROP TABLE csv_import_cards, csv_import_levels")
+    return result
+
+
+def _read_cards(stream: TextIO, filename: str, result: CsvImportResult) -> Iterator[_PendingCard]:
+    """Cards of the file with their validated levels; cards with an invalid row are failed."""
+    try:
+        reader, columns = _read_header(stream, filename)
+        yield from _group_rows(reader, columns, result)
+    except UnicodeDecodeError:
+        raise CsvImportError("The file is not valid UTF-8")
+    except csv.Error as e:
+        raise CsvImportError(f"Invalid CSV: {e}")
+
+
+def _group_rows(
+    reader: Iterator[list[str]], columns: dict[str, int], result: CsvImportResult
+) -> Iterator[_PendingCard]:
+    """Rows grouped into cards: a row without a level (or level 1) starts the next card."""
+    card: _PendingCard | None = None
+    for row_number, values in enumerate(reader, start=2):
+        if not any(value.strip() for value in values):
+            continue
+        result.rows += 1
+        fields = _row_fields(values, columns)
+
+        level = fields.get("level", "")
+        if level in ("", "1"):
+            if card is not None:
+                yield card
+            card = _PendingCard(row_number, fields.get("title") or None)
+        else:
+            error = _level_order_error(level, card)
+            if error:
+                result.add_error(row_number, error)
+                if card is not None:
+                    card.failed = True
+                continue
+        _add_level(card, fields, row_number, result)
+    if card is not None:
+        yield card
+
+
+def _read_header(stream: TextIO, filename: str) -> tuple[Iterator[list[str]], dict[str, int]]:
+    """A reader positioned after the header row, and the index of each known column."""
+    header_line = stream.readline()
+    if not header_line.strip():
+        raise CsvImportError("The file is empty")
+    reader = csv.reader(
+        itertools.chain([header_line], stream),
+        delimiter=detect_delimiter(filename, header_line),
+    )
+    header = [name.strip().lower() for name in next(reader)]
+    missing = [name for name in REQUIRED_COLUMNS if name not in header]
+    if missing:
+        raise CsvImportError(f"Missing columns: {', '.join(missing)}")
+    columns = {
+        name: header.index(name) for name in REQUIRED_COLUMNS + OPTIONAL_COLUMNS if name in header
+    }
+    return reader, columns
+
+
+def _row_fields(values: list[str], columns: dict[str, int]) -> dict[str, str]:
+    # Short rows leave the missing columns empty
+    return {
+        name: values[index].strip() if index < len(values) else ""
+        for name, index in columns.items()
+    }
+
+
+def _level_order_error(level: str, card: _PendingCard | None) -> str | None:
+    """Why a row with level 2, 3, ... can't continue `card`, None if it can."""
+    if not level.isdigit() or int(level) < 1:
+        return f"Invalid level '{level}': must be a number from 1"
+    if card is None or int(level) != len(card.levels) + 1:
+        expected = "1" if card is None else str(len(card.levels) + 1)
+        return f"Level {level} out of order: expected level {expected}"
+    return None
+
+
+def _add_level(
+    card: _PendingCard, fields: dict[str, str], row_number: int, result: CsvImportResult
+) -> None:
+    """Append the row's level to `card`; an invalid one fails the card and is reported."""
+    error = _validate_level(fields)
+    if error:
+        result.add_error(row_number, error)
+        card.failed = True
+        # Keeps the numbering of the following levels
+        card.levels.append({})
+        return
+    card.levels.append(
+        {
+            "question": fields["question"],
+            "answer": fields["answer"],
+            "explanation": fields.get("explanation") or None,
+        }
+    )
+
+
+def _validate_level(fields: dict[str, str]) -> str | None:
+    # The rules POST /cards applies to flashcard levels
+    if not fields["question"]:
+        return "question is required"
+    if not fields["answer"]:
+        return "answer is required"
+    return None
@@ -0,0 +1,409 @@
+# backend/app/services/deck_export.py
+"""
+Export of a deck to JSON, CSV or an Anki package, streamed.
+
+The cards and levels of the deck are read through a server-side cursor
+(yield_per), EXPORT_BATCH_ROWS at a time, and written out as they come, so an
+export holds one batch in memory whatever the size of the deck:
+
+- json: the DeckWithCards shape (deck and cards with their levels), one chunk
+  per batch
+- csv: one row per level, one chunk per batch
+- apkg: the notes are written to an Anki collection (SQLite) on disk, which is
+  zipped on disk and streamed from there; the files are removed once sent
+
+Every exporter opens its own session: the body is produced after the route
+returned, when the request's session is no longer there to use.
+"""
+
+from __future__ import annotations
+
+import csv
+import hashlib
+import html
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import zipfile
+from typing import Any, Callable, Iterator, Sequence
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.card import Card
+from app.models.card_level import CardLevel
+from app.models.deck import Deck
+
+EXPORT_FORMATS = ("json", "csv", "apkg")
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "csv": "text/csv; charset=utf-8",
+    "apkg": "application/zip",
+}
+
+# Size of the chunks an .apkg file is streamed in
+_FILE_CHUNK_SIZE = 64 * 1024
+
+CSV_COLUMNS = (
+    "card_id",
+    "title",
+    "type",
+    "level_index",
+    "question",
+    "answer",
+    "explanation",
+    "options",
+    "question_image_urls",
+    "answer_image_urls",
+    "question_audio_urls",
+    "answer_audio_urls",
+)
+
+_URL_COLUMNS = CSV_COLUMNS[-4:]
+
+# Note type of exported notes: the Basic model plus the explanation on the back
+_MODEL_ID = 1_700_000_000_000
+_ANKI_DECK_ID = 1_700_000_000_001
+_MODEL_FIELDS = ("Front", "Back", "Explanation")
+_ANSWER_TEMPLATE = (
+    "{{FrontSide}}<hr id=answer>{{Back}}" "{{#Explanation}}<br><br>{{Explanation}}{{/Explanation}}"
+)
+
+_ANKI_SCHEMA = """
+CREATE TABLE col (
+    id integer primary key, crt integer not null, mod integer not null,
+    scm integer not null, ver integer not null, dty integer not null,
+    usn integer not null, ls integer not null, conf text not null,
+    models text not null, decks text not null, dconf text not null, tags text not null
+);
+CREATE TABLE notes (
+    id integer primary key, guid text not null, mid integer not null,
+    mod integer not null, usn integer not null, tags text not null,
+    flds text not null, sfld integer not null, csum integer not null,
+    flags integer not null, data text not null
+);
+CREATE TABLE cards (
+    id integer primary key, nid integer not null, did integer not null,
+    ord integer not null, mod integer not null, usn integer not null,
+    type integer not null, queue integer not null, due integer not null,
+    ivl integer not null, factor integer not null, reps integer not null,
+    lapses integer not null, left integer not null, odue integer not null,
+    odid integer not null, flags integer not null, data text not null
+);
+CREATE TABLE revlog (
+    id integer primary key, cid integer not null, usn integer not null,
+    ease integer not null, ivl integer not null, lastIvl integer not null,
+    factor integer not null, time integer not null, type integer not null
+);
+CREATE TABLE graves (usn integer not null, oid integer not null, type integer not null);
+CREATE INDEX ix_notes_usn on notes (usn);
+CREATE INDEX ix_cards_usn on cards (usn);
+CREATE INDEX ix_revlog_usn on revlog (usn);
+CREATE INDEX ix_cards_nid on cards (nid);
+CREATE INDEX ix_cards_sched on cards (did, queue, due);
+CREATE INDEX ix_revlog_cid on revlog (cid);
+CREATE INDEX ix_notes_csum on notes (csum);
+"""
+
+
+def export_filename(title: str, export_format: str) -> str:
+    """File name of an export: the deck title without characters unsafe in file names."""
+    name = "".join(c for c in title if c.isalnum() or c in " -_.").strip(" .")
+    return f"{name or 'deck'}.{export_format}"
+
+
+def export_deck(deck_id: UUID, export_format: str) -> Iterator[bytes]:
+    """The body of an export of the deck in one of EXPORT_FORMATS."""
+    exporters: dict[str, Callable[[Session, UUID], Iterator[bytes]]] = {
+        "json": _json_chunks,
+        "csv": _csv_chunks,
+        "apkg": _apkg_chunks,
+    }
+    exporter = exporters[export_format]
+    db = SessionLocal()
+    try:
+        yield from exporter(db, deck_id)
+    finally:
+        db.close()
+
+
+def _level_batches(db: Session, deck_id: UUID) -> Iterator[Sequence[Row]]:
+    """
+    Levels of the deck in card order, EXPORT_BATCH_ROWS at a time.
+
+    Cards without levels come as a single row whose level columns are None.
+    """
+    stmt = (
+        select(
+            Card.id,
+            Card.title,
+            Card.type,
+            Card.source_guid,
+            CardLevel.level_index,
+            CardLevel.content,
+            CardLevel.question_image_urls,
+            CardLevel.answer_image_urls,
+            CardLevel.question_audio_urls,
+            CardLevel.answer_audio_urls,
+        )
+        .outerjoin(CardLevel, CardLevel.card_id == Card.id)
+        .where(Card.deck_id == deck_id)
+        .order_by(Card.created_at.asc(), Card.id.asc(), CardLevel.level_index.asc())
+        .execution_options(yield_per=settings.EXPORT_BATCH_ROWS)
+    )
+    yield from db.execute(stmt).partitions()
+
+
+def _level_json(row: Row) -> dict[str, Any]:
+    return {
+        "level_index": row.level_index,
+        "content": row.content,
+        "question_image_urls": row.question_image_urls,
+        "answer_image_urls": row.answer_image_urls,
+        "question_audio_urls": row.question_audio_urls,
+        "answer_audio_urls": row.answer_audio_urls,
+    }
+
+
+def _json_chunks(db: Session, deck_id: UUID) -> Iterator[bytes]:
+    deck = db.get(Deck, deck_id)
+    header = {
+        "deck_id": str(deck.id),
+        "title": deck.title,
+        "description": deck.description,
+        "color": deck.color or "#4A6FA5",
+        "owner_id": str(deck.owner_id),
+        "is_public": deck.is_public,
+        "show_card_title": deck.show_card_title,
+    }
+    yield f'{{"deck": {json.dumps(header, ensure_ascii=False)}, "cards": ['.encode()
+
+    # The levels of a card may be split between batches: a card is written
+    # once the first row of the next one is seen
+    card: dict[str, Any] | None = None
+    separator = ""
+    for rows in _level_batches(db, deck_id):
+        parts = []
+        for row in rows:
+            if card is None or card["card_id"] != str(row.id):
+                if card is not None:
+                    parts.append(separator + json.dumps(card, ensure_ascii=False))
+                    separator = ", "
+                card = {"card_id": str(row.id), "title": row.title, "type": row.type, "levels": []}
+            if row.level_index is not None:
+                card["levels"].append(_level_json(row))
+        if parts:
+            yield "".join(parts).encode()
+
+    tail = "" if card is None else separator + json.dumps(card, ensure_ascii=False)
+    yield f"{tail}]}}".encode()
+
+
+def _qa(card_type: str, content: dict[str, Any]) -> tuple[str, str]:
+    """Question and answer text of a level; for multiple choice the correct option."""
+    question = content.get("question") or ""
+    if card_type == "multiple_choice":
+        correct = content.get("correctOptionId")
+        answer = next(
+            (o.get("text") or "" for o in content.get("options") or [] if o.get("id") == correct),
+            "",
+        )
+        return question, answer
+    return question, content.get("answer") or ""
+
+
+def _csv_chunks(db: Session, deck_id: UUID) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # A BOM, so spreadsheets open the file as UTF-8
+    buffer.write("\ufeff")
+    writer.writerow(CSV_COLUMNS)
+
+    for rows in _level_batches(db, deck_id):
+        for row in rows:
+            if row.level_index is None:
+                continue
+            content = row.content or {}
+            question, answer = _qa(row.type, content)
+            options = content.get("options")
+            writer.writerow(
+                (
+                    row.id,
+                    row.title,
+                    row.type,
+                    row.level_index,
+                    question,
+                    answer,
+                    content.get("explanation") or "",
+                    json.dumps(options, ensure_ascii=False) if options else "",
+                    *(" ".join(getattr(row, column) or []) for column in _URL_COLUMNS),
+                )
+            )
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _field_html(text: str) -> str:
+    return html.escape(text, quote=False).replace("\n", "<br>")
+
+
+def _checksum(text: str) -> int:
+    """Anki's checksum of the sort field: first 8 hex digits of its SHA-1."""
+    return int(hashlib.sha1(text.encode()).hexdigest()[:8], 16)
+
+
+def _collection_json(deck_title: str, now: int) -> tuple[str, str, str, str]:
+    """models, decks, dconf and conf of the exported collection."""
+    model = {
+        "id": _MODEL_ID,
+        "name": "MnemonicFlow",
+        "type": 0,
+        "mod": now,
+        "usn": -1,
+        "sortf": 0,
+        "did": _ANKI_DECK_ID,
+        "tags": [],
+        "vers": [],
+        "flds": [
+            {"name": name, "ord": i, "sticky": False, "rtl": False, "font": "Arial", "size": 20}
+            for i, name in enumerate(_MODEL_FIELDS)
+        ],
+        "tmpls": [
+            {
+                "name": "Card 1",
+                "ord": 0,
+                "qfmt": "{{Front}}",
+                "afmt": _ANSWER_TEMPLATE,
+                "did": None,
+                "bqfmt": "",
+                "bafmt": "",
+            }
+        ],
+        "css": ".card { font-family: arial; font-size: 20px; text-align: center; }",
+        "latexPre": "",
+        "latexPost": "",
+        "req": [[0, "any", [0]]],
+    }
+    deck_defaults = {
+        "mod": now,
+        "usn": -1,
+        "collapsed": False,
+        "desc": "",
+        "dyn": 0,
+        "conf": 1,
+        "extendNew": 0,
+        "extendRev": 0,
+        "newToday": [0, 0],
+        "revToday": [0, 0],
+        "lrnToday": [0, 0],
+        "timeToday": [0, 0],
+    }
+    # The exported deck first: importers that take one deck name take the first
+    decks = {
+        str(_ANKI_DECK_ID): {**deck_defaults, "id": _ANKI_DECK_ID, "name": deck_title},
+        "1": {**deck_defaults, "id": 1, "name": "Default"},
+    }
+    dconf = {"1": {"id": 1, "name": "Default", "mod": 0, "usn": 0}}
+    conf = {"curDeck": _ANKI_DECK_ID, "curModel": str(_MODEL_ID), "nextPos": 1}
+    return (
+        json.dumps({str(_MODEL_ID): model}),
+        json.dumps(decks),
+        json.dumps(dconf),
+        json.dumps(conf),
+    )
+
+
+def _note_guid(card_id: UUID, source_guid: str | None, level_index: int) -> str:
+    # The first level keeps the guid of an imported note, so re-imports into
+    # the deck the export came from match it
+    if level_index == 0:
+        return source_guid or f"mf-{card_id}"
+    return f"mf-{card_id}-{level_index}"
+
+
+def _write_collection(db: Session, deck_id: UUID, path: str) -> None:
+    """Write the levels of the deck as notes of a new Anki collection at path."""
+    deck = db.get(Deck, deck_id)
+    now = int(time.time())
+    # Note and card ids are creation times in milliseconds; counting up from
+    # now keeps them unique and in deck order
+    next_id = now * 1000
+
+    collection = sqlite3.connect(path)
+    try:
+        collection.executescript(_ANKI_SCHEMA)
+        models, decks, dconf, conf = _collection_json(deck.title, now)
+        collection.execute(
+            "INSERT INTO col VALUES (1, ?, ?, ?, 11, 0, 0, 0, ?, ?, ?, ?, '{}')",
+            (now, now * 1000, now * 1000, conf, models, decks, dconf),
+        )
+        due = 0
+        for rows in _level_batches(db, deck_id):
+            notes, cards = [], []
+            for row in rows:
+                if row.level_index is None:
+                    continue
+                question, answer = _qa(row.type, row.content or {})
+                explanation = (row.content or {}).get("explanation") or ""
+                fields = [_field_html(question), _field_html(answer), _field_html(explanation)]
+                note_id, card_id = next_id, next_id + 1
+                next_id += 2
+                due += 1
+                notes.append(
+                    (
+                        note_id,
+                        _note_guid(row.id, row.source_guid, row.level_index),
+                        _MODEL_ID,
+                        now,
+                        "\x1f".join(fields),
+                        question,
+                        _checksum(question),
+                    )
+                )
+                # New cards, shown in deck order
+                cards.append((card_id, note_id, _ANKI_DECK_ID, now, due))
+            collection.executemany(
+                "INSERT INTO notes VALUES (?, ?, ?, ?, -1, '', ?, ?, ?, 0, '')", notes
+            )
+            collection.executemany(
+                "INSERT INTO cards VALUES (?, ?, ?, 0, ?, -1, 0, 0, ?, 0, 0, 0, 0, 0, 0, 0, 0, '')",
+                cards,
+            )
+            collection.commit()
+    finally:
+        collection.close()
+
+
+def _apkg_chunks(db: Session, deck_id: UUID) -> Iterator[bytes]:
+    workdir = tempfile.mkdtemp(prefix="export-")
+    try:
+        collection = os.path.join(workdir, "collection.anki2")
+        _write_collection(db, deck_id, collection)
+        # Done with the database before the (possibly slow) download starts
+        db.close()
+
+        package = os.path.join(workdir, "deck.apkg")
+        with zipfile.ZipFile(package, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.write(collection, "collection.anki2")
+            # Media files are not exported, the levels only link to them
+            archive.writestr("media", "{}")
+        os.unlink(collection)
+
+        with open(package, "rb") as f:
+            while chunk := f.read(_FILE_CHUNK_SIZE):
+                yield chunk
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,482 @@
+# backend/app/services/import_jobs.py
+"""
+Background processing of deck imports.
+
+POST /decks/import-anki spools the upload to IMPORT_UPLOAD_DIR and inserts an
+import_jobs row. Workers claim queued jobs with SELECT ... FOR UPDATE SKIP LOCKED,
+so API processes and standalone workers can share one queue.
+
+Resumability:
+- the deck is created in the first transaction and recorded on the job
+- every COPY-ed batch of notes is committed together with the job checkpoint
+  (notes_processed, last_note_id, heartbeat), so a dead worker loses at most one batch
+- a running job whose heartbeat is older than IMPORT_JOB_LEASE_SECONDS is claimed
+  again and continues after last_note_id
+- checkpoints are conditional on worker_id: a worker that lost its lease rolls back
+  instead of writing over the new owner's progress
+- the review log, scheduling state and the link of the deck to the user's study
+  group are written after the last batch, in the transaction that finishes the job
+
+The package is parsed in the sandbox process pool (app/services/anki_sandbox.py);
+a package that exceeds its memory, CPU or time limits fails the job for good.
+
+Update mode (deck_id given at submit): notes are diffed against the deck's cards by
+Anki guid, only new and changed notes are written and cards of removed notes are
+deleted in the finalizing phase. Batches are idempotent against the current deck
+state, so resuming needs nothing beyond last_note_id. A failed update keeps the
+batches it already committed; the deck itself is never dropped.
+
+Standalone worker:
+    python -m app.services.import_jobs
+"""
+
+import logging
+import os
+import signal
+import socket
+import tempfile
+import threading
+import uuid
+from datetime import timedelta
+from pathlib import Path
+from typing import Callable, Iterable
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db import init_db  # noqa: F401 - registers all models for the standalone worker
+from app.db.session import SessionLocal
+from app.models.card import Card
+from app.models.deck import Deck
+from app.models.import_job import ImportJob
+from app.services.anki_mapper import IMPORT_BATCH_NOTES, AnkiMapper
+from app.services.anki_media import AnkiMediaUploader
+from app.services.anki_parser import ApkgParseError
+from app.services.anki_sandbox import SandboxedApkg, sandbox_pool
+
+logger = logging.getLogger(__name__)
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+MODE_CREATE = "create"
+MODE_UPDATE = "update"
+
+
+class LeaseLost(Exception):
+    """The job was claimed by another worker while this one was processing it."""
+
+    pass
+
+
+def upload_dir() -> Path:
+    """Directory for spooled uploads, shared by the API and the workers."""
+    path = Path(
+        settings.IMPORT_UPLOAD_DIR or os.path.join(tempfile.gettempdir(), "mnemonic-imports")
+    )
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def submit_anki_import(
+    db: Session,
+    user_id: uuid.UUID,
+    source_path: str | os.PathLike[str],
+    filename: str,
+    deck_id: uuid.UUID | None = None,
+) -> ImportJob:
+    """
+    Queue an import of a spooled .apkg. The job takes ownership of the file.
+
+    With deck_id the package updates that deck instead of creating a new one;
+    access to the deck must be checked by the caller.
+    """
+    job = ImportJob(
+        user_id=user_id,
+        kind="anki",
+        mode=MODE_UPDATE if deck_id else MODE_CREATE,
+        source_path=str(source_path),
+        filename=filename,
+        deck_id=deck_id,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    import_worker.wake()
+    return job
+
+
+def claim_next_job(
+    db: Session,
+    worker_id: str,
+    lease_seconds: int | None = None,
+    max_attempts: int | None = None,
+) -> ImportJob | None:
+    """
+    Claim the oldest queued job, or a running one whose worker stopped heartbeating.
+
+    Jobs that already used up max_attempts are failed instead of being claimed.
+    """
+    lease = timedelta(seconds=lease_seconds or settings.IMPORT_JOB_LEASE_SECONDS)
+    max_attempts = max_attempts or settings.IMPORT_JOB_MAX_ATTEMPTS
+
+    while True:
+        job = db.execute(
+            select(ImportJob)
+            .where(
+                or_(
+                    ImportJob.status == STATUS_QUEUED,
+                    and_(
+                        ImportJob.status == STATUS_RUNNING,
+                        ImportJob.heartbeat_at < func.now() - lease,
+                    ),
+                )
+            )
+            .order_by(ImportJob.created_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        ).scalar_one_or_none()
+
+        if job is None:
+            db.commit()
+            return None
+
+        if job.attempts >= max_attempts:
+            logger.error("Import job %s abandoned after %d attempts", job.id, job.attempts)
+            _finish_failed(db, job, f"Import abandoned after {job.attempts} attempts")
+            continue
+
+        job.status = STATUS_RUNNING
+        job.worker_id = worker_id
+        job.attempts += 1
+        job.heartbeat_at = func.now()
+        db.commit()
+        db.refresh(job)
+        return job
+
+
+def run_import_job(
+    db: Session,
+    job: ImportJob,
+    worker_id: str,
+    *,
+    batch_size: int = IMPORT_BATCH_NOTES,
+    should_stop: Callable[[], bool] = lambda: False,
+    max_attempts: int | None = None,
+) -> str:
+    """
+    Process a claimed job, resuming from its checkpoint.
+
+    If should_stop() turns true between batches the job is released back to the
+    queue. Returns the job status the worker left behind.
+    """
+    max_attempts = max_attempts or settings.IMPORT_JOB_MAX_ATTEMPTS
+    job_id, attempts, source_path = job.id, job.attempts, job.source_path
+
+    try:
+        with (
+            SandboxedApkg(source_path) as package,
+            AnkiMediaUploader(package) as media,
+        ):
+            mapper = AnkiMapper(db, job.user_id, media=media)
+            _checkpoint(db, job_id, worker_id, phase="parsing")
+            db.commit()
+            anki_deck = package.parse()
+
+            resumed = _resume(db, job, mapper, anki_deck)
+            if resumed is None:
+                _finish_failed(db, job, "The deck to update no longer exists")
+                return STATUS_FAILED
+            deck, existing, last_note_id, counters = resumed
+            if last_note_id is not None:
+                logger.info("Resuming import job %s after note %s", job_id, last_note_id)
+            _checkpoint(
+                db,
+                job_id,
+                worker_id,
+                phase="importing",
+                deck_id=deck.id,
+                notes_total=anki_deck.note_count,
+                last_note_id=last_note_id,
+                **counters,
+            )
+            db.commit()
+
+            batches = mapper.import_notes(
+                package, deck, after_note_id=last_note_id, batch_size=batch_size, existing=existing
+            )
+            if not _import_batches(db, job_id, worker_id, batches, counters, should_stop):
+                return STATUS_QUEUED
+            # In a short transaction of its own: finalizing can take long
+            mapper.prepare_review_history(anki_deck)
+            _finalize(db, job, worker_id, mapper, package, deck, existing, counters, media)
+
+    except LeaseLost:
+        db.rollback()
+        logger.warning("Import job %s was taken over by another worker", job_id)
+        return STATUS_RUNNING
+    except ApkgParseError as e:
+        db.rollback()
+        logger.error("Import job %s: failed to parse .apkg file: %s", job_id, e)
+        return _fail_owned(db, job_id, worker_id, f"Invalid .apkg file: {e}")
+    except Exception as e:
+        db.rollback()
+        logger.error("Import job %s failed: %s", job_id, e, exc_info=True)
+        if attempts < max_attempts:
+            # Retry from the last checkpoint
+            return _fail_owned(db, job_id, worker_id, str(e), retry=True)
+        return _fail_owned(db, job_id, worker_id, f"Import failed: {e}")
+
+    _remove_source(job_id, source_path)
+    logger.info(
+        "Import job %s into deck %s: %d cards created, %d updated",
+        job_id,
+        deck.id,
+        counters["cards_created"],
+        counters["cards_updated"],
+    )
+    return STATUS_DONE
+
+
+def _resume(
+    db: Session, job: ImportJob, mapper: AnkiMapper, anki_deck
+) -> tuple[Deck, dict, int | None, dict[str, int]] | None:
+    """
+    Deck, existing cards, last imported note and counters to continue the job from.
+
+    None if the deck an update job should write to is gone.
+    """
+    counters = {
+        "notes_processed": job.notes_processed,
+        "cards_created": job.cards_created,
+        "cards_updated": job.cards_updated,
+        "notes_skipped": job.notes_skipped,
+    }
+    deck = db.get(Deck, job.deck_id) if job.deck_id else None
+    if job.mode == MODE_UPDATE:
+        if deck is None:
+            return None
+        return deck, mapper.load_existing(deck.id), job.last_note_id, counters
+    if deck is None:
+        # First attempt, or the partial deck is gone: start from the first note
+        return mapper.start_deck(anki_deck), {}, None, dict.fromkeys(counters, 0)
+    # The batch in flight was rolled back; the committed ones are matched by guid
+    return deck, mapper.load_existing(deck.id), job.last_note_id, counters
+
+
+def _import_batches(
+    db: Session,
+    job_id: uuid.UUID,
+    worker_id: str,
+    batches: Iterable,
+    counters: dict[str, int],
+    should_stop: Callable[[], bool],
+) -> bool:
+    """Checkpoint each committed batch. Returns False if the job was released midway."""
+    for batch in batches:
+        counters["notes_processed"] += batch.notes
+        counters["cards_created"] += batch.created
+        counters["cards_updated"] += batch.updated
+        counters["notes_skipped"] += batch.skipped
+        _checkpoint(db, job_id, worker_id, last_note_id=batch.last_note_id, **counters)
+        db.commit()
+
+        if should_stop():
+            _checkpoint(db, job_id, worker_id, status=STATUS_QUEUED, worker_id=None)
+            db.commit()
+            logger.info("Import job %s released after note %s", job_id, batch.last_note_id)
+            return False
+    return True
+
+
+def _finalize(
+    db: Session,
+    job: ImportJob,
+    worker_id: str,
+    mapper: AnkiMapper,
+    package: SandboxedApkg,
+    deck: Deck,
+    existing: dict,
+    counters: dict[str, int],
+    media: AnkiMediaUploader,
+) -> None:
+    """Removed cards, review log, scheduling and the group link, in the job's last transaction."""
+    # Everything from here on is one transaction, redone as a whole on resume
+    _checkpoint(db, job.id, worker_id, phase="finalizing")
+    if job.mode == MODE_UPDATE:
+        cards_deleted = mapper.remove_missing(package, existing)
+        _checkpoint(db, job.id, worker_id, cards_deleted=cards_deleted)
+    reviews_imported, _ = mapper.import_scheduling(package, deck)
+    _checkpoint(db, job.id, worker_id, reviews_imported=reviews_imported)
+    if job.mode == MODE_CREATE:
+        mapper.link_deck(deck)
+
+    warnings = []
+    if counters["notes_skipped"]:
+        warnings.append(f"{counters['notes_skipped']} notes without a question were skipped")
+    warnings.extend(media.warnings())
+    _checkpoint(
+        db,
+        job.id,
+        worker_id,
+        status=STATUS_DONE,
+        phase="done",
+        warnings=warnings,
+        finished_at=func.now(),
+    )
+    db.commit()
+
+
+def _fail_owned(
+    db: Session, job_id: uuid.UUID, worker_id: str, error: str, *, retry: bool = False
+) -> str:
+    """
+    Fail the job, or queue it again with retry, if this worker still holds its lease.
+
+    The job row is locked, so a worker claiming it meanwhile waits; a job already
+    taken over is left to its new owner.
+    """
+    job = db.get(ImportJob, job_id, with_for_update=True, populate_existing=True)
+    if job is None or job.worker_id != worker_id or job.status != STATUS_RUNNING:
+        db.rollback()
+        logger.warning("Import job %s was taken over by another worker", job_id)
+        return STATUS_RUNNING
+    if retry:
+        job.status = STATUS_QUEUED
+        job.worker_id = None
+        job.error = error
+        db.commit()
+        return STATUS_QUEUED
+    _finish_failed(db, job, error)
+    return STATUS_FAILED
+
+
+def _checkpoint(db: Session, job_id: uuid.UUID, worker_id: str, **values) -> None:
+    """Update the job and its heartbeat in the current transaction, if we still own it."""
+    result = db.execute(
+        update(ImportJob)
+        .where(
+            ImportJob.id == job_id,
+            ImportJob.worker_id == worker_id,
+            ImportJob.status == STATUS_RUNNING,
+        )
+        .values(heartbeat_at=func.now(), **values)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        raise LeaseLost(str(job_id))
+
+
+def _finish_failed(db: Session, job: ImportJob, error: str) -> None:
+    """Fail the job for good: drop the partial deck and the spooled upload."""
+    if job.mode == MODE_CREATE and job.deck_id is not None:
+        db.query(Card).filter(Card.deck_id == job.deck_id).delete(synchronize_session=False)
+        db.query(Deck).filter(Deck.id == job.deck_id).delete(synchronize_session=False)
+        job.deck_id = None
+    job.status = STATUS_FAILED
+    job.phase = "failed"
+    job.error = error
+    job.worker_id = None
+    job.finished_at = func.now()
+    db.commit()
+    _remove_source(job.id, job.source_path)
+
+
+def _remove_source(job_id: uuid.UUID, path: str) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    except OSError:
+        logger.warning("Import job %s: could not remove %s", job_id, path, exc_info=True)
+
+
+class ImportWorker:
+    """
+    Claims and processes import jobs one at a time.
+
+    Usage:
+        import_worker.start()     # background thread in the API process
+        import_worker.run_once()  # claim and process a single job
+    """
+
+    def __init__(
+        self,
+        *,
+        poll_interval_s: float,
+        batch_size: int = IMPORT_BATCH_NOTES,
+        session_factory: Callable[[], Session] = SessionLocal,
+        worker_id: str | None = None,
+    ) -> None:
+        self.poll_interval = poll_interval_s
+        self.batch_size = batch_size
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._session_factory = session_factory
+
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def run_once(self) -> bool:
+        """Process one job if there is one. Returns False when the queue is empty."""
+        db = self._session_factory()
+        try:
+            job = claim_next_job(db, self.worker_id)
+            if job is None:
+                return False
+            logger.info("Import job %s claimed by %s", job.id, self.worker_id)
+            run_import_job(
+                db,
+                job,
+                self.worker_id,
+                batch_size=self.batch_size,
+                should_stop=self._stopping.is_set,
+            )
+            return True
+        finally:
+            db.close()
+
+    def run_forever(self) -> None:
+        """Poll the queue until stop() is called."""
+        while not self._stopping.is_set():
+            try:
+                while not self._stopping.is_set() and self.run_once():
+                    pass
+            except Exception:
+                logger.exception("Import worker iteration failed")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def wake(self) -> None:
+        """Check the queue now instead of at the next poll."""
+        self._wakeup.set()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self.run_forever, name="import-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop polling; a job in progress is released back to the queue after its batch."""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+import_worker = ImportWorker(poll_interval_s=settings.IMPORT_WORKER_POLL_INTERVAL_S)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    # A job in progress is released back to the queue after its current batch
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: import_worker.stop())
+    import_worker.run_forever()
+    sandbox_pool.shutdown()
@@ -0,0 +1,231 @@
+# backend/app/services/media_gc.py
+"""
+Garbage collection of card media.
+
+Deleting cards, decks or levels only removes rows: their images and audio stay
+in the bucket until this job collects them. Two kinds of objects are collected,
+both only once they are older than MEDIA_GC_GRACE_HOURS, so an upload whose
+level isn't saved yet is left alone:
+
+- content-addressed objects (app/services/media_store.py) whose ref_count has
+  dropped to zero and that haven't been uploaded again since, together with
+  their image variants (app/services/media_variants.py);
+- orphans: objects that no card level links to and media_objects doesn't know,
+  i.e. per-card uploads from before content addressing and uploads whose
+  transaction was rolled back. They are found by listing the bucket and
+  checking each page of keys against the references of all levels, collected
+  once per run into a temporary table.
+
+Objects are deleted with DeleteObjects, up to StorageService.DELETE_BATCH_SIZE
+keys per request. The media_objects rows of a batch stay locked until their
+objects are gone: an upload of the same content waits for the batch and then
+stores the file again instead of linking to a deleted object.
+
+Run periodically (e.g. daily from cron); --dry-run only reports what would go:
+    python -m app.services.media_gc [--dry-run]
+"""
+
+import argparse
+import json
+import logging
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from typing import Iterator
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.media_refs import referenced_keys_sql
+from app.db.session import SessionLocal
+from app.services.storage_service import (
+    StorageService,
+    StoredObject,
+    get_storage_service,
+)
+
+logger = logging.getLogger(__name__)
+
+# Prefixes StorageService stores card media under
+MEDIA_PREFIXES = ("cards/", "audio/")
+
+# Next batch of unreferenced objects; rows an upload is touching right now are skipped
+_UNREFERENCED_SQL = """
+    SELECT sha256, object_key, size, variants FROM media_objects
+    WHERE ref_count <= 0
+        AND last_used_at < now() - make_interval(hours => :grace_hours)
+        AND sha256 > :after
+    ORDER BY sha256
+    LIMIT :batch_size
+    {lock}
+"""
+
+_DELETE_ROWS_SQL = """
+    DELETE FROM media_objects WHERE sha256 = ANY(CAST(:hashes AS varchar[])) AND ref_count <= 0
+"""
+
+# Dropped with the transaction of the orphan sweep
+_CREATE_REFS_SQL = f"""
+    CREATE TEMP TABLE media_gc_refs ON COMMIT DROP AS
+    SELECT DISTINCT object_key FROM ({referenced_keys_sql()}) refs
+    WHERE object_key IS NOT NULL;
+    CREATE UNIQUE INDEX ON media_gc_refs (object_key);
+    ANALYZE media_gc_refs;
+"""
+
+# Keys of a listed page nothing links to, in listing order; image variants
+# (app/services/media_variants.py) go with their original
+_ORPHANS_SQL = """
+    SELECT k FROM unnest(CAST(:keys AS text[])) WITH ORDINALITY AS listed (k, n)
+    WHERE NOT EXISTS (SELECT 1 FROM media_gc_refs r WHERE r.object_key = k)
+        AND NOT EXISTS (SELECT 1 FROM media_objects m WHERE m.object_key = k)
+        AND NOT EXISTS (
+            SELECT 1 FROM media_objects m
+            WHERE m.sha256 = substring(k FROM '/([0-9a-f]{64})-w[0-9]+[.]webp$')
+        )
+    ORDER BY n
+"""
+
+
+@dataclass
+class MediaGcStats:
+    """What a run deleted (or, in a dry run, would delete)."""
+
+    dry_run: bool
+    # Content-addressed objects whose ref_count dropped to zero, with their image variants
+    unreferenced_objects: int = 0
+    unreferenced_bytes: int = 0
+    # Bucket objects no level links to and media_objects doesn't know
+    listed_objects: int = 0
+    orphan_objects: int = 0
+    orphan_bytes: int = 0
+    # DeleteObjects calls and keys they failed to delete
+    delete_requests: int = 0
+    delete_errors: int = 0
+    duration_s: float = 0.0
+
+
+def collect_media_garbage(
+    db: Session,
+    storage: StorageService | None = None,
+    dry_run: bool = False,
+    grace_hours: int | None = None,
+    batch_size: int = StorageService.DELETE_BATCH_SIZE,
+) -> MediaGcStats:
+    """
+    Delete media no card level links to any more.
+
+    Args:
+        db: Database session; committed once per batch
+        storage: Storage service (defaults to the shared one)
+        dry_run: Only count what would be deleted
+        grace_hours: Minimum age of collected objects (defaults to settings)
+        batch_size: Objects per DeleteObjects request, at most DELETE_BATCH_SIZE
+
+    Returns:
+        Counters of the run
+    """
+    storage = storage or get_storage_service()
+    if grace_hours is None:
+        grace_hours = settings.MEDIA_GC_GRACE_HOURS
+    batch_size = min(batch_size, StorageService.DELETE_BATCH_SIZE)
+    stats = MediaGcStats(dry_run=dry_run)
+    started = time.monotonic()
+
+    _collect_unreferenced(db, storage, stats, grace_hours, batch_size)
+    _collect_orphans(db, storage, stats, grace_hours, batch_size)
+
+    stats.duration_s = round(time.monotonic() - started, 3)
+    logger.info("Media GC finished: %s", stats)
+    return stats
+
+
+def _collect_unreferenced(
+    db: Session, storage: StorageService, stats: MediaGcStats, grace_hours: int, batch_size: int
+) -> None:
+    query = text(_UNREFERENCED_SQL.format(lock="" if stats.dry_run else "FOR UPDATE SKIP LOCKED"))
+    after = ""
+    while True:
+        rows = db.execute(
+            query, {"grace_hours": grace_hours, "after": after, "batch_size": batch_size}
+        ).all()
+        if not rows:
+            break
+        after = rows[-1].sha256
+        keys = {
+            row.sha256: [row.object_key] + [v["key"] for v in row.variants or []] for row in rows
+        }
+        stats.unreferenced_objects += sum(len(k) for k in keys.values())
+        stats.unreferenced_bytes += sum(
+            row.size + sum(v["size"] for v in row.variants or []) for row in rows
+        )
+        if stats.dry_run:
+            continue
+
+        failed = set(_delete(storage, [key for k in keys.values() for key in k], stats, batch_size))
+        # Rows of objects that failed stay and are retried by the next run
+        db.execute(
+            text(_DELETE_ROWS_SQL),
+            {"hashes": [digest for digest, k in keys.items() if failed.isdisjoint(k)]},
+        )
+        db.commit()
+    db.rollback()
+
+
+def _collect_orphans(
+    db: Session, storage: StorageService, stats: MediaGcStats, grace_hours: int, batch_size: int
+) -> None:
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=grace_hours)
+    db.connection().exec_driver_sql(_CREATE_REFS_SQL)
+    try:
+        for prefix in MEDIA_PREFIXES:
+            for page in _pages(storage.list_objects(prefix), batch_size):
+                stats.listed_objects += len(page)
+                old = {obj.key: obj for obj in page if obj.last_modified < cutoff}
+                if not old:
+                    continue
+                orphans = db.execute(text(_ORPHANS_SQL), {"keys": list(old)}).scalars().all()
+                if not orphans:
+                    continue
+                stats.orphan_objects += len(orphans)
+                stats.orphan_bytes += sum(old[key].size for key in orphans)
+                if not stats.dry_run:
+                    _delete(storage, orphans, stats, batch_size)
+    finally:
+        # Only the temporary table was written
+        db.rollback()
+
+
+def _delete(
+    storage: StorageService, keys: list[str], stats: MediaGcStats, batch_size: int
+) -> list[str]:
+    """Delete keys, batch_size per request; returns the keys that failed."""
+    failed = []
+    for start in range(0, len(keys), batch_size):
+        failed += storage.delete_objects(keys[start : start + batch_size])
+        stats.delete_requests += 1
+    stats.delete_errors += len(failed)
+    if failed:
+        logger.warning("Media GC failed to delete %d objects, e.g. %s", len(failed), failed[0])
+    return failed
+
+
+def _pages(objects: Iterator[StoredObject], size: int) -> Iterator[list[StoredObject]]:
+    while page := list(islice(objects, size)):
+        yield page
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Delete media no card level links to.")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would go")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    session = SessionLocal()
+    try:
+        result = collect_media_garbage(session, dry_run=args.dry_run)
+    finally:
+        session.close()
+    print(json.dumps(asdict(result)))
@@ -0,0 +1,148 @@
+# backend/app/services/media_manifest.py
+"""
+Media manifests and bundles for offline study.
+
+Before a session the client has to find the media of the next cards in their
+level payloads, one card at a time. build_media_manifest() lists them up front:
+every image, audio and option image URL of the given levels, each once, in
+card order, with size, content type and SHA-256 from media_objects (unknown for
+files stored before content addressing and for remote URLs).
+
+stream_media_bundle() packs the files of a manifest into one zip for
+prefetching: manifest.json first, then each stored file under its URL path
+(images/cards/media/ab/<sha256>.jpg), read from storage one at a time while the
+archive is sent. Media are compressed already, so files are stored as they
+are; remote URLs and files missing in storage are left out.
+"""
+
+from __future__ import annotations
+
+import io
+import logging
+import zipfile
+from typing import Iterable, Iterator, Sequence
+
+from sqlalchemy.orm import Session
+
+from app.models.card_level import CardLevel
+from app.models.media_object import MediaObject
+from app.schemas.cards import MediaManifest, MediaManifestItem
+from app.services.storage_service import StorageService, get_storage_service
+
+logger = logging.getLogger(__name__)
+
+_STORAGE_PREFIXES = ("/images/", "/audio/")
+
+# Entries get a fixed timestamp: the same manifest gives the same archive
+_ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+def level_media_urls(level: CardLevel) -> Iterator[tuple[str, str]]:
+    """(url, kind) of every media file a level links to, in display order."""
+    for url in (level.question_image_urls or []) + (level.answer_image_urls or []):
+        yield url, "image"
+    options = (level.content or {}).get("options")
+    for option in options if isinstance(options, list) else []:
+        if isinstance(option, dict) and option.get("image_url"):
+            yield option["image_url"], "image"
+    for url in (level.question_audio_urls or []) + (level.answer_audio_urls or []):
+        yield url, "audio"
+
+
+def _object_key(url: str) -> str | None:
+    """Storage key of a media URL, None for URLs not served from storage."""
+    for prefix in _STORAGE_PREFIXES:
+        if url.startswith(prefix):
+            return url.removeprefix(prefix)
+    return None
+
+
+def build_media_manifest(
+    db: Session, card_ids: Sequence, levels: Iterable[CardLevel]
+) -> MediaManifest:
+    """
+    Manifest of the media of `levels`, deduplicated by URL.
+
+    Args:
+        db: Database session
+        card_ids: The cards the levels belong to, in study order
+        levels: Their levels; files are listed in the order of card_ids
+    """
+    order = {card_id: i for i, card_id in enumerate(card_ids)}
+    urls: dict[str, str] = {}
+    for level in sorted(levels, key=lambda lvl: (order[lvl.card_id], lvl.level_index)):
+        for url, kind in level_media_urls(level):
+            urls.setdefault(url, kind)
+
+    keys = {key: url for url in urls if (key := _object_key(url)) is not None}
+    known = {}
+    if keys:
+        rows = db.query(
+            MediaObject.object_key, MediaObject.sha256, MediaObject.size, MediaObject.content_type
+        ).filter(MediaObject.object_key.in_(keys))
+        known = {keys[row.object_key]: row for row in rows}
+
+    media = []
+    for url, kind in urls.items():
+        row = known.get(url)
+        media.append(
+            MediaManifestItem(
+                url=url,
+                kind=kind,
+                content_type=row.content_type if row else None,
+                size=row.size if row else None,
+                sha256=row.sha256 if row else None,
+            )
+        )
+    return MediaManifest(
+        card_ids=list(card_ids),
+        media=media,
+        total_size=sum(item.size or 0 for item in media),
+    )
+
+
+class _ZipStream(io.RawIOBase):
+    """Write-only stream collecting what ZipFile writes, to be sent in chunks."""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _entry(name: str, compress_type: int) -> zipfile.ZipInfo:
+    info = zipfile.ZipInfo(name, date_time=_ZIP_DATE_TIME)
+    info.compress_type = compress_type
+    return info
+
+
+def stream_media_bundle(
+    manifest: MediaManifest, storage: StorageService | None = None
+) -> Iterator[bytes]:
+    """Zip of manifest.json and the stored files of a manifest, produced as it is sent."""
+    storage = storage or get_storage_service()
+    stream = _ZipStream()
+    # Not seekable: ZipFile writes sizes after each file (data descriptors)
+    with zipfile.ZipFile(stream, "w") as bundle:
+        bundle.writestr(_entry("manifest.json", zipfile.ZIP_DEFLATED), manifest.model_dump_json())
+        yield stream.take()
+        for item in manifest.media:
+            key = _object_key(item.url)
+            data = storage.download_object(key) if key is not None else None
+            if data is None:
+                if key is not None:
+                    logger.warning("Media bundle: %s missing in storage", key)
+                continue
+            bundle.writestr(_entry(item.url.lstrip("/"), zipfile.ZIP_STORED), data)
+            yield stream.take()
+    yield stream.take()
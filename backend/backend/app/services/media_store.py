@@ -0,0 +1,333 @@
+# backend/app/services/media_store.py
+"""
+Content-addressed storage of card media.
+
+Uploads are stored under a key derived from the SHA-256 of their content, so the
+same image uploaded for ten cards, or imported by ten users, is stored and
+transferred once and every level links to the same URL. media_objects records
+each stored object; its ref_count follows the levels that link to it (see
+app/db/media_refs.py) and objects nobody references any more are left to
+garbage collection (app/services/media_gc.py) instead of being deleted while
+another card may use them.
+
+store_media() is the whole path for a single upload: the file is read in
+chunks to hash it, with the size limit checked as it grows; a hit in
+media_objects returns the existing URL without touching storage, otherwise the
+object is looked up in storage (HEAD) and streamed there only if it is missing.
+Bulk uploads (Anki imports) call upload_content() from worker threads, which
+needs no database, and record the results in batches with record_media_objects().
+
+Clients can also upload directly to storage, bypassing the API workers:
+presign_media_upload() returns a presigned PUT to the content key of a file
+the client has hashed, and confirm_media_upload() checks the stored object
+(HEAD) and records it.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+from dataclasses import dataclass
+from typing import BinaryIO, Iterable, Optional
+
+from sqlalchemy import Row, func, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.media_object import MediaObject
+from app.services.storage_service import (
+    FileType,
+    PresignedUpload,
+    StorageService,
+    get_storage_service,
+)
+
+# Bytes read at a time when hashing an upload
+_READ_CHUNK_SIZE = 1024 * 1024
+
+# Claim of the oldest unclaimed objects waiting for variants; rows another
+# worker is claiming right now are skipped
+_CLAIM_SQL = """
+    WITH batch AS (
+        SELECT sha256 FROM media_objects
+        WHERE variants IS NULL AND file_type = :file_type
+            AND (claimed_at IS NULL OR claimed_at < now() - make_interval(secs => :lease_s))
+        ORDER BY created_at
+        LIMIT :limit
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE media_objects m SET claimed_at = now()
+    FROM batch
+    WHERE m.sha256 = batch.sha256
+    RETURNING m.sha256, m.object_key, m.size
+"""
+
+# File extensions of the content types StorageService accepts
+_EXTENSIONS = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/webp": "webp",
+    "audio/mpeg": "mp3",
+    "audio/mp4": "m4a",
+    "audio/wav": "wav",
+    "audio/webm": "webm",
+    "audio/ogg": "ogg",
+}
+
+
+@dataclass
+class StoredMedia:
+    """An object stored by upload_content()."""
+
+    sha256: str
+    object_key: str
+    file_type: FileType
+    content_type: str
+    size: int
+    # False if the object was already in storage
+    uploaded: bool
+
+    @property
+    def url(self) -> str:
+        return StorageService.public_url(self.object_key, self.file_type)
+
+
+def content_key(digest: str, file_type: FileType, content_type: str) -> str:
+    """Object key of content with the given SHA-256 (hex)."""
+    type_prefix = "audio" if file_type == FileType.AUDIO else "cards"
+    ext = _EXTENSIONS.get(content_type, "bin")
+    return f"{type_prefix}/media/{digest[:2]}/{digest}.{ext}"
+
+
+def is_content_addressed(url: Optional[str]) -> bool:
+    """Whether a media URL points at a content-addressed object."""
+    return bool(url) and ("/cards/media/" in url or "/audio/media/" in url)
+
+
+def upload_content(
+    data: bytes,
+    content_type: str,
+    file_type: FileType,
+    storage: StorageService | None = None,
+) -> StoredMedia:
+    """
+    Store already validated data under its content key, uploading it only if
+    storage doesn't have it yet. Needs no database; safe to call from several
+    threads at once (call storage.ensure_bucket() once before).
+    """
+    storage = storage or get_storage_service()
+    digest = hashlib.sha256(data).hexdigest()
+    object_key = content_key(digest, file_type, content_type)
+    uploaded = not storage.object_exists(object_key)
+    if uploaded:
+        storage.upload_object(object_key, data, content_type, file_type)
+    return StoredMedia(digest, object_key, file_type, content_type, len(data), uploaded)
+
+
+def record_media_objects(db: Session, objects: Iterable[StoredMedia]) -> None:
+    """
+    Add stored objects to media_objects (known ones are marked as used now). Not committed.
+
+    Record objects before saving the levels that link to them: references to
+    objects missing from media_objects are not counted.
+    """
+    rows = {
+        o.sha256: {
+            "sha256": o.sha256,
+            "object_key": o.object_key,
+            "file_type": o.file_type.value,
+            "content_type": o.content_type,
+            "size": o.size,
+        }
+        for o in objects
+    }
+    if not rows:
+        return
+    stmt = insert(MediaObject).values(sorted(rows.values(), key=lambda r: r["sha256"]))
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[MediaObject.sha256], set_={"last_used_at": func.now()}
+        )
+    )
+
+
+def claim_pending_media(db: Session, file_type: FileType, limit: int) -> list[Row]:
+    """
+    Claim a batch of objects waiting for variants (variants IS NULL), oldest
+    first, and commit: the rows are not locked while the worker processes them.
+
+    Objects claimed by another worker are skipped until their claim is older
+    than MEDIA_VARIANTS_CLAIM_LEASE_S. The worker writes its results and clears
+    the claim in another short transaction, or calls release_media_claims().
+
+    Returns:
+        (sha256, object_key, size) of the claimed objects
+    """
+    rows = db.execute(
+        text(_CLAIM_SQL),
+        {
+            "file_type": file_type.value,
+            "lease_s": settings.MEDIA_VARIANTS_CLAIM_LEASE_S,
+            "limit": limit,
+        },
+    ).all()
+    db.commit()
+    return rows
+
+
+def release_media_claims(db: Session, digests: Iterable[str]) -> None:
+    """Clear the claims of objects still waiting for variants, so the next batch retries them."""
+    db.rollback()
+    db.execute(
+        update(MediaObject)
+        .where(MediaObject.sha256.in_(list(digests)), MediaObject.variants.is_(None))
+        .values(claimed_at=None)
+    )
+    db.commit()
+
+
+def store_media(
+    db: Session,
+    fileobj: BinaryIO,
+    filename: str,
+    content_type: str,
+    file_type: FileType,
+    storage: StorageService | None = None,
+) -> str:
+    """
+    Validate and store one upload and return its public URL. Not committed.
+
+    The file is read from the start and never held in memory as a whole.
+
+    Raises:
+        ValueError: If the file type or size is not allowed
+    """
+    storage = storage or get_storage_service()
+    digest, size = _hash_file(fileobj, filename, content_type, file_type, storage)
+    known_url = _touch_known(db, digest)
+    if known_url is not None:
+        return known_url
+
+    storage.ensure_bucket()
+    object_key = content_key(digest, file_type, content_type)
+    uploaded = not storage.object_exists(object_key)
+    if uploaded:
+        fileobj.seek(0)
+        storage.upload_fileobj(object_key, fileobj, content_type, file_type)
+    stored = StoredMedia(digest, object_key, file_type, content_type, size, uploaded)
+    record_media_objects(db, [stored])
+    return stored.url
+
+
+def presign_media_upload(
+    db: Session,
+    sha256: str,
+    size: int,
+    content_type: str,
+    file_type: FileType,
+    storage: StorageService | None = None,
+) -> tuple[str, PresignedUpload | None]:
+    """
+    Prepare a direct upload of a file with the given SHA-256 (hex) and size.
+
+    Returns:
+        The URL the file will have, and the presigned upload to make, or None
+        if storage already has this content
+
+    Raises:
+        ValueError: If the file type or size is not allowed
+    """
+    storage = storage or get_storage_service()
+    storage.validate_file("", content_type, size, file_type)
+    known = db.get(MediaObject, sha256)
+    if known is not None:
+        return StorageService.public_url(known.object_key, FileType(known.file_type)), None
+
+    object_key = content_key(sha256, file_type, content_type)
+    url = StorageService.public_url(object_key, file_type)
+    if storage.object_exists(object_key):
+        return url, None
+    storage.ensure_bucket()
+    checksum = base64.b64encode(bytes.fromhex(sha256)).decode()
+    upload = storage.presigned_upload(
+        object_key, content_type, size, checksum, settings.MEDIA_UPLOAD_URL_EXPIRES_S
+    )
+    return url, upload
+
+
+def confirm_media_upload(
+    db: Session,
+    sha256: str,
+    content_type: str,
+    file_type: FileType,
+    storage: StorageService | None = None,
+) -> str:
+    """
+    Record a directly uploaded file and return its public URL. Not committed.
+
+    Raises:
+        ValueError: If the object isn't in storage, or its type or size is not allowed
+    """
+    storage = storage or get_storage_service()
+    storage.validate_file("", content_type, 0, file_type)
+    known_url = _touch_known(db, sha256)
+    if known_url is not None:
+        return known_url
+
+    object_key = content_key(sha256, file_type, content_type)
+    head = storage.head_object(object_key)
+    if head is None:
+        raise ValueError("File not uploaded: PUT it to the upload URL first")
+    # Storage enforced the signed headers; this only guards against other writers
+    storage.validate_file("", head.content_type, head.size, file_type)
+    stored = StoredMedia(sha256, object_key, file_type, head.content_type, head.size, True)
+    record_media_objects(db, [stored])
+    return stored.url
+
+
+def _touch_known(db: Session, digest: str) -> str | None:
+    """URL of known content, marked as used now; None if media_objects doesn't have it."""
+    # One statement: waits for a garbage collection batch holding the row, and
+    # finds nothing if the batch deleted it
+    known = db.execute(
+        update(MediaObject)
+        .where(MediaObject.sha256 == digest)
+        .values(last_used_at=func.now())
+        .returning(MediaObject.object_key, MediaObject.file_type)
+    ).first()
+    if known is None:
+        return None
+    return StorageService.public_url(known.object_key, FileType(known.file_type))
+
+
+def _hash_file(
+    fileobj: BinaryIO,
+    filename: str,
+    content_type: str,
+    file_type: FileType,
+    storage: StorageService,
+) -> tuple[str, int]:
+    """SHA-256 (hex) and size of a file; fails as soon as the size limit is crossed."""
+    storage.validate_file(filename, content_type, 0, file_type)
+    sha256 = hashlib.sha256()
+    size = 0
+    fileobj.seek(0)
+    while chunk := fileobj.read(_READ_CHUNK_SIZE):
+        size += len(chunk)
+        storage.validate_file(filename, content_type, size, file_type)
+        sha256.update(chunk)
+    return sha256.hexdigest(), size
+
+
+def discard_media(url: Optional[str], storage: StorageService | None = None) -> None:
+    """
+    Handle a media URL a level no longer links to.
+
+    Content-addressed objects may be shared: their reference count drops when
+    the level is saved and garbage collection removes them once unused. Objects
+    from before content addressing belong to one level and are deleted now.
+    """
+    if not url or is_content_addressed(url):
+        return
+    (storage or get_storage_service()).delete_file(url)
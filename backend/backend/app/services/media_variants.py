@@ -0,0 +1,403 @@
+# backend/app/services/media_variants.py
+"""
+Responsive variants of card images.
+
+Images are stored as uploaded, up to 5 MB of JPEG or PNG, often photos many
+times the width of a phone screen. After upload a background worker makes WebP
+copies of every image in media_objects: decoded, turned upright by its EXIF
+orientation, stripped of metadata (EXIF, ICC, XMP) and scaled to each of
+IMAGE_VARIANT_WIDTHS narrower than the original, plus one at full size capped
+to IMAGE_MAX_DIMENSION. The copies are stored next to the original
+(cards/media/ab/<sha256>-w640.webp) and listed in media_objects.variants; as
+media are content-addressed, an image shared by many cards is processed once.
+
+Decoding untrusted images is CPU- and memory-heavy, so it runs in a
+SandboxPool (app/services/anki_sandbox.py) of MEDIA_VARIANTS_WORKERS processes
+with memory and CPU limits, never in a request worker. An image that can't be
+decoded, exceeds the limits or is missing in storage gets no variants
+(variants = []). Workers claim batches for a lease
+(MEDIA_VARIANTS_CLAIM_LEASE_S) instead of locking the rows while they work; a
+batch left by a worker that died is processed again once its lease is over.
+
+The same worker transcodes audio to compact Opus/WebM and relinks levels to
+it (app/services/audio_transcode.py).
+
+Review and study responses carry the variants as srcset structures next to the
+image URL arrays (attach_image_srcsets()). Images that aren't processed yet
+have none, and clients show the original.
+
+The worker runs in the API process (MEDIA_VARIANTS_WORKER_ENABLED) or alone:
+    python -m app.services.media_variants
+"""
+
+from __future__ import annotations
+
+import io
+import logging
+import signal
+import threading
+import warnings
+from concurrent.futures import CancelledError, Future
+from typing import Callable, Iterable, NamedTuple
+
+from sqlalchemy import Row, func, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.media_object import MediaObject
+from app.schemas.cards import ImageSrcset, ImageVariant
+from app.services.anki_sandbox import SandboxLimitExceeded, SandboxPool
+from app.services.audio_transcode import (
+    find_ffmpeg,
+    process_pending_audio,
+    relink_transcoded_audio,
+)
+from app.services.media_store import (
+    claim_pending_media,
+    is_content_addressed,
+    release_media_claims,
+)
+from app.services.storage_service import FileType, StorageService, get_storage_service
+
+logger = logging.getLogger(__name__)
+
+# Images per batch for each worker process
+_TASKS_PER_WORKER = 4
+
+# Larger images are not decoded (Pillow's decompression bomb check)
+_MAX_PIXELS = 40_000_000
+
+# Limits of the worker processes
+_WORKER_MEMORY_MB = 1024
+_TASK_CPU_SECONDS = 30
+_TASK_TIMEOUT_S = 60.0
+
+
+class ImageVariantError(Exception):
+    """The image can't be decoded or is too large."""
+
+    pass
+
+
+class RenderedImage(NamedTuple):
+    """Upright size of an image and its WebP variants as (width, height, data)."""
+
+    width: int
+    height: int
+    variants: list[tuple[int, int, bytes]]
+
+
+def variant_key(digest: str, width: int) -> str:
+    """Object key of the variant of width `width` of the image with the given SHA-256."""
+    return f"cards/media/{digest[:2]}/{digest}-w{width}.webp"
+
+
+def variant_widths(width: int, height: int, widths: Iterable[int], max_dimension: int) -> list[int]:
+    """Widths to render, ascending: the narrower ones and the full size within max_dimension."""
+    full = min(width, round(width * max_dimension / max(width, height)))
+    return sorted({w for w in widths if w < full} | {full})
+
+
+# Worker side: runs in the pool's processes
+
+
+def render_image_variants(
+    data: bytes, widths: tuple[int, ...], max_dimension: int, quality: int
+) -> RenderedImage:
+    """Decode an image and encode its variants as WebP, without metadata."""
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = _MAX_PIXELS
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", Image.DecompressionBombWarning)
+        try:
+            image = Image.open(io.BytesIO(data))
+            # JPEG: decode at 1/2, 1/4 or 1/8 scale right away if that's still large enough
+            image.draft(None, (max_dimension, max_dimension))
+            image.load()
+            image = ImageOps.exif_transpose(image)
+        except (
+            OSError,
+            SyntaxError,
+            ValueError,
+            Image.DecompressionBombError,
+            Image.DecompressionBombWarning,
+        ) as e:
+            raise ImageVariantError(f"{type(e).__name__}: {e}") from None
+
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+    image = image.convert("RGBA" if has_alpha else "RGB")
+    width, height = image.size
+    variants = []
+    # Largest first, so each one is scaled down from the previous
+    source = image
+    for target in reversed(variant_widths(width, height, widths, max_dimension)):
+        size = (target, max(1, round(height * target / width)))
+        if source.size != size:
+            source = source.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        out = io.BytesIO()
+        # Nothing of image.info is written: no EXIF, ICC profile or XMP
+        source.save(out, "WEBP", quality=quality, method=4)
+        variants.append((size[0], size[1], out.getvalue()))
+    return RenderedImage(width, height, variants[::-1])
+
+
+# Parent side
+
+image_pool = SandboxPool(
+    workers=settings.MEDIA_VARIANTS_WORKERS,
+    memory_mb=_WORKER_MEMORY_MB,
+    cpu_seconds=_TASK_CPU_SECONDS,
+    timeout_s=_TASK_TIMEOUT_S,
+)
+
+
+def process_pending_images(
+    db: Session,
+    storage: StorageService | None = None,
+    pool: SandboxPool | None = None,
+    limit: int | None = None,
+) -> int:
+    """
+    Make the variants of a batch of images that have none yet, and commit.
+
+    The batch is claimed in a short transaction (claim_pending_media()), so
+    downloads, rendering and uploads hold no row lock; reference counting and
+    uploads of the same content aren't blocked meanwhile.
+
+    Args:
+        db: Database session
+        storage: Storage service (defaults to the shared one)
+        pool: Process pool to render in; None renders in the calling process
+        limit: Images per batch (defaults to a few per worker process)
+
+    Returns:
+        Number of images processed, 0 when none are waiting
+    """
+    storage = storage or get_storage_service()
+    limit = limit or settings.MEDIA_VARIANTS_WORKERS * _TASKS_PER_WORKER
+    rows = claim_pending_media(db, FileType.IMAGE, limit)
+    if not rows:
+        return 0
+
+    try:
+        results = _make_variants(rows, storage, pool)
+    except Exception:
+        release_media_claims(db, [row.sha256 for row in rows])
+        raise
+    for digest, (image, variants) in results.items():
+        db.execute(
+            update(MediaObject)
+            .where(MediaObject.sha256 == digest)
+            .values(
+                width=image.width if image else None,
+                height=image.height if image else None,
+                variants=variants,
+                claimed_at=None,
+            )
+        )
+    db.commit()
+    return len(rows)
+
+
+def _make_variants(
+    rows: list[Row], storage: StorageService, pool: SandboxPool | None
+) -> dict[str, tuple[RenderedImage | None, list[dict]]]:
+    # Downloads, renders and uploads, without holding any row lock
+    sources = {}
+    for row in rows:
+        data = storage.download_object(row.object_key)
+        if data is None:
+            logger.warning("No variants for image %s: missing in storage", row.sha256)
+        else:
+            sources[row.sha256] = data
+    rendered = _render_all(sources, pool)
+    storage.ensure_bucket()
+    results = {}
+    for row in rows:
+        image = rendered.get(row.sha256)
+        variants = []
+        for width, height, data in image.variants if image else []:
+            key = variant_key(row.sha256, width)
+            storage.upload_object(key, data, "image/webp")
+            variants.append({"key": key, "width": width, "height": height, "size": len(data)})
+        results[row.sha256] = (image, variants)
+    return results
+
+
+def _render_all(
+    sources: dict[str, bytes], pool: SandboxPool | None
+) -> dict[str, RenderedImage | None]:
+    args = (
+        tuple(settings.IMAGE_VARIANT_WIDTHS),
+        settings.IMAGE_MAX_DIMENSION,
+        settings.IMAGE_VARIANT_QUALITY,
+    )
+    if pool is None:
+        return {
+            digest: _render(digest, render_image_variants, data, *args)
+            for digest, data in sources.items()
+        }
+
+    futures = {
+        digest: pool.submit(render_image_variants, data, *args) for digest, data in sources.items()
+    }
+    return {
+        digest: _render(digest, _pool_result, pool, future, sources[digest], args)
+        for digest, future in futures.items()
+    }
+
+
+def _pool_result(pool: SandboxPool, future: Future, data: bytes, args: tuple) -> RenderedImage:
+    try:
+        return pool.result(future)
+    except (SandboxLimitExceeded, CancelledError):
+        # An image over the limits takes down the tasks of the others with the
+        # pool; alone, only the culprit fails again
+        return pool.result(pool.submit(render_image_variants, data, *args))
+
+
+def _render(digest: str, render: Callable[..., RenderedImage], *args) -> RenderedImage | None:
+    try:
+        return render(*args)
+    except (ImageVariantError, SandboxLimitExceeded) as e:
+        logger.warning("No variants for image %s: %s", digest, e)
+        return None
+
+
+def image_srcsets(db: Session, urls: Iterable[str]) -> dict[str, ImageSrcset]:
+    """srcset structures of the images among `urls` that have variants, by URL."""
+    by_key = {
+        url.removeprefix("/images/"): url
+        for url in urls
+        if is_content_addressed(url) and url.startswith("/images/")
+    }
+    if not by_key:
+        return {}
+    rows = db.query(
+        MediaObject.object_key, MediaObject.width, MediaObject.height, MediaObject.variants
+    ).filter(
+        MediaObject.object_key.in_(by_key),
+        func.jsonb_array_length(MediaObject.variants) > 0,
+    )
+    srcsets = {}
+    for row in rows:
+        variants = [
+            ImageVariant(
+                url=StorageService.public_url(v["key"], FileType.IMAGE),
+                width=v["width"],
+                height=v["height"],
+            )
+            for v in row.variants
+        ]
+        url = by_key[row.object_key]
+        srcsets[url] = ImageSrcset(
+            src=url,
+            width=row.width,
+            height=row.height,
+            srcset=", ".join(f"{v.url} {v.width}w" for v in variants),
+            variants=variants,
+        )
+    return srcsets
+
+
+def attach_image_srcsets(db: Session, items: Iterable) -> None:
+    """
+    Fill question_image_srcsets and answer_image_srcsets of response items from
+    their image URL arrays, with one query for all of them: one entry per URL,
+    None for images without variants.
+    """
+    items = list(items)
+    srcsets = image_srcsets(
+        db,
+        [
+            url
+            for item in items
+            for url in (item.question_image_urls or []) + (item.answer_image_urls or [])
+        ],
+    )
+    for item in items:
+        for side in ("question", "answer"):
+            urls = getattr(item, f"{side}_image_urls")
+            if urls:
+                setattr(item, f"{side}_image_srcsets", [srcsets.get(url) for url in urls])
+
+
+class MediaVariantsWorker:
+    """
+    Processes images waiting for variants and audio waiting for transcoding, a
+    batch at a time.
+
+    Usage:
+        media_variants_worker.start()     # background thread in the API process
+        media_variants_worker.run_once()  # process a single batch
+    """
+
+    def __init__(
+        self,
+        *,
+        poll_interval_s: float,
+        pool: SandboxPool | None = image_pool,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ) -> None:
+        self.poll_interval = poll_interval_s
+        self.pool = pool
+        self._session_factory = session_factory
+
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def run_once(self) -> bool:
+        """
+        Process one batch of images and one of audio, and relink levels to
+        transcoded audio. Returns False when nothing is waiting.
+        """
+        db = self._session_factory()
+        try:
+            done = process_pending_images(db, pool=self.pool)
+            done += process_pending_audio(db)
+            done += relink_transcoded_audio(db)
+            return done > 0
+        finally:
+            db.close()
+
+    def run_forever(self) -> None:
+        """Process batches until stop() is called, polling when none is waiting."""
+        if settings.AUDIO_TRANSCODE_ENABLED and find_ffmpeg() is None:
+            logger.warning("%s not found: audio is served as uploaded", settings.FFMPEG_PATH)
+        while not self._stopping.is_set():
+            try:
+                while not self._stopping.is_set() and self.run_once():
+                    pass
+            except Exception:
+                # E.g. storage unavailable: the batch is retried at the next poll
+                logger.exception("Media variants worker iteration failed")
+            self._stopping.wait(self.poll_interval)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self.run_forever, name="media-variants-worker", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop after the current batch."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+media_variants_worker = MediaVariantsWorker(poll_interval_s=settings.MEDIA_VARIANTS_POLL_INTERVAL_S)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: media_variants_worker.stop())
+    media_variants_worker.run_forever()
+    image_pool.shutdown()
@@ -0,0 +1,131 @@
+# backend/app/services/review_history_archive.py
+"""
+Retention job for card_review_history.
+
+Monthly partitions older than REVIEW_HISTORY_RETENTION_MONTHS are folded into
+review_daily_rollups and detached (or dropped with REVIEW_HISTORY_DROP_ARCHIVED)
+in one transaction per partition, so a crash never leaves a month counted twice
+or not at all. Old rows that ended up in the default partition are rolled up and
+deleted the same way. The job also creates upcoming partitions.
+
+Run periodically (e.g. daily from cron):
+    python -m app.services.review_history_archive
+"""
+
+import logging
+from datetime import date, datetime, timezone
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.review_history_partitions import (
+    DEFAULT_PARTITION,
+    PARENT_TABLE,
+    add_months,
+    ensure_review_history_partitions,
+    list_month_partitions,
+    month_start,
+)
+from app.db.session import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+_ROLLUP_SQL = """
+    INSERT INTO review_daily_rollups (
+        user_id, deck_id, day,
+        reviews_count, again_count, hard_count, good_count, easy_count, study_seconds
+    )
+    SELECT
+        h.user_id,
+        c.deck_id,
+        DATE(h.reviewed_at),
+        COUNT(*),
+        COUNT(*) FILTER (WHERE h.rating = 'again'),
+        COUNT(*) FILTER (WHERE h.rating = 'hard'),
+        COUNT(*) FILTER (WHERE h.rating = 'good'),
+        COUNT(*) FILTER (WHERE h.rating = 'easy'),
+        COALESCE(SUM(EXTRACT(EPOCH FROM (h.reviewed_at - h.show_at))), 0)
+    FROM {table} h
+    JOIN cards c ON c.id = h.card_id
+    {where}
+    GROUP BY h.user_id, c.deck_id, DATE(h.reviewed_at)
+    ON CONFLICT (user_id, deck_id, day) DO UPDATE SET
+        reviews_count = review_daily_rollups.reviews_count + EXCLUDED.reviews_count,
+        again_count = review_daily_rollups.again_count + EXCLUDED.again_count,
+        hard_count = review_daily_rollups.hard_count + EXCLUDED.hard_count,
+        good_count = review_daily_rollups.good_count + EXCLUDED.good_count,
+        easy_count = review_daily_rollups.easy_count + EXCLUDED.easy_count,
+        study_seconds = review_daily_rollups.study_seconds + EXCLUDED.study_seconds
+"""
+
+
+def archive_review_history(
+    db: Session,
+    retention_months: int | None = None,
+    drop: bool | None = None,
+    today: date | None = None,
+) -> list[str]:
+    """
+    Fold review history older than the retention window into daily rollups.
+
+    Args:
+        db: Database session
+        retention_months: Months of raw history to keep (defaults to settings)
+        drop: Drop archived partitions instead of only detaching them (defaults to settings)
+        today: Reference date (defaults to now, UTC)
+
+    Returns:
+        Names of the archived partitions
+    """
+    if retention_months is None:
+        retention_months = settings.REVIEW_HISTORY_RETENTION_MONTHS
+    if drop is None:
+        drop = settings.REVIEW_HISTORY_DROP_ARCHIVED
+
+    cutoff = add_months(month_start(today or datetime.now(timezone.utc)), -retention_months)
+    archived = []
+
+    for month, name in sorted(list_month_partitions(db.connection()).items()):
+        if add_months(month, 1) > cutoff:
+            break
+        db.execute(text(_ROLLUP_SQL.format(table=name, where="")))
+        db.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+        if drop:
+            db.execute(text(f"DROP TABLE {name}"))
+        db.commit()
+        archived.append(name)
+        logger.info("Archived review history partition %s (dropped=%s)", name, drop)
+
+    # Stray old rows in the default partition
+    where = "WHERE h.reviewed_at < :cutoff"
+    params = {"cutoff": datetime(cutoff.year, cutoff.month, 1, tzinfo=timezone.utc)}
+    db.execute(text(_ROLLUP_SQL.format(table=DEFAULT_PARTITION, where=where)), params)
+    deleted = db.execute(
+        text(f"DELETE FROM {DEFAULT_PARTITION} WHERE reviewed_at < :cutoff"), params
+    ).rowcount
+    db.commit()
+    if deleted:
+        logger.info("Archived %d review history rows from %s", deleted, DEFAULT_PARTITION)
+
+    return archived
+
+
+def run_maintenance(db: Session) -> None:
+    """Create upcoming partitions and archive expired ones."""
+    created = ensure_review_history_partitions(
+        db.connection(), settings.REVIEW_HISTORY_PARTITIONS_AHEAD
+    )
+    db.commit()
+    if created:
+        logger.info("Created review history partitions: %s", ", ".join(created))
+    archive_review_history(db)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    session = SessionLocal()
+    try:
+        run_maintenance(session)
+    finally:
+        session.close()
@@ -0,0 +1,219 @@
+# backend/app/services/review_history_buffer.py
+"""
+Write-behind buffer for CardReviewHistory inserts.
+
+Each worker process keeps a bounded in-memory queue of history rows. A background
+thread flushes it every REVIEW_HISTORY_FLUSH_INTERVAL_MS, or as soon as
+REVIEW_HISTORY_FLUSH_BATCH_SIZE rows are waiting, with a single multi-row INSERT.
+
+Only rows without a client review id are buffered: rows with one are inserted
+with the progress update, so the unique index rejects a concurrent retry before
+the review policy is applied twice, whichever worker the retry lands on.
+
+Guarantees:
+- a full queue is never dropped: add() returns False and the caller inserts synchronously
+- a batch that violates a constraint (e.g. its card was deleted after the review) is
+  retried row by row; only the rows that can't be inserted are logged and dropped
+- a batch that fails otherwise (database unavailable) goes back to the head of the
+  queue, within max_size, and is retried next tick
+- stop() drains the queue, so a graceful shutdown loses nothing
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.card_review_history import CardReviewHistory
+
+logger = logging.getLogger(__name__)
+
+
+class ReviewHistoryBuffer:
+    """
+    Bounded per-process queue of review history rows.
+
+    Usage:
+        if not review_history_buffer.add(row):
+            db.add(CardReviewHistory(**row))
+    """
+
+    def __init__(
+        self,
+        *,
+        enabled: bool,
+        flush_interval_ms: int,
+        batch_size: int,
+        max_size: int,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ) -> None:
+        self.enabled = enabled
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+        self.max_size = max_size
+        self._session_factory = session_factory
+
+        self._rows: deque[dict[str, Any]] = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+
+        self._flushed_rows = 0
+        self._flush_count = 0
+        self._flush_failures = 0
+        self._rejected_rows = 0
+        self._dropped_rows = 0
+        self._last_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+
+    def add(self, row: dict[str, Any]) -> bool:
+        """Queue a history row. Returns False if the queue is full."""
+        with self._lock:
+            if len(self._rows) >= self.max_size:
+                self._rejected_rows += 1
+                return False
+            self._rows.append(row)
+            depth = len(self._rows)
+
+        self._ensure_started()
+        if depth >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def flush(self) -> int:
+        """
+        Write one batch to the database.
+
+        Returns the number of rows taken off the queue (written or dropped as
+        invalid), 0 if the batch was requeued.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch = [self._rows.popleft() for _ in range(min(self.batch_size, len(self._rows)))]
+            if not batch:
+                return 0
+
+            started = time.perf_counter()
+            try:
+                dropped = self._write(batch)
+            except Exception:
+                self._requeue(batch)
+                logger.exception("Review history flush failed, batch of %d requeued", len(batch))
+                return 0
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self._flushed_rows += len(batch) - dropped
+                self._dropped_rows += dropped
+                self._flush_count += 1
+                self._last_flush_ms = elapsed_ms
+                self._max_flush_ms = max(self._max_flush_ms, elapsed_ms)
+            return len(batch)
+
+    def _write(self, batch: list[dict[str, Any]]) -> int:
+        """Insert a batch, row by row if it violates a constraint. Returns the rows dropped."""
+        # Duplicates by client_review_id are already recorded: skip them
+        stmt = insert(CardReviewHistory).on_conflict_do_nothing()
+        db = self._session_factory()
+        try:
+            try:
+                db.execute(stmt, batch)
+                db.commit()
+                return 0
+            except IntegrityError:
+                db.rollback()
+
+            dropped = 0
+            for row in batch:
+                try:
+                    with db.begin_nested():
+                        db.execute(stmt, [row])
+                except IntegrityError as exc:
+                    dropped += 1
+                    logger.error("Review history row %s dropped: %s", row["id"], exc.orig)
+            db.commit()
+            return dropped
+        finally:
+            db.close()
+
+    def _requeue(self, batch: list[dict[str, Any]]) -> None:
+        """Put a batch back at the head of the queue, as far as max_size allows."""
+        with self._lock:
+            self._flush_failures += 1
+            room = max(self.max_size - len(self._rows), 0)
+            self._rows.extendleft(reversed(batch[:room]))
+            lost = len(batch) - room
+            if lost > 0:
+                self._dropped_rows += lost
+        if lost > 0:
+            logger.error("Review history queue full, %d requeued rows dropped", lost)
+
+    def drain(self) -> None:
+        """Flush until the queue is empty or a flush fails."""
+        while self.depth() and self.flush():
+            pass
+
+    def depth(self) -> int:
+        with self._lock:
+            return len(self._rows)
+
+    def stop(self) -> None:
+        """Stop the flusher thread and write out everything still queued."""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.drain()
+        if self.depth():
+            logger.error("Review history buffer stopped with %d unflushed rows", self.depth())
+
+    def metrics(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "queue_depth": len(self._rows),
+                "queue_max_size": self.max_size,
+                "flushed_rows": self._flushed_rows,
+                "flush_count": self._flush_count,
+                "flush_failures": self._flush_failures,
+                "rejected_rows": self._rejected_rows,
+                "dropped_rows": self._dropped_rows,
+                "last_flush_ms": round(self._last_flush_ms, 2),
+                "max_flush_ms": round(self._max_flush_ms, 2),
+            }
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None or self._stopping.is_set():
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="review-history-flusher", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            # Keep flushing full batches while the queue is backed up
+            while self.flush() == self.batch_size:
+                pass
+
+
+review_history_buffer = ReviewHistoryBuffer(
+    enabled=settings.REVIEW_HISTORY_WRITE_BEHIND,
+    flush_interval_ms=settings.REVIEW_HISTORY_FLUSH_INTERVAL_MS,
+    batch_size=settings.REVIEW_HISTORY_FLUSH_BATCH_SIZE,
+    max_size=settings.REVIEW_HISTORY_QUEUE_MAX_SIZE,
+)
@@ -7,18 +7,23 @@ Provides functions for:
 - Activity heatmap data
 - Deck progress statistics
 - Activity chart data
+
+Lifetime figures combine live card_review_history with review_daily_rollups (days
+whose partitions were archived); time-bounded queries filter on reviewed_at ranges
+so Postgres prunes the monthly partitions outside the window.
 """
 
 from datetime import datetime, timedelta, timezone
 from uuid import UUID
 
-from sqlalchemy import case, func, text
+from sqlalchemy import case, func, text, union_all
 from sqlalchemy.orm import Session
 
 from app.models.card import Card
 from app.models.card_progress import CardProgress
 from app.models.card_review_history import CardReviewHistory
 from app.models.deck import Deck
+from app.models.review_daily_rollup import ReviewDailyRollup
 
 
 def format_duration(total_minutes: int) -> str:
@@ -48,6 +53,48 @@ def format_duration(total_minutes: int) -> str:
     return f"{days} day{'s' if days > 1 else ''} {remaining_hours}h"
 
 
+def _study_seconds():
+    return func.extract("epoch", CardReviewHistory.reviewed_at - CardReviewHistory.show_at)
+
+
+def _daily_activity(db: Session, user_id: UUID):
+    """
+    Per-day review counts and study time of a user, live history plus archived rollups.
+
+    Returns:
+        Subquery with columns day, reviews, again, hard, good, easy, seconds
+        (one row per day and source; archived and live days don't overlap)
+    """
+    rating = CardReviewHistory.rating
+    live = (
+        db.query(
+            func.date(CardReviewHistory.reviewed_at).label("day"),
+            func.count(CardReviewHistory.id).label("reviews"),
+            func.count(CardReviewHistory.id).filter(rating == "again").label("again"),
+            func.count(CardReviewHistory.id).filter(rating == "hard").label("hard"),
+            func.count(CardReviewHistory.id).filter(rating == "good").label("good"),
+            func.count(CardReviewHistory.id).filter(rating == "easy").label("easy"),
+            func.sum(_study_seconds()).label("seconds"),
+        )
+        .filter(CardReviewHistory.user_id == user_id)
+        .group_by(func.date(CardReviewHistory.reviewed_at))
+    )
+    archived = (
+        db.query(
+            ReviewDailyRollup.day,
+            func.sum(ReviewDailyRollup.reviews_count),
+            func.sum(ReviewDailyRollup.again_count),
+            func.sum(ReviewDailyRollup.hard_count),
+            func.sum(ReviewDailyRollup.good_count),
+            func.sum(ReviewDailyRollup.easy_count),
+            func.sum(ReviewDailyRollup.study_seconds),
+        )
+        .filter(ReviewDailyRollup.user_id == user_id)
+        .group_by(ReviewDailyRollup.day)
+    )
+    return union_all(live.statement, archived.statement).subquery("daily_activity")
+
+
 def get_user_study_dates(db: Session, user_id: UUID) -> set[datetime.date]:
     """
     Get all dates when user had review activity.
@@ -59,12 +106,8 @@ def get_user_study_dates(db: Session, user_id: UUID) -> set[datetime.date]:
     Returns:
         Set of dates with reviews
     """
-    result = (
-        db.query(func.date(CardReviewHistory.reviewed_at))
-        .filter(CardReviewHistory.user_id == user_id)
-        .distinct()
-        .all()
-    )
+    activity = _daily_activity(db, user_id)
+    result = db.query(activity.c.day).distinct().all()
     return {row[0] for row in result}
 
 
@@ -79,21 +122,17 @@ def calculate_rating_distribution(db: Session, user_id: UUID) -> dict[str, int]:
     Returns:
         Dict with counts for each rating: again, hard, good, easy
     """
-    result = (
-        db.query(
-            CardReviewHistory.rating,
-            func.count(CardReviewHistory.id).label("count"),
-        )
-        .filter(CardReviewHistory.user_id == user_id)
-        .group_by(CardReviewHistory.rating)
-        .all()
-    )
-
-    distribution = {"again": 0, "hard": 0, "good": 0, "easy": 0}
-    for rating, count in result:
-        distribution[rating] = count
+    activity = _daily_activity(db, user_id)
+    result = db.query(
+        func.sum(activity.c.again),
+        func.sum(activity.c.hard),
+        func.sum(activity.c.good),
+        func.sum(activity.c.easy),
+    ).one()
 
-    return distribution
+    return {
+        rating: int(count or 0) for rating, count in zip(("again", "hard", "good", "easy"), result)
+    }
 
 
 def calculate_average_rating(db: Session, user_id: UUID) -> float:
@@ -109,22 +148,14 @@ def calculate_average_rating(db: Session, user_id: UUID) -> float:
     Returns:
         Average rating (1.0-4.0)
     """
-    avg = (
-        db.query(
-            func.avg(
-                case(
-                    (CardReviewHistory.rating == "again", 1),
-                    (CardReviewHistory.rating == "hard", 2),
-                    (CardReviewHistory.rating == "good", 3),
-                    (CardReviewHistory.rating == "easy", 4),
-                    else_=2,
-                )
-            )
-        )
-        .filter(CardReviewHistory.user_id == user_id)
-        .scalar()
-    )
-    return float(avg) if avg is not None else 0.0
+    activity = _daily_activity(db, user_id)
+    weighted, total = db.query(
+        func.sum(
+            activity.c.again + 2 * activity.c.hard + 3 * activity.c.good + 4 * activity.c.easy
+        ),
+        func.sum(activity.c.reviews),
+    ).one()
+    return float(weighted) / float(total) if total else 0.0
 
 
 def calculate_total_study_time(db: Session, user_id: UUID) -> int:
@@ -138,16 +169,8 @@ def calculate_total_study_time(db: Session, user_id: UUID) -> int:
     Returns:
         Total study time in minutes
     """
-    result = (
-        db.query(
-            func.sum(
-                func.extract("epoch", CardReviewHistory.reviewed_at - CardReviewHistory.show_at)
-                / 60
-            )
-        )
-        .filter(CardReviewHistory.user_id == user_id)
-        .scalar()
-    )
+    activity = _daily_activity(db, user_id)
+    result = db.query(func.sum(activity.c.seconds) / 60).scalar()
     return int(result) if result is not None else 0
 
 
@@ -165,16 +188,13 @@ def calculate_average_session_duration(db: Session, user_id: UUID) -> float:
         Average session duration in minutes
     """
     # Get daily study times
+    activity = _daily_activity(db, user_id)
     daily_times = (
         db.query(
-            func.date(CardReviewHistory.reviewed_at).label("review_date"),
-            func.sum(
-                func.extract("epoch", CardReviewHistory.reviewed_at - CardReviewHistory.show_at)
-                / 60
-            ).label("daily_minutes"),
+            activity.c.day.label("review_date"),
+            (func.sum(activity.c.seconds) / 60).label("daily_minutes"),
         )
-        .filter(CardReviewHistory.user_id == user_id)
-        .group_by(func.date(CardReviewHistory.reviewed_at))
+        .group_by(activity.c.day)
         .all()
     )
 
@@ -250,22 +270,34 @@ def get_activity_heatmap(db: Session, user_id: UUID, days: int = 365) -> list[di
     end_date_str = end_date.isoformat()
     user_id_str = str(user_id)
 
+    # The reviewed_at range (not DATE(reviewed_at)) lets Postgres prune partitions
     query = text(f"""
         SELECT
             TO_CHAR(d.date, 'YYYY-MM-DD') as date,
-            COALESCE(COUNT(crh.id), 0) as reviews_count,
-            COALESCE(
-                SUM(EXTRACT(EPOCH FROM (crh.reviewed_at - crh.show_at)) / 60),
-                0
-            ) as study_time_minutes
+            COALESCE(SUM(a.reviews), 0) as reviews_count,
+            COALESCE(SUM(a.seconds) / 60, 0) as study_time_minutes
         FROM generate_series(
             '{start_date_str}'::date,
             '{end_date_str}'::date,
             INTERVAL '1 day'
         ) d(date)
-        LEFT JOIN card_review_history crh ON
-            crh.user_id = '{user_id_str}' AND
-            DATE(crh.reviewed_at) = d.date
+        LEFT JOIN (
+            SELECT
+                DATE(crh.reviewed_at) as day,
+                COUNT(crh.id) as reviews,
+                SUM(EXTRACT(EPOCH FROM (crh.reviewed_at - crh.show_at))) as seconds
+            FROM card_review_history crh
+            WHERE crh.user_id = '{user_id_str}'
+                AND crh.reviewed_at >= '{start_date_str}'::date
+                AND crh.reviewed_at < '{end_date_str}'::date + 1
+            GROUP BY DATE(crh.reviewed_at)
+            UNION ALL
+            SELECT r.day, SUM(r.reviews_count), SUM(r.study_seconds)
+            FROM review_daily_rollups r
+            WHERE r.user_id = '{user_id_str}'
+                AND r.day BETWEEN '{start_date_str}'::date AND '{end_date_str}'::date
+            GROUP BY r.day
+        ) a ON a.day = d.date
         GROUP BY d.date
         ORDER BY d.date
     """)
@@ -339,6 +371,21 @@ def get_deck_progress(db: Session, user_id: UUID) -> list[dict]:
         .all()
     )
 
+    # Reviews of archived partitions, per deck
+    archived_stats = {
+        row.deck_id: row
+        for row in (
+            db.query(
+                ReviewDailyRollup.deck_id,
+                func.sum(ReviewDailyRollup.reviews_count).label("total_reviews"),
+                func.sum(ReviewDailyRollup.study_seconds / 60).label("total_study_time"),
+            )
+            .filter(ReviewDailyRollup.user_id == user_id)
+            .group_by(ReviewDailyRollup.deck_id)
+            .all()
+        )
+    }
+
     decks = []
     for row in result:
         total_cards = row.total_cards or 0
@@ -366,6 +413,10 @@ def get_deck_progress(db: Session, user_id: UUID) -> list[dict]:
             .one()
         )
 
+        archived = archived_stats.get(row.deck_id)
+        archived_reviews = int(archived.total_reviews) if archived else 0
+        archived_study_time = float(archived.total_study_time) if archived else 0.0
+
         decks.append(
             {
                 "deck_id": str(row.deck_id),
@@ -376,8 +427,10 @@ def get_deck_progress(db: Session, user_id: UUID) -> list[dict]:
                 "learning_cards": learning,
                 "new_cards": new_cards,
                 "progress_percentage": progress_percentage,
-                "total_reviews": deck_stats.total_reviews or 0,
-                "total_study_time_minutes": int(deck_stats.total_study_time or 0),
+                "total_reviews": (deck_stats.total_reviews or 0) + archived_reviews,
+                "total_study_time_minutes": int(
+                    float(deck_stats.total_study_time or 0) + archived_study_time
+                ),
             }
         )
 
@@ -1,6 +1,8 @@
+import threading
 import uuid
+from datetime import datetime
 from enum import Enum
-from typing import Literal, Optional
+from typing import BinaryIO, Iterator, Literal, NamedTuple, Optional
 
 from app.core.config import settings
 
@@ -12,6 +14,29 @@ class FileType(Enum):
     AUDIO = "audio"
 
 
+class StoredObject(NamedTuple):
+    """An object listed from the bucket."""
+
+    key: str
+    size: int
+    last_modified: datetime
+
+
+class ObjectHead(NamedTuple):
+    """Metadata of a stored object (HEAD response)."""
+
+    size: int
+    content_type: str
+
+
+class PresignedUpload(NamedTuple):
+    """A presigned PUT: the client sends the file with exactly these headers."""
+
+    url: str
+    headers: dict[str, str]
+    expires_in: int
+
+
 class StorageService:
     """
     Service for managing file uploads to S3/MinIO.
@@ -34,24 +59,61 @@ class StorageService:
 
     BUCKET_NAME = settings.MINIO_BUCKET_NAME
 
+    # Keys per DeleteObjects request (the S3 limit)
+    DELETE_BATCH_SIZE = 1000
+
+    # Streamed uploads above this size go in parts (5MB is the S3 minimum part
+    # size); each part in flight is held in memory
+    MULTIPART_CHUNK_SIZE = 5 * 1024 * 1024
+    MULTIPART_CONCURRENCY = 2
+
+    # Threads of the pool sync endpoints run in (anyio's default limit)
+    ENDPOINT_THREADS = 40
+
     def __init__(self) -> None:
         # Lazy import boto3 only when actually creating a StorageService instance
+        from botocore.config import Config  # noqa: TCH002 - Third-party import
+
+        # Set once the bucket is known to exist: it is provisioned at startup or
+        # by the first upload, not checked again before each one
+        self._bucket_ready = False
+        self._bucket_lock = threading.Lock()
+        self._s3_client = self._create_client(
+            settings.MINIO_ENDPOINT,
+            # One client (and connection pool) is shared by the endpoint threads,
+            # the Anki media upload threads and their multipart uploads, so none of
+            # them waits for a connection or opens one per request
+            Config(
+                max_pool_connections=self.ENDPOINT_THREADS
+                + settings.ANKI_MEDIA_UPLOAD_WORKERS * self.MULTIPART_CONCURRENCY,
+                tcp_keepalive=True,
+                connect_timeout=settings.STORAGE_CONNECT_TIMEOUT_S,
+                read_timeout=settings.STORAGE_READ_TIMEOUT_S,
+                retries={"mode": "standard", "max_attempts": settings.STORAGE_MAX_ATTEMPTS},
+            ),
+        )
+        # Presigned URLs are signed (SigV4: signed headers) for the host browsers send them to
+        self._presign_client = self._create_client(
+            settings.MINIO_PUBLIC_ENDPOINT or settings.MINIO_ENDPOINT,
+            Config(signature_version="s3v4"),
+        )
+
+    @staticmethod
+    def _create_client(endpoint: str, config):
         import boto3  # noqa: TCH002 - Third-party import needed for S3
 
-        # MINIO_ENDPOINT may already include protocol (http:// or https://)
-        endpoint = settings.MINIO_ENDPOINT
+        # The endpoint may already include protocol (http:// or https://)
         if not endpoint.startswith(("http://", "https://")):
             protocol = "https" if settings.MINIO_USE_SSL else "http"
-            endpoint_url = f"{protocol}://{endpoint}"
-        else:
-            endpoint_url = endpoint
+            endpoint = f"{protocol}://{endpoint}"
 
-        self._s3_client = boto3.client(
+        return boto3.client(
             "s3",
-            endpoint_url=endpoint_url,
+            endpoint_url=endpoint,
             aws_access_key_id=settings.MINIO_ACCESS_KEY,
             aws_secret_access_key=settings.MINIO_SECRET_KEY,
             region_name="us-east-1",
+            config=config,
         )
 
     def _ensure_bucket_exists(self) -> None:
@@ -79,6 +141,21 @@ class StorageService:
             }
             self._s3_client.put_bucket_policy(Bucket=self.BUCKET_NAME, Policy=json.dumps(policy))
 
+    def ensure_bucket(self) -> None:
+        """
+        Make sure the bucket exists before uploading.
+
+        Only the first call talks to storage (HEAD, and creating the bucket if
+        it's missing); after that the verified state is cached for the life of
+        the service.
+        """
+        if self._bucket_ready:
+            return
+        with self._bucket_lock:
+            if not self._bucket_ready:
+                self._ensure_bucket_exists()
+                self._bucket_ready = True
+
     def validate_file(
         self,
         filename: str,
@@ -122,6 +199,145 @@ class StorageService:
         type_prefix = "audio" if file_type == FileType.AUDIO else "cards"
         return f"{type_prefix}/{card_id[:8]}/{card_id}_{side}_{unique_id}.{ext}"
 
+    def upload_object(
+        self,
+        object_key: str,
+        file_data: bytes,
+        content_type: str,
+        file_type: Literal[FileType.IMAGE, FileType.AUDIO] = FileType.IMAGE,
+    ) -> str:
+        """
+        Upload already validated data under a given key and return its public URL.
+
+        Doesn't check the bucket: call ensure_bucket() once before. Safe to call
+        from several threads at once.
+        """
+        self._s3_client.put_object(
+            Bucket=self.BUCKET_NAME,
+            Key=object_key,
+            Body=file_data,
+            ContentType=content_type,
+        )
+        return self.public_url(object_key, file_type)
+
+    def upload_fileobj(
+        self,
+        object_key: str,
+        fileobj: BinaryIO,
+        content_type: str,
+        file_type: Literal[FileType.IMAGE, FileType.AUDIO] = FileType.IMAGE,
+    ) -> str:
+        """
+        Stream already validated data from a file object under a given key and
+        return its public URL.
+
+        Files larger than MULTIPART_CHUNK_SIZE are sent as a multipart upload,
+        so at most MULTIPART_CONCURRENCY chunks are in memory at a time. Like
+        upload_object() this doesn't check the bucket.
+        """
+        from boto3.s3.transfer import TransferConfig  # noqa: TCH002 - Third-party import
+
+        self._s3_client.upload_fileobj(
+            fileobj,
+            self.BUCKET_NAME,
+            object_key,
+            ExtraArgs={"ContentType": content_type},
+            Config=TransferConfig(
+                multipart_threshold=self.MULTIPART_CHUNK_SIZE,
+                multipart_chunksize=self.MULTIPART_CHUNK_SIZE,
+                max_concurrency=self.MULTIPART_CONCURRENCY,
+            ),
+        )
+        return self.public_url(object_key, file_type)
+
+    def download_object(self, object_key: str) -> bytes | None:
+        """Content of an object, None if there is none (GET request)."""
+        from botocore.exceptions import ClientError  # noqa: TCH002 - Third-party import
+
+        try:
+            response = self._s3_client.get_object(Bucket=self.BUCKET_NAME, Key=object_key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return response["Body"].read()
+
+    def object_exists(self, object_key: str) -> bool:
+        """Whether the bucket has an object under this key (HEAD request)."""
+        return self.head_object(object_key) is not None
+
+    def head_object(self, object_key: str) -> ObjectHead | None:
+        """Size and content type of an object, None if there is none (HEAD request)."""
+        from botocore.exceptions import ClientError  # noqa: TCH002 - Third-party import
+
+        try:
+            response = self._s3_client.head_object(Bucket=self.BUCKET_NAME, Key=object_key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return ObjectHead(response["ContentLength"], response.get("ContentType", ""))
+
+    def presigned_upload(
+        self,
+        object_key: str,
+        content_type: str,
+        size: int,
+        sha256_b64: str,
+        expires_in: int,
+    ) -> PresignedUpload:
+        """
+        Presigned PUT of exactly one file: content type, length and SHA-256
+        checksum are signed, so storage rejects any other body.
+
+        The Content-Length header is set by the client from the body itself.
+        """
+        url = self._presign_client.generate_presigned_url(
+            "put_object",
+            Params={
+                "Bucket": self.BUCKET_NAME,
+                "Key": object_key,
+                "ContentType": content_type,
+                "ContentLength": size,
+                "ChecksumSHA256": sha256_b64,
+            },
+            ExpiresIn=expires_in,
+        )
+        headers = {"Content-Type": content_type, "x-amz-checksum-sha256": sha256_b64}
+        return PresignedUpload(url, headers, expires_in)
+
+    def list_objects(self, prefix: str = "") -> Iterator[StoredObject]:
+        """All objects under a prefix, in key order, one ListObjectsV2 page at a time."""
+        paginator = self._s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.BUCKET_NAME, Prefix=prefix):
+            for item in page.get("Contents", []):
+                yield StoredObject(item["Key"], item["Size"], item["LastModified"])
+
+    def delete_objects(self, object_keys: list[str]) -> list[str]:
+        """
+        Delete objects with one DeleteObjects request per DELETE_BATCH_SIZE keys.
+
+        Returns:
+            Keys that couldn't be deleted (missing keys count as deleted)
+        """
+        failed = []
+        for start in range(0, len(object_keys), self.DELETE_BATCH_SIZE):
+            batch = object_keys[start : start + self.DELETE_BATCH_SIZE]
+            response = self._s3_client.delete_objects(
+                Bucket=self.BUCKET_NAME,
+                Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+            )
+            failed += [error["Key"] for error in response.get("Errors", [])]
+        return failed
+
+    @staticmethod
+    def public_url(
+        object_key: str, file_type: Literal[FileType.IMAGE, FileType.AUDIO] = FileType.IMAGE
+    ) -> str:
+        """Public URL of an object (proxied through nginx)."""
+        url_prefix = "/audio/" if file_type == FileType.AUDIO else "/images/"
+        return f"{url_prefix}{object_key}"
+
     def upload_file(
         self,
         file_data: bytes,
@@ -145,7 +361,7 @@ class StorageService:
         Returns:
             Public URL of the uploaded file
         """
-        self._ensure_bucket_exists()
+        self.ensure_bucket()
 
         file_size = len(file_data)
         self.validate_file(filename, content_type, file_size, file_type)
@@ -160,8 +376,7 @@ class StorageService:
         )
 
         # Return public URL (will be proxied through nginx)
-        url_prefix = "/audio/" if file_type == FileType.AUDIO else "/images/"
-        return f"{url_prefix}{object_key}"
+        return self.public_url(object_key, file_type)
 
     def delete_file(self, object_url: Optional[str]) -> None:
         """
@@ -207,3 +422,9 @@ class _StorageServiceModule:
 
 
 storage_service = _StorageServiceModule()
+
+
+if __name__ == "__main__":
+    # One-time provisioning, e.g. from a deploy script: python -m app.services.storage_service
+    get_storage_service().ensure_bucket()
+    print(f"Bucket {StorageService.BUCKET_NAME} is ready")
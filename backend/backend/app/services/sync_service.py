@@ -0,0 +1,257 @@
+# backend/app/services/sync_service.py
+"""
+Incremental sync for offline clients.
+
+The change log (sync_changes) is filled by DB triggers. The sync cursor is the xmin of
+a transaction snapshot: every transaction with a smaller txid has already finished, so
+changes below the cursor are final and anything at or above it is picked up by the next
+call. Changes are collapsed per entity, so the payload is proportional to what changed.
+
+The log is pruned by a retention job (SYNC_CHANGES_RETENTION_DAYS), which records the
+cursor below which it no longer answers in sync_horizon. A client with an older cursor
+gets a full snapshot, as on its first sync.
+
+Run the retention job periodically (e.g. daily from cron):
+    python -m app.services.sync_service
+"""
+
+import logging
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+from sqlalchemy import and_, false, func, or_, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.card import Card
+from app.models.card_level import CardLevel
+from app.models.card_progress import CardProgress
+from app.models.sync_change import SyncChange
+from app.models.sync_horizon import SyncHorizon
+from app.models.user_study_group import UserStudyGroup
+from app.models.user_study_group_deck import UserStudyGroupDeck
+from app.schemas.sync import (
+    SyncCard,
+    SyncCardLevel,
+    SyncDeckMembership,
+    SyncMembershipKey,
+    SyncProgress,
+    SyncResponse,
+    SyncTombstones,
+)
+
+ENTITY_CARD = "card"
+ENTITY_CARD_LEVEL = "card_level"
+ENTITY_PROGRESS = "card_progress"
+ENTITY_MEMBERSHIP = "deck_membership"
+
+logger = logging.getLogger(__name__)
+
+
+def get_sync_cursor(db: Session) -> int:
+    """Return the current cursor: all transactions below it are committed or aborted."""
+    return db.execute(text("SELECT txid_snapshot_xmin(txid_current_snapshot())")).scalar_one()
+
+
+def get_sync_horizon(db: Session) -> int:
+    """Oldest cursor the change log still answers: changes below it were pruned."""
+    return db.scalar(select(SyncHorizon.txid)) or 0
+
+
+def prune_sync_changes(
+    db: Session, retention_days: int | None = None, now: datetime | None = None
+) -> int:
+    """
+    Delete change log entries older than the retention and move the horizon past them.
+
+    Args:
+        db: Database session; committed
+        retention_days: Days of changes to keep (defaults to settings)
+        now: Reference time (defaults to now)
+
+    Returns:
+        Number of deleted changes
+    """
+    if retention_days is None:
+        retention_days = settings.SYNC_CHANGES_RETENTION_DAYS
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=retention_days)
+
+    newest_expired = db.scalar(
+        select(func.max(SyncChange.txid)).where(SyncChange.changed_at < cutoff)
+    )
+    if newest_expired is None:
+        return 0
+    horizon = newest_expired + 1
+
+    # Horizon and deletion commit together, so a reader never sees one without the other
+    stmt = insert(SyncHorizon).values(id=1, txid=horizon)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[SyncHorizon.id],
+            set_={
+                "txid": func.greatest(SyncHorizon.txid, stmt.excluded.txid),
+                "pruned_at": func.now(),
+            },
+        )
+    )
+    deleted = db.execute(
+        text("DELETE FROM sync_changes WHERE txid < :horizon"), {"horizon": horizon}
+    ).rowcount
+    db.commit()
+    logger.info("Pruned %d sync changes below txid %d", deleted, horizon)
+    return deleted
+
+
+def _user_memberships(db: Session, user_id: UUID) -> list[UserStudyGroupDeck]:
+    return (
+        db.query(UserStudyGroupDeck)
+        .join(UserStudyGroup, UserStudyGroup.id == UserStudyGroupDeck.user_group_id)
+        .filter(UserStudyGroup.user_id == user_id)
+        .all()
+    )
+
+
+def _collapse_changes(
+    db: Session, user_id: UUID, deck_ids: set[UUID], since: int, cursor: int
+) -> tuple[dict[str, set], dict[str, set]]:
+    """Read the change log window and keep only the last operation per entity."""
+    rows = (
+        db.query(SyncChange.entity_type, SyncChange.entity_id, SyncChange.deck_id, SyncChange.op)
+        .filter(
+            SyncChange.txid >= since,
+            SyncChange.txid < cursor,
+            or_(
+                SyncChange.user_id == user_id,
+                and_(
+                    SyncChange.entity_type.in_((ENTITY_CARD, ENTITY_CARD_LEVEL)),
+                    SyncChange.deck_id.in_(list(deck_ids)) if deck_ids else false(),
+                ),
+            ),
+        )
+        .order_by(SyncChange.id.asc())
+        .all()
+    )
+
+    latest: dict[tuple, str] = {}
+    for entity_type, entity_id, deck_id, op in rows:
+        # Memberships are keyed by (user_group_id, deck_id), everything else by id
+        key = (entity_id, deck_id) if entity_type == ENTITY_MEMBERSHIP else entity_id
+        latest[(entity_type, key)] = op
+
+    upserted: dict[str, set] = {}
+    deleted: dict[str, set] = {}
+    for (entity_type, key), op in latest.items():
+        bucket = deleted if op == "delete" else upserted
+        bucket.setdefault(entity_type, set()).add(key)
+    return upserted, deleted
+
+
+def get_sync_changes(db: Session, user_id: UUID, since: int | None) -> SyncResponse:
+    """
+    Build a sync payload for the user.
+
+    Args:
+        db: Database session
+        user_id: User UUID
+        since: Cursor from the previous response, or None for a full snapshot; a
+            cursor older than the sync horizon also gets a full snapshot
+
+    Returns:
+        SyncResponse with upserted rows, tombstones and the next cursor
+    """
+    # Cursor first: anything committed after this point is re-sent next time
+    cursor = get_sync_cursor(db)
+
+    memberships = _user_memberships(db, user_id)
+    deck_ids = {m.deck_id for m in memberships}
+
+    upserted: dict[str, set] = {}
+    deleted: dict[str, set] = {}
+    if since is not None:
+        upserted, deleted = _collapse_changes(db, user_id, deck_ids, since, cursor)
+        # Read after the change log: a prune that committed before it shows up here
+        if since < get_sync_horizon(db):
+            since = None
+
+    if since is None:
+        upserted, deleted = {}, {}
+        fresh_deck_ids = deck_ids
+        membership_rows = memberships
+    else:
+        new_links = upserted.get(ENTITY_MEMBERSHIP, set())
+        membership_rows = [m for m in memberships if (m.user_group_id, m.deck_id) in new_links]
+        # Decks that just appeared for the user are sent whole
+        fresh_deck_ids = {m.deck_id for m in membership_rows}
+
+    card_ids = upserted.get(ENTITY_CARD, set())
+    level_ids = upserted.get(ENTITY_CARD_LEVEL, set())
+    progress_ids = upserted.get(ENTITY_PROGRESS, set())
+
+    cards: list[Card] = []
+    if deck_ids and (card_ids or fresh_deck_ids):
+        cards = (
+            db.query(Card)
+            .filter(
+                Card.deck_id.in_(list(deck_ids)),
+                or_(Card.id.in_(list(card_ids)), Card.deck_id.in_(list(fresh_deck_ids))),
+            )
+            .order_by(Card.created_at.asc(), Card.id.asc())
+            .all()
+        )
+
+    levels: list[CardLevel] = []
+    if deck_ids and (level_ids or fresh_deck_ids):
+        levels = (
+            db.query(CardLevel)
+            .join(Card, Card.id == CardLevel.card_id)
+            .filter(
+                Card.deck_id.in_(list(deck_ids)),
+                or_(CardLevel.id.in_(list(level_ids)), Card.deck_id.in_(list(fresh_deck_ids))),
+            )
+            .order_by(CardLevel.card_id.asc(), CardLevel.level_index.asc())
+            .all()
+        )
+
+    progress: list[CardProgress] = []
+    if progress_ids or fresh_deck_ids:
+        progress = (
+            db.query(CardProgress)
+            .join(Card, Card.id == CardProgress.card_id)
+            .filter(
+                CardProgress.user_id == user_id,
+                or_(
+                    CardProgress.id.in_(list(progress_ids)),
+                    Card.deck_id.in_(list(fresh_deck_ids)),
+                ),
+            )
+            .all()
+        )
+
+    return SyncResponse(
+        cursor=cursor,
+        full=since is None,
+        cards=[SyncCard.model_validate(c) for c in cards],
+        card_levels=[SyncCardLevel.model_validate(lvl) for lvl in levels],
+        progress=[SyncProgress.model_validate(p) for p in progress],
+        deck_memberships=[SyncDeckMembership.model_validate(m) for m in membership_rows],
+        deleted=SyncTombstones(
+            cards=sorted(deleted.get(ENTITY_CARD, set())),
+            card_levels=sorted(deleted.get(ENTITY_CARD_LEVEL, set())),
+            progress=sorted(deleted.get(ENTITY_PROGRESS, set())),
+            deck_memberships=[
+                SyncMembershipKey(user_group_id=group_id, deck_id=deck_id)
+                for group_id, deck_id in sorted(deleted.get(ENTITY_MEMBERSHIP, set()))
+            ],
+        ),
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    session = SessionLocal()
+    try:
+        prune_sync_changes(session)
+    finally:
+        session.close()
@@ -0,0 +1,116 @@
+"""
+End-to-end Anki import benchmark: .apkg on disk -> cards and card_levels in Postgres.
+
+Builds a Basic-model package with --notes notes, imports it with SandboxedApkg
+and AnkiMapper as the /decks/import-anki endpoint does, and checks the run
+against the target (100k notes in under 10 s on a local Postgres). With --reviews
+the package also carries a review log of that many entries and scheduled cards,
+imported into card_review_history and card_progress. Notes are parsed in the
+sandbox process pool (IMPORT_SANDBOX_WORKERS processes), or in the benchmark's
+own process with --in-process.
+
+Usage (from backend/backend, DATABASE_URL pointing at a scratch database):
+    python -m benchmarks.anki_import --notes 100000
+    python -m benchmarks.anki_import --notes 100000 --reviews 1000000
+    python -m benchmarks.anki_import --notes 100000 --in-process
+"""
+
+import argparse
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from sqlalchemy import text
+from tests.anki_fixtures import build_apkg
+
+from app.db.init_db import init_db
+from app.db.session import SessionLocal
+from app.models.user import User
+from app.services.anki_mapper import AnkiMapper
+from app.services.anki_sandbox import SandboxedApkg, sandbox_pool
+
+TARGET_SECONDS = 10.0
+
+
+def _cleanup(db, user_id: uuid.UUID) -> None:
+    params = {"user_id": user_id}
+    decks = "SELECT id FROM decks WHERE owner_id = :user_id"
+    db.execute(text("DELETE FROM card_review_history WHERE user_id = :user_id"), params)
+    db.execute(text("DELETE FROM card_progress WHERE user_id = :user_id"), params)
+    db.execute(text(f"DELETE FROM cards WHERE deck_id IN ({decks})"), params)
+    db.execute(text(f"DELETE FROM user_study_group_decks WHERE deck_id IN ({decks})"), params)
+    db.execute(text("DELETE FROM decks WHERE owner_id = :user_id"), params)
+    db.execute(text("DELETE FROM user_study_groups WHERE user_id = :user_id"), params)
+    db.execute(text("DELETE FROM users WHERE id = :user_id"), params)
+    db.commit()
+
+
+def _revlog(notes: int, reviews: int) -> list[tuple[int, int, int, int, int]]:
+    """`reviews` entries spread over the notes, one per minute from 2020-01-01 on."""
+    start_ms = 1_577_836_800_000
+    return [
+        (start_ms + i * 60_000, i % notes, 1 + i % 4, (i % 30) - 5, 1000 + i % 9000)
+        for i in range(reviews)
+    ]
+
+
+def run(notes: int, reviews: int, keep: bool, isolated: bool = True) -> float:
+    init_db()
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        scheduled = {"type": 2, "queue": 2, "due": 1500, "ivl": 20, "factor": 2300}
+        package = build_apkg(
+            Path(tmp) / "bench.apkg",
+            [(f"<b>Question</b> {i}<br>line two", f"Answer {i} &amp; more") for i in range(notes)],
+            scheduling=dict.fromkeys(range(notes), scheduled) if reviews else None,
+            revlog=_revlog(notes, reviews),
+            collection_created=1_577_836_800,
+        )
+        print(
+            f"built {notes:,}-note package with {reviews:,} reviews "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+
+        db = SessionLocal()
+        user = User(
+            username="bench",
+            email=f"bench_{uuid.uuid4()}@example.com",
+            password_hash="x",
+            is_email_verified=True,
+        )
+        db.add(user)
+        db.commit()
+        try:
+            started = time.perf_counter()
+            with SandboxedApkg(package, isolated=isolated) as source:
+                deck, cards_created = AnkiMapper(db, user.id).create_deck(source)
+            elapsed = time.perf_counter() - started
+        finally:
+            if not keep:
+                _cleanup(db, user.id)
+            db.close()
+            sandbox_pool.shutdown()
+
+    status = "OK" if elapsed < TARGET_SECONDS else "SLOWER THAN TARGET"
+    print(
+        f"imported {cards_created:,} cards in {elapsed:.2f}s "
+        f"({cards_created / elapsed:,.0f} notes/s) - target {TARGET_SECONDS:.0f}s: {status}"
+    )
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--notes", type=int, default=100_000)
+    parser.add_argument("--reviews", type=int, default=0, help="revlog entries in the package")
+    parser.add_argument("--keep", action="store_true", help="keep the imported deck")
+    parser.add_argument(
+        "--in-process", action="store_true", help="parse in this process, not in the sandbox"
+    )
+    args = parser.parse_args()
+    run(args.notes, args.reviews, args.keep, isolated=not args.in_process)
+
+
+if __name__ == "__main__":
+    main()
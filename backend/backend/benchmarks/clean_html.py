@@ -0,0 +1,111 @@
+"""
+HTML cleanup of imported Anki fields: batched clean_fields() vs the per-field cleaner.
+
+The reference is the cleaner imports used before, a dozen regex passes and
+replaces per field; clean_fields() cleans a batch of fields (question and
+answer of IMPORT_BATCH_NOTES notes) joined into one string. Outputs may differ
+only where the new cleaner is more complete: entities the reference left
+encoded and markup the reference mangled (e.g. "x < y<br>z").
+
+The corpus is --fields fields in the markup Anki's editor produces (divs, <br>,
+spans with inline styles, lists, entities, media tags), or the note fields of a
+real collection with --apkg.
+
+Usage (from backend/backend):
+    python -m benchmarks.clean_html --fields 100000
+    python -m benchmarks.clean_html --apkg ~/Downloads/deck.apkg
+"""
+
+import argparse
+import random
+import re
+import time
+
+from app.services.anki_parser import ApkgParser
+from app.services.anki_transform import clean_fields
+
+TARGET_SPEEDUP = 3.0
+
+# Question and answer of the notes of one import batch (IMPORT_BATCH_NOTES)
+_BATCH_FIELDS = 10_000
+
+_FIELD_TEMPLATES = [
+    "word {i}",
+    "der Hund, die Hunde ({i})",
+    "<div>Some text {i}</div><div>more text</div>",
+    "<b>bold</b> and <i>italic</i> {i}<br>line two",
+    "voiture&nbsp;(f) {i}",
+    '<img src="paste-{i}.jpg">',
+    "[sound:rec_{i}.mp3]",
+    '<span style="color: rgb(0, 0, 0);">text {i}</span>',
+    "<ul><li>one</li><li>two {i}</li></ul>",
+    "&lt;tag&gt; &amp; &quot;entities&quot; {i}",
+    '<div style="text-align: center;">Frage {i}<br /><br /></div><div><br></div>',
+    "x &lt; y {i}",
+]
+
+
+def reference_clean_html(text: str) -> str:
+    """The per-field cleaner clean_fields() replaced."""
+    if not text:
+        return ""
+    text = re.sub(r"\[sound:[^\]]+\]", "", text)
+    text = re.sub(r"<!--.*?-->", "", text, flags=re.DOTALL)
+    text = re.sub(r"<br\s*/?\s*>", "\n", text, flags=re.IGNORECASE)
+    text = re.sub(r"</\s*(div|p)\s*>", "\n", text, flags=re.IGNORECASE)
+    text = re.sub(r"<\s*li\s*>", "• ", text, flags=re.IGNORECASE)
+    text = re.sub(r"<[^>]+>", "", text)
+    text = (
+        text.replace("&nbsp;", " ")
+        .replace("&lt;", "<")
+        .replace("&gt;", ">")
+        .replace("&amp;", "&")
+        .replace("&quot;", '"')
+        .replace("&#39;", "'")
+    )
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+
+def _synthetic_fields(count: int) -> list[str]:
+    rng = random.Random(1)
+    return [rng.choice(_FIELD_TEMPLATES).format(i=i) for i in range(count)]
+
+
+def _package_fields(path: str) -> list[str]:
+    with ApkgParser(path) as parser:
+        return [field for notes in parser.iter_notes() for note in notes for field in note.fields]
+
+
+def run(fields: list[str]) -> float:
+    started = time.perf_counter()
+    expected = [reference_clean_html(field) for field in fields]
+    reference = time.perf_counter() - started
+
+    started = time.perf_counter()
+    cleaned = []
+    for start in range(0, len(fields), _BATCH_FIELDS):
+        cleaned += clean_fields(fields[start : start + _BATCH_FIELDS])
+    batched = time.perf_counter() - started
+
+    # Expected only for entities the reference left encoded and for malformed markup
+    differ = sum(1 for old, new in zip(expected, cleaned) if old != new)
+    speedup = reference / batched
+    status = "OK" if speedup >= TARGET_SPEEDUP else "BELOW TARGET"
+    print(f"{len(fields):,} fields, {differ} outputs differ")
+    print(f"per-field reference: {reference:.2f}s ({len(fields) / reference:,.0f} fields/s)")
+    print(f"batched clean_fields: {batched:.2f}s ({len(fields) / batched:,.0f} fields/s)")
+    print(f"speedup {speedup:.1f}x - target {TARGET_SPEEDUP:.0f}x: {status}")
+    return speedup
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--fields", type=int, default=100_000, help="synthetic corpus size")
+    parser.add_argument("--apkg", help="take the fields of this package instead")
+    args = parser.parse_args()
+    run(_package_fields(args.apkg) if args.apkg else _synthetic_fields(args.fields))
+
+
+if __name__ == "__main__":
+    main()
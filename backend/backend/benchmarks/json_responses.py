@@ -0,0 +1,183 @@
+"""
+CPU time to turn a 1000-card payload into a JSON response, FastAPI's way vs FastJSONResponse.
+
+Two payloads are built from in-memory card and level rows the way the routes
+build them:
+
+- session: /decks/{id}/session, a list of DeckSessionCard models with their
+  CardLevelContent levels. FastAPI validates the returned list against the
+  response_model again and dumps it; FastJSONResponse dumps it as it is.
+- study-cards: /decks/{id}/study-cards, nested dicts. FastAPI runs them
+  through jsonable_encoder() and json.dumps(); FastJSONResponse through orjson.
+
+Building the payload from the rows is the same both ways and timed apart. The
+FastAPI side calls fastapi.routing.serialize_response() as the request handler
+does; no HTTP or database time is included. Bodies are checked to decode to the
+same JSON.
+
+Usage (from backend/backend):
+    python -m benchmarks.json_responses --cards 1000 --levels 3
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable
+
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+import app.db.init_db  # noqa: F401 - registers every model for the mappers
+from app.api.responses import FastJSONResponse
+from app.models.card import Card
+from app.models.card_level import CardLevel
+from app.schemas.cards import CardLevelContent, DeckSessionCard
+
+
+def _rows(cards: int, levels: int) -> list[tuple[Card, list[CardLevel]]]:
+    deck_id = uuid.uuid4()
+    rows = []
+    for i in range(cards):
+        card = Card(id=uuid.uuid4(), deck_id=deck_id, title=f"Card {i}", type="flashcard")
+        card_levels = [
+            CardLevel(
+                id=uuid.uuid4(),
+                card_id=card.id,
+                level_index=n,
+                content={
+                    "question": f"Как по-немецки «кошка»? ({i}.{n})",
+                    "answer": "die Katze, die Katzen",
+                    "explanation": "Feminine; plural with -n. " * 3,
+                },
+                question_image_urls=[f"/images/cards/media/ab/{uuid.uuid4().hex}.jpg"],
+                answer_image_urls=None,
+                question_audio_urls=[f"/audio/audio/media/cd/{uuid.uuid4().hex}.webm"],
+                answer_audio_urls=[],
+            )
+            for n in range(levels)
+        ]
+        rows.append((card, card_levels))
+    return rows
+
+
+def _session(rows) -> list[DeckSessionCard]:
+    return [
+        DeckSessionCard(
+            card_id=card.id,
+            deck_id=card.deck_id,
+            title=card.title,
+            type=card.type,
+            active_card_level_id=levels[0].id,
+            active_level_index=0,
+            levels=[
+                CardLevelContent(
+                    level_index=lvl.level_index,
+                    content=lvl.content,
+                    question_image_urls=lvl.question_image_urls,
+                    answer_image_urls=lvl.answer_image_urls,
+                    question_audio_urls=lvl.question_audio_urls,
+                    answer_audio_urls=lvl.answer_audio_urls,
+                )
+                for lvl in levels
+            ],
+        )
+        for card, levels in rows
+    ]
+
+
+def _study_cards(rows) -> dict:
+    reviewed_at = datetime(2026, 10, 19, 12, 30, tzinfo=timezone.utc)
+    return {
+        "cards": [
+            {
+                "id": str(card.id),
+                "deckId": str(card.deck_id),
+                "title": card.title,
+                "type": card.type,
+                "levels": [
+                    {
+                        "levelIndex": lvl.level_index,
+                        "content": lvl.content,
+                        "questionImageUrls": lvl.question_image_urls,
+                        "answerImageUrls": lvl.answer_image_urls,
+                        "questionAudioUrls": lvl.question_audio_urls,
+                        "answerAudioUrls": lvl.answer_audio_urls,
+                        "questionImageSrcsets": None,
+                        "answerImageSrcsets": None,
+                    }
+                    for lvl in levels
+                ],
+                "activeLevel": 0,
+                "activeCardLevelId": str(levels[0].id),
+                "reviewHistory": [
+                    {"rating": "good", "reviewedAt": (reviewed_at - timedelta(days=d)).isoformat()}
+                    for d in range(10)
+                ],
+            }
+            for card, levels in rows
+        ],
+        "deck": {"show_card_title": False},
+    }
+
+
+_SESSION_FIELD = create_model_field(
+    name="Response", type_=list[DeckSessionCard], mode="serialization"
+)
+
+
+def _fastapi_model_response(content) -> bytes:
+    # What the request handler does with a response_model and the default response class
+    body = asyncio.run(
+        serialize_response(field=_SESSION_FIELD, response_content=content, dump_json=True)
+    )
+    return Response(content=body, media_type="application/json").body
+
+
+def _fastapi_dict_response(content) -> bytes:
+    return JSONResponse(asyncio.run(serialize_response(response_content=content))).body
+
+
+def _cpu_ms(fn: Callable[[], Any], repeat: int) -> tuple[float, Any]:
+    result = fn()
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.process_time()
+        result = fn()
+        timings.append((time.process_time() - started) * 1000)
+    return statistics.median(timings), result
+
+
+def run(cards: int, levels: int, repeat: int) -> None:
+    rows = _rows(cards, levels)
+    payloads = [
+        ("session", _session, _fastapi_model_response),
+        ("study-cards", _study_cards, _fastapi_dict_response),
+    ]
+    per_1000 = 1000 / cards
+    print(f"CPU ms per 1000 cards ({levels} levels each), median of {repeat}")
+    for name, build, fastapi_response in payloads:
+        built, content = _cpu_ms(lambda: build(rows), repeat)
+        before, before_body = _cpu_ms(lambda: fastapi_response(content), repeat)
+        after, after_body = _cpu_ms(lambda: FastJSONResponse(content).body, repeat)
+        assert json.loads(before_body) == json.loads(after_body), name
+        print(
+            f"{name:12} {len(after_body) / 1e6:4.1f} MB  build {built * per_1000:6.1f}  "
+            f"+ FastAPI {before * per_1000:6.1f}  vs + FastJSONResponse {after * per_1000:5.1f}  "
+            f"total {(built + before) * per_1000:6.1f} -> {(built + after) * per_1000:6.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--cards", type=int, default=1000)
+    parser.add_argument("--levels", type=int, default=3, help="levels per card")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    run(args.cards, args.levels, args.repeat)
@@ -0,0 +1,115 @@
+"""
+Bytes on the wire and CPU time of compressing a study-cards response, per encoding and level.
+
+The body is /decks/{id}/study-cards for in-memory cards (as built in
+benchmarks/json_responses.py: several levels per card, ten review history
+entries each). For gzip and brotli at several levels it prints the compressed
+size and the median CPU time to compress it once.
+
+It then sends the body through CompressionMiddleware as a GET with the
+configured levels: the first request compresses it (cache miss), the following
+ones hash the body and take the compressed body from the cache (hit). The
+difference is what an unchanged deck saves per request.
+
+Usage (from backend/backend):
+    python -m benchmarks.response_compression --cards 1000 --levels 3
+"""
+
+import argparse
+import asyncio
+import gc
+import gzip
+import statistics
+import time
+from typing import Any, Callable
+
+import brotli
+from benchmarks.json_responses import _rows, _study_cards
+
+from app.api.compression import CompressedBodyCache, CompressionMiddleware
+from app.api.responses import FastJSONResponse
+
+LEVELS = [("gzip", 1), ("gzip", 6), ("gzip", 9), ("br", 1), ("br", 4), ("br", 5), ("br", 11)]
+
+
+def _cpu_ms(fn: Callable[[], Any], repeat: int) -> tuple[float, Any]:
+    result = fn()
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.process_time()
+        result = fn()
+        timings.append((time.process_time() - started) * 1000)
+    return statistics.median(timings), result
+
+
+def _compress(body: bytes, encoding: str, level: int) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, mode=brotli.MODE_TEXT, quality=level)
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def _request(middleware: CompressionMiddleware, encoding: str) -> bytes:
+    """Body sent by the middleware for one GET with Accept-Encoding: encoding."""
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message.get("body", b""))
+
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/api/decks/x/study-cards",
+        "headers": [(b"accept-encoding", encoding.encode())],
+    }
+    asyncio.run(middleware(scope, receive, send))
+    return b"".join(sent)
+
+
+def run(cards: int, levels: int, repeat: int) -> None:
+    body = FastJSONResponse(_study_cards(_rows(cards, levels))).body
+    print(f"study-cards, {cards} cards ({levels} levels each): {len(body) / 1024:,.0f} KB")
+    print(f"CPU ms per response, median of {repeat}")
+    for encoding, level in LEVELS:
+        ms, compressed = _cpu_ms(lambda: _compress(body, encoding, level), repeat)
+        print(
+            f"  {encoding:4} level {level:2}  {len(compressed) / 1024:7,.0f} KB  "
+            f"{len(body) / len(compressed):5.1f}x  {ms:6.1f} ms"
+        )
+
+    # The response's own body ("null") is replaced by the payload
+    async def payload_app(scope, receive, send):
+        async def send_payload(message):
+            if message["type"] == "http.response.body":
+                message = {**message, "body": body}
+            await send(message)
+
+        await FastJSONResponse(None)(scope, receive, send_payload)
+
+    print("CompressionMiddleware (configured levels), CPU ms per request")
+    for encoding in ("gzip", "br"):
+        middleware = CompressionMiddleware(payload_app, cache=CompressedBodyCache(1 << 30))
+        missed = []
+        for _ in range(repeat):
+            middleware.cache.clear()
+            gc.collect()
+            started = time.process_time()
+            _request(middleware, encoding)
+            missed.append((time.process_time() - started) * 1000)
+        hit, sent = _cpu_ms(lambda: _request(middleware, encoding), repeat)
+        print(
+            f"  {encoding:4} level {middleware.level(encoding):2}  {len(sent) / 1024:7,.0f} KB  "
+            f"miss {statistics.median(missed):6.1f} ms  hit {hit:5.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--cards", type=int, default=1000)
+    parser.add_argument("--levels", type=int, default=3, help="levels per card")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    run(args.cards, args.levels, args.repeat)
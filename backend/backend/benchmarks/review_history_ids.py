@@ -0,0 +1,115 @@
+"""
+Insert throughput of uuid4 vs UUIDv7 primary keys on a review-history-shaped table.
+
+Each key kind gets its own scratch table with a UUID primary key and the same
+secondary index as card_review_history. Rows are loaded with COPY in batches, the
+way a steady stream of reviews fills the table, and per-segment throughput is
+reported so the slowdown of random keys as the index outgrows shared_buffers shows up.
+
+Usage (from backend/backend, DATABASE_URL pointing at a scratch database):
+    python -m benchmarks.review_history_ids --rows 10000000
+"""
+
+import argparse
+import io
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine
+
+from app.core.uuid7 import uuid7
+
+_GENERATORS = {"uuid4": uuid.uuid4, "uuid7": uuid7}
+
+
+def _create_table(cursor, table: str) -> None:
+    cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    cursor.execute(f"""
+        CREATE TABLE {table} (
+            id uuid PRIMARY KEY,
+            user_id uuid NOT NULL,
+            card_id uuid NOT NULL,
+            rating smallint NOT NULL,
+            reviewed_at timestamptz NOT NULL
+        )
+        """)
+    cursor.execute(f"CREATE INDEX {table}_user_date ON {table} (user_id, reviewed_at)")
+
+
+def _batch(new_id, users: list[uuid.UUID], card_id: uuid.UUID, start: datetime, size: int):
+    buf = io.StringIO()
+    for i in range(size):
+        reviewed_at = start + timedelta(milliseconds=i)
+        buf.write(f"{new_id()}\t{users[i % len(users)]}\t{card_id}\t{i % 4}\t{reviewed_at}\n")
+    buf.seek(0)
+    return buf
+
+
+def run(database_url: str, rows: int, batch_size: int, segments: int, keep: bool) -> None:
+    engine = create_engine(database_url)
+    users = [uuid.uuid4() for _ in range(1000)]
+    card_id = uuid.uuid4()
+    segment_rows = max(rows // segments, batch_size)
+
+    for kind, new_id in _GENERATORS.items():
+        table = f"bench_review_history_{kind}"
+        raw = engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            _create_table(cursor, table)
+            raw.commit()
+
+            print(f"\n{kind}: {rows:,} rows, batches of {batch_size:,}")
+            start = datetime.now(timezone.utc)
+            loaded = 0
+            total_seconds = 0.0
+            segment_started, segment_loaded = time.perf_counter(), 0
+            while loaded < rows:
+                size = min(batch_size, rows - loaded)
+                buf = _batch(new_id, users, card_id, start + timedelta(seconds=loaded), size)
+                # Id generation is timed too: it is part of the application's insert path
+                cursor.copy_expert(
+                    f"COPY {table} (id, user_id, card_id, rating, reviewed_at) FROM STDIN", buf
+                )
+                raw.commit()
+                loaded += size
+                segment_loaded += size
+
+                if segment_loaded >= segment_rows or loaded == rows:
+                    elapsed = time.perf_counter() - segment_started
+                    total_seconds += elapsed
+                    print(
+                        f"  {loaded:>12,} rows  {segment_loaded / elapsed:>10,.0f} rows/s "
+                        f"(segment)  {loaded / total_seconds:>10,.0f} rows/s (cumulative)"
+                    )
+                    segment_started, segment_loaded = time.perf_counter(), 0
+
+            cursor.execute("SELECT pg_relation_size(%s)", (f"{table}_pkey",))
+            (pkey_bytes,) = cursor.fetchone()
+            print(f"  primary key index: {pkey_bytes / 1024 / 1024:,.1f} MiB")
+
+            if not keep:
+                cursor.execute(f"DROP TABLE {table}")
+                raw.commit()
+        finally:
+            raw.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--segments", type=int, default=10, help="throughput report points")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch tables")
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("DATABASE_URL is not set")
+
+    run(args.database_url, args.rows, args.batch_size, args.segments, args.keep)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Upload latency with and without the bucket check before each upload.
+
+StorageService.upload_file() used to send head_bucket before every put_object;
+the bucket is now checked once and the result cached (ensure_bucket()). Both
+ways are timed against a local S3 stand-in: a threaded HTTP server that answers
+bucket and object requests after --latency-ms, the round trip to a storage
+server on the network. Uploads go through the tuned client of StorageService
+(kept-alive pooled connections), so the difference is the extra round trip.
+
+Usage (from backend/backend):
+    python -m benchmarks.storage_upload --uploads 500 --latency-ms 2
+"""
+
+import argparse
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.core.config import settings
+from app.services.storage_service import FileType, StorageService
+
+
+class _S3StandIn(BaseHTTPRequestHandler):
+    """Accepts HEAD/PUT of buckets and objects and counts requests by method."""
+
+    protocol_version = "HTTP/1.1"
+    latency_s = 0.0
+    requests: dict[str, int] = {}
+    lock = threading.Lock()
+
+    def do_HEAD(self):
+        self._answer()
+
+    def do_PUT(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self._answer()
+
+    def _answer(self):
+        with self.lock:
+            self.requests[self.command] = self.requests.get(self.command, 0) + 1
+        time.sleep(self.latency_s)
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.send_header("ETag", '"0"')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _serve(latency_ms: float) -> ThreadingHTTPServer:
+    _S3StandIn.latency_s = latency_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _S3StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _time_uploads(service: StorageService, uploads: int, check_each: bool) -> list[float]:
+    data = b"\xff\xd8" + b"x" * 50_000
+    timings = []
+    for i in range(uploads):
+        started = time.perf_counter()
+        if check_each:
+            # What upload_file() did before each upload
+            service._ensure_bucket_exists()
+        service.upload_file(data, f"{i}.jpg", "image/jpeg", "benchmark", "question", FileType.IMAGE)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def run(uploads: int, latency_ms: float) -> None:
+    server = _serve(latency_ms)
+    settings.MINIO_ENDPOINT = f"http://127.0.0.1:{server.server_address[1]}"
+    service = StorageService()
+    service.ensure_bucket()
+    # Warm up the connection pool
+    _time_uploads(service, 10, check_each=False)
+
+    for name, check_each in [("head_bucket per upload", True), ("cached bucket check", False)]:
+        _S3StandIn.requests = {}
+        timings = _time_uploads(service, uploads, check_each)
+        per_upload = sum(_S3StandIn.requests.values()) / uploads
+        p95 = statistics.quantiles(timings, n=20)[-1]
+        print(
+            f"{name:24} median {statistics.median(timings):6.2f} ms  p95 {p95:6.2f} ms  "
+            f"{per_upload:.1f} requests/upload"
+        )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--uploads", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="simulated round trip")
+    args = parser.parse_args()
+    run(args.uploads, args.latency_ms)
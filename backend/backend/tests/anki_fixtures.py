@@ -0,0 +1,116 @@
+"""Helpers for building small .apkg packages in tests."""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import zipfile
+from pathlib import Path
+
+BASIC_MODEL_ID = 1342697561419
+
+_SCHEMA = """
+CREATE TABLE col (
+    id integer primary key, crt integer not null, mod integer not null,
+    scm integer not null, ver integer not null, dty integer not null,
+    usn integer not null, ls integer not null, conf text not null,
+    models text not null, decks text not null, dconf text not null, tags text not null
+);
+CREATE TABLE notes (
+    id integer primary key, guid text not null, mid integer not null,
+    mod integer not null, usn integer not null, tags text not null,
+    flds text not null, sfld integer not null, csum integer not null,
+    flags integer not null, data text not null
+);
+CREATE TABLE cards (
+    id integer primary key, nid integer not null, did integer not null,
+    ord integer not null, mod integer not null, usn integer not null,
+    type integer not null, queue integer not null, due integer not null,
+    ivl integer not null, factor integer not null, reps integer not null,
+    lapses integer not null, left integer not null, odue integer not null,
+    odid integer not null, flags integer not null, data text not null
+);
+CREATE TABLE revlog (
+    id integer primary key, cid integer not null, usn integer not null,
+    ease integer not null, ivl integer not null, lastIvl integer not null,
+    factor integer not null, time integer not null, type integer not null
+);
+"""
+
+
+def build_apkg(
+    path: Path,
+    notes: list[tuple[str, str]],
+    media: dict[str, bytes] | None = None,
+    deck_name: str = "Test Deck",
+    db_name: str = "collection.anki21",
+    guids: list[str] | None = None,
+    scheduling: dict[int, dict[str, int]] | None = None,
+    revlog: list[tuple[int, int, int, int, int]] | None = None,
+    collection_created: int = 0,
+) -> Path:
+    """
+    Write an .apkg with one Basic (Front/Back) note and card per (front, back) pair.
+
+    scheduling maps a note's index to its card's type/queue/due/ivl/factor;
+    revlog entries are (review time ms, note index, ease, ivl, answer time ms).
+
+    Returns:
+        Path of the written package
+    """
+    db_path = path.with_suffix(".anki21.tmp")
+    conn = sqlite3.connect(db_path)
+    conn.executescript(_SCHEMA)
+
+    models = {
+        str(BASIC_MODEL_ID): {
+            "id": BASIC_MODEL_ID,
+            "name": "Basic",
+            "flds": [{"name": "Front", "ord": 0}, {"name": "Back", "ord": 1}],
+        }
+    }
+    decks = {"1": {"id": 1, "name": deck_name}}
+    conn.execute(
+        "INSERT INTO col VALUES (1, ?, 0, 0, 11, 0, 0, 0, '{}', ?, ?, '{}', '{}')",
+        (collection_created, json.dumps(models), json.dumps(decks)),
+    )
+    for i, (front, back) in enumerate(notes, start=1):
+        note_id = 1_600_000_000_000 + i
+        guid = guids[i - 1] if guids else f"guid{i}"
+        conn.execute(
+            "INSERT INTO notes VALUES (?, ?, ?, 0, 0, '', ?, ?, 0, 0, '')",
+            (note_id, guid, BASIC_MODEL_ID, f"{front}\x1f{back}", front),
+        )
+        card = {"type": 0, "queue": 0, "due": i, "ivl": 0, "factor": 0}
+        card.update((scheduling or {}).get(i - 1, {}))
+        conn.execute(
+            "INSERT INTO cards VALUES (?, ?, 1, 0, 0, 0, ?, ?, ?, ?, ?, 0, 0, 0, 0, 0, 0, '')",
+            (
+                1_700_000_000_000 + i,
+                note_id,
+                card["type"],
+                card["queue"],
+                card["due"],
+                card["ivl"],
+                card["factor"],
+            ),
+        )
+    for review_id, index, ease, ivl, time_ms in revlog or []:
+        conn.execute(
+            "INSERT INTO revlog VALUES (?, ?, 0, ?, ?, 0, 0, ?, 1)",
+            (review_id, 1_700_000_000_001 + index, ease, ivl, time_ms),
+        )
+    conn.commit()
+    conn.close()
+
+    media = media or {}
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.write(db_path, db_name)
+        if db_name != "collection.anki2":
+            # Newer exports carry a stub legacy collection next to the real one
+            archive.writestr("collection.anki2", b"stub")
+        archive.writestr("media", json.dumps({str(i): name for i, name in enumerate(media)}))
+        for i, content in enumerate(media.values()):
+            archive.writestr(str(i), content)
+    db_path.unlink()
+    return path
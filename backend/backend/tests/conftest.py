@@ -5,6 +5,7 @@ import os
 import uuid
 import uuid as uuid_lib
 import warnings
+from datetime import datetime, timezone
 
 import pytest
 from fastapi.testclient import TestClient
@@ -33,6 +34,7 @@ if "MINIO_BUCKET_NAME" not in os.environ:
 if "MINIO_USE_SSL" not in os.environ:
     os.environ["MINIO_USE_SSL"] = "false"
 
+import app.db.init_db  # noqa: F401 - registers every model, tests may use any of them
 from app.core.security import hash_password
 from app.db.base import Base
 from app.db.session import SessionLocal
@@ -43,6 +45,8 @@ from app.models.study_group import StudyGroup  # noqa: F401 - needed for UserStu
 from app.models.user import User
 from app.models.user_study_group import UserStudyGroup
 from app.models.user_study_group_deck import UserStudyGroupDeck
+from app.services import storage_service as storage_service_module
+from app.services.storage_service import FileType, ObjectHead, PresignedUpload, StoredObject
 
 # Отключаем SQLAlchemy логирование
 for logger_name in (
@@ -57,95 +61,162 @@ for logger_name in (
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
 
-@pytest.fixture(scope="function", autouse=True)
-def mock_storage_service():
-    """Mock StorageService to avoid S3/MinIO connections in tests."""
-    from app.services import storage_service as storage_service_module
-    from app.services.storage_service import FileType
-
-    # Create a mock storage service that doesn't require boto3
-    class MockStorageService:
-        # Image settings
-        IMAGE_ALLOWED_MIME_TYPES = {"image/jpeg", "image/png", "image/webp"}
-        IMAGE_MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
-
-        # Audio settings
-        AUDIO_ALLOWED_MIME_TYPES = {
-            "audio/mpeg",  # mp3
-            "audio/mp4",  # m4a
-            "audio/wav",
-            "audio/webm",
-            "audio/ogg",  # opus
-        }
-        AUDIO_MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
-
-        def validate_file(
-            self,
-            filename: str,
-            content_type: str,
-            file_size: int,
-            file_type: FileType = FileType.IMAGE,
-        ) -> None:
-            """Validate file before upload."""
-            if file_type == FileType.IMAGE:
-                allowed_types = self.IMAGE_ALLOWED_MIME_TYPES
-                max_size = self.IMAGE_MAX_FILE_SIZE
-            else:  # AUDIO
-                allowed_types = self.AUDIO_ALLOWED_MIME_TYPES
-                max_size = self.AUDIO_MAX_FILE_SIZE
-
-            if content_type not in allowed_types:
-                raise ValueError(
-                    f"Invalid file type: {content_type}. " f"Allowed: {', '.join(allowed_types)}"
-                )
-            if file_size > max_size:
-                raise ValueError(
-                    f"File too large: {file_size} bytes. "
-                    f"Max size: {max_size} bytes ({max_size // (1024 * 1024)}MB)"
-                )
-
-        def generate_object_key(
-            self,
-            card_id: str,
-            side: str,
-            file_type: FileType,
-            original_filename: str,
-        ) -> str:
-            """Generate unique object key for uploaded file."""
-            ext = (
-                original_filename.rsplit(".", 1)[-1].lower()
-                if "." in original_filename
-                else ("jpg" if file_type == FileType.IMAGE else "mp3")
+def _extension(filename: str, file_type: FileType) -> str:
+    """Extension of an upload, by file type when the name has none."""
+    if "." in filename:
+        return filename.rsplit(".", 1)[-1].lower()
+    return "jpg" if file_type == FileType.IMAGE else "mp3"
+
+
+def _url_prefix(file_type: FileType) -> str:
+    return "/audio/" if file_type == FileType.AUDIO else "/images/"
+
+
+class MockStorageService:
+    """In-memory StorageService, so tests don't need boto3 or S3/MinIO."""
+
+    # Image settings
+    IMAGE_ALLOWED_MIME_TYPES = {"image/jpeg", "image/png", "image/webp"}
+    IMAGE_MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
+
+    # Audio settings
+    AUDIO_ALLOWED_MIME_TYPES = {
+        "audio/mpeg",  # mp3
+        "audio/mp4",  # m4a
+        "audio/wav",
+        "audio/webm",
+        "audio/ogg",  # opus
+    }
+    AUDIO_MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+
+    DELETE_BATCH_SIZE = 1000
+
+    def __init__(self):
+        # (object_key, data, content_type) of every upload_object() call
+        self.uploaded_objects = []
+        # The bucket: object_key -> StoredObject, their content types and data
+        self.objects = {}
+        self.content_types = {}
+        self.contents = {}
+        # Keys of every delete_objects() request
+        self.delete_requests = []
+        # URLs of every delete_file() call
+        self.deleted_urls = []
+
+    def validate_file(
+        self,
+        filename: str,
+        content_type: str,
+        file_size: int,
+        file_type: FileType = FileType.IMAGE,
+    ) -> None:
+        """Validate file before upload."""
+        if file_type == FileType.IMAGE:
+            allowed_types = self.IMAGE_ALLOWED_MIME_TYPES
+            max_size = self.IMAGE_MAX_FILE_SIZE
+        else:  # AUDIO
+            allowed_types = self.AUDIO_ALLOWED_MIME_TYPES
+            max_size = self.AUDIO_MAX_FILE_SIZE
+
+        if content_type not in allowed_types:
+            raise ValueError(
+                f"Invalid file type: {content_type}. " f"Allowed: {', '.join(allowed_types)}"
             )
-            unique_id = str(uuid.uuid4())
-            type_prefix = "audio" if file_type == FileType.AUDIO else "cards"
-            return f"{type_prefix}/{card_id[:8]}/{card_id}_{side}_{unique_id}.{ext}"
-
-        def upload_file(
-            self,
-            file_data,
-            filename,
-            content_type,
-            card_id,
-            side,
-            file_type: FileType = FileType.IMAGE,
-        ):
-            """Mock upload that returns a fake URL without touching S3."""
-            self.validate_file(filename, content_type, len(file_data), file_type)
-            ext = (
-                filename.rsplit(".", 1)[-1].lower()
-                if "." in filename
-                else "jpg" if file_type == FileType.IMAGE else "mp3"
+        if file_size > max_size:
+            raise ValueError(
+                f"File too large: {file_size} bytes. "
+                f"Max size: {max_size} bytes ({max_size // (1024 * 1024)}MB)"
             )
-            unique_id = str(uuid.uuid4())
-            url_prefix = "/audio/" if file_type == FileType.AUDIO else "/images/"
-            type_prefix = "audio" if file_type == FileType.AUDIO else "cards"
-            return f"{url_prefix}{type_prefix}/{card_id[:8]}/{card_id}_{side}_{unique_id}.{ext}"
 
-        def delete_file(self, object_url):
-            """Mock delete that does nothing."""
-            pass
+    def generate_object_key(
+        self,
+        card_id: str,
+        side: str,
+        file_type: FileType,
+        original_filename: str,
+    ) -> str:
+        """Generate unique object key for uploaded file."""
+        ext = _extension(original_filename, file_type)
+        unique_id = str(uuid.uuid4())
+        type_prefix = "audio" if file_type == FileType.AUDIO else "cards"
+        return f"{type_prefix}/{card_id[:8]}/{card_id}_{side}_{unique_id}.{ext}"
+
+    def upload_file(
+        self,
+        file_data,
+        filename,
+        content_type,
+        card_id,
+        side,
+        file_type: FileType = FileType.IMAGE,
+    ):
+        """Mock upload that returns a fake URL without touching S3."""
+        self.validate_file(filename, content_type, len(file_data), file_type)
+        object_key = self.generate_object_key(card_id, side, file_type, filename)
+        return f"{_url_prefix(file_type)}{object_key}"
+
+    def ensure_bucket(self):
+        """Mock bucket check that does nothing."""
+        pass
+
+    def object_exists(self, object_key):
+        """Mock HEAD against the in-memory bucket."""
+        return object_key in self.objects
+
+    def head_object(self, object_key):
+        """Mock HEAD against the in-memory bucket."""
+        if object_key not in self.objects:
+            return None
+        return ObjectHead(self.objects[object_key].size, self.content_types[object_key])
+
+    def presigned_upload(self, object_key, content_type, size, sha256_b64, expires_in):
+        """Mock presigned PUT; the client's upload is simulated with upload_object()."""
+        return PresignedUpload(
+            f"http://storage.test/card-media/{object_key}?X-Amz-Signature=test",
+            {"Content-Type": content_type, "x-amz-checksum-sha256": sha256_b64},
+            expires_in,
+        )
+
+    def upload_object(self, object_key, file_data, content_type, file_type=FileType.IMAGE):
+        """Mock upload that records the object instead of touching S3."""
+        self.uploaded_objects.append((object_key, file_data, content_type))
+        self.objects[object_key] = StoredObject(
+            object_key, len(file_data), datetime.now(timezone.utc)
+        )
+        self.content_types[object_key] = content_type
+        self.contents[object_key] = file_data
+        return f"{_url_prefix(file_type)}{object_key}"
+
+    def download_object(self, object_key):
+        """Mock GET from the in-memory bucket."""
+        return self.contents.get(object_key)
+
+    def upload_fileobj(self, object_key, fileobj, content_type, file_type=FileType.IMAGE):
+        """Mock streamed upload, recorded like upload_object()."""
+        return self.upload_object(object_key, fileobj.read(), content_type, file_type)
+
+    def delete_file(self, object_url):
+        """Mock delete that records the URL instead of touching S3."""
+        self.deleted_urls.append(object_url)
+
+    def list_objects(self, prefix=""):
+        """Mock ListObjectsV2 over the in-memory bucket, in key order."""
+        for key in sorted(self.objects):
+            if key.startswith(prefix):
+                yield self.objects[key]
+
+    def delete_objects(self, object_keys):
+        """Mock DeleteObjects: missing keys count as deleted, like in S3."""
+        assert len(object_keys) <= self.DELETE_BATCH_SIZE
+        self.delete_requests.append(list(object_keys))
+        for key in object_keys:
+            self.objects.pop(key, None)
+        return []
+
 
+@pytest.fixture(scope="function", autouse=True)
+def mock_storage_service():
+    """Mock StorageService to avoid S3/MinIO connections in tests."""
     # Replace the singleton instance before any code tries to use it
     storage_service_module._storage_service_instance = MockStorageService()
 
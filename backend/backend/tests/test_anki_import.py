@@ -0,0 +1,257 @@
+"""Tests for streaming .apkg parsing and the Anki import endpoint."""
+
+import os
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from tests.anki_fixtures import build_apkg
+
+from app.domain.review.policy import MIN_STABILITY_DAYS
+from app.models.card import Card
+from app.models.card_level import CardLevel
+from app.models.card_progress import CardProgress
+from app.models.card_review_history import CardReviewHistory
+from app.services import storage_service as storage_service_module
+from app.services.anki_media import find_media_refs
+from app.services.anki_parser import ApkgParseError, ApkgParser
+from app.services.import_jobs import ImportWorker
+
+
+@pytest.fixture
+def apkg(tmp_path):
+    notes = [(f"Question {i}", f"Answer {i}") for i in range(25)]
+    media = {"cat.jpg": b"\xff\xd8jpeg-bytes", "hello.mp3": b"ID3mp3-bytes"}
+    return build_apkg(tmp_path / "deck.apkg", notes, media=media, deck_name="Lang::Words")
+
+
+class TestApkgParser:
+    def test_metadata_without_loading_notes(self, apkg):
+        with ApkgParser(apkg) as parser:
+            deck = parser.parse()
+
+        assert deck.name == "Lang::Words"
+        assert (deck.note_count, deck.card_count) == (25, 25)
+        assert set(deck.media_files) == {"cat.jpg", "hello.mp3"}
+
+    def test_notes_and_cards_are_batched(self, apkg):
+        with ApkgParser(apkg, batch_size=10) as parser:
+            note_batches = list(parser.iter_notes())
+            card_batches = list(parser.iter_cards())
+
+        assert [len(b) for b in note_batches] == [10, 10, 5]
+        assert [len(b) for b in card_batches] == [10, 10, 5]
+        assert note_batches[0][0].fields == ["Question 0", "Answer 0"]
+        assert card_batches[0][0].note_id == note_batches[0][0].id
+
+    def test_scheduling_and_revlog_are_streamed(self, tmp_path):
+        path = build_apkg(
+            tmp_path / "scheduled.apkg",
+            [("Q1", "A1"), ("Q2", "A2")],
+            scheduling={0: {"type": 2, "queue": 2, "due": 10, "ivl": 3, "factor": 2500}},
+            revlog=[(1_600_000_000_000, 0, 3, 3, 4000), (1_600_000_001_000, 1, 1, -60, 2000)],
+            collection_created=1_500_000_000,
+        )
+        with ApkgParser(path, batch_size=1) as parser:
+            deck = parser.parse()
+            cards = [c for batch in parser.iter_cards() for c in batch]
+            revlog = [row for batch in parser.iter_revlog() for row in batch]
+
+        assert (deck.review_count, deck.created_at) == (2, 1_500_000_000)
+        assert deck.review_months == [date(2020, 9, 1)]
+        assert (cards[0].note_guid, cards[0].type, cards[0].ivl, cards[0].factor) == (
+            "guid1",
+            2,
+            3,
+            2500,
+        )
+        assert cards[1].type == 0
+        assert revlog == [
+            (1_600_000_000_000, cards[0].id, 3, 3, 4000, 1),
+            (1_600_000_001_000, cards[1].id, 1, -60, 2000, 1),
+        ]
+
+    def test_media_is_read_lazily_by_name(self, apkg):
+        with ApkgParser(apkg) as parser:
+            assert parser.media_size("cat.jpg") == len(b"\xff\xd8jpeg-bytes")
+            assert parser.read_media("hello.mp3") == b"ID3mp3-bytes"
+            assert parser.read_media("missing.png") is None
+
+    def test_prefers_anki21_collection_over_legacy_stub(self, apkg):
+        # build_apkg writes a non-SQLite collection.anki2 stub next to the real database
+        with ApkgParser(apkg) as parser:
+            assert parser.parse().note_count == 25
+
+    def test_temp_files_are_removed_on_close(self, apkg):
+        parser = ApkgParser(apkg)
+        parser.parse()
+        tmp_dir = parser._tmp_dir
+        parser.close()
+
+        assert not os.path.exists(tmp_dir)
+
+    def test_invalid_zip(self, tmp_path):
+        bad = tmp_path / "bad.apkg"
+        bad.write_bytes(b"not a zip")
+
+        with pytest.raises(ApkgParseError):
+            ApkgParser(bad).parse()
+
+
+def _import(client: TestClient, auth_headers, path, deck_id=None) -> dict:
+    """Submit an import job, run the worker until the queue is empty and return the job."""
+    with open(path, "rb") as f:
+        response = client.post(
+            "/api/decks/import-anki" + (f"?deck_id={deck_id}" if deck_id else ""),
+            headers=auth_headers,
+            files={"file": (path.name, f, "application/octet-stream")},
+        )
+    assert response.status_code == 202, response.text
+
+    worker = ImportWorker(poll_interval_s=0)
+    while worker.run_once():
+        pass
+
+    response = client.get(f"/api/imports/{response.json()['job_id']}", headers=auth_headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_import_endpoint_creates_cards(client: TestClient, auth_headers, db, apkg):
+    job = _import(client, auth_headers, apkg)
+
+    assert job["status"] == "done", job
+    assert job["cards_created"] == 25
+    assert job["deck_title"] == "Words"
+
+    cards = db.query(Card).filter(Card.deck_id == job["deck_id"]).all()
+    assert len(cards) == 25
+    level = db.query(CardLevel).filter(CardLevel.card_id == cards[0].id).one()
+    assert level.content["question"].startswith("Question")
+
+
+def test_import_preserves_special_characters(client: TestClient, auth_headers, db, tmp_path):
+    # Tabs, newlines and backslashes must survive the COPY text encoding
+    front = 'Tab\there<br>C:\\path "quoted" \\N'
+    back = "Back\nline &amp; ünïcödé"
+    job = _import(client, auth_headers, build_apkg(tmp_path / "special.apkg", [(front, back)]))
+
+    assert job["status"] == "done", job
+    card = db.query(Card).filter(Card.deck_id == job["deck_id"]).one()
+    level = db.query(CardLevel).filter(CardLevel.card_id == card.id).one()
+    assert level.content == {
+        "question": 'Tab\there\nC:\\path "quoted" \\N',
+        "answer": "Back\nline & ünïcödé",
+    }
+    assert card.title == 'Tab\there\nC:\\path "quoted" \\N'
+    assert card.type == "flashcard"
+
+
+def test_import_brings_review_history_and_progress(
+    client: TestClient, auth_headers, db, test_user, tmp_path
+):
+    crt = 1_600_000_000  # 2020-09-13 12:26:40 UTC
+    path = build_apkg(
+        tmp_path / "scheduled.apkg",
+        [("Review card", "A"), ("Learning card", "B"), ("New card", "C")],
+        scheduling={
+            0: {"type": 2, "queue": 2, "due": 100, "ivl": 30, "factor": 2020},
+            1: {"type": 1, "queue": 1, "due": 1_700_000_000, "ivl": 0, "factor": 0},
+        },
+        revlog=[
+            (1_600_000_000_000, 0, 1, -600, 5000),
+            (1_600_000_100_000, 0, 3, 30, 8000),
+            (1_600_000_200_000, 1, 2, -60, 3000),
+            (1_600_000_300_000, 0, 0, 40, 0),  # manual reschedule, not a review
+        ],
+        collection_created=crt,
+    )
+
+    job = _import(client, auth_headers, path)
+
+    assert job["status"] == "done", job
+    assert job["reviews_imported"] == 3
+    cards = {c.title: c for c in db.query(Card).filter(Card.deck_id == job["deck_id"])}
+
+    history = (
+        db.query(CardReviewHistory)
+        .filter(CardReviewHistory.card_id == cards["Review card"].id)
+        .order_by(CardReviewHistory.reviewed_at)
+        .all()
+    )
+    assert [(h.rating, h.interval_minutes) for h in history] == [("again", 10), ("good", 43200)]
+    assert history[1].reviewed_at == datetime.fromtimestamp(1_600_000_100, tz=timezone.utc)
+    assert history[1].reviewed_at - history[1].show_at == timedelta(seconds=8)
+    assert history[1].id.version == 7
+    # In the month's partition, created before the import's transaction
+    partitions = db.execute(
+        text(
+            "SELECT DISTINCT tableoid::regclass::text FROM card_review_history WHERE user_id = :u"
+        ),
+        {"u": test_user.id},
+    ).scalars()
+    assert list(partitions) == ["card_review_history_p2020_09"]
+
+    progress = {
+        p.card_id: p for p in db.query(CardProgress).filter(CardProgress.user_id == test_user.id)
+    }
+    review = progress[cards["Review card"].id]
+    assert (review.stability, review.difficulty, review.is_active) == (30, 7.0, True)
+    assert review.next_review == datetime.fromtimestamp(crt, tz=timezone.utc) + timedelta(days=100)
+    assert review.last_reviewed == history[1].reviewed_at
+
+    learning = progress[cards["Learning card"].id]
+    assert (learning.stability, learning.difficulty) == (MIN_STABILITY_DAYS, 5.0)
+    assert learning.next_review == datetime.fromtimestamp(1_700_000_000, tz=timezone.utc)
+    assert cards["New card"].id not in progress
+
+    # Importing the same log into the same deck again adds nothing
+    again = _import(client, auth_headers, path, deck_id=job["deck_id"])
+    assert again["status"] == "done", again
+    assert (again["reviews_imported"], again["cards_updated"]) == (0, 0)
+    assert (
+        db.query(CardReviewHistory).filter(CardReviewHistory.user_id == test_user.id).count() == 3
+    )
+
+
+def test_find_media_refs():
+    field = (
+        "<img src=\"cat.jpg\"><IMG class=x src='dog &amp; co.png'> <img src=cat.jpg>"
+        '<img src="https://example.com/remote.png"> [sound:hello.mp3][sound:hello.mp3]'
+    )
+
+    assert find_media_refs(field) == (["cat.jpg", "dog & co.png"], ["hello.mp3"])
+    assert find_media_refs("plain text") == ([], [])
+
+
+def test_import_uploads_each_media_file_once(client: TestClient, auth_headers, db, tmp_path):
+    notes = [
+        ('Cat <img src="cat.jpg">', "[sound:hello.mp3] meow"),
+        ('Another cat <img src="cat.jpg">', 'Answer <img src="missing.png">'),
+        ('Animated <img src="anim.gif">', "[sound:hello.mp3]"),
+    ]
+    media = {"cat.jpg": b"\xff\xd8jpeg-bytes", "hello.mp3": b"ID3mp3-bytes", "anim.gif": b"GIF8"}
+    job = _import(client, auth_headers, build_apkg(tmp_path / "media.apkg", notes, media=media))
+
+    assert job["status"] == "done", job
+    uploaded = storage_service_module._storage_service_instance.uploaded_objects
+    assert sorted(data for _, data, _ in uploaded) == [b"ID3mp3-bytes", b"\xff\xd8jpeg-bytes"]
+    assert len(job["warnings"]) == 2
+    assert "'missing.png' is missing" in job["warnings"][0] + job["warnings"][1]
+
+    levels = (
+        db.query(CardLevel)
+        .join(Card, Card.id == CardLevel.card_id)
+        .filter(Card.deck_id == job["deck_id"])
+        .order_by(Card.title)
+        .all()
+    )
+    animated, another, cat = levels
+    assert cat.content == {"question": "Cat", "answer": "meow"}
+    assert cat.question_image_urls == another.question_image_urls
+    assert cat.question_image_urls[0].startswith("/images/cards/media/")
+    assert cat.answer_audio_urls == animated.answer_audio_urls
+    assert cat.answer_audio_urls[0].startswith("/audio/audio/media/")
+    assert another.answer_image_urls is None
+    assert animated.question_image_urls is None
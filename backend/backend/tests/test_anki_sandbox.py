@@ -0,0 +1,101 @@
+"""Tests for parsing Anki packages in the sandboxed process pool."""
+
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from tests.anki_fixtures import build_apkg
+from tests.test_anki_import import _import
+
+from app.services import anki_sandbox
+from app.services.anki_sandbox import SandboxedApkg, SandboxLimitExceeded, SandboxPool
+
+_MB = 1024 * 1024
+
+
+@pytest.fixture
+def pool():
+    pool = SandboxPool(workers=1)
+    yield pool
+    pool.shutdown()
+
+
+def _read_all(package: SandboxedApkg) -> tuple:
+    batches = list(package.iter_prepared(batch_size=10))
+    return (
+        package.parse().note_count,
+        batches,
+        # Resuming after the first batch
+        list(package.iter_prepared(batch_size=10, after_id=batches[0].last_note_id)),
+        package.note_guids(),
+        list(package.iter_cards(batch_size=10)),
+        list(package.iter_revlog(batch_size=1)),
+    )
+
+
+def test_isolated_package_reads_like_in_process(tmp_path, pool):
+    notes = [(f"<b>Question</b> {i}", f'Answer <img src="{i}.png">') for i in range(25)]
+    notes[3] = ("", "No question")
+    path = build_apkg(
+        tmp_path / "deck.apkg",
+        notes,
+        scheduling={0: {"type": 2, "queue": 2, "due": 10, "ivl": 3, "factor": 2500}},
+        revlog=[(1_600_000_000_000, 0, 3, 3, 4000), (1_600_000_001_000, 1, 1, -60, 2000)],
+    )
+
+    with SandboxedApkg(path, pool=pool, isolated=True) as package:
+        isolated = _read_all(package)
+    with SandboxedApkg(path, isolated=False) as package:
+        in_process = _read_all(package)
+
+    assert isolated == in_process
+    note_count, batches, resumed, guids, cards, revlog = isolated
+    assert [(b.notes, b.skipped) for b in batches] == [(10, 1), (10, 0), (5, 0)]
+    assert batches[0].prepared[0].question == "Question 0"
+    assert batches[0].prepared[0].answer_media == (["0.png"], [])
+    assert [b.notes for b in resumed] == [10, 5]
+    assert len(guids) == note_count == 25
+    assert [len(c) for c in cards] == [10, 10, 5]
+    assert len(revlog) == 2
+
+
+def test_memory_limit(pool):
+    pool.memory_mb = 512
+    with pytest.raises(SandboxLimitExceeded, match="more than 512 MB"):
+        pool.result(pool.submit(bytearray, 1024 * _MB))
+    assert pool.result(pool.submit(len, "abc")) == 3
+
+
+def test_cpu_time_limit_kills_the_worker(pool):
+    pool.cpu_seconds = 1
+    with pytest.raises(SandboxLimitExceeded, match="CPU time"):
+        pool.result(pool.submit(sum, range(10**12)))
+    # A new pool takes over
+    assert pool.result(pool.submit(len, "abc")) == 3
+
+
+def test_wall_clock_limit_kills_the_worker(pool):
+    pool.timeout_s = 0.5
+    started = time.monotonic()
+    with pytest.raises(SandboxLimitExceeded, match="longer than 0.5 s"):
+        pool.result(pool.submit(time.sleep, 30))
+    assert time.monotonic() - started < 10
+    assert pool.result(pool.submit(len, "abc")) == 3
+
+
+def test_import_of_oversized_collection_fails(
+    client: TestClient, auth_headers, tmp_path, monkeypatch
+):
+    # The extracted collection is written by a worker that may not write files over 1 MB
+    pool = SandboxPool(workers=1, max_file_mb=1)
+    monkeypatch.setattr(anki_sandbox, "sandbox_pool", pool)
+    path = build_apkg(tmp_path / "big.apkg", [("Q" * (2 * _MB), "A")])
+
+    try:
+        job = _import(client, auth_headers, path)
+    finally:
+        pool.shutdown()
+
+    assert job["status"] == "failed", job
+    assert job["error"] == "Invalid .apkg file: the collection is larger than 1 MB"
+    assert job["deck_id"] is None
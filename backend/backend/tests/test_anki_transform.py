@@ -0,0 +1,83 @@
+"""Golden tests for the HTML cleanup of imported Anki fields."""
+
+import pytest
+
+from app.services.anki_parser import AnkiNote
+from app.services.anki_transform import clean_fields, clean_html, prepare_notes
+
+# Output of the original per-field cleaner, kept as is
+GOLDEN = [
+    ("", ""),
+    ("Plain text", "Plain text"),
+    ("  padded  ", "padded"),
+    ("<b>Bold</b> and <i>italic</i>", "Bold and italic"),
+    ("line one<br>line two<BR/>line three<br />four", "line one\nline two\nline three\nfour"),
+    ("<div>first</div><div>second</div>", "first\nsecond"),
+    ("<p>para</p><P>Para</P >", "para\nPara"),
+    ("<ul><li>one</li><LI>two</li></ul>", "• one• two"),
+    ("<div><br></div><div><br></div><div><br></div>text", "text"),
+    ("a\n\n\n\nb", "a\n\nb"),
+    ("[sound:hello.mp3]Hello [sound:a b.ogg]", "Hello"),
+    ("[SOUND:kept.mp3]", "[SOUND:kept.mp3]"),
+    ("before<!-- a comment <br> with > inside -->after", "beforeafter"),
+    ("<!--\nmultiline\n-->x", "x"),
+    ('<img src="cat.jpg">Cat', "Cat"),
+    ('<span style="color: rgb(0, 0, 0);">styled</span>', "styled"),
+    ("&lt;tag&gt; &amp; &quot;q&quot; &#39;s&#39;", "<tag> & \"q\" 's'"),
+    ("voiture&nbsp;(f)", "voiture (f)"),
+    ("&amp;lt; stays escaped once", "&lt; stays escaped once"),
+    ("x &lt; y<br>y &gt; z", "x < y\ny > z"),
+    ("x < y<br>z", "x < y\nz"),
+    ("x < y > z", "x  z"),
+    ("AT&T and a & b", "AT&T and a & b"),
+    ("unclosed <b", "unclosed <b"),
+    ("<b>Question</b> 1<br>line two", "Question 1\nline two"),
+    ('Tab\there<br>C:\\path "quoted" \\N', 'Tab\there\nC:\\path "quoted" \\N'),
+    ("Back\nline &amp; ünïcödé", "Back\nline & ünïcödé"),
+]
+
+# Entities beyond the few the original cleaner knew
+ENTITIES = [
+    ("caf&eacute; &mdash; &euro;5", "café — €5"),
+    ("&#233;&#xE9;&#XE9;", "ééé"),
+    ("a&#160;b&#xa0;c", "a b c"),
+    ("&unknown; &amp", "&unknown; &amp"),
+    ("&#31;", ""),
+]
+
+
+@pytest.mark.parametrize("field,expected", GOLDEN + ENTITIES)
+def test_clean_html(field, expected):
+    assert clean_html(field) == expected
+
+
+def test_batch_matches_fields_cleaned_one_by_one():
+    fields = [field for field, _ in GOLDEN + ENTITIES]
+
+    assert clean_fields(fields) == [expected for _, expected in GOLDEN + ENTITIES]
+    # Markup split over two fields stays in its fields
+    assert clean_fields(["a <b", "c> d", "<br", ">"]) == ["a <b", "c> d", "<br", ">"]
+
+
+def test_separator_inside_a_field():
+    assert clean_fields(["<b>a\x1fb</b>", "<i>c</i>"]) == ["a\x1fb", "c"]
+
+
+def test_prepare_notes_cleans_the_batch():
+    notes = [
+        AnkiNote(
+            id=1, fields=["<b>Q1</b>", "A1&nbsp;<br>[sound:a.mp3]"], tags=[], model_id=0, guid="g1"
+        ),
+        AnkiNote(id=2, fields=["", "no question"], tags=[], model_id=0, guid="g2"),
+        AnkiNote(id=3, fields=['Q3 <img src="c.jpg">', "A3"], tags=[], model_id=0, guid="g3"),
+    ]
+
+    batch = prepare_notes(notes, models={})
+
+    assert (batch.last_note_id, batch.notes, batch.skipped) == (3, 3, 1)
+    assert [(n.guid, n.question, n.answer) for n in batch.prepared] == [
+        ("g1", "Q1", "A1"),
+        ("g3", "Q3", "A3"),
+    ]
+    assert batch.prepared[0].answer_media == ([], ["a.mp3"])
+    assert batch.prepared[1].question_media == (["c.jpg"], [])
@@ -0,0 +1,240 @@
+"""Tests for compact re-encoding of card audio."""
+
+import hashlib
+import io
+import math
+import struct
+import uuid
+import wave
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.card import Card
+from app.models.card_level import CardLevel
+from app.models.media_object import MediaObject
+from app.services import storage_service as storage_service_module
+from app.services.audio_transcode import (
+    AudioTranscodeError,
+    TranscodedAudio,
+    find_ffmpeg,
+    process_pending_audio,
+    relink_transcoded_audio,
+    transcode_audio,
+)
+
+
+@pytest.fixture(autouse=True)
+def no_pending_media(db):
+    """Media stored by other tests are not waiting for processing."""
+    db.execute(text("UPDATE media_objects SET variants = '[]' WHERE variants IS NULL"))
+    db.commit()
+
+
+@pytest.fixture(scope="function")
+def test_card(db, test_deck):
+    card = Card(deck_id=test_deck.id, title="Audio Card", type="flashcard", max_level=1)
+    db.add(card)
+    db.flush()
+    for i in range(2):
+        db.add(CardLevel(card_id=card.id, level_index=i, content={"question": "q", "answer": "a"}))
+    db.commit()
+    return card
+
+
+def _storage():
+    return storage_service_module._storage_service_instance
+
+
+def _compact(data: bytes) -> TranscodedAudio:
+    return TranscodedAudio(b"webm" + hashlib.sha256(data).digest(), 1500, 2000)
+
+
+def _media(db, data: bytes) -> MediaObject:
+    db.expire_all()
+    return db.get(MediaObject, hashlib.sha256(data).hexdigest())
+
+
+def _upload(client, auth_headers, card_id, level_index, data: bytes, side="question") -> list:
+    response = client.post(
+        f"/api/cards/{card_id}/levels/{level_index}/{side}-audio",
+        headers=auth_headers,
+        files={"file": ("word.wav", io.BytesIO(data), "audio/wav")},
+    )
+    assert response.status_code == 200, response.text
+    return response.json()[f"{side}_audio_urls"]
+
+
+def _level(db, card, level_index) -> CardLevel:
+    db.expire_all()
+    return db.query(CardLevel).filter_by(card_id=card.id, level_index=level_index).one()
+
+
+def test_levels_are_relinked_to_the_compact_version(
+    client: TestClient, auth_headers, db, test_card
+):
+    word, phrase = uuid.uuid4().bytes * 100, uuid.uuid4().bytes * 100
+    _upload(client, auth_headers, test_card.id, 0, word)
+    _upload(client, auth_headers, test_card.id, 0, phrase)
+    _upload(client, auth_headers, test_card.id, 1, word, side="answer")
+
+    assert process_pending_audio(db, transcode=_compact) == 2
+    assert relink_transcoded_audio(db) == 2
+
+    compact_word, compact_phrase = _compact(word).data, _compact(phrase).data
+    word_url = "/audio/" + _media(db, compact_word).object_key
+    phrase_url = "/audio/" + _media(db, compact_phrase).object_key
+    assert word_url.startswith("/audio/audio/media/") and word_url.endswith(".webm")
+    assert _level(db, test_card, 0).question_audio_urls == [word_url, phrase_url]
+    assert _level(db, test_card, 1).answer_audio_urls == [word_url]
+
+    original, compact = _media(db, word), _media(db, compact_word)
+    assert original.transcoded_sha256 == compact.sha256
+    assert (original.ref_count, compact.ref_count) == (0, 2)
+    assert (original.duration_ms, compact.duration_ms) == (2000, 1500)
+    assert compact.content_type == "audio/webm"
+    assert compact.variants == []
+    assert _storage().contents[compact.object_key] == compact_word
+
+    # Nothing left to do
+    assert process_pending_audio(db, transcode=_compact) == 0
+    assert relink_transcoded_audio(db) == 0
+
+
+def test_links_made_after_transcoding_are_relinked(client: TestClient, auth_headers, db, test_card):
+    data = uuid.uuid4().bytes * 100
+    _upload(client, auth_headers, test_card.id, 0, data)
+    process_pending_audio(db, transcode=_compact)
+    relink_transcoded_audio(db)
+
+    # The same content again: the known original is linked, next to a legacy URL
+    level = _level(db, test_card, 1)
+    level.answer_audio_urls = ["/audio/audio/abcd1234/legacy.mp3"]
+    db.commit()
+    _upload(client, auth_headers, test_card.id, 1, data, side="answer")
+    assert relink_transcoded_audio(db) == 1
+
+    compact_url = "/audio/" + _media(db, _compact(data).data).object_key
+    assert _level(db, test_card, 1).answer_audio_urls == [
+        "/audio/audio/abcd1234/legacy.mp3",
+        compact_url,
+    ]
+    assert _media(db, _compact(data).data).ref_count == 2
+
+
+def test_larger_output_is_not_kept(client: TestClient, auth_headers, db, test_card):
+    data = uuid.uuid4().bytes
+    urls = _upload(client, auth_headers, test_card.id, 0, data)
+
+    process_pending_audio(db, transcode=lambda d: TranscodedAudio(d * 2, 900, 1000))
+
+    media = _media(db, data)
+    assert media.transcoded_sha256 is None
+    assert media.duration_ms == 1000
+    assert relink_transcoded_audio(db) == 0
+    assert _level(db, test_card, 0).question_audio_urls == urls
+
+
+def test_failed_transcoding_keeps_the_original(client: TestClient, auth_headers, db, test_card):
+    data = uuid.uuid4().bytes * 100
+    _upload(client, auth_headers, test_card.id, 0, data)
+
+    def fail(_):
+        raise AudioTranscodeError("ffmpeg failed")
+
+    assert process_pending_audio(db, transcode=fail) == 1
+
+    media = _media(db, data)
+    assert media.variants == []
+    assert media.transcoded_sha256 is None
+    assert process_pending_audio(db, transcode=_compact) == 0
+
+
+def test_audio_waits_without_ffmpeg(client: TestClient, auth_headers, db, test_card, monkeypatch):
+    data = uuid.uuid4().bytes * 100
+    _upload(client, auth_headers, test_card.id, 0, data)
+    monkeypatch.setattr(settings, "FFMPEG_PATH", "/nonexistent/ffmpeg")
+
+    assert process_pending_audio(db) == 0
+
+    assert _media(db, data).variants is None
+
+
+def test_rows_are_not_locked_while_transcoding(client: TestClient, auth_headers, db, test_card):
+    data = uuid.uuid4().bytes * 100
+    _upload(client, auth_headers, test_card.id, 0, data)
+    digest = hashlib.sha256(data).hexdigest()
+
+    def transcode_and_link(source):
+        # Levels linking the same content update its reference count meanwhile
+        with SessionLocal() as other:
+            other.execute(text("SET LOCAL lock_timeout = '1s'"))
+            other.execute(
+                text("UPDATE media_objects SET ref_count = ref_count + 1 WHERE sha256 = :d"),
+                {"d": digest},
+            )
+            other.commit()
+        return _compact(source)
+
+    assert process_pending_audio(db, transcode=transcode_and_link) == 1
+
+    media = _media(db, data)
+    assert (media.ref_count, media.claimed_at) == (2, None)
+    assert media.transcoded_sha256 is not None
+
+
+def test_failed_batch_is_released(client: TestClient, auth_headers, db, test_card, monkeypatch):
+    data = uuid.uuid4().bytes * 100
+    _upload(client, auth_headers, test_card.id, 0, data)
+
+    def unavailable(object_key):
+        raise ConnectionError("storage unavailable")
+
+    monkeypatch.setattr(_storage(), "download_object", unavailable)
+
+    with pytest.raises(ConnectionError):
+        process_pending_audio(db, transcode=_compact)
+
+    assert _media(db, data).claimed_at is None
+    monkeypatch.undo()
+    assert process_pending_audio(db, transcode=_compact) == 1
+
+
+def _wav(segments) -> bytes:
+    """16 kHz mono WAV of (seconds, frequency) segments; frequency 0 is silence."""
+    out = io.BytesIO()
+    with wave.open(out, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(16000)
+        for seconds, frequency in segments:
+            f.writeframes(
+                b"".join(
+                    struct.pack("<h", int(12000 * math.sin(2 * math.pi * frequency * i / 16000)))
+                    for i in range(int(seconds * 16000))
+                )
+            )
+    return out.getvalue()
+
+
+@pytest.mark.skipif(find_ffmpeg() is None, reason="ffmpeg is not installed")
+def test_ffmpeg_trims_and_compresses():
+    data = _wav([(0.5, 0), (1.0, 440), (0.5, 0)])
+
+    audio = transcode_audio(data, find_ffmpeg())
+
+    # WebM (EBML header), far smaller than the WAV
+    assert audio.data[:4] == b"\x1a\x45\xdf\xa3"
+    assert len(audio.data) < len(data) / 5
+    assert audio.source_duration_ms == 2000
+    assert 900 <= audio.duration_ms <= 1100
+    # Same input, same bytes: the compact version is content-addressed
+    assert transcode_audio(data, find_ffmpeg()).data == audio.data
+
+    with pytest.raises(AudioTranscodeError):
+        transcode_audio(_wav([(1.0, 0)]), find_ffmpeg())
+    with pytest.raises(AudioTranscodeError):
+        transcode_audio(b"not audio", find_ffmpeg())
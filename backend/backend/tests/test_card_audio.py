@@ -102,13 +102,13 @@ class TestLevelAudioUpload:
         self, client: TestClient, test_card, auth_headers
     ):
         """Test that different levels can have different audio files."""
-        audio_data = b"ID3" + b"\x00" * 100 + b"fake_audio_data" * 500
-
         # Upload to level 0
         response1 = client.post(
             f"/api/cards/{test_card.id}/levels/0/question-audio",
             headers=auth_headers,
-            files={"file": ("test1.mp3", BytesIO(audio_data), "audio/mpeg")},
+            files={
+                "file": ("test1.mp3", BytesIO(b"ID3" + b"fake_audio_data_1" * 500), "audio/mpeg")
+            },
         )
         assert response1.status_code == 200
         url1 = response1.json()["question_audio_urls"][0]
@@ -117,7 +117,9 @@ class TestLevelAudioUpload:
         response2 = client.post(
             f"/api/cards/{test_card.id}/levels/1/question-audio",
             headers=auth_headers,
-            files={"file": ("test2.mp3", BytesIO(audio_data), "audio/mpeg")},
+            files={
+                "file": ("test2.mp3", BytesIO(b"ID3" + b"fake_audio_data_2" * 500), "audio/mpeg")
+            },
         )
         assert response2.status_code == 200
         url2 = response2.json()["question_audio_urls"][0]
@@ -135,13 +135,12 @@ class TestLevelImageUpload:
         self, client: TestClient, test_card, auth_headers
     ):
         """Test that different levels can have different images."""
-        image_data = b"fake_image_data" * 1000
 
         # Upload to level 0
         response1 = client.post(
             f"/api/cards/{test_card.id}/levels/0/question-image",
             headers=auth_headers,
-            files={"file": ("test1.jpg", BytesIO(image_data), "image/jpeg")},
+            files={"file": ("test1.jpg", BytesIO(b"fake_image_data_1" * 1000), "image/jpeg")},
         )
         assert response1.status_code == 200
         url1 = response1.json()["question_image_urls"][0]
@@ -150,7 +149,7 @@ class TestLevelImageUpload:
         response2 = client.post(
             f"/api/cards/{test_card.id}/levels/1/question-image",
             headers=auth_headers,
-            files={"file": ("test2.jpg", BytesIO(image_data), "image/jpeg")},
+            files={"file": ("test2.jpg", BytesIO(b"fake_image_data_2" * 1000), "image/jpeg")},
         )
         assert response2.status_code == 200
         url2 = response2.json()["question_image_urls"][0]
@@ -385,14 +384,13 @@ class TestMCQOptionImageUpload:
         self, client: TestClient, test_mcq_card, auth_headers
     ):
         """Test that uploading a new image replaces the old one."""
-        image_data = b"fake_image_data" * 1000
 
         # Upload first image
         response1 = client.post(
             f"/api/cards/{test_mcq_card.id}/option-image",
             headers=auth_headers,
             data={"option_id": "opt1"},
-            files={"file": ("test1.jpg", BytesIO(image_data), "image/jpeg")},
+            files={"file": ("test1.jpg", BytesIO(b"fake_image_data_1" * 1000), "image/jpeg")},
         )
         assert response1.status_code == 200
         url1 = response1.json()["content"]["options"][0]["image_url"]
@@ -402,7 +400,7 @@ class TestMCQOptionImageUpload:
             f"/api/cards/{test_mcq_card.id}/option-image",
             headers=auth_headers,
             data={"option_id": "opt1"},
-            files={"file": ("test2.jpg", BytesIO(image_data), "image/jpeg")},
+            files={"file": ("test2.jpg", BytesIO(b"fake_image_data_2" * 1000), "image/jpeg")},
         )
         assert response2.status_code == 200
         url2 = response2.json()["content"]["options"][0]["image_url"]
@@ -414,14 +412,13 @@ class TestMCQOptionImageUpload:
         self, client: TestClient, test_mcq_card, auth_headers
     ):
         """Test that different options can have different images."""
-        image_data = b"fake_image_data" * 1000
 
         # Upload to opt1
         response1 = client.post(
             f"/api/cards/{test_mcq_card.id}/option-image",
             headers=auth_headers,
             data={"option_id": "opt1"},
-            files={"file": ("test1.jpg", BytesIO(image_data), "image/jpeg")},
+            files={"file": ("test1.jpg", BytesIO(b"fake_image_data_1" * 1000), "image/jpeg")},
         )
         assert response1.status_code == 200
         url1 = response1.json()["content"]["options"][0]["image_url"]
@@ -431,7 +428,7 @@ class TestMCQOptionImageUpload:
             f"/api/cards/{test_mcq_card.id}/option-image",
             headers=auth_headers,
             data={"option_id": "opt2"},
-            files={"file": ("test2.jpg", BytesIO(image_data), "image/jpeg")},
+            files={"file": ("test2.jpg", BytesIO(b"fake_image_data_2" * 1000), "image/jpeg")},
         )
         assert response2.status_code == 200
 
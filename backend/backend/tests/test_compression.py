@@ -0,0 +1,147 @@
+"""Tests for negotiated response compression and the compressed body cache."""
+
+import asyncio
+import gzip
+
+import brotli
+import pytest
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.responses import StreamingResponse
+from starlette.routing import Route
+
+from app.api.compression import (
+    CompressedBodyCache,
+    CompressionMiddleware,
+    compressed_body_cache,
+    negotiate_encoding,
+)
+from app.models.card import Card
+from app.models.card_level import CardLevel
+
+
+@pytest.fixture(scope="function")
+def study_cards_url(db, test_deck) -> str:
+    for i in range(20):
+        card = Card(deck_id=test_deck.id, title=f"Katze {i}", type="flashcard", max_level=1)
+        db.add(card)
+        db.flush()
+        for n in range(2):
+            content = {"question": f"Как по-немецки «кошка»? {i}", "answer": "die Katze"}
+            db.add(CardLevel(card_id=card.id, level_index=n, content=content))
+    db.commit()
+    return f"/api/decks/{test_deck.id}/study-cards?mode=ordered"
+
+
+def _get(client: TestClient, url: str, headers: dict, encoding: str):
+    # The raw body, as sent: httpx would decode it
+    with client.stream("GET", url, headers={**headers, "Accept-Encoding": encoding}) as response:
+        return response, b"".join(response.iter_raw())
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, expected",
+    [
+        ("gzip, deflate, br", "br"),
+        ("gzip", "gzip"),
+        ("br;q=0.5, gzip", "gzip"),
+        ("br;q=0, gzip;q=0", None),
+        ("*", "br"),
+        ("*;q=0.1, gzip;q=0.5", "gzip"),
+        ("identity, deflate", None),
+        ("", None),
+    ],
+)
+def test_negotiate_encoding(accept_encoding, expected):
+    assert negotiate_encoding(accept_encoding) == expected
+
+
+@pytest.mark.parametrize(
+    "encoding, decompress", [("br", brotli.decompress), ("gzip", gzip.decompress)]
+)
+def test_study_cards_are_compressed(
+    client: TestClient, auth_headers, study_cards_url, encoding, decompress
+):
+    identity, body = _get(client, study_cards_url, auth_headers, "identity")
+    response, compressed = _get(client, study_cards_url, auth_headers, encoding)
+
+    assert response.status_code == 200
+    assert "content-encoding" not in identity.headers
+    assert response.headers["content-encoding"] == encoding
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert "Accept-Encoding" in identity.headers["vary"]
+    assert int(response.headers["content-length"]) == len(compressed) < len(body) // 4
+    assert decompress(compressed) == body
+    assert response.headers["etag"] == identity.headers["etag"]
+    assert response.headers["etag"].startswith('W/"')
+
+
+def test_small_responses_are_sent_as_they_are(client: TestClient):
+    response, body = _get(client, "/health", {}, "br, gzip")
+
+    assert "content-encoding" not in response.headers
+    assert body == b'{"status":"ok"}'
+
+
+def test_compressed_body_is_cached_by_etag(client: TestClient, auth_headers, study_cards_url):
+    compressed_body_cache.clear()
+    hits = compressed_body_cache.hits
+
+    first, first_body = _get(client, study_cards_url, auth_headers, "br")
+    second, second_body = _get(client, study_cards_url, auth_headers, "br")
+
+    assert second_body == first_body
+    assert compressed_body_cache.hits == hits + 1
+    assert compressed_body_cache.metrics()["entries"] == 1
+
+    # The gzip body is a different entry
+    _get(client, study_cards_url, auth_headers, "gzip")
+    assert compressed_body_cache.metrics()["entries"] == 2
+
+
+def test_matching_etag_gets_not_modified(client: TestClient, auth_headers, study_cards_url):
+    response, _ = _get(client, study_cards_url, auth_headers, "br")
+    etag = response.headers["etag"]
+
+    not_modified, body = _get(
+        client, study_cards_url, {**auth_headers, "If-None-Match": etag}, "br"
+    )
+
+    assert not_modified.status_code == 304
+    assert body == b""
+    assert not_modified.headers["etag"] == etag
+    stale, _ = _get(client, study_cards_url, {**auth_headers, "If-None-Match": 'W/"0"'}, "br")
+    assert stale.status_code == 200
+
+
+def test_cache_evicts_least_recently_used():
+    cache = CompressedBodyCache(max_bytes=10)
+    cache.put(("a",), b"1234")
+    cache.put(("b",), b"1234")
+    assert cache.get(("a",)) == b"1234"
+
+    cache.put(("c",), b"1234")
+    cache.put(("too large",), b"x" * 11)
+
+    assert cache.get(("b",)) is None
+    assert cache.metrics()["size"] == 8
+    assert cache.get(("a",)) == cache.get(("c",)) == b"1234"
+
+
+def test_streamed_responses_are_compressed_per_chunk():
+    async def rows():
+        for i in range(200):
+            yield f"{i};die Katze;die Katzen\n"
+            await asyncio.sleep(0)
+
+    app = Starlette(
+        routes=[Route("/export", lambda request: StreamingResponse(rows(), media_type="text/csv"))]
+    )
+    client = TestClient(CompressionMiddleware(app, cache=CompressedBodyCache(1024)))
+
+    response, body = _get(client, "/export", {}, "gzip")
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert "etag" not in response.headers
+    assert gzip.decompress(body).decode().splitlines()[199] == "199;die Katze;die Katzen"
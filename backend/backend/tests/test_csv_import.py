@@ -0,0 +1,169 @@
+"""Tests for importing cards from CSV/TSV files."""
+
+import uuid
+
+from fastapi.testclient import TestClient
+
+from app.models.card import Card
+from app.models.card_level import CardLevel
+from app.models.card_progress import CardProgress
+from app.models.deck import Deck
+from app.models.user import User
+
+
+def _import_csv(client: TestClient, deck_id, auth_headers, content: str, filename="cards.csv"):
+    return client.post(
+        f"/api/decks/{deck_id}/import-csv",
+        headers=auth_headers,
+        files={"file": (filename, content.encode(), "text/csv")},
+    )
+
+
+def _cards(db, deck_id) -> list[tuple]:
+    cards = db.query(Card).filter(Card.deck_id == deck_id).order_by(Card.created_at, Card.id).all()
+    return [
+        (
+            card.title,
+            card.max_level,
+            [
+                level.content
+                for level in (
+                    db.query(CardLevel)
+                    .filter(CardLevel.card_id == card.id)
+                    .order_by(CardLevel.level_index)
+                )
+            ],
+        )
+        for card in cards
+    ]
+
+
+def test_import_csv_creates_cards(client: TestClient, test_deck, auth_headers, db):
+    content = (
+        "question,answer,explanation,level,title\n"
+        "der Hund,dog,m.,,Hund\n"
+        'die Hunde,"dogs, plural",,2,\n'
+        "die Katze,cat,,1,\n"
+    )
+    response = _import_csv(client, test_deck.id, auth_headers, content)
+
+    assert response.status_code == 200, response.text
+    assert response.json() == {
+        "rows": 3,
+        "cards_created": 2,
+        "levels_created": 3,
+        "cards_failed": 0,
+        "errors_total": 0,
+        "errors": [],
+    }
+    assert _cards(db, test_deck.id) == [
+        (
+            "Hund",
+            1,
+            [
+                {"question": "der Hund", "answer": "dog", "explanation": "m."},
+                {"question": "die Hunde", "answer": "dogs, plural", "explanation": None},
+            ],
+        ),
+        # Named like cards created without a title
+        ("Test_Deck-2", 0, [{"question": "die Katze", "answer": "cat", "explanation": None}]),
+    ]
+
+
+def test_import_tsv(client: TestClient, test_deck, auth_headers, db):
+    content = "\ufeffQuestion\tAnswer\nhello, world\tпривет, мир\n"
+    response = _import_csv(client, test_deck.id, auth_headers, content, filename="words.tsv")
+
+    assert response.status_code == 200, response.text
+    assert response.json()["cards_created"] == 1
+    assert _cards(db, test_deck.id)[0][2][0]["answer"] == "привет, мир"
+
+
+def test_import_csv_reports_row_errors(client: TestClient, test_deck, auth_headers, db):
+    client.post(
+        "/api/cards/",
+        json={
+            "deck_id": str(test_deck.id),
+            "title": "Taken",
+            "type": "flashcard",
+            "levels": [{"question": "q", "answer": "a"}],
+        },
+        headers=auth_headers,
+    )
+    content = (
+        "question,answer,level,title\n"
+        "bad level,a,x,\n"  # row 2
+        "ok 1,a,,\n"
+        "no answer,,,\n"  # row 4
+        "multi,a,,\n"
+        "level two,,2,\n"  # row 6: fails the card of row 5
+        "level three,a,3,\n"  # valid, but its card failed
+        "gap,a,,\n"
+        "gap level 3,a,3,\n"  # row 9
+        "dup,a,,Taken\n"  # row 10
+        "same,a,,Mine\n"
+        "same again,a,,Mine\n"  # row 12
+        "\n"
+        "ok 2,a,,\n"
+    )
+    response = _import_csv(client, test_deck.id, auth_headers, content)
+
+    assert response.status_code == 200, response.text
+    report = response.json()
+    assert report["errors"] == [
+        {"row": 2, "error": "Invalid level 'x': must be a number from 1"},
+        {"row": 4, "error": "answer is required"},
+        {"row": 6, "error": "answer is required"},
+        {"row": 9, "error": "Level 3 out of order: expected level 2"},
+        {"row": 10, "error": "Card with title 'Taken' already exists in this deck"},
+        {"row": 12, "error": "Card with title 'Mine' is already in row 11"},
+    ]
+    assert report["errors_total"] == 6
+    assert report["rows"] == 12
+    assert report["cards_failed"] == 5
+    assert report["cards_created"] == 3
+    titles = [title for title, _, _ in _cards(db, test_deck.id)]
+    assert titles == ["Taken", "Test_Deck-2", "Mine", "Test_Deck-4"]
+
+
+def test_import_csv_adds_cards_to_study(client: TestClient, test_deck, auth_headers, db, test_user):
+    test_deck.auto_add_cards_to_study = True
+    db.commit()
+
+    response = _import_csv(client, test_deck.id, auth_headers, "question,answer\nq,a\nq2,a2\n")
+
+    assert response.status_code == 200, response.text
+    progress = db.query(CardProgress).filter(CardProgress.user_id == test_user.id).all()
+    assert len(progress) == 2
+    assert all(p.is_active for p in progress)
+
+
+def test_import_csv_rejects_bad_files(client: TestClient, test_deck, auth_headers, db):
+    cases = [
+        ("cards.csv", b"question,explanation\nq,e\n", "Missing columns: answer"),
+        ("cards.csv", b"", "The file is empty"),
+        ("cards.csv", b"question,answer\n\xff\xfe,a\n", "The file is not valid UTF-8"),
+        ("cards.xlsx", b"question,answer\n", "Only .csv and .tsv files are supported"),
+    ]
+    for filename, content, detail in cases:
+        response = client.post(
+            f"/api/decks/{test_deck.id}/import-csv",
+            headers=auth_headers,
+            files={"file": (filename, content, "text/csv")},
+        )
+        assert response.status_code == 422, filename
+        assert response.json()["detail"] == detail
+
+    assert _cards(db, test_deck.id) == []
+
+
+def test_import_csv_needs_editor(client: TestClient, auth_headers, db, test_deck):
+    other = User(username="other", email=f"other_{uuid.uuid4()}@example.com", password_hash="x")
+    db.add(other)
+    db.flush()
+    deck = Deck(owner_id=other.id, title="Other", is_public=True)
+    db.add(deck)
+    db.commit()
+
+    response = _import_csv(client, deck.id, auth_headers, "question,answer\nq,a\n")
+    assert response.status_code == 403
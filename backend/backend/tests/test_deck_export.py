@@ -0,0 +1,193 @@
+"""Tests for streamed deck exports."""
+
+import csv
+import io
+import tempfile
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from tests.test_anki_import import _import
+
+from app.core.config import settings
+from app.core.security import hash_password
+from app.models.deck import Deck
+from app.models.user import User
+from app.services.anki_parser import ApkgParser
+from app.services.anki_transform import extract_qa
+
+
+@pytest.fixture
+def cards(client: TestClient, test_deck, auth_headers) -> list[str]:
+    """Two flashcards, the first with two levels, and a multiple choice card."""
+    payloads = [
+        {
+            "title": "Hund",
+            "type": "flashcard",
+            "levels": [
+                {"question": "der Hund", "answer": "dog", "explanation": "m., die Hunde"},
+                {"question": "die Hunde", "answer": "dogs\n(plural)"},
+            ],
+        },
+        {
+            "title": "Symbols",
+            "type": "flashcard",
+            "levels": [{"question": "x < y & z", "answer": "less than"}],
+        },
+        {
+            "title": "Capital",
+            "type": "multiple_choice",
+            "levels": [
+                {
+                    "question": "Capital of France?",
+                    "options": [{"id": "a", "text": "Paris"}, {"id": "b", "text": "Rome"}],
+                    "correctOptionId": "a",
+                }
+            ],
+        },
+    ]
+    card_ids = []
+    for payload in payloads:
+        response = client.post(
+            "/api/cards/", json={**payload, "deck_id": str(test_deck.id)}, headers=auth_headers
+        )
+        assert response.status_code == 201, response.text
+        card_ids.append(response.json()["card_id"])
+    return card_ids
+
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    # Levels of the first card end up in different batches
+    monkeypatch.setattr(settings, "EXPORT_BATCH_ROWS", 1)
+
+
+def _export(client: TestClient, deck_id, auth_headers, export_format: str):
+    response = client.get(
+        f"/api/decks/{deck_id}/export?format={export_format}", headers=auth_headers
+    )
+    assert response.status_code == 200, response.text
+    return response
+
+
+@pytest.mark.parametrize("batch_rows", [1, 1000])
+def test_json_export(client: TestClient, test_deck, auth_headers, cards, monkeypatch, batch_rows):
+    monkeypatch.setattr(settings, "EXPORT_BATCH_ROWS", batch_rows)
+    response = _export(client, test_deck.id, auth_headers, "json")
+
+    assert response.headers["content-type"] == "application/json"
+    assert 'filename="Test Deck.json"' in response.headers["content-disposition"]
+    data = response.json()
+    assert data["deck"]["deck_id"] == str(test_deck.id)
+    assert data["deck"]["title"] == "Test Deck"
+    assert [c["card_id"] for c in data["cards"]] == cards
+    first = data["cards"][0]
+    assert [level["level_index"] for level in first["levels"]] == [0, 1]
+    assert first["levels"][0]["content"]["explanation"] == "m., die Hunde"
+    assert data["cards"][2]["levels"][0]["content"]["correctOptionId"] == "a"
+
+
+def test_json_export_of_empty_deck(client: TestClient, test_deck, auth_headers):
+    data = _export(client, test_deck.id, auth_headers, "json").json()
+    assert data["cards"] == []
+
+
+def test_csv_export(client: TestClient, test_deck, auth_headers, cards, small_batches):
+    response = _export(client, test_deck.id, auth_headers, "csv")
+
+    assert response.headers["content-type"] == "text/csv; charset=utf-8"
+    rows = list(csv.DictReader(io.StringIO(response.content.decode("utf-8-sig"))))
+    assert [(r["card_id"], r["level_index"]) for r in rows] == [
+        (cards[0], "0"),
+        (cards[0], "1"),
+        (cards[1], "0"),
+        (cards[2], "0"),
+    ]
+    assert rows[1]["answer"] == "dogs\n(plural)"
+    assert rows[0]["explanation"] == "m., die Hunde"
+    # Multiple choice: the correct option is the answer
+    assert rows[3]["answer"] == "Paris"
+    assert '"Rome"' in rows[3]["options"]
+
+
+def test_apkg_export(
+    client: TestClient, test_deck, auth_headers, cards, small_batches, tmp_path, monkeypatch
+):
+    workdir = tmp_path / "tmp"
+    workdir.mkdir()
+    monkeypatch.setattr(tempfile, "tempdir", str(workdir))
+    response = _export(client, test_deck.id, auth_headers, "apkg")
+
+    path = tmp_path / "export.apkg"
+    path.write_bytes(response.content)
+    with ApkgParser(path) as parser:
+        deck = parser.parse()
+        notes = [note for batch in parser.iter_notes() for note in batch]
+        questions_answers = [extract_qa(note, deck.models) for note in notes]
+
+    assert deck.name == "Test Deck"
+    assert deck.note_count == 4
+    assert questions_answers == [
+        ("der Hund", "dog"),
+        ("die Hunde", "dogs<br>(plural)"),
+        ("x &lt; y &amp; z", "less than"),
+        ("Capital of France?", "Paris"),
+    ]
+    assert len({note.guid for note in notes}) == 4
+    # The working files are removed once the package is sent
+    assert not list(workdir.iterdir())
+
+
+def test_apkg_export_imports_back(client: TestClient, test_deck, auth_headers, cards, tmp_path, db):
+    path = tmp_path / "export.apkg"
+    path.write_bytes(_export(client, test_deck.id, auth_headers, "apkg").content)
+
+    job = _import(client, auth_headers, path)
+
+    assert job["status"] == "done", job
+    assert job["cards_created"] == 4
+    data = _export(client, job["deck_id"], auth_headers, "json").json()
+    contents = [card["levels"][0]["content"] for card in data["cards"]]
+    assert [(c["question"], c["answer"]) for c in contents] == [
+        ("der Hund", "dog"),
+        ("die Hunde", "dogs\n(plural)"),
+        ("x < y & z", "less than"),
+        ("Capital of France?", "Paris"),
+    ]
+
+
+def test_export_of_unlinked_deck_by_owner(client: TestClient, auth_headers, db, test_user):
+    deck = Deck(owner_id=test_user.id, title="Not linked", is_public=False)
+    db.add(deck)
+    db.commit()
+
+    assert _export(client, deck.id, auth_headers, "json").json()["cards"] == []
+
+    response = client.get(f"/api/decks/{uuid.uuid4()}/export", headers=auth_headers)
+    assert response.status_code == 404
+
+
+def test_export_of_deck_without_access(client: TestClient, db, test_deck):
+    other = User(
+        username="otheruser",
+        email=f"other_{uuid.uuid4().hex[:8]}@example.com",
+        password_hash=hash_password("password123"),
+        is_email_verified=True,
+    )
+    db.add(other)
+    test_deck.is_public = False
+    db.commit()
+    login = client.post("/api/auth/login", json={"email": other.email, "password": "password123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    url = f"/api/decks/{test_deck.id}/export?format=json"
+
+    assert client.get(url, headers=headers).status_code == 403
+
+    test_deck.is_public = True
+    db.commit()
+    assert client.get(url, headers=headers).status_code == 200
+
+
+def test_export_rejects_unknown_format(client: TestClient, test_deck, auth_headers):
+    response = client.get(f"/api/decks/{test_deck.id}/export?format=xlsx", headers=auth_headers)
+    assert response.status_code == 422
@@ -0,0 +1,277 @@
+"""Tests for background import jobs: claiming, checkpoints and resuming."""
+
+import os
+import uuid
+import zipfile
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import func
+from tests.anki_fixtures import build_apkg
+
+from app.models.card import Card
+from app.models.card_level import CardLevel
+from app.models.card_progress import CardProgress
+from app.models.deck import Deck
+from app.models.import_job import ImportJob
+from app.models.sync_change import SyncChange
+from app.models.user import User
+from app.models.user_study_group_deck import UserStudyGroupDeck
+from app.services.anki_parser import ApkgParseError
+from app.services.anki_sandbox import SandboxedApkg
+from app.services.import_jobs import (
+    STATUS_DONE,
+    STATUS_FAILED,
+    STATUS_QUEUED,
+    STATUS_RUNNING,
+    ImportWorker,
+    claim_next_job,
+    run_import_job,
+    submit_anki_import,
+)
+
+
+@pytest.fixture(autouse=True)
+def empty_queue(db):
+    # Jobs left over from other tests would be claimed first
+    db.query(ImportJob).filter(ImportJob.status.in_([STATUS_QUEUED, STATUS_RUNNING])).delete()
+    db.commit()
+
+
+@pytest.fixture
+def job(db, test_user, tmp_path):
+    notes = [(f"Question {i}", f"Answer {i}") for i in range(23)] + [("", "no question")] * 2
+    path = build_apkg(tmp_path / "deck.apkg", notes)
+    return submit_anki_import(db, test_user.id, path, "deck.apkg")
+
+
+def _is_linked(db, deck_id) -> bool:
+    return db.query(UserStudyGroupDeck).filter(UserStudyGroupDeck.deck_id == deck_id).count() > 0
+
+
+def test_submit_returns_job_immediately(client: TestClient, auth_headers, tmp_path):
+    path = build_apkg(tmp_path / "deck.apkg", [("Q", "A")])
+    with open(path, "rb") as f:
+        response = client.post(
+            "/api/decks/import-anki",
+            headers=auth_headers,
+            files={"file": ("deck.apkg", f, "application/octet-stream")},
+        )
+
+    assert response.status_code == 202, response.text
+    data = response.json()
+    assert (data["status"], data["phase"], data["deck_id"]) == ("queued", "queued", None)
+
+    polled = client.get(f"/api/imports/{data['job_id']}", headers=auth_headers)
+    assert polled.status_code == 200
+    assert polled.json()["status"] == "queued"
+
+
+def test_invalid_upload_is_rejected_without_job(client: TestClient, auth_headers, db):
+    before = db.query(ImportJob).count()
+    response = client.post(
+        "/api/decks/import-anki",
+        headers=auth_headers,
+        files={"file": ("deck.apkg", b"not a zip", "application/octet-stream")},
+    )
+
+    assert response.status_code == 422
+    assert db.query(ImportJob).count() == before
+
+
+def test_job_of_another_user_is_not_visible(client: TestClient, auth_headers, db, tmp_path):
+    other = User(username="other", email=f"other_{uuid.uuid4()}@example.com", password_hash="x")
+    db.add(other)
+    db.commit()
+    path = build_apkg(tmp_path / "deck.apkg", [("Q", "A")])
+    job = submit_anki_import(db, other.id, path, "deck.apkg")
+
+    response = client.get(f"/api/imports/{job.id}", headers=auth_headers)
+    assert response.status_code == 404
+
+
+def test_worker_imports_and_reports_progress(db, job):
+    source_path = job.source_path
+
+    assert ImportWorker(poll_interval_s=0, batch_size=10).run_once()
+
+    db.refresh(job)
+    assert (job.status, job.phase) == (STATUS_DONE, "done")
+    assert (job.notes_total, job.notes_processed, job.cards_created) == (25, 25, 23)
+    assert job.warnings == ["2 notes without a question were skipped"]
+    assert db.query(Card).filter(Card.deck_id == job.deck_id).count() == 23
+    assert _is_linked(db, job.deck_id)
+    assert not os.path.exists(source_path)
+
+
+def test_released_job_resumes_from_checkpoint(db, job):
+    claimed = claim_next_job(db, "worker-a")
+    status = run_import_job(db, claimed, "worker-a", batch_size=10, should_stop=lambda: True)
+
+    assert status == STATUS_QUEUED
+    db.refresh(job)
+    assert (job.status, job.notes_processed, job.worker_id) == (STATUS_QUEUED, 10, None)
+    # Partial deck exists but is not shown to the user yet
+    assert db.query(Card).filter(Card.deck_id == job.deck_id).count() == 10
+    assert not _is_linked(db, job.deck_id)
+
+    assert ImportWorker(poll_interval_s=0, batch_size=10).run_once()
+
+    db.refresh(job)
+    assert (job.status, job.attempts, job.cards_created) == (STATUS_DONE, 2, 23)
+    assert db.query(Card).filter(Card.deck_id == job.deck_id).count() == 23
+    assert _is_linked(db, job.deck_id)
+
+
+def test_stale_running_job_is_taken_over(db, job):
+    claimed = claim_next_job(db, "dead-worker")
+    assert claim_next_job(db, "worker-b") is None  # lease still valid
+
+    claimed.heartbeat_at = datetime.now(timezone.utc) - timedelta(hours=1)
+    db.commit()
+
+    taken = claim_next_job(db, "worker-b")
+    assert taken is not None and taken.id == job.id
+    assert (taken.worker_id, taken.attempts) == ("worker-b", 2)
+
+    # The old worker wakes up and must not touch the job any more
+    assert run_import_job(db, taken, "dead-worker") == STATUS_RUNNING
+    assert run_import_job(db, taken, "worker-b") == STATUS_DONE
+
+
+def test_job_failing_too_often_is_abandoned(db, job):
+    job.status, job.attempts = STATUS_RUNNING, 3
+    job.heartbeat_at = datetime.now(timezone.utc) - timedelta(hours=1)
+    db.commit()
+
+    assert claim_next_job(db, "worker-a", max_attempts=3) is None
+
+    db.refresh(job)
+    assert job.status == STATUS_FAILED
+    assert "abandoned" in job.error
+
+
+def test_invalid_package_fails_job(db, test_user, tmp_path):
+    path = tmp_path / "broken.apkg"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("media", "{}")
+    job = submit_anki_import(db, test_user.id, path, "broken.apkg")
+
+    assert ImportWorker(poll_interval_s=0).run_once()
+
+    db.refresh(job)
+    assert (job.status, job.phase, job.deck_id) == (STATUS_FAILED, "failed", None)
+    assert job.error.startswith("Invalid .apkg file")
+    assert not path.exists()
+
+
+def test_parse_error_after_losing_the_lease_leaves_the_job_alone(db, job, monkeypatch):
+    claimed = claim_next_job(db, "worker-a")
+
+    def parse_while_taken_over(self):
+        # The lease expires during a slow parse and worker-b claims the job
+        taken = db.get(ImportJob, job.id)
+        taken.worker_id, taken.heartbeat_at = "worker-b", func.now()
+        db.commit()
+        raise ApkgParseError("collection.anki2 not found")
+
+    monkeypatch.setattr(SandboxedApkg, "parse", parse_while_taken_over)
+
+    assert run_import_job(db, claimed, "worker-a") == STATUS_RUNNING
+    db.refresh(job)
+    assert (job.status, job.worker_id, job.error) == (STATUS_RUNNING, "worker-b", None)
+    assert os.path.exists(job.source_path)
+
+
+def _imported_deck(db, test_user, tmp_path, notes) -> Deck:
+    path = build_apkg(tmp_path / "v1.apkg", notes)
+    job = submit_anki_import(db, test_user.id, path, "v1.apkg")
+    assert ImportWorker(poll_interval_s=0, batch_size=10).run_once()
+    db.refresh(job)
+    return db.get(Deck, job.deck_id)
+
+
+def test_update_import_writes_only_changed_notes(db, test_user, tmp_path):
+    notes = [(f"Question {i}", f"Answer {i}") for i in range(30)]
+    deck = _imported_deck(db, test_user, tmp_path, notes)
+    cards = {c.source_guid: c for c in db.query(Card).filter(Card.deck_id == deck.id)}
+    changed = cards["guid3"]
+    level = db.query(CardLevel).filter(CardLevel.card_id == changed.id).one()
+    db.add(CardProgress(user_id=test_user.id, card_id=changed.id, card_level_id=level.id))
+    db.commit()
+    last_change = db.query(func.max(SyncChange.id)).scalar()
+
+    # guid3 edited, guid5 removed from the package, guid31 added
+    notes[2] = ("Question 2 (edited)", "Answer 2")
+    guids = [f"guid{i}" for i in range(1, 31)]
+    del notes[4], guids[4]
+    notes.append(("New question", "New answer"))
+    guids.append("guid31")
+    path = build_apkg(tmp_path / "v2.apkg", notes, guids=guids)
+    job = submit_anki_import(db, test_user.id, path, "v2.apkg", deck_id=deck.id)
+    assert ImportWorker(poll_interval_s=0, batch_size=10).run_once()
+
+    db.refresh(job)
+    assert (job.status, job.mode, job.deck_id) == (STATUS_DONE, "update", deck.id)
+    assert (job.cards_created, job.cards_updated, job.cards_deleted) == (1, 1, 1)
+    assert job.notes_processed == 30
+
+    # Only the three notes were written: one card and one level row each
+    written = (
+        db.query(SyncChange.entity_type, SyncChange.op).filter(SyncChange.id > last_change).all()
+    )
+    assert sorted(written) == [
+        ("card", "delete"),
+        ("card", "insert"),
+        ("card", "update"),
+        ("card_level", "delete"),
+        ("card_level", "insert"),
+        ("card_level", "update"),
+    ]
+
+    db.expire_all()
+    updated = db.get(Card, changed.id)
+    assert updated.title == "Question 2 (edited)"
+    assert db.get(CardLevel, level.id).content["question"] == "Question 2 (edited)"
+    assert db.query(CardProgress).filter(CardProgress.card_id == changed.id).count() == 1
+    guids_now = {c.source_guid for c in db.query(Card).filter(Card.deck_id == deck.id)}
+    assert guids_now == set(guids)
+
+
+def test_update_import_without_changes_writes_nothing(db, test_user, tmp_path):
+    notes = [(f"Question {i}", f"Answer {i}") for i in range(12)]
+    deck = _imported_deck(db, test_user, tmp_path, notes)
+    last_change = db.query(func.max(SyncChange.id)).scalar()
+
+    path = build_apkg(tmp_path / "v2.apkg", notes)
+    job = submit_anki_import(db, test_user.id, path, "v2.apkg", deck_id=deck.id)
+    assert ImportWorker(poll_interval_s=0, batch_size=5).run_once()
+
+    db.refresh(job)
+    assert (job.cards_created, job.cards_updated, job.cards_deleted) == (0, 0, 0)
+    assert db.query(SyncChange).filter(SyncChange.id > last_change).count() == 0
+
+
+def test_update_import_requires_anki_deck(
+    client: TestClient, auth_headers, db, test_deck, tmp_path
+):
+    db.add(Card(deck_id=test_deck.id, type="flashcard", title="Manual", max_level=1))
+    db.commit()
+    path = build_apkg(tmp_path / "deck.apkg", [("Q", "A")])
+
+    with open(path, "rb") as f:
+        response = client.post(
+            f"/api/decks/import-anki?deck_id={test_deck.id}",
+            headers=auth_headers,
+            files={"file": ("deck.apkg", f, "application/octet-stream")},
+        )
+    assert response.status_code == 422
+
+    with open(path, "rb") as f:
+        response = client.post(
+            f"/api/decks/import-anki?deck_id={uuid.uuid4()}",
+            headers=auth_headers,
+            files={"file": ("deck.apkg", f, "application/octet-stream")},
+        )
+    assert response.status_code == 404
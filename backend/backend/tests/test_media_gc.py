@@ -0,0 +1,131 @@
+"""Tests for the media garbage collection job."""
+
+import hashlib
+import uuid
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+
+from sqlalchemy import text
+
+from app.models.card import Card
+from app.models.card_level import CardLevel
+from app.models.media_object import MediaObject
+from app.services import storage_service as storage_service_module
+from app.services.media_gc import collect_media_garbage
+from app.services.media_store import store_media
+from app.services.storage_service import FileType, StoredObject
+
+_LONG_AGO = datetime.now(timezone.utc) - timedelta(days=3)
+
+
+def _storage():
+    return storage_service_module._storage_service_instance
+
+
+def _store(db, card_id=None) -> MediaObject:
+    """Store a new image, linked from a level of `card_id` if given, uploaded 2 days ago."""
+    data = uuid.uuid4().bytes * 10
+    url = store_media(db, BytesIO(data), "photo.png", "image/png", FileType.IMAGE)
+    if card_id is not None:
+        db.add(CardLevel(card_id=card_id, level_index=0, content={}, question_image_urls=[url]))
+    db.flush()
+    media = db.get(MediaObject, hashlib.sha256(data).hexdigest())
+    db.execute(
+        text("UPDATE media_objects SET last_used_at = now() - interval '2 days' WHERE sha256 = :s"),
+        {"s": media.sha256},
+    )
+    db.commit()
+    db.refresh(media)
+    # Keeps its attributes after the job deletes the row
+    db.expunge(media)
+    return media
+
+
+def _put_legacy(key: str, last_modified=_LONG_AGO) -> None:
+    _storage().objects[key] = StoredObject(key, 100, last_modified)
+
+
+def test_collects_unreferenced_objects(db, test_deck):
+    card = Card(deck_id=test_deck.id, title="Kept", type="flashcard", max_level=0)
+    db.add(card)
+    db.flush()
+    kept = _store(db, card.id)
+    unreferenced = _store(db)
+
+    stats = collect_media_garbage(db, grace_hours=24)
+
+    assert unreferenced.object_key not in _storage().objects
+    assert kept.object_key in _storage().objects
+    db.expire_all()
+    assert db.get(MediaObject, unreferenced.sha256) is None
+    assert db.get(MediaObject, kept.sha256) is not None
+    assert stats.unreferenced_objects == 1
+    assert stats.unreferenced_bytes == unreferenced.size
+    assert stats.delete_errors == 0
+
+
+def test_grace_period_keeps_recent_uploads(db):
+    data = uuid.uuid4().bytes * 10
+    url = store_media(db, BytesIO(data), "photo.png", "image/png", FileType.IMAGE)
+    db.commit()
+    _put_legacy("cards/abcd1234/recent.jpg", datetime.now(timezone.utc))
+
+    collect_media_garbage(db, grace_hours=24)
+
+    assert url.removeprefix("/images/") in _storage().objects
+    assert "cards/abcd1234/recent.jpg" in _storage().objects
+
+
+def test_collects_orphans(db, test_deck):
+    card = Card(deck_id=test_deck.id, title="Legacy", type="multiple_choice", max_level=0)
+    db.add(card)
+    db.flush()
+    db.add(
+        CardLevel(
+            card_id=card.id,
+            level_index=0,
+            content={"options": [{"id": "a", "image_url": "/images/cards/abcd1234/option.jpg"}]},
+            question_audio_urls=["/audio/audio/abcd1234/linked.mp3"],
+        )
+    )
+    db.commit()
+    linked = ["audio/abcd1234/linked.mp3", "cards/abcd1234/option.jpg"]
+    orphans = ["audio/abcd1234/deleted_card.mp3", "cards/media/00/rolled-back.png"]
+    for key in linked + orphans:
+        _put_legacy(key)
+    _put_legacy("exports/not-media.json")
+
+    stats = collect_media_garbage(db, grace_hours=24)
+
+    assert sorted(_storage().objects) == sorted(linked + ["exports/not-media.json"])
+    assert stats.orphan_objects == 2
+    assert stats.orphan_bytes == 200
+    assert stats.listed_objects == 4
+
+
+def test_deletes_in_batches(db):
+    keys = [f"cards/abcd1234/orphan-{i}.jpg" for i in range(5)]
+    for key in keys:
+        _put_legacy(key)
+
+    stats = collect_media_garbage(db, grace_hours=24, batch_size=2)
+
+    assert _storage().delete_requests == [keys[:2], keys[2:4], keys[4:]]
+    assert stats.delete_requests == 3
+    assert not _storage().objects
+
+
+def test_dry_run_deletes_nothing(db):
+    unreferenced = _store(db)
+    _put_legacy("cards/abcd1234/orphan.jpg")
+
+    stats = collect_media_garbage(db, dry_run=True, grace_hours=24)
+
+    assert stats.dry_run
+    assert stats.unreferenced_objects >= 1
+    assert stats.orphan_objects == 1
+    assert stats.delete_requests == 0
+    assert _storage().delete_requests == []
+    assert set(_storage().objects) == {unreferenced.object_key, "cards/abcd1234/orphan.jpg"}
+    db.expire_all()
+    assert db.get(MediaObject, unreferenced.sha256) is not None
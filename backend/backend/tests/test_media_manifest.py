@@ -0,0 +1,166 @@
+"""Tests for study-session media manifests and prefetch bundles."""
+
+import hashlib
+import io
+import json
+import uuid
+import zipfile
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.models.card import Card
+from app.models.card_level import CardLevel
+from app.models.card_progress import CardProgress
+from app.models.deck import Deck
+from app.models.user import User
+from app.services import storage_service as storage_service_module
+
+LEGACY_URL = "/images/cards/abcd1234/legacy.jpg"
+REMOTE_URL = "https://example.com/remote.mp3"
+
+
+def _storage():
+    return storage_service_module._storage_service_instance
+
+
+def _card(db, deck, title, levels) -> Card:
+    card = Card(deck_id=deck.id, title=title, type="flashcard", max_level=len(levels) - 1)
+    db.add(card)
+    db.flush()
+    for i, urls in enumerate(levels):
+        db.add(CardLevel(card_id=card.id, level_index=i, content={"question": "q"}, **urls))
+    db.commit()
+    return card
+
+
+def _progress(db, user, card, next_review) -> None:
+    level = db.query(CardLevel).filter_by(card_id=card.id, level_index=0).one()
+    db.add(
+        CardProgress(
+            user_id=user.id,
+            card_id=card.id,
+            card_level_id=level.id,
+            is_active=True,
+            stability=1.0,
+            difficulty=5.0,
+            next_review=next_review,
+        )
+    )
+    db.commit()
+
+
+def _upload(client, auth_headers, card, kind, data: bytes) -> str:
+    content_type = "image/png" if kind == "image" else "audio/mpeg"
+    response = client.post(
+        f"/api/cards/{card.id}/levels/0/question-{kind}",
+        headers=auth_headers,
+        files={"file": (f"file.{kind}", io.BytesIO(data), content_type)},
+    )
+    assert response.status_code == 200, response.text
+    return response.json()[f"question_{kind}_urls"][-1]
+
+
+@pytest.fixture(scope="function")
+def media(client: TestClient, auth_headers, db, test_deck, test_user):
+    """Three cards of the deck: a due one, one due later and a new one, sharing an image."""
+    image, audio, other = (uuid.uuid4().bytes * 100 for _ in range(3))
+    later = _card(db, test_deck, "Later", [{}])
+    due = _card(db, test_deck, "Due", [{}, {"answer_image_urls": [LEGACY_URL]}])
+    new = _card(db, test_deck, "New", [{"answer_audio_urls": [REMOTE_URL]}])
+    image_url = _upload(client, auth_headers, due, "image", image)
+    audio_url = _upload(client, auth_headers, due, "audio", audio)
+    _upload(client, auth_headers, later, "image", image)
+    other_url = _upload(client, auth_headers, later, "image", other)
+    now = datetime.now(timezone.utc)
+    _progress(db, test_user, due, now - timedelta(hours=1))
+    _progress(db, test_user, later, now + timedelta(days=1))
+    return {
+        "cards": (due, later, new),
+        "data": {image_url: image, audio_url: audio, other_url: other},
+        "urls": [image_url, audio_url, LEGACY_URL, other_url, REMOTE_URL],
+    }
+
+
+def test_deck_manifest_lists_each_file_once(client: TestClient, auth_headers, test_deck, media):
+    response = client.get(f"/api/decks/{test_deck.id}/media-manifest", headers=auth_headers)
+
+    assert response.status_code == 200, response.text
+    manifest = response.json()
+    due, later, new = media["cards"]
+    assert manifest["card_ids"] == [str(due.id), str(later.id), str(new.id)]
+    assert [item["url"] for item in manifest["media"]] == media["urls"]
+    image, audio, legacy, _, remote = manifest["media"]
+    data = media["data"][image["url"]]
+    assert image == {
+        "url": image["url"],
+        "kind": "image",
+        "content_type": "image/png",
+        "size": len(data),
+        "sha256": hashlib.sha256(data).hexdigest(),
+    }
+    assert (audio["kind"], audio["content_type"]) == ("audio", "audio/mpeg")
+    assert legacy["size"] is None and legacy["sha256"] is None
+    assert remote["kind"] == "audio"
+    assert manifest["total_size"] == sum(len(d) for d in media["data"].values())
+
+
+def test_deck_manifest_is_limited_to_the_next_cards(
+    client: TestClient, auth_headers, test_deck, media
+):
+    response = client.get(f"/api/decks/{test_deck.id}/media-manifest?limit=1", headers=auth_headers)
+
+    assert response.status_code == 200, response.text
+    assert response.json()["card_ids"] == [str(media["cards"][0].id)]
+    assert [item["url"] for item in response.json()["media"]] == media["urls"][:3]
+
+
+def test_review_manifest_covers_due_cards(client: TestClient, auth_headers, media):
+    response = client.get("/api/cards/review/media-manifest", headers=auth_headers)
+
+    assert response.status_code == 200, response.text
+    assert response.json()["card_ids"] == [str(media["cards"][0].id)]
+    assert [item["url"] for item in response.json()["media"]] == media["urls"][:3]
+
+
+def test_bundle_streams_stored_files(client: TestClient, auth_headers, test_deck, media):
+    _storage().contents[LEGACY_URL.removeprefix("/images/")] = b"legacy"
+
+    response = client.get(
+        f"/api/decks/{test_deck.id}/media-manifest?format=zip", headers=auth_headers
+    )
+
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "application/zip"
+    bundle = zipfile.ZipFile(io.BytesIO(response.content))
+    names = bundle.namelist()
+    # The remote URL isn't bundled
+    assert names == ["manifest.json"] + [url.lstrip("/") for url in media["urls"][:4]]
+    manifest = json.loads(bundle.read("manifest.json"))
+    assert [item["url"] for item in manifest["media"]] == media["urls"]
+    for url, data in media["data"].items():
+        assert bundle.read(url.lstrip("/")) == data
+        assert bundle.getinfo(url.lstrip("/")).compress_type == zipfile.ZIP_STORED
+    assert bundle.read(LEGACY_URL.lstrip("/")) == b"legacy"
+
+
+def test_bundle_skips_files_missing_in_storage(client: TestClient, auth_headers, media):
+    response = client.get("/api/cards/review/media-manifest?format=zip", headers=auth_headers)
+
+    assert response.status_code == 200, response.text
+    names = zipfile.ZipFile(io.BytesIO(response.content)).namelist()
+    assert names == ["manifest.json"] + [url.lstrip("/") for url in media["urls"][:2]]
+
+
+def test_private_deck_of_another_user_is_not_accessible(client: TestClient, auth_headers, db):
+    owner = User(username="owner", email=f"owner_{uuid.uuid4()}@example.com", password_hash="x")
+    db.add(owner)
+    db.flush()
+    deck = Deck(owner_id=owner.id, title="Private", is_public=False)
+    db.add(deck)
+    db.commit()
+
+    response = client.get(f"/api/decks/{deck.id}/media-manifest", headers=auth_headers)
+
+    assert response.status_code == 403
@@ -0,0 +1,240 @@
+"""Tests for content-addressed media storage and its reference counts."""
+
+import hashlib
+import uuid
+from io import BytesIO
+
+import pytest
+from fastapi.testclient import TestClient
+from tests.anki_fixtures import build_apkg
+from tests.test_anki_import import _import
+
+from app.models.card import Card
+from app.models.card_level import CardLevel
+from app.models.media_object import MediaObject
+from app.services import storage_service as storage_service_module
+
+
+@pytest.fixture(scope="function")
+def test_card(db, test_deck):
+    card = Card(deck_id=test_deck.id, title="Media Card", type="flashcard", max_level=1)
+    db.add(card)
+    db.flush()
+    for i in range(2):
+        db.add(CardLevel(card_id=card.id, level_index=i, content={"question": "q", "answer": "a"}))
+    db.commit()
+    return card
+
+
+def _storage():
+    return storage_service_module._storage_service_instance
+
+
+def _media_object(db, data: bytes) -> MediaObject:
+    db.expire_all()
+    return db.get(MediaObject, hashlib.sha256(data).hexdigest())
+
+
+def _upload_image(client, auth_headers, card_id, level_index, data: bytes) -> str:
+    response = client.post(
+        f"/api/cards/{card_id}/levels/{level_index}/question-image",
+        headers=auth_headers,
+        files={"file": ("photo.jpg", BytesIO(data), "image/jpeg")},
+    )
+    assert response.status_code == 200, response.text
+    return response.json()["question_image_urls"][-1]
+
+
+def test_same_content_is_stored_once(client: TestClient, auth_headers, db, test_card):
+    data = uuid.uuid4().bytes * 100
+
+    url1 = _upload_image(client, auth_headers, test_card.id, 0, data)
+    url2 = _upload_image(client, auth_headers, test_card.id, 1, data)
+
+    assert url1 == url2
+    assert url1.startswith("/images/cards/media/")
+    assert [key for key, _, _ in _storage().uploaded_objects] == [url1.removeprefix("/images/")]
+    media = _media_object(db, data)
+    assert media.ref_count == 2
+    assert media.size == len(data)
+    assert media.content_type == "image/jpeg"
+
+
+def test_object_already_in_storage_is_not_uploaded(client: TestClient, auth_headers, db, test_card):
+    data = uuid.uuid4().bytes * 100
+    _upload_image(client, auth_headers, test_card.id, 0, data)
+    # Lost row, object still in storage
+    db.delete(_media_object(db, data))
+    db.commit()
+
+    _upload_image(client, auth_headers, test_card.id, 1, data)
+
+    assert len(_storage().uploaded_objects) == 1
+    # Only the level saved after the row was recorded again is counted
+    assert _media_object(db, data).ref_count == 1
+
+
+def test_removing_references_keeps_shared_objects(client: TestClient, auth_headers, db, test_card):
+    data = uuid.uuid4().bytes * 100
+    _upload_image(client, auth_headers, test_card.id, 0, data)
+    _upload_image(client, auth_headers, test_card.id, 1, data)
+
+    response = client.delete(
+        f"/api/cards/{test_card.id}/levels/0/question-image/0", headers=auth_headers
+    )
+    assert response.status_code == 204
+    assert _media_object(db, data).ref_count == 1
+
+    response = client.delete(f"/api/cards/{test_card.id}", headers=auth_headers)
+    assert response.status_code == 204
+    # Left for garbage collection
+    assert _media_object(db, data).ref_count == 0
+    assert _storage().deleted_urls == []
+
+
+def test_legacy_urls_are_deleted(client: TestClient, auth_headers, db, test_card):
+    level = db.query(CardLevel).filter_by(card_id=test_card.id, level_index=0).one()
+    level.question_image_urls = ["/images/cards/abcd1234/legacy.jpg"]
+    db.commit()
+
+    response = client.delete(
+        f"/api/cards/{test_card.id}/levels/0/question-image/0", headers=auth_headers
+    )
+
+    assert response.status_code == 204
+    assert _storage().deleted_urls == ["/images/cards/abcd1234/legacy.jpg"]
+
+
+def test_option_images_are_counted(client: TestClient, auth_headers, db, test_deck):
+    card = Card(deck_id=test_deck.id, title="MCQ", type="multiple_choice", max_level=0)
+    db.add(card)
+    db.flush()
+    options = [{"id": "a", "text": "A"}, {"id": "b", "text": "B"}]
+    db.add(
+        CardLevel(
+            card_id=card.id,
+            level_index=0,
+            content={"question": "q", "options": options, "correctOptionId": "a"},
+        )
+    )
+    db.commit()
+    first, second = uuid.uuid4().bytes * 100, uuid.uuid4().bytes * 100
+
+    for option_id, data in [("a", first), ("b", first), ("a", second)]:
+        response = client.post(
+            f"/api/cards/{card.id}/option-image",
+            headers=auth_headers,
+            data={"option_id": option_id},
+            files={"file": ("option.png", BytesIO(data), "image/png")},
+        )
+        assert response.status_code == 200, response.text
+
+    assert _media_object(db, first).ref_count == 1
+    assert _media_object(db, second).ref_count == 1
+
+
+def test_anki_reimport_reuses_media(client: TestClient, auth_headers, db, tmp_path):
+    image = uuid.uuid4().bytes * 10
+    notes = [('Cat <img src="cat.jpg">', "meow"), ('Cat again <img src="cat.jpg">', "meow")]
+    for name in ("first", "second"):
+        job = _import(
+            client,
+            auth_headers,
+            build_apkg(tmp_path / f"{name}.apkg", notes, media={"cat.jpg": image}),
+        )
+        assert job["status"] == "done", job
+
+    assert len(_storage().uploaded_objects) == 1
+    assert _media_object(db, image).ref_count == 4
+
+
+def _upload_url(client, auth_headers, card_id, data: bytes, **overrides):
+    body = {
+        "side": "answer",
+        "kind": "audio",
+        "content_type": "audio/ogg",
+        "size": len(data),
+        "sha256": hashlib.sha256(data).hexdigest(),
+        **overrides,
+    }
+    return client.post(
+        f"/api/cards/{card_id}/levels/0/media-upload-url", headers=auth_headers, json=body
+    )
+
+
+def _confirm(client, auth_headers, card_id, data: bytes):
+    body = {
+        "side": "answer",
+        "kind": "audio",
+        "content_type": "audio/ogg",
+        "sha256": hashlib.sha256(data).hexdigest(),
+    }
+    return client.post(f"/api/cards/{card_id}/levels/0/media", headers=auth_headers, json=body)
+
+
+def test_direct_upload(client: TestClient, auth_headers, db, test_card):
+    data = uuid.uuid4().bytes * 100
+
+    response = _upload_url(client, auth_headers, test_card.id, data)
+    assert response.status_code == 200, response.text
+    ticket = response.json()
+    assert ticket["upload_url"].startswith("http://storage.test/card-media/audio/media/")
+    assert ticket["upload_headers"]["Content-Type"] == "audio/ogg"
+    assert ticket["media_url"].startswith("/audio/audio/media/")
+
+    # Not uploaded yet
+    response = _confirm(client, auth_headers, test_card.id, data)
+    assert response.status_code == 422
+    assert "not uploaded" in response.json()["detail"]
+
+    # The client's PUT
+    object_key = ticket["media_url"].removeprefix("/audio/")
+    _storage().upload_object(object_key, data, "audio/ogg")
+
+    response = _confirm(client, auth_headers, test_card.id, data)
+    assert response.status_code == 200, response.text
+    assert response.json()["answer_audio_urls"] == [ticket["media_url"]]
+    media = _media_object(db, data)
+    assert media.ref_count == 1
+    assert media.size == len(data)
+
+
+def test_direct_upload_of_known_content_needs_no_upload(
+    client: TestClient, auth_headers, db, test_card
+):
+    data = uuid.uuid4().bytes * 100
+    url = _upload_image(client, auth_headers, test_card.id, 1, data)
+
+    response = _upload_url(
+        client, auth_headers, test_card.id, data, kind="image", content_type="image/jpeg"
+    )
+
+    assert response.status_code == 200, response.text
+    assert response.json() == {
+        "media_url": url,
+        "upload_url": None,
+        "upload_headers": {},
+        "expires_in": None,
+    }
+
+
+def test_direct_upload_is_validated(client: TestClient, auth_headers, test_card):
+    data = b"x" * 100
+    cases = [
+        ({"content_type": "video/mp4"}, "Invalid file type"),
+        ({"size": 11 * 1024 * 1024}, "File too large"),
+        ({"sha256": "not-a-hash"}, None),
+    ]
+    for overrides, detail in cases:
+        response = _upload_url(client, auth_headers, test_card.id, data, **overrides)
+        assert response.status_code == 422, overrides
+        if detail:
+            assert detail in response.json()["detail"]
+
+    # Written to storage by someone else, bypassing the signed limits
+    big = b"y" * (11 * 1024 * 1024)
+    digest = hashlib.sha256(big).hexdigest()
+    _storage().upload_object(f"audio/media/{digest[:2]}/{digest}.ogg", big, "audio/ogg")
+    response = _confirm(client, auth_headers, test_card.id, big)
+    assert response.status_code == 422
+    assert "File too large" in response.json()["detail"]
@@ -0,0 +1,297 @@
+"""Tests for WebP variants of card images."""
+
+import hashlib
+import io
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.card import Card
+from app.models.card_level import CardLevel
+from app.models.card_progress import CardProgress
+from app.models.media_object import MediaObject
+from app.services import storage_service as storage_service_module
+from app.services.anki_sandbox import SandboxPool
+from app.services.media_gc import collect_media_garbage
+from app.services.media_store import store_media
+from app.services.media_variants import process_pending_images
+from app.services.storage_service import FileType
+
+
+@pytest.fixture(autouse=True)
+def no_pending_images(db):
+    """Images stored by other tests are not waiting for variants."""
+    db.execute(text("UPDATE media_objects SET variants = '[]' WHERE variants IS NULL"))
+    db.commit()
+
+
+def _storage():
+    return storage_service_module._storage_service_instance
+
+
+def _image(size, fmt="PNG", mode="RGB", **save_args) -> bytes:
+    # Random pixels: every image is new content
+    image = Image.frombytes(
+        mode, size, uuid.uuid4().bytes * (size[0] * size[1] * len(mode) // 16 + 1)
+    )
+    out = io.BytesIO()
+    image.save(out, fmt, **save_args)
+    return out.getvalue()
+
+
+def _store(db, data: bytes, content_type="image/png") -> MediaObject:
+    store_media(db, io.BytesIO(data), "photo", content_type, FileType.IMAGE)
+    db.commit()
+    return db.get(MediaObject, hashlib.sha256(data).hexdigest())
+
+
+def _variant(key: str) -> Image.Image:
+    return Image.open(io.BytesIO(_storage().contents[key]))
+
+
+def test_variants_at_each_width(db):
+    media = _store(db, _image((1500, 1000)))
+
+    assert process_pending_images(db) == 1
+
+    db.refresh(media)
+    assert (media.width, media.height) == (1500, 1000)
+    assert [(v["width"], v["height"]) for v in media.variants] == [
+        (320, 213),
+        (640, 427),
+        (1280, 853),
+        (1500, 1000),
+    ]
+    for variant in media.variants:
+        assert (
+            variant["key"]
+            == f"cards/media/{media.sha256[:2]}/{media.sha256}-w{variant['width']}.webp"
+        )
+        assert _storage().content_types[variant["key"]] == "image/webp"
+        image = _variant(variant["key"])
+        assert image.format == "WEBP"
+        assert image.size == (variant["width"], variant["height"])
+        assert variant["size"] == len(_storage().contents[variant["key"]])
+    # Nothing left to do
+    assert process_pending_images(db) == 0
+
+
+def test_large_images_are_capped_and_small_ones_not_enlarged(db):
+    large = _store(db, _image((4000, 3000), "JPEG", quality=50), "image/jpeg")
+    small = _store(db, _image((200, 100)))
+
+    process_pending_images(db)
+
+    db.refresh(large)
+    db.refresh(small)
+    assert large.variants[-1]["width"] == 2048
+    assert large.variants[-1]["height"] == 1536
+    assert [(v["width"], v["height"]) for v in small.variants] == [(200, 100)]
+
+
+def test_orientation_is_applied_and_metadata_stripped(db):
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: rotate 90° clockwise
+    exif[0x010F] = "Camera maker"
+    media = _store(db, _image((800, 400), "JPEG", exif=exif.tobytes()), "image/jpeg")
+
+    process_pending_images(db)
+
+    db.refresh(media)
+    assert (media.width, media.height) == (400, 800)
+    image = _variant(media.variants[-1]["key"])
+    assert image.size == (400, 800)
+    assert not image.getexif()
+    assert "icc_profile" not in image.info
+
+
+def test_transparency_is_kept(db):
+    media = _store(db, _image((400, 400), mode="RGBA"))
+
+    process_pending_images(db)
+
+    db.refresh(media)
+    assert _variant(media.variants[0]["key"]).mode == "RGBA"
+
+
+def test_undecodable_image_gets_no_variants(db):
+    media = _store(db, b"\x89PNG\r\n\x1a\n" + uuid.uuid4().bytes * 100)
+
+    assert process_pending_images(db) == 1
+
+    db.refresh(media)
+    assert media.variants == []
+    assert media.width is None
+    assert process_pending_images(db) == 0
+
+
+def test_audio_is_left_alone(db):
+    store_media(db, io.BytesIO(uuid.uuid4().bytes), "a.mp3", "audio/mpeg", FileType.AUDIO)
+    db.commit()
+
+    assert process_pending_images(db) == 0
+
+
+def test_variants_are_rendered_in_the_process_pool(db):
+    media = _store(db, _image((700, 500)))
+    pool = SandboxPool(workers=1)
+    try:
+        assert process_pending_images(db, pool=pool) == 1
+    finally:
+        pool.shutdown()
+
+    db.refresh(media)
+    assert [v["width"] for v in media.variants] == [320, 640, 700]
+
+
+@pytest.fixture(scope="function")
+def due_card(db, test_deck, test_user):
+    card = Card(deck_id=test_deck.id, title="Photo", type="flashcard", max_level=0)
+    db.add(card)
+    db.flush()
+    level = CardLevel(card_id=card.id, level_index=0, content={"question": "q", "answer": "a"})
+    db.add(level)
+    db.flush()
+    db.add(
+        CardProgress(
+            user_id=test_user.id,
+            card_id=card.id,
+            card_level_id=level.id,
+            is_active=True,
+            stability=1.0,
+            difficulty=5.0,
+            next_review=datetime.now(timezone.utc) - timedelta(minutes=1),
+        )
+    )
+    db.commit()
+    return card
+
+
+def test_review_returns_srcsets(client: TestClient, auth_headers, db, due_card):
+    processed, pending = _image((900, 600)), _image((300, 300))
+    urls = []
+    for data in (processed, pending):
+        response = client.post(
+            f"/api/cards/{due_card.id}/levels/0/question-image",
+            headers=auth_headers,
+            files={"file": ("photo.png", io.BytesIO(data), "image/png")},
+        )
+        assert response.status_code == 200, response.text
+        urls = response.json()["question_image_urls"]
+        if data is processed:
+            process_pending_images(db)
+
+    response = client.get("/api/cards/review_with_levels", headers=auth_headers)
+
+    assert response.status_code == 200, response.text
+    [level] = response.json()[0]["levels"]
+    assert level["question_image_urls"] == urls
+    first, second = level["question_image_srcsets"]
+    assert second is None
+    base = urls[0].removesuffix(".png")
+    assert first["src"] == urls[0]
+    assert (first["width"], first["height"]) == (900, 600)
+    assert first["srcset"] == f"{base}-w320.webp 320w, {base}-w640.webp 640w, {base}-w900.webp 900w"
+    assert [v["url"] for v in first["variants"]] == [
+        f"{base}-w320.webp",
+        f"{base}-w640.webp",
+        f"{base}-w900.webp",
+    ]
+    assert level["answer_image_srcsets"] is None
+
+
+def test_variants_are_collected_with_their_image(db):
+    media = _store(db, _image((700, 500)))
+    process_pending_images(db)
+    db.refresh(media)
+    digest, keys = media.sha256, {media.object_key, *(v["key"] for v in media.variants)}
+    media.last_used_at = media.last_used_at.replace(year=2020)
+    db.commit()
+
+    stats = collect_media_garbage(db, dry_run=True, grace_hours=24)
+    # Variants of a known image are not orphans
+    assert stats.orphan_objects == 0
+    assert keys <= set(_storage().objects)
+
+    collect_media_garbage(db, grace_hours=24)
+
+    assert not keys & set(_storage().objects)
+    db.expire_all()
+    assert db.get(MediaObject, digest) is None
+
+
+def test_missing_original_gets_no_variants(db):
+    media = _store(db, _image((300, 200)))
+    del _storage().contents[media.object_key]
+
+    assert process_pending_images(db) == 1
+
+    db.refresh(media)
+    assert media.variants == []
+
+
+def test_rows_are_not_locked_while_rendering(db, monkeypatch):
+    media = _store(db, _image((300, 200)))
+    download = _storage().download_object
+    seen = []
+
+    def download_and_touch(object_key):
+        # Reference counting and uploads of the same content update the row meanwhile
+        with SessionLocal() as other:
+            other.execute(text("SET LOCAL lock_timeout = '1s'"))
+            other.execute(
+                text("UPDATE media_objects SET last_used_at = now() WHERE sha256 = :d"),
+                {"d": media.sha256},
+            )
+            other.commit()
+            # Claimed: another worker's batch skips it
+            seen.append(process_pending_images(other))
+        return download(object_key)
+
+    monkeypatch.setattr(_storage(), "download_object", download_and_touch)
+
+    assert process_pending_images(db) == 1
+
+    assert seen == [0]
+    db.refresh(media)
+    assert [v["width"] for v in media.variants] == [300]
+    assert media.claimed_at is None
+
+
+def test_stale_claims_are_processed_again(db):
+    media = _store(db, _image((300, 200)))
+    media.claimed_at = datetime.now(timezone.utc)
+    db.commit()
+
+    assert process_pending_images(db) == 0
+
+    lease = timedelta(seconds=settings.MEDIA_VARIANTS_CLAIM_LEASE_S)
+    media.claimed_at = datetime.now(timezone.utc) - lease - timedelta(minutes=1)
+    db.commit()
+
+    assert process_pending_images(db) == 1
+    db.refresh(media)
+    assert [v["width"] for v in media.variants] == [300]
+
+
+def test_failed_batch_is_released(db, monkeypatch):
+    media = _store(db, _image((300, 200)))
+
+    def unavailable(object_key):
+        raise ConnectionError("storage unavailable")
+
+    monkeypatch.setattr(_storage(), "download_object", unavailable)
+
+    with pytest.raises(ConnectionError):
+        process_pending_images(db)
+
+    db.refresh(media)
+    assert (media.variants, media.claimed_at) == (None, None)
+    monkeypatch.undo()
+    assert process_pending_images(db) == 1
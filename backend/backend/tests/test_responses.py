@@ -0,0 +1,93 @@
+"""Tests for FastJSONResponse."""
+
+import json
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+
+from app.api.responses import FastJSONResponse
+from app.core.enums import ReviewRating
+from app.models.card import Card
+from app.models.card_level import CardLevel
+from app.schemas.card_review import ReviewPreviewItem
+from app.schemas.cards import CardLevelContent, DeckSessionCard
+
+
+def _level(i: int) -> CardLevelContent:
+    return CardLevelContent(
+        level_index=i,
+        content={"question": "Кошка", "answer": "die Katze", "nested": {"n": [1, 2.5, None]}},
+        question_image_urls=[f"/images/cards/media/ab/{uuid.uuid4().hex}.jpg"],
+        answer_audio_urls=[],
+    )
+
+
+def test_models_are_dumped_as_fastapi_dumps_them():
+    cards = [
+        DeckSessionCard(
+            card_id=uuid.uuid4(),
+            deck_id=uuid.uuid4(),
+            title="Katze",
+            type="flashcard",
+            active_card_level_id=uuid.uuid4(),
+            active_level_index=0,
+            levels=[_level(0), _level(1)],
+        )
+        for _ in range(3)
+    ]
+    # Serialized by alias, enum by value
+    previews = [
+        ReviewPreviewItem(
+            rating=ReviewRating.good,
+            interval_seconds=600,
+            next_review=datetime(2026, 10, 19, 12, 30, tzinfo=timezone.utc),
+        )
+    ]
+
+    for content in (cards, cards[0], previews):
+        response = FastJSONResponse(content)
+        assert response.media_type == "application/json"
+        assert json.loads(response.body) == jsonable_encoder(content)
+
+
+def test_plain_data_is_dumped_with_orjson():
+    card_id = uuid.uuid4()
+    reviewed_at = datetime(2026, 10, 19, 12, 30, tzinfo=timezone.utc)
+    content = {
+        "id": card_id,
+        "reviewedAt": reviewed_at,
+        "ease": Decimal("2.5"),
+        1: "non-string key",
+        "levels": [{"content": {"question": "Кошка"}}],
+    }
+
+    body = json.loads(FastJSONResponse(content).body)
+
+    assert body == {
+        "id": str(card_id),
+        "reviewedAt": "2026-10-19T12:30:00+00:00",
+        "ease": 2.5,
+        "1": "non-string key",
+        "levels": [{"content": {"question": "Кошка"}}],
+    }
+    assert FastJSONResponse([]).body == b"[]"
+
+
+def test_session_response(client: TestClient, auth_headers, db, test_deck):
+    card = Card(deck_id=test_deck.id, title="Katze", type="flashcard", max_level=0)
+    db.add(card)
+    db.flush()
+    db.add(CardLevel(card_id=card.id, level_index=0, content={"question": "q", "answer": "a"}))
+    db.commit()
+
+    response = client.get(f"/api/decks/{test_deck.id}/session", headers=auth_headers)
+
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "application/json"
+    [item] = response.json()
+    assert item["card_id"] == str(card.id)
+    assert item["levels"][0]["content"] == {"question": "q", "answer": "a"}
+    assert item["levels"][0]["question_image_srcsets"] is None
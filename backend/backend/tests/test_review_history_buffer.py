@@ -0,0 +1,158 @@
+"""Tests for the review history write-behind buffer."""
+
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import OperationalError
+
+from app.api.routes import cards as cards_routes
+from app.core.enums import ReviewRating
+from app.models.card import Card
+from app.models.card_level import CardLevel
+from app.models.card_review_history import CardReviewHistory
+from app.services import review_history_buffer as buffer_module
+from app.services.review_history_buffer import ReviewHistoryBuffer
+
+
+@pytest.fixture(scope="function")
+def test_card(db, test_user, test_deck):
+    card = Card(deck_id=test_deck.id, title="Buffered Card", type="flashcard", max_level=0)
+    db.add(card)
+    db.flush()
+    db.add(CardLevel(card_id=card.id, level_index=0, content={"question": "Q", "answer": "A"}))
+    db.commit()
+    db.refresh(card)
+    return card
+
+
+@pytest.fixture(scope="function")
+def buffer(monkeypatch):
+    """Enabled buffer with a long interval, so tests flush explicitly."""
+    instance = ReviewHistoryBuffer(
+        enabled=True, flush_interval_ms=60_000, batch_size=100, max_size=100
+    )
+    monkeypatch.setattr(buffer_module, "review_history_buffer", instance)
+    monkeypatch.setattr(cards_routes, "review_history_buffer", instance)
+    yield instance
+    instance.stop()
+
+
+def _history_row(test_user, test_card, client_review_id=None) -> dict:
+    now = datetime.now(timezone.utc)
+    return {
+        "id": uuid.uuid4(),
+        "user_id": test_user.id,
+        "card_id": test_card.id,
+        "card_level_id": test_card.levels[0].id,
+        "rating": ReviewRating.good,
+        "interval_minutes": 10,
+        "show_at": now,
+        "reveal_at": now,
+        "reviewed_at": now,
+        "client_review_id": client_review_id,
+    }
+
+
+def _review_payload(client_review_id=None) -> dict:
+    now = datetime.now(timezone.utc)
+    payload = {
+        "rating": "good",
+        "shownAt": now.isoformat(),
+        "ratedAt": (now + timedelta(seconds=10)).isoformat(),
+    }
+    if client_review_id is not None:
+        payload["clientReviewId"] = str(client_review_id)
+    return payload
+
+
+def test_flush_writes_queued_rows_in_one_batch(buffer, test_user, test_card, db):
+    for _ in range(3):
+        assert buffer.add(_history_row(test_user, test_card))
+
+    assert buffer.flush() == 3
+    assert buffer.depth() == 0
+    assert db.query(CardReviewHistory).filter_by(card_id=test_card.id).count() == 3
+    assert buffer.metrics()["flush_count"] == 1
+
+
+def test_full_queue_rejects_rows(test_user, test_card):
+    buffer = ReviewHistoryBuffer(enabled=True, flush_interval_ms=60_000, batch_size=10, max_size=1)
+    assert buffer.add(_history_row(test_user, test_card))
+    assert not buffer.add(_history_row(test_user, test_card))
+    assert buffer.metrics()["rejected_rows"] == 1
+    buffer.stop()
+
+
+def test_invalid_rows_are_dropped_without_blocking_the_batch(buffer, test_user, test_card, db):
+    orphan = _history_row(test_user, test_card)
+    # Its card was deleted between the progress commit and the flush
+    orphan["card_id"] = uuid.uuid4()
+    buffer.add(_history_row(test_user, test_card))
+    buffer.add(orphan)
+    buffer.add(_history_row(test_user, test_card))
+
+    assert buffer.flush() == 3
+    assert buffer.depth() == 0
+    assert db.query(CardReviewHistory).filter_by(card_id=test_card.id).count() == 2
+    assert buffer.metrics()["flushed_rows"] == 2
+    assert buffer.metrics()["dropped_rows"] == 1
+
+
+def test_failed_flush_requeues_within_max_size(test_user, test_card):
+    buffer = ReviewHistoryBuffer(enabled=True, flush_interval_ms=60_000, batch_size=3, max_size=3)
+
+    class Unavailable:
+        def execute(self, *args, **kwargs):
+            # Reviews keep coming in while the database is down
+            buffer.add(_history_row(test_user, test_card))
+            buffer.add(_history_row(test_user, test_card))
+            raise OperationalError("INSERT", {}, Exception("connection refused"))
+
+        def close(self):
+            pass
+
+    buffer._session_factory = Unavailable
+    first = [_history_row(test_user, test_card) for _ in range(3)]
+    for row in first:
+        buffer.add(row)
+
+    assert buffer.flush() == 0
+    assert buffer.depth() == 3
+    assert list(buffer._rows)[0] is first[0]
+    assert buffer.metrics()["flush_failures"] == 1
+    assert buffer.metrics()["dropped_rows"] == 2
+
+
+def test_review_endpoint_defers_history_without_client_review_id(
+    client: TestClient, buffer, test_card, auth_headers, db
+):
+    response = client.post(
+        f"/api/cards/{test_card.id}/review", headers=auth_headers, json=_review_payload()
+    )
+    assert response.status_code == 200
+    assert db.query(CardReviewHistory).filter_by(card_id=test_card.id).count() == 0
+    assert buffer.depth() == 1
+
+    buffer.stop()
+    assert db.query(CardReviewHistory).filter_by(card_id=test_card.id).count() == 1
+
+
+def test_review_with_client_review_id_is_recorded_with_progress(
+    client: TestClient, buffer, test_card, auth_headers, db
+):
+    review_id = uuid.uuid4()
+
+    first = client.post(
+        f"/api/cards/{test_card.id}/review", headers=auth_headers, json=_review_payload(review_id)
+    )
+    assert first.status_code == 200
+    assert buffer.depth() == 0
+    assert db.query(CardReviewHistory).filter_by(client_review_id=review_id).count() == 1
+
+    retry = client.post(
+        f"/api/cards/{test_card.id}/review", headers=auth_headers, json=_review_payload(review_id)
+    )
+    assert retry.json()["duplicate"] is True
+    assert db.query(CardReviewHistory).filter_by(card_id=test_card.id).count() == 1
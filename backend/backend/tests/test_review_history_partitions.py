@@ -0,0 +1,116 @@
+"""Tests for monthly partitioning and archival of card_review_history."""
+
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app.core.enums import ReviewRating
+from app.db.review_history_partitions import (
+    create_month_partition,
+    create_month_partitions,
+    ensure_review_history_partitions,
+    list_month_partitions,
+    month_start,
+    partition_name,
+)
+from app.models.card import Card
+from app.models.card_level import CardLevel
+from app.models.card_review_history import CardReviewHistory
+from app.models.review_daily_rollup import ReviewDailyRollup
+from app.services.review_history_archive import archive_review_history
+
+
+@pytest.fixture(scope="function")
+def test_card(db, test_user, test_deck):
+    card = Card(deck_id=test_deck.id, title="Partitioned Card", type="flashcard", max_level=0)
+    db.add(card)
+    db.flush()
+    db.add(CardLevel(card_id=card.id, level_index=0, content={"question": "Q", "answer": "A"}))
+    db.commit()
+    db.refresh(card)
+    return card
+
+
+def _add_review(db, user, card, reviewed_at: datetime, rating=ReviewRating.good) -> uuid.UUID:
+    entry = CardReviewHistory(
+        user_id=user.id,
+        card_id=card.id,
+        card_level_id=card.levels[0].id,
+        rating=rating,
+        interval_minutes=10,
+        show_at=reviewed_at - timedelta(seconds=30),
+        reveal_at=reviewed_at,
+        reviewed_at=reviewed_at,
+    )
+    db.add(entry)
+    db.commit()
+    return entry.id
+
+
+def _partition_of(db, review_id: uuid.UUID) -> str:
+    return db.execute(
+        text("SELECT tableoid::regclass::text FROM card_review_history WHERE id = :id"),
+        {"id": review_id},
+    ).scalar_one()
+
+
+def test_current_and_upcoming_months_are_partitioned(db):
+    partitions = list_month_partitions(db.connection())
+    current = month_start(datetime.now(timezone.utc))
+    assert current in partitions
+    assert len([m for m in partitions if m > current]) >= 1
+
+
+def test_new_partition_takes_over_rows_from_default(db, test_user, test_card):
+    month = date(2100, 1, 1)
+    review_id = _add_review(db, test_user, test_card, datetime(2100, 1, 15, tzinfo=timezone.utc))
+    if month not in list_month_partitions(db.connection()):
+        assert _partition_of(db, review_id) == "card_review_history_default"
+
+    ensure_review_history_partitions(db.connection(), months_ahead=0, since=month, today=month)
+    db.commit()
+
+    assert _partition_of(db, review_id) == partition_name(month)
+
+
+def test_create_month_partitions_skips_existing_months(db, test_user, test_card):
+    existing, stray, new = date(2102, 1, 1), date(2102, 2, 1), date(2102, 3, 1)
+    create_month_partition(db.connection(), existing)
+    db.commit()
+    review_id = _add_review(db, test_user, test_card, datetime(2102, 2, 3, tzinfo=timezone.utc))
+
+    created = create_month_partitions(db.connection(), [new, existing, stray, new])
+    db.commit()
+
+    assert created == [partition_name(stray), partition_name(new)]
+    assert _partition_of(db, review_id) == partition_name(stray)
+
+
+def test_archive_rolls_up_and_detaches_old_partitions(
+    client: TestClient, db, test_user, test_card, test_deck, auth_headers
+):
+    month = date(2001, 3, 1)
+    create_month_partition(db.connection(), month)
+    db.commit()
+    _add_review(db, test_user, test_card, datetime(2001, 3, 5, 10, tzinfo=timezone.utc))
+    _add_review(
+        db, test_user, test_card, datetime(2001, 3, 5, 11, tzinfo=timezone.utc), ReviewRating.again
+    )
+    _add_review(db, test_user, test_card, datetime.now(timezone.utc))
+
+    archived = archive_review_history(db, retention_months=24, drop=True)
+
+    assert partition_name(month) in archived
+    assert month not in list_month_partitions(db.connection())
+    rollup = db.get(ReviewDailyRollup, (test_user.id, test_deck.id, date(2001, 3, 5)))
+    assert rollup.reviews_count == 2
+    assert (rollup.again_count, rollup.good_count) == (1, 1)
+    assert rollup.study_seconds == 60
+
+    # Lifetime stats still count the archived reviews
+    stats = client.get("/api/stats/general", headers=auth_headers).json()
+    assert stats["total_reviews"] == 3
+    assert stats["rating_distribution"]["again_count"] == 1
@@ -0,0 +1,147 @@
+"""Tests for idempotent review ingestion with client-generated review ids."""
+
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.routes.cards import _lock_client_review_id
+from app.core.enums import ReviewRating
+from app.db.session import SessionLocal
+from app.models.card import Card
+from app.models.card_level import CardLevel
+from app.models.card_review_history import CardReviewHistory
+
+
+@pytest.fixture(scope="function")
+def test_card(db, test_user, test_deck):
+    card = Card(deck_id=test_deck.id, title="Review Card", type="flashcard", max_level=0)
+    db.add(card)
+    db.flush()
+    db.add(CardLevel(card_id=card.id, level_index=0, content={"question": "Q", "answer": "A"}))
+    db.commit()
+    db.refresh(card)
+    return card
+
+
+def _review_payload(rating: str, client_review_id=None) -> dict:
+    now = datetime.now(timezone.utc)
+    payload = {
+        "rating": rating,
+        "shownAt": now.isoformat(),
+        "ratedAt": (now + timedelta(seconds=10)).isoformat(),
+    }
+    if client_review_id is not None:
+        payload["clientReviewId"] = str(client_review_id)
+    return payload
+
+
+def test_retry_is_acknowledged_without_reapplying(client: TestClient, test_card, auth_headers, db):
+    review_id = uuid.uuid4()
+
+    first = client.post(
+        f"/api/cards/{test_card.id}/review",
+        headers=auth_headers,
+        json=_review_payload("good", review_id),
+    )
+    assert first.status_code == 200
+    assert first.json()["duplicate"] is False
+
+    retry = client.post(
+        f"/api/cards/{test_card.id}/review",
+        headers=auth_headers,
+        json=_review_payload("good", review_id),
+    )
+    assert retry.status_code == 200
+    assert retry.json()["duplicate"] is True
+    # Scheduling state is unchanged by the retry
+    assert retry.json()["stability"] == first.json()["stability"]
+    assert retry.json()["next_review"] == first.json()["next_review"]
+
+    assert db.query(CardReviewHistory).filter_by(card_id=test_card.id).count() == 1
+
+
+def test_reviews_without_client_id_are_not_deduplicated(
+    client: TestClient, test_card, auth_headers, db
+):
+    for _ in range(2):
+        response = client.post(
+            f"/api/cards/{test_card.id}/review",
+            headers=auth_headers,
+            json=_review_payload("good"),
+        )
+        assert response.status_code == 200
+
+    assert db.query(CardReviewHistory).filter_by(card_id=test_card.id).count() == 2
+
+
+def test_client_review_id_of_another_card_is_rejected(
+    client: TestClient, test_card, test_deck, auth_headers, db
+):
+    other = Card(deck_id=test_deck.id, title="Other Card", type="flashcard", max_level=0)
+    db.add(other)
+    db.flush()
+    db.add(CardLevel(card_id=other.id, level_index=0, content={"question": "Q", "answer": "A"}))
+    db.commit()
+    review_id = uuid.uuid4()
+
+    first = client.post(
+        f"/api/cards/{test_card.id}/review",
+        headers=auth_headers,
+        json=_review_payload("good", review_id),
+    )
+    reused = client.post(
+        f"/api/cards/{other.id}/review",
+        headers=auth_headers,
+        json=_review_payload("good", review_id),
+    )
+
+    assert first.status_code == 200
+    assert reused.status_code == 409
+    assert db.query(CardReviewHistory).filter_by(card_id=other.id).count() == 0
+
+
+def test_concurrent_retry_with_another_rated_at_waits_for_the_first(
+    client: TestClient, test_card, test_user, auth_headers, db
+):
+    # Progress for the level, as the first attempt would leave it
+    url = f"/api/cards/{test_card.id}/review"
+    assert client.post(url, headers=auth_headers, json=_review_payload("good")).status_code == 200
+    review_id = uuid.uuid4()
+
+    # The first attempt is still in flight: it holds the lock, its row isn't committed
+    first = SessionLocal()
+    _lock_client_review_id(first, test_user.id, review_id)
+    responses = []
+    retry = threading.Thread(
+        target=lambda: responses.append(
+            client.post(url, headers=auth_headers, json=_review_payload("good", review_id))
+        )
+    )
+    retry.start()
+    retry.join(timeout=1)
+    assert retry.is_alive()
+
+    rated_at = datetime.now(timezone.utc) - timedelta(days=1)
+    first.add(
+        CardReviewHistory(
+            user_id=test_user.id,
+            card_id=test_card.id,
+            card_level_id=test_card.levels[0].id,
+            rating=ReviewRating.good,
+            interval_minutes=10,
+            show_at=rated_at,
+            reveal_at=rated_at,
+            reviewed_at=rated_at,
+            client_review_id=review_id,
+        )
+    )
+    first.commit()
+    first.close()
+    retry.join(timeout=10)
+
+    assert responses[0].status_code == 200
+    assert responses[0].json()["duplicate"] is True
+    assert db.query(CardReviewHistory).filter_by(client_review_id=review_id).count() == 1
@@ -132,3 +132,138 @@ class TestStorageServiceDeleteFile:
         except Exception:
             # Expected to fail on actual S3 call, but prefix logic is tested
             pass
+
+
+class TestStorageServiceDeleteObjects:
+    """Tests for batched deletes against a stubbed S3 client."""
+
+    def test_delete_objects_sends_one_request_per_1000_keys(self):
+        from botocore.stub import Stubber
+
+        from app.services.storage_service import StorageService
+
+        service = StorageService()
+        keys = [f"cards/media/{i:04d}.jpg" for i in range(2500)]
+        with Stubber(service._s3_client) as stub:
+            for start, end in [(0, 1000), (1000, 2000), (2000, 2500)]:
+                errors = [{"Key": keys[2001], "Code": "AccessDenied"}] if start == 2000 else []
+                stub.add_response(
+                    "delete_objects",
+                    {"Errors": errors},
+                    {
+                        "Bucket": StorageService.BUCKET_NAME,
+                        "Delete": {"Objects": [{"Key": k} for k in keys[start:end]], "Quiet": True},
+                    },
+                )
+            failed = service.delete_objects(keys)
+            stub.assert_no_pending_responses()
+
+        assert failed == [keys[2001]]
+
+    def test_list_objects_follows_pages(self):
+        from datetime import datetime, timezone
+
+        from botocore.stub import Stubber
+
+        from app.services.storage_service import StorageService
+
+        service = StorageService()
+        modified = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        bucket = StorageService.BUCKET_NAME
+        with Stubber(service._s3_client) as stub:
+            stub.add_response(
+                "list_objects_v2",
+                {
+                    "Contents": [{"Key": "cards/a.jpg", "Size": 1, "LastModified": modified}],
+                    "IsTruncated": True,
+                    "NextContinuationToken": "next",
+                },
+                {"Bucket": bucket, "Prefix": "cards/"},
+            )
+            stub.add_response(
+                "list_objects_v2",
+                {
+                    "Contents": [{"Key": "cards/b.jpg", "Size": 2, "LastModified": modified}],
+                    "IsTruncated": False,
+                },
+                {"Bucket": bucket, "Prefix": "cards/", "ContinuationToken": "next"},
+            )
+            objects = list(service.list_objects("cards/"))
+
+        assert [(o.key, o.size) for o in objects] == [("cards/a.jpg", 1), ("cards/b.jpg", 2)]
+
+
+class TestStorageServiceDirectUploads:
+    """Tests for presigned uploads and HEAD requests."""
+
+    def test_presigned_upload_signs_type_length_and_checksum(self):
+        from urllib.parse import parse_qs, urlparse
+
+        from app.services.storage_service import StorageService
+
+        upload = StorageService().presigned_upload(
+            "cards/media/ab/ab12.jpg", "image/jpeg", 1234, "q83vEjRWeJA=", 900
+        )
+
+        query = parse_qs(urlparse(upload.url).query)
+        assert urlparse(upload.url).path.endswith("/cards/media/ab/ab12.jpg")
+        assert query["X-Amz-Expires"] == ["900"]
+        assert query["X-Amz-SignedHeaders"] == [
+            "content-length;content-type;host;x-amz-checksum-sha256"
+        ]
+        assert upload.headers == {
+            "Content-Type": "image/jpeg",
+            "x-amz-checksum-sha256": "q83vEjRWeJA=",
+        }
+
+    def test_head_object(self):
+        from botocore.stub import Stubber
+
+        from app.services.storage_service import ObjectHead, StorageService
+
+        service = StorageService()
+        with Stubber(service._s3_client) as stub:
+            stub.add_response(
+                "head_object",
+                {"ContentLength": 42, "ContentType": "audio/ogg"},
+                {"Bucket": StorageService.BUCKET_NAME, "Key": "audio/media/ab/ab.ogg"},
+            )
+            stub.add_client_error("head_object", service_error_code="404", http_status_code=404)
+            assert service.head_object("audio/media/ab/ab.ogg") == ObjectHead(42, "audio/ogg")
+            assert service.head_object("audio/media/cd/cd.ogg") is None
+
+
+class TestStorageServiceBucket:
+    """Tests for the cached bucket check."""
+
+    def test_bucket_is_checked_once(self):
+        from botocore.stub import ANY, Stubber
+
+        from app.services.storage_service import StorageService
+
+        service = StorageService()
+        bucket = StorageService.BUCKET_NAME
+        put = {"Bucket": bucket, "Key": ANY, "Body": ANY, "ContentType": "image/jpeg"}
+        with Stubber(service._s3_client) as stub:
+            stub.add_response("head_bucket", {}, {"Bucket": bucket})
+            stub.add_response("put_object", {}, put)
+            stub.add_response("put_object", {}, put)
+            for _ in range(2):
+                service.upload_file(b"jpeg", "a.jpg", "image/jpeg", "card-id", "question")
+            # No head_bucket before the second upload
+            stub.assert_no_pending_responses()
+
+    def test_missing_bucket_is_created(self):
+        from botocore.stub import ANY, Stubber
+
+        from app.services.storage_service import StorageService
+
+        service = StorageService()
+        bucket = StorageService.BUCKET_NAME
+        with Stubber(service._s3_client) as stub:
+            stub.add_client_error("head_bucket", service_error_code="404", http_status_code=404)
+            stub.add_response("create_bucket", {}, {"Bucket": bucket})
+            stub.add_response("put_bucket_policy", {}, {"Bucket": bucket, "Policy": ANY})
+            service.ensure_bucket()
+            service.ensure_bucket()
+            stub.assert_no_pending_responses()
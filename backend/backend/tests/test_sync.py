@@ -0,0 +1,99 @@
+"""Tests for incremental sync endpoint."""
+
+from datetime import datetime, timezone
+
+from fastapi.testclient import TestClient
+
+from app.models.user_study_group_deck import UserStudyGroupDeck
+from app.services.sync_service import get_sync_horizon, prune_sync_changes
+
+
+def _create_card(client: TestClient, deck_id, headers, title: str) -> str:
+    response = client.post(
+        "/api/cards/",
+        json={
+            "deck_id": str(deck_id),
+            "title": title,
+            "type": "flashcard",
+            "levels": [{"question": f"{title} Q", "answer": f"{title} A"}],
+        },
+        headers=headers,
+    )
+    assert response.status_code == 201, response.text
+    return response.json()["card_id"]
+
+
+def test_full_sync_returns_snapshot(client: TestClient, test_deck, auth_headers):
+    card_id = _create_card(client, test_deck.id, auth_headers, "Snapshot")
+
+    response = client.get("/api/sync", headers=auth_headers)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["full"] is True
+    assert [c["id"] for c in data["cards"]] == [card_id]
+    assert len(data["card_levels"]) == 1
+    assert data["deck_memberships"][0]["deck_id"] == str(test_deck.id)
+    assert data["cursor"] > 0
+
+
+def test_incremental_sync_returns_only_changes(client: TestClient, test_deck, auth_headers):
+    _create_card(client, test_deck.id, auth_headers, "Old")
+    cursor = client.get("/api/sync", headers=auth_headers).json()["cursor"]
+
+    new_card_id = _create_card(client, test_deck.id, auth_headers, "New")
+
+    data = client.get(f"/api/sync?since={cursor}", headers=auth_headers).json()
+    assert data["full"] is False
+    assert [c["id"] for c in data["cards"]] == [new_card_id]
+    assert [lvl["card_id"] for lvl in data["card_levels"]] == [new_card_id]
+    assert data["deck_memberships"] == []
+
+    # Nothing changed since the last cursor
+    data = client.get(f"/api/sync?since={data['cursor']}", headers=auth_headers).json()
+    assert data["cards"] == [] and data["card_levels"] == []
+
+
+def test_incremental_sync_returns_tombstones(client: TestClient, test_deck, auth_headers):
+    card_id = _create_card(client, test_deck.id, auth_headers, "Doomed")
+    cursor = client.get("/api/sync", headers=auth_headers).json()["cursor"]
+
+    assert client.delete(f"/api/cards/{card_id}", headers=auth_headers).status_code == 204
+
+    data = client.get(f"/api/sync?since={cursor}", headers=auth_headers).json()
+    assert data["cards"] == []
+    assert card_id in data["deleted"]["cards"]
+
+
+def test_removed_membership_is_tombstoned(client: TestClient, test_deck, auth_headers, db):
+    cursor = client.get("/api/sync", headers=auth_headers).json()["cursor"]
+
+    link = db.query(UserStudyGroupDeck).filter(UserStudyGroupDeck.deck_id == test_deck.id).one()
+    group_id = str(link.user_group_id)
+    db.delete(link)
+    db.commit()
+
+    data = client.get(f"/api/sync?since={cursor}", headers=auth_headers).json()
+    assert data["deleted"]["deck_memberships"] == [
+        {"user_group_id": group_id, "deck_id": str(test_deck.id)}
+    ]
+
+
+def test_cursor_older_than_the_horizon_gets_a_full_snapshot(
+    client: TestClient, test_deck, auth_headers, db
+):
+    old_card_id = _create_card(client, test_deck.id, auth_headers, "Before")
+    cursor = client.get("/api/sync", headers=auth_headers).json()["cursor"]
+    new_card_id = _create_card(client, test_deck.id, auth_headers, "After")
+
+    # Everything in the log is past the retention
+    assert prune_sync_changes(db, retention_days=0, now=datetime.now(timezone.utc)) > 0
+    assert get_sync_horizon(db) > cursor
+
+    data = client.get(f"/api/sync?since={cursor}", headers=auth_headers).json()
+    assert data["full"] is True
+    assert {c["id"] for c in data["cards"]} == {old_card_id, new_card_id}
+
+    # Cursors handed out after the prune are answered incrementally again
+    data = client.get(f"/api/sync?since={data['cursor']}", headers=auth_headers).json()
+    assert data["full"] is False
@@ -0,0 +1,110 @@
+"""Tests for streamed media uploads and the early upload size limit."""
+
+import asyncio
+import re
+import uuid
+from io import BytesIO
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.api.upload_limits import UploadSizeLimitMiddleware
+from app.models.card import Card
+from app.models.card_level import CardLevel
+from app.services import storage_service as storage_service_module
+from app.services.media_store import store_media
+from app.services.storage_service import FileType
+
+MB = 1024 * 1024
+
+
+class _ReadRecorder(BytesIO):
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.reads = []
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.reads.append(len(chunk))
+        return chunk
+
+
+@pytest.fixture(scope="function")
+def test_card(db, test_deck):
+    card = Card(deck_id=test_deck.id, title="Upload Card", type="flashcard", max_level=0)
+    db.add(card)
+    db.flush()
+    db.add(CardLevel(card_id=card.id, level_index=0, content={"question": "q", "answer": "a"}))
+    db.commit()
+    return card
+
+
+def test_oversized_upload_is_rejected_from_content_length(
+    client: TestClient, auth_headers, test_card
+):
+    response = client.post(
+        f"/api/cards/{test_card.id}/levels/0/question-audio",
+        headers=auth_headers,
+        files={"file": ("long.mp3", BytesIO(b"x" * (11 * MB)), "audio/mpeg")},
+    )
+
+    assert response.status_code == 422
+    assert response.json()["detail"].startswith("File too large")
+    assert storage_service_module._storage_service_instance.uploaded_objects == []
+
+
+def test_chunked_body_is_cut_off_at_the_limit():
+    chunks_read = 0
+
+    async def receive():
+        nonlocal chunks_read
+        chunks_read += 1
+        return {"type": "http.request", "body": b"x" * MB, "more_body": True}
+
+    async def app(scope, receive, send):
+        while True:
+            await receive()
+
+    middleware = UploadSizeLimitMiddleware(app, limits=((re.compile("^/upload$"), 5 * MB),))
+    scope = {"type": "http", "method": "POST", "path": "/upload", "headers": []}
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(middleware(scope, receive, None))
+
+    assert error.value.status_code == 422
+    # 5MB plus the multipart allowance
+    assert chunks_read == 6
+
+
+def test_other_routes_are_not_limited():
+    async def app(scope, receive, send):
+        app.called = True
+
+    middleware = UploadSizeLimitMiddleware(app)
+    headers = [(b"content-length", str(100 * MB).encode())]
+    scope = {"type": "http", "method": "POST", "path": "/api/decks/import-anki", "headers": headers}
+    asyncio.run(middleware(scope, None, None))
+
+    assert app.called
+
+
+def test_store_media_streams_the_file(db):
+    data = b"\x00" * (3 * MB) + uuid.uuid4().bytes
+    fileobj = _ReadRecorder(data)
+
+    url = store_media(db, fileobj, "big.mp3", "audio/mpeg", FileType.AUDIO)
+
+    assert url.startswith("/audio/audio/media/")
+    # Hashed in chunks, then rewound for the upload
+    assert fileobj.reads[:4] == [MB, MB, MB, 16]
+    [(_, uploaded, _)] = storage_service_module._storage_service_instance.uploaded_objects
+    assert uploaded == data
+
+
+def test_store_media_stops_reading_past_the_limit(db):
+    fileobj = _ReadRecorder(b"x" * (20 * MB))
+
+    with pytest.raises(ValueError, match="File too large"):
+        store_media(db, fileobj, "huge.jpg", "image/jpeg", FileType.IMAGE)
+
+    assert sum(fileobj.reads) == 6 * MB
@@ -0,0 +1,59 @@
+"""Tests for time-ordered UUIDv7 primary keys."""
+
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from app.core.enums import ReviewRating
+from app.core.uuid7 import uuid7, uuid7_time
+from app.models.card import Card
+from app.models.card_level import CardLevel
+from app.models.card_review_history import CardReviewHistory
+
+
+def test_uuid7_layout_and_time():
+    before = datetime.now(timezone.utc) - timedelta(milliseconds=1)
+    value = uuid7()
+
+    assert value.version == 7
+    assert value.variant == uuid.RFC_4122
+    assert before <= uuid7_time(value) <= datetime.now(timezone.utc)
+    assert uuid7_time(uuid.uuid4()) is None
+
+
+def test_uuid7_is_strictly_increasing():
+    values = [uuid7() for _ in range(10_000)]
+
+    assert values == sorted(values)
+    assert len(set(values)) == len(values)
+
+
+def test_history_mixes_legacy_uuid4_and_uuid7_rows(db, test_user, test_deck):
+    card = Card(deck_id=test_deck.id, title="Ids", type="flashcard", max_level=0)
+    db.add(card)
+    db.flush()
+    level = CardLevel(card_id=card.id, level_index=0, content={"question": "Q", "answer": "A"})
+    db.add(level)
+    db.flush()
+
+    now = datetime.now(timezone.utc)
+    rows = [
+        CardReviewHistory(
+            id=legacy_id,
+            user_id=test_user.id,
+            card_id=card.id,
+            card_level_id=level.id,
+            rating=ReviewRating.good,
+            interval_minutes=1,
+            show_at=now,
+            reveal_at=now,
+            reviewed_at=now,
+        )
+        for legacy_id in (uuid.uuid4(), None)
+    ]
+    db.add_all(rows)
+    db.commit()
+
+    versions = {
+        row.id.version for row in db.query(CardReviewHistory).filter_by(card_id=card.id).all()
+    }
+    assert versions == {4, 7}
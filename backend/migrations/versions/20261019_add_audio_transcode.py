@@ -0,0 +1,36 @@
+"""add audio duration and compact transcoded version to media_objects
+
+Revision ID: 20261019_audio_transcode
+Revises: 20261019_media_variants
+Create Date: 2026-10-19 23:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "20261019_audio_transcode"
+down_revision: Union[str, None] = "20261019_media_variants"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("media_objects", sa.Column("duration_ms", sa.Integer(), nullable=True))
+    op.add_column(
+        "media_objects", sa.Column("transcoded_sha256", sa.String(length=64), nullable=True)
+    )
+    op.create_index(
+        "idx_media_objects_relink_pending",
+        "media_objects",
+        ["transcoded_sha256"],
+        postgresql_where=sa.text("transcoded_sha256 IS NOT NULL AND ref_count > 0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("idx_media_objects_relink_pending", table_name="media_objects")
+    op.drop_column("media_objects", "transcoded_sha256")
+    op.drop_column("media_objects", "duration_ms")
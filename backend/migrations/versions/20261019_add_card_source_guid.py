@@ -0,0 +1,48 @@
+"""add Anki note guid and content hash to cards for incremental re-import
+
+Revision ID: 20261019_card_source_guid
+Revises: 20261019_import_jobs
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "20261019_card_source_guid"
+down_revision: Union[str, None] = "20261019_import_jobs"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("cards", sa.Column("source_guid", sa.String(), nullable=True))
+    op.add_column("cards", sa.Column("source_hash", sa.String(length=64), nullable=True))
+    op.create_index(
+        "uq_cards_deck_source_guid",
+        "cards",
+        ["deck_id", "source_guid"],
+        unique=True,
+        postgresql_where=sa.text("source_guid IS NOT NULL"),
+    )
+
+    op.add_column(
+        "import_jobs",
+        sa.Column("mode", sa.String(length=16), nullable=False, server_default="create"),
+    )
+    for column in ("cards_updated", "cards_deleted", "notes_skipped"):
+        op.add_column(
+            "import_jobs",
+            sa.Column(column, sa.Integer(), nullable=False, server_default="0"),
+        )
+
+
+def downgrade() -> None:
+    for column in ("notes_skipped", "cards_deleted", "cards_updated", "mode"):
+        op.drop_column("import_jobs", column)
+
+    op.drop_index("uq_cards_deck_source_guid", table_name="cards")
+    op.drop_column("cards", "source_hash")
+    op.drop_column("cards", "source_guid")
@@ -0,0 +1,37 @@
+"""add client_review_id to card_review_history for idempotent review ingestion
+
+Revision ID: 20261019_client_review_id
+Revises: 20261019_sync_changes
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+revision: str = "20261019_client_review_id"
+down_revision: Union[str, None] = "20261019_sync_changes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "card_review_history",
+        sa.Column("client_review_id", postgresql.UUID(as_uuid=True), nullable=True),
+    )
+    op.create_index(
+        "uq_user_client_review_id",
+        "card_review_history",
+        ["user_id", "client_review_id"],
+        unique=True,
+        postgresql_where=sa.text("client_review_id IS NOT NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("uq_user_client_review_id", table_name="card_review_history")
+    op.drop_column("card_review_history", "client_review_id")
@@ -0,0 +1,28 @@
+"""add reviews_imported counter to import_jobs
+
+Revision ID: 20261019_import_job_reviews
+Revises: 20261019_card_source_guid
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "20261019_import_job_reviews"
+down_revision: Union[str, None] = "20261019_card_source_guid"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "import_jobs",
+        sa.Column("reviews_imported", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("import_jobs", "reviews_imported")
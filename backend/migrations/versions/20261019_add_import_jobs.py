@@ -0,0 +1,76 @@
+"""add import_jobs table for background deck imports
+
+Revision ID: 20261019_import_jobs
+Revises: 20261019_partition_history
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+revision: str = "20261019_import_jobs"
+down_revision: Union[str, None] = "20261019_partition_history"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "import_jobs",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column(
+            "user_id",
+            postgresql.UUID(as_uuid=True),
+            sa.ForeignKey("users.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column("kind", sa.String(16), nullable=False),
+        sa.Column("status", sa.String(16), nullable=False),
+        sa.Column("phase", sa.String(16), nullable=False),
+        sa.Column("source_path", sa.Text(), nullable=False),
+        sa.Column("filename", sa.String(), nullable=False),
+        sa.Column("notes_total", sa.Integer(), nullable=True),
+        sa.Column("notes_processed", sa.Integer(), nullable=False),
+        sa.Column("cards_created", sa.Integer(), nullable=False),
+        sa.Column("last_note_id", sa.BigInteger(), nullable=True),
+        sa.Column(
+            "warnings",
+            postgresql.JSONB(),
+            nullable=False,
+            server_default=sa.text("'[]'::jsonb"),
+        ),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column(
+            "deck_id",
+            postgresql.UUID(as_uuid=True),
+            sa.ForeignKey("decks.id", ondelete="SET NULL"),
+            nullable=True,
+        ),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("worker_id", sa.String(128), nullable=True),
+        sa.Column("heartbeat_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column(
+            "created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False
+        ),
+        sa.Column(
+            "updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False
+        ),
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index("ix_import_jobs_user_id", "import_jobs", ["user_id"])
+    op.create_index(
+        "idx_import_jobs_claim",
+        "import_jobs",
+        ["status", "created_at"],
+        postgresql_where=sa.text("status IN ('queued', 'running')"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("idx_import_jobs_claim", table_name="import_jobs")
+    op.drop_index("ix_import_jobs_user_id", table_name="import_jobs")
+    op.drop_table("import_jobs")
@@ -0,0 +1,57 @@
+"""add content-addressed media_objects with reference counting triggers
+
+Revision ID: 20261019_media_objects
+Revises: 20261019_import_job_reviews
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+from app.db.media_refs import drop_media_ref_triggers, install_media_ref_triggers
+
+revision: str = "20261019_media_objects"
+down_revision: Union[str, None] = "20261019_import_job_reviews"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "media_objects",
+        sa.Column("sha256", sa.String(64), primary_key=True),
+        sa.Column("object_key", sa.String(), nullable=False, unique=True),
+        sa.Column("file_type", sa.String(8), nullable=False),
+        sa.Column("content_type", sa.String(100), nullable=False),
+        sa.Column("size", sa.BigInteger(), nullable=False),
+        sa.Column("ref_count", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.text("now()"),
+        ),
+        sa.Column(
+            "last_used_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.text("now()"),
+        ),
+    )
+    op.create_index(
+        "idx_media_objects_unreferenced",
+        "media_objects",
+        ["last_used_at"],
+        postgresql_where=sa.text("ref_count <= 0"),
+    )
+
+    install_media_ref_triggers(op.get_bind())
+
+
+def downgrade() -> None:
+    drop_media_ref_triggers(op.get_bind())
+    op.drop_index("idx_media_objects_unreferenced", table_name="media_objects")
+    op.drop_table("media_objects")
@@ -0,0 +1,41 @@
+"""add image dimensions and derived variants to media_objects
+
+Revision ID: 20261019_media_variants
+Revises: 20261019_media_objects
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+revision: str = "20261019_media_variants"
+down_revision: Union[str, None] = "20261019_media_objects"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("media_objects", sa.Column("width", sa.Integer(), nullable=True))
+    op.add_column("media_objects", sa.Column("height", sa.Integer(), nullable=True))
+    # Existing media are queued for processing (variants IS NULL)
+    op.add_column(
+        "media_objects",
+        sa.Column("variants", postgresql.JSONB(), nullable=True),
+    )
+    op.create_index(
+        "idx_media_objects_variants_pending",
+        "media_objects",
+        ["created_at"],
+        postgresql_where=sa.text("variants IS NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("idx_media_objects_variants_pending", table_name="media_objects")
+    op.drop_column("media_objects", "variants")
+    op.drop_column("media_objects", "height")
+    op.drop_column("media_objects", "width")
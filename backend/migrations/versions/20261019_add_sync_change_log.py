@@ -0,0 +1,63 @@
+"""add sync change log and updated_at to cards/card_levels
+
+Revision ID: 20261019_sync_changes
+Revises: 753f2296fc32
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+from app.db.sync_triggers import drop_sync_triggers, install_sync_triggers
+
+revision: str = "20261019_sync_changes"
+down_revision: Union[str, None] = "753f2296fc32"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    for table in ("cards", "card_levels"):
+        op.add_column(
+            table,
+            sa.Column(
+                "updated_at",
+                sa.DateTime(timezone=True),
+                nullable=False,
+                server_default=sa.text("now()"),
+            ),
+        )
+
+    op.create_table(
+        "sync_changes",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column(
+            "txid", sa.BigInteger(), nullable=False, server_default=sa.text("txid_current()")
+        ),
+        sa.Column("entity_type", sa.String(32), nullable=False),
+        sa.Column("entity_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("deck_id", postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column("user_id", postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column("op", sa.String(8), nullable=False),
+        sa.Column(
+            "changed_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.text("now()"),
+        ),
+    )
+    op.create_index("idx_sync_changes_txid", "sync_changes", ["txid"])
+
+    install_sync_triggers(op.get_bind())
+
+
+def downgrade() -> None:
+    drop_sync_triggers(op.get_bind())
+    op.drop_index("idx_sync_changes_txid", table_name="sync_changes")
+    op.drop_table("sync_changes")
+    op.drop_column("card_levels", "updated_at")
+    op.drop_column("cards", "updated_at")
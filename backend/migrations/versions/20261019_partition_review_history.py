@@ -0,0 +1,164 @@
+"""partition card_review_history by month and add review_daily_rollups
+
+Revision ID: 20261019_partition_history
+Revises: 20261019_client_review_id
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+from app.db.review_history_partitions import ensure_review_history_partitions
+
+revision: str = "20261019_partition_history"
+down_revision: Union[str, None] = "20261019_client_review_id"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_COLUMNS = (
+    "id, user_id, card_id, card_level_id, rating, interval_minutes, "
+    "show_at, reveal_at, reviewed_at, client_review_id"
+)
+_INDEXES = (
+    "idx_user_review_date",
+    "idx_card_deck_reviews",
+    "uq_user_client_review_id",
+    "ix_card_review_history_user_id",
+    "ix_card_review_history_card_id",
+    "ix_card_review_history_card_level_id",
+)
+_MONTHS_AHEAD = 3
+
+
+def _create_history_table(partitioned: bool) -> None:
+    op.create_table(
+        "card_review_history",
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column(
+            "user_id",
+            postgresql.UUID(as_uuid=True),
+            sa.ForeignKey("users.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column(
+            "card_id",
+            postgresql.UUID(as_uuid=True),
+            sa.ForeignKey("cards.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column(
+            "card_level_id",
+            postgresql.UUID(as_uuid=True),
+            sa.ForeignKey("card_levels.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column(
+            "rating",
+            postgresql.ENUM(
+                "again", "hard", "good", "easy", name="review_rating", create_type=False
+            ),
+            nullable=False,
+        ),
+        sa.Column("interval_minutes", sa.Integer(), nullable=False),
+        sa.Column("show_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("reveal_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("reviewed_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("client_review_id", postgresql.UUID(as_uuid=True), nullable=True),
+        sa.PrimaryKeyConstraint(*(("id", "reviewed_at") if partitioned else ("id",))),
+        **({"postgresql_partition_by": "RANGE (reviewed_at)"} if partitioned else {}),
+    )
+
+
+def _create_history_indexes(partitioned: bool) -> None:
+    op.create_index("idx_user_review_date", "card_review_history", ["user_id", "reviewed_at"])
+    op.create_index("idx_card_deck_reviews", "card_review_history", ["card_id", "reviewed_at"])
+    op.create_index(
+        "uq_user_client_review_id",
+        "card_review_history",
+        (
+            ["user_id", "client_review_id", "reviewed_at"]
+            if partitioned
+            else ["user_id", "client_review_id"]
+        ),
+        unique=True,
+        postgresql_where=sa.text("client_review_id IS NOT NULL"),
+    )
+    for column in ("user_id", "card_id", "card_level_id"):
+        op.create_index(f"ix_card_review_history_{column}", "card_review_history", [column])
+
+
+def _set_aside_history_table(new_name: str) -> None:
+    op.rename_table("card_review_history", new_name)
+    # Free the constraint and index names for the new table; the old one is only copied from
+    constraints = op.get_bind().execute(
+        sa.text("""
+            SELECT conname FROM pg_constraint
+            WHERE conrelid = CAST(:table AS regclass) AND contype IN ('f', 'p')
+            ORDER BY contype
+            """),
+        {"table": new_name},
+    )
+    for name in constraints.scalars().all():
+        op.execute(f'ALTER TABLE {new_name} DROP CONSTRAINT "{name}"')
+    for index in _INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {index}")
+
+
+def upgrade() -> None:
+    op.create_table(
+        "review_daily_rollups",
+        sa.Column(
+            "user_id",
+            postgresql.UUID(as_uuid=True),
+            sa.ForeignKey("users.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column(
+            "deck_id",
+            postgresql.UUID(as_uuid=True),
+            sa.ForeignKey("decks.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column("reviews_count", sa.Integer(), nullable=False),
+        sa.Column("again_count", sa.Integer(), nullable=False),
+        sa.Column("hard_count", sa.Integer(), nullable=False),
+        sa.Column("good_count", sa.Integer(), nullable=False),
+        sa.Column("easy_count", sa.Integer(), nullable=False),
+        sa.Column("study_seconds", sa.Float(), nullable=False),
+    )
+
+    _set_aside_history_table("card_review_history_unpartitioned")
+    _create_history_table(partitioned=True)
+
+    bind = op.get_bind()
+    first_review = bind.execute(
+        sa.text("SELECT MIN(reviewed_at) FROM card_review_history_unpartitioned")
+    ).scalar()
+    ensure_review_history_partitions(bind, _MONTHS_AHEAD, since=first_review)
+
+    # Load before indexing: one index build per partition instead of per-row maintenance
+    op.execute(
+        f"INSERT INTO card_review_history ({_COLUMNS}) "
+        f"SELECT {_COLUMNS} FROM card_review_history_unpartitioned"
+    )
+    op.drop_table("card_review_history_unpartitioned")
+    _create_history_indexes(partitioned=True)
+
+
+def downgrade() -> None:
+    # Rows of detached (archived) partitions are not brought back
+    _set_aside_history_table("card_review_history_partitioned")
+    _create_history_table(partitioned=False)
+    op.execute(
+        f"INSERT INTO card_review_history ({_COLUMNS}) "
+        f"SELECT {_COLUMNS} FROM card_review_history_partitioned"
+    )
+    op.drop_table("card_review_history_partitioned")
+    _create_history_indexes(partitioned=False)
+
+    op.drop_table("review_daily_rollups")
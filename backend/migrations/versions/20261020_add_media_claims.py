@@ -0,0 +1,27 @@
+"""add claimed_at to media_objects: lease of the variants worker's batches
+
+Revision ID: 20261020_media_claims
+Revises: 20261020_sync_horizon
+Create Date: 2026-10-20 12:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "20261020_media_claims"
+down_revision: Union[str, None] = "20261020_sync_horizon"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "media_objects", sa.Column("claimed_at", sa.DateTime(timezone=True), nullable=True)
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("media_objects", "claimed_at")
@@ -0,0 +1,35 @@
+"""add sync_horizon: oldest cursor the pruned sync change log still answers
+
+Revision ID: 20261020_sync_horizon
+Revises: 20261019_audio_transcode
+Create Date: 2026-10-20 09:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "20261020_sync_horizon"
+down_revision: Union[str, None] = "20261019_audio_transcode"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "sync_horizon",
+        sa.Column("id", sa.SmallInteger(), primary_key=True),
+        sa.Column("txid", sa.BigInteger(), nullable=False),
+        sa.Column(
+            "pruned_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.text("now()"),
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("sync_horizon")
@@ -4,15 +4,75 @@ export interface ImportAnkiResult {
   deck_id: string
   title: string
   cards_created: number
+  cards_updated: number
+  cards_deleted: number
   warnings: string[]
 }
 
-export async function importAnkiPackage(file: File): Promise<ImportAnkiResult> {
+export interface ImportJobStatus {
+  job_id: string
+  kind: string
+  mode: 'create' | 'update'
+  status: 'queued' | 'running' | 'done' | 'failed'
+  phase: string
+  filename: string
+  notes_total: number | null
+  notes_processed: number
+  cards_created: number
+  cards_updated: number
+  cards_deleted: number
+  notes_skipped: number
+  reviews_imported: number
+  warnings: string[]
+  error: string | null
+  deck_id: string | null
+  deck_title: string | null
+  created_at: string
+  finished_at: string | null
+}
+
+const POLL_INTERVAL_MS = 1000
+
+export function getImportJob(jobId: string): Promise<ImportJobStatus> {
+  return apiRequest<ImportJobStatus>(`/imports/${jobId}`)
+}
+
+/**
+ * Upload a package and wait for the background import job to finish.
+ * onProgress is called with every polled job status.
+ * With deckId the package updates that (previously imported) deck instead of
+ * creating a new one.
+ */
+export async function importAnkiPackage(
+  file: File,
+  onProgress?: (job: ImportJobStatus) => void,
+  deckId?: string
+): Promise<ImportAnkiResult> {
   const formData = new FormData()
   formData.append('file', file)
 
-  return apiRequest<ImportAnkiResult>('/decks/import-anki', {
+  const query = deckId ? `?deck_id=${encodeURIComponent(deckId)}` : ''
+  let job = await apiRequest<ImportJobStatus>(`/decks/import-anki${query}`, {
     method: 'POST',
     body: formData,
   })
+
+  while (job.status === 'queued' || job.status === 'running') {
+    onProgress?.(job)
+    await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL_MS))
+    job = await getImportJob(job.job_id)
+  }
+
+  if (job.status === 'failed' || !job.deck_id) {
+    throw new Error(job.error || 'Import failed')
+  }
+
+  return {
+    deck_id: job.deck_id,
+    title: job.deck_title ?? file.name.replace(/\.apkg$/i, ''),
+    cards_created: job.cards_created,
+    cards_updated: job.cards_updated,
+    cards_deleted: job.cards_deleted,
+    warnings: job.warnings,
+  }
 }